@@ -0,0 +1,158 @@
+"""
+Benchmark Conversation History Storage
+Compares the compact history codec (with and without zstd / a trained
+dictionary) with the JSON entries it replaces: bytes per session and
+encode/decode time per exchange, for the API's history entries and for
+entries that carry the full navigation output
+
+Usage:
+    python scripts/benchmark_history_codec.py [--exchanges 50] [--sessions 200] [--iterations 2000]
+    python scripts/benchmark_history_codec.py --train-dict data/history.zdict [--redis-url URL]
+"""
+
+import argparse
+import json
+import os
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from src.core.session_state_manager import TRTSessionState
+from src.utils.history_codec import (
+    encode_exchange, decode_exchange, train_dictionary, dictionary_from_bytes, SUBSTATES, DECISIONS,
+    SITUATIONS, RAG_QUERIES
+)
+
+CLIENT_LINES = [
+    "I want to feel calmer at work", "it's like a tightness in my chest", "yeah",
+    "mostly when my manager emails me late", "I don't know, kind of heavy", "it's moving up to my throat",
+    "I guess I'd be able to speak up in meetings without my heart racing",
+    "it's been like this since I started the new job, maybe two years"
+]
+THERAPIST_LINES = [
+    "What do you want our work together to achieve?", "Where do you feel that in your body?",
+    "What else?", "How do you know it's time to feel anxious?", "And what's that like right now?",
+    "So when you're calm and confident at work, what will you notice that's different?"
+]
+REASONS = [
+    "Client described a body sensation; continue exploring location and quality.",
+    "Goal stated but vision not accepted yet; build the future vision.",
+    "STRICT RULE: Must establish goal first",
+]
+
+
+def build_exchanges(rng: random.Random, count: int, navigation: bool):
+    """
+    Exchanges as the API records them, or (navigation=True) as the session
+    state does, with the full navigation output
+    """
+    completion = dict(TRTSessionState("bench").stage_1_completion)
+    start = datetime(2026, 10, 18, 9, 0) + timedelta(minutes=rng.randint(0, 10 ** 5))
+    exchanges = []
+    for turn in range(count):
+        substate = rng.choice(SUBSTATES[:4])
+        exchange = {
+            "client_input": rng.choice(CLIENT_LINES),
+            "therapist_response": rng.choice(THERAPIST_LINES),
+            "navigation_decision": rng.choice(DECISIONS[:8]),
+            "current_substate": substate,
+            "timestamp": (start + timedelta(seconds=40 * turn, microseconds=rng.randint(1, 999999))).isoformat()
+        }
+        if navigation:
+            completion[rng.choice(sorted(completion))] = True
+            exchange = {
+                "turn": turn + 1,
+                "timestamp": exchange["timestamp"],
+                "client_input": exchange["client_input"],
+                "therapist_response": exchange["therapist_response"],
+                "substate": substate,
+                "navigation_output": {
+                    "current_stage": "stage_1_safety_building",
+                    "current_substate": substate,
+                    "navigation_decision": exchange["navigation_decision"],
+                    "situation_type": rng.choice(SITUATIONS),
+                    "rag_query": rng.choice(RAG_QUERIES),
+                    "completion_status": dict(completion),
+                    "ready_for_next": False,
+                    "advancement_blocked_by": ["vision_not_accepted"],
+                    "reasoning": rng.choice(REASONS),
+                    "recent_events": [],
+                    "llm_reasoning": False,
+                    "fallback_used": False,
+                    "rule_override": True
+                }
+            }
+        exchanges.append(exchange)
+    return exchanges
+
+
+def per_exchange_us(fn, items, iterations: int) -> float:
+    start = time.perf_counter()
+    for index in range(iterations):
+        fn(items[index % len(items)])
+    return (time.perf_counter() - start) / iterations * 1e6
+
+
+def redis_samples(redis_url: str, limit: int = 5000):
+    """Exchanges from the live history streams, to train on real conversations"""
+    import redis
+    client = redis.from_url(redis_url, decode_responses=False)
+    samples = []
+    for key in client.scan_iter(match="trt:session:*:stream", count=500):
+        samples += [decode_exchange(fields[b"entry"]) for _, fields in client.xrange(key)]
+        if len(samples) >= limit:
+            break
+    return samples
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--exchanges", type=int, default=50, help="Exchanges per session (history limit)")
+    parser.add_argument("--sessions", type=int, default=200, help="Sessions to train the dictionary on")
+    parser.add_argument("--iterations", type=int, default=2000)
+    parser.add_argument("--dict-size", type=int, default=16384)
+    parser.add_argument("--train-dict", metavar="PATH", help="Train a dictionary, save it to PATH and exit")
+    parser.add_argument("--redis-url", help="With --train-dict: train on the history stored in this Redis")
+    args = parser.parse_args()
+
+    rng = random.Random(2026)
+    if args.train_dict:
+        samples = redis_samples(args.redis_url) if args.redis_url else [
+            exchange for _ in range(args.sessions) for navigation in (False, True)
+            for exchange in build_exchanges(rng, args.exchanges, navigation)]
+        with open(args.train_dict, "wb") as f:
+            f.write(train_dictionary(samples, args.dict_size))
+        print(f"✅ Trained a {args.dict_size}-byte dictionary on {len(samples)} exchanges: {args.train_dict}")
+        print(f"   Set TRT_HISTORY_ZSTD_DICT={args.train_dict}")
+        return
+
+    training = [exchange for _ in range(args.sessions) for navigation in (False, True)
+                for exchange in build_exchanges(rng, args.exchanges, navigation)]
+    dictionary = dictionary_from_bytes(train_dictionary(training, args.dict_size))
+    formats = {
+        "json": (lambda e: json.dumps(e).encode("utf-8"), json.loads),
+        "compact": (lambda e: encode_exchange(e, compress=False, dictionary=None), decode_exchange),
+        "compact+zstd": (lambda e: encode_exchange(e, compress=True, dictionary=None), decode_exchange),
+        "compact+dict": (lambda e: encode_exchange(e, compress=True, dictionary=dictionary),
+                         lambda b: decode_exchange(b, dictionary=dictionary)),
+    }
+
+    print(f"{'history':<10} {'format':<13} {'bytes/session':>13} {'ratio':>6} {'encode µs':>10} {'decode µs':>10}")
+    for label, navigation in (("api", False), ("navigation", True)):
+        session = build_exchanges(random.Random(7), args.exchanges, navigation)
+        json_size = None
+        for name, (encode, decode) in formats.items():
+            entries = [encode(exchange) for exchange in session]
+            assert [decode(entry) for entry in entries] == session
+            size = sum(len(entry) for entry in entries)
+            json_size = json_size or size
+            encode_us = per_exchange_us(encode, session, args.iterations)
+            decode_us = per_exchange_us(decode, entries, args.iterations)
+            print(f"{label:<10} {name:<13} {size:>13} {size / json_size:>6.2f} {encode_us:>10.1f} {decode_us:>10.1f}")
+
+
+if __name__ == "__main__":
+    main()
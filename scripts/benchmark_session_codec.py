@@ -0,0 +1,97 @@
+"""
+Benchmark Session State Serialization
+Compares the msgpack/zstd session codec with JSON on size and encode/decode
+time, for sessions of increasing length
+
+Usage:
+    python scripts/benchmark_session_codec.py [--turns 0 10 30 60] [--iterations 2000]
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from src.core.session_state_manager import TRTSessionState
+from src.utils.session_codec import encode_state, decode_state
+
+CLIENT_LINES = [
+    "I want to feel calmer at work", "it's like a tightness in my chest", "yeah",
+    "mostly when my manager emails me late", "I don't know, kind of heavy", "it's moving up to my throat"
+]
+THERAPIST_LINES = [
+    "What do you want our work together to achieve?", "Where do you feel that in your body?",
+    "What else?", "How do you know it's time to feel anxious?", "And what's that like right now?"
+]
+
+
+def build_session(turns: int) -> TRTSessionState:
+    """A session with realistic history (navigation output included, as the wrapper stores it)"""
+    state = TRTSessionState(f"bench-{turns}")
+    for turn in range(turns):
+        state.add_exchange(
+            CLIENT_LINES[turn % len(CLIENT_LINES)],
+            THERAPIST_LINES[turn % len(THERAPIST_LINES)],
+            {
+                "navigation_decision": "body_enquiry",
+                "current_substate": state.current_substate,
+                "reasoning": "Client described a body sensation; continue exploring location and quality.",
+                "completion_status": dict(state.stage_1_completion),
+                "rag_query": "body sensation follow-up"
+            }
+        )
+    return state
+
+
+def json_encode(state: TRTSessionState) -> bytes:
+    fields = dict(vars(state))
+    fields["questions_asked_set"] = sorted(fields["questions_asked_set"])
+    return json.dumps(fields).encode("utf-8")
+
+
+def json_decode(data: bytes) -> TRTSessionState:
+    fields = json.loads(data)
+    state = TRTSessionState(fields["session_id"])
+    state.__dict__.update(fields)
+    state.questions_asked_set = set(fields["questions_asked_set"])
+    return state
+
+
+def time_per_call(fn, arg, iterations: int) -> float:
+    """Microseconds per call"""
+    start = time.perf_counter()
+    for _ in range(iterations):
+        fn(arg)
+    return (time.perf_counter() - start) / iterations * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--turns", type=int, nargs="+", default=[0, 10, 30, 60])
+    parser.add_argument("--iterations", type=int, default=2000)
+    args = parser.parse_args()
+
+    formats = {
+        "json": (json_encode, json_decode),
+        "msgpack": (lambda s: encode_state(s, compress=False), decode_state),
+        "msgpack+zstd": (lambda s: encode_state(s, compress=True), decode_state),
+    }
+
+    print(f"{'turns':>5}  {'format':<13} {'bytes':>8} {'ratio':>6} {'encode µs':>10} {'decode µs':>10}")
+    for turns in args.turns:
+        state = build_session(turns)
+        json_size = None
+        for name, (encode, decode) in formats.items():
+            blob = encode(state)
+            json_size = json_size or len(blob)
+            encode_us = time_per_call(encode, state, args.iterations)
+            decode_us = time_per_call(decode, blob, args.iterations)
+            print(f"{turns:>5}  {name:<13} {len(blob):>8} {len(blob) / json_size:>6.2f} "
+                  f"{encode_us:>10.1f} {decode_us:>10.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,117 @@
+"""
+Benchmark Session Store Backends
+Runs the API's per-turn pattern (load, change, commit with an exchange)
+against the SQLite, disk and Redis stores: p50 / p99 latency per call and
+turns per second. "sqlite" is the write-behind store as the API uses it;
+"sqlite-flush" waits for every turn to reach the file, to show what the
+write-behind queue takes off the request path.
+
+Without --redis-url, Redis is fakeredis (in-process, no network), so its
+numbers are a lower bound; point it at a real server for a fair comparison.
+
+Usage:
+    python scripts/benchmark_session_store.py [--sessions 200] [--turns 20] [--redis-url URL]
+    python scripts/benchmark_session_store.py --backends sqlite sqlite-flush --synchronous FULL
+"""
+
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from src.core.session_state_manager import TRTSessionState
+from src.utils.session_store import SessionRecord, FileSessionStore, RedisSessionStore
+from src.utils.sqlite_session_store import SqliteSessionStore
+
+BACKENDS = ["sqlite", "sqlite-flush", "disk", "redis"]
+SUBSTATES = ["1.1_goal_and_vision", "1.2_problem_and_body", "1.3_readiness_assessment"]
+
+
+def build_store(backend: str, directory: str, args):
+    if backend.startswith("sqlite"):
+        return SqliteSessionStore(os.path.join(directory, f"{backend}.db"), synchronous=args.synchronous)
+    if backend == "disk":
+        return FileSessionStore(os.path.join(directory, "sessions"))
+
+    from src.utils import redis_session_manager
+    if args.redis_url:
+        os.environ["REDIS_URL"] = args.redis_url
+    else:
+        import fakeredis
+        server = fakeredis.FakeServer()
+        redis_session_manager.redis.from_url = lambda url, **kwargs: fakeredis.FakeRedis(server=server, **kwargs)
+    return RedisSessionStore(redis_session_manager.RedisSessionManager())
+
+
+def percentile(samples, fraction: float) -> float:
+    return sorted(samples)[min(len(samples) - 1, int(len(samples) * fraction))]
+
+
+def run(store, backend: str, sessions: int, turns: int):
+    """
+    Returns:
+        {operation: latencies in µs}, plus the wall time of the turn phase
+    """
+    timings = {"create": [], "load": [], "commit": [], "list": []}
+    ids = [f"bench-{backend}-{index}" for index in range(sessions)]
+    for session_id in ids:
+        start = time.perf_counter()
+        store.create(SessionRecord(session_id=session_id, session_state=TRTSessionState(session_id),
+                                   client_id="bench"))
+        timings["create"].append((time.perf_counter() - start) * 1e6)
+
+    started = time.perf_counter()
+    for turn in range(1, turns + 1):
+        for session_id in ids:
+            start = time.perf_counter()
+            record = store.load(session_id)
+            loaded = time.perf_counter()
+            record.turn_count = turn
+            record.session_state.current_substate = SUBSTATES[turn % len(SUBSTATES)]
+            record.session_state.add_exchange("it's like a tightness in my chest",
+                                              "Where do you feel that in your body?",
+                                              {"navigation_decision": "body_enquiry"})
+            store.commit(record, {"turn": turn, "client_input": "it's like a tightness in my chest",
+                                  "therapist_response": "Where do you feel that in your body?"},
+                         fencing_token=turn)
+            if backend == "sqlite-flush":
+                store.flush()
+            timings["load"].append((loaded - start) * 1e6)
+            timings["commit"].append((time.perf_counter() - loaded) * 1e6)
+    elapsed = time.perf_counter() - started
+
+    for _ in range(20):
+        start = time.perf_counter()
+        store.list_page(limit=50, substate=SUBSTATES[0])
+        timings["list"].append((time.perf_counter() - start) * 1e6)
+    return timings, elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--backends", nargs="+", choices=BACKENDS, default=BACKENDS)
+    parser.add_argument("--sessions", type=int, default=200)
+    parser.add_argument("--turns", type=int, default=20, help="Turns per session")
+    parser.add_argument("--synchronous", default="NORMAL", choices=["NORMAL", "FULL"],
+                        help="SQLite synchronous pragma")
+    parser.add_argument("--redis-url", help="Real Redis to benchmark against (default: fakeredis)")
+    args = parser.parse_args()
+
+    print(f"{'backend':<13} {'operation':<8} {'p50 µs':>9} {'p99 µs':>9} {'turns/s':>9}")
+    with tempfile.TemporaryDirectory() as directory:
+        for backend in args.backends:
+            store = build_store(backend, directory, args)
+            timings, elapsed = run(store, backend, args.sessions, args.turns)
+            store.close()
+            for operation, samples in timings.items():
+                throughput = f"{args.sessions * args.turns / elapsed:>9.0f}" if operation == "commit" else ""
+                print(f"{backend:<13} {operation:<8} {statistics.median(samples):>9.1f} "
+                      f"{percentile(samples, 0.99):>9.1f} {throughput:>9}")
+
+
+if __name__ == "__main__":
+    main()
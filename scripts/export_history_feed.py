@@ -0,0 +1,79 @@
+"""
+Export Conversation History from the Feed
+Reads the history feed streams through a consumer group and writes one JSON
+line per exchange. Entries are acked only after they are written, so a
+crashed export resumes without losing any (a few may be written twice).
+
+Usage:
+    python scripts/export_history_feed.py [--group history-export] [--output history.jsonl] [--once]
+"""
+
+import argparse
+import json
+import os
+import socket
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import redis
+
+from src.utils.history_feed import HistoryFeed
+
+
+def export(feed: HistoryFeed, out, count: int, claim_idle_ms: int) -> int:
+    """
+    Write one batch (stale entries of dead consumers first, then new ones) and ack it
+
+    Returns:
+        Number of entries exported
+    """
+    entries = feed.claim_stale(claim_idle_ms, count) + feed.read(count)
+    for entry in entries:
+        out.write(json.dumps({"session_id": entry.session_id, "entry_id": entry.entry_id,
+                              "exchange": entry.exchange}) + "\n")
+    out.flush()
+    return feed.ack(entries)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--redis-url", default=os.getenv("REDIS_URL", "redis://:changeme@localhost:6379"))
+    parser.add_argument("--cluster", action="store_true",
+                        default=os.getenv("REDIS_CLUSTER", "false").lower() == "true")
+    parser.add_argument("--group", default="history-export")
+    parser.add_argument("--consumer", default=f"{socket.gethostname()}-{os.getpid()}")
+    parser.add_argument("--output", help="JSONL file to append to (default: stdout)")
+    parser.add_argument("--count", type=int, default=500, help="Entries per bucket and read")
+    parser.add_argument("--claim-idle", type=int, default=60000,
+                        help="Take over entries pending this long (ms) with another consumer")
+    parser.add_argument("--interval", type=float, default=1.0, help="Seconds to wait when the feed is drained")
+    parser.add_argument("--once", action="store_true", help="Exit once the feed is drained")
+    args = parser.parse_args()
+
+    connect = redis.RedisCluster.from_url if args.cluster else redis.from_url
+    feed = HistoryFeed(connect(args.redis_url, decode_responses=False), args.group, args.consumer)
+    feed.ensure_group()
+
+    out = open(args.output, "a", encoding="utf-8") if args.output else sys.stdout
+    total = 0
+    try:
+        while True:
+            exported = export(feed, out, args.count, args.claim_idle)
+            total += exported
+            if not exported:
+                if args.once:
+                    break
+                time.sleep(args.interval)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        if out is not sys.stdout:
+            out.close()
+    print(f"✅ Exported {total} exchanges ({feed.pending()} still pending in group '{args.group}')",
+          file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
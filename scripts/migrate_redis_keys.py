@@ -0,0 +1,166 @@
+"""
+Migrate Redis Session Keys to the Hash-Tagged Layout
+Moves every session from trt:session:<id>:<kind> to trt:session:{<id>}:<kind>
+(TTL kept) and rebuilds the activity / substate indexes as bucketed sorted sets
+(see src/utils/redis_keys.py). Run it with the API stopped; it is idempotent.
+
+Usage:
+    python scripts/migrate_redis_keys.py [--dry-run] [--batch 500]
+    python scripts/migrate_redis_keys.py --rebuild-index   # e.g. after changing TRT_ACTIVITY_INDEX_SHARDS
+"""
+
+import argparse
+import os
+import sys
+import time
+from datetime import datetime
+from itertools import islice
+from typing import Dict, Iterable, Iterator, List
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import redis
+
+from src.utils.redis_keys import (
+    session_key, index_shards, index_bucket, activity_key, substate_key,
+    LEGACY_ACTIVE_SESSIONS_KEY, LEGACY_SUBSTATE_PREFIX, legacy_session_key
+)
+
+# Moved with the session; the turn lock is short-lived and simply re-taken
+MIGRATED_KINDS = ("state", "meta", "stream", "history", "fence")
+
+
+def batches(items: Iterable, size: int) -> Iterator[List]:
+    items = iter(items)
+    while True:
+        batch = list(islice(items, size))
+        if not batch:
+            return
+        yield batch
+
+
+def _session_id(state_key: bytes) -> str:
+    return state_key.decode()[len("trt:session:"):-len(":state")]
+
+
+def legacy_session_ids(client, batch_size: int = 500) -> Iterator[str]:
+    """Sessions still stored under the old layout"""
+    for key in client.scan_iter(match="trt:session:*:state", count=batch_size):
+        session_id = _session_id(key)
+        if not session_id.startswith("{"):
+            yield session_id
+
+
+def move_sessions(client, session_ids: List[str], dry_run: bool = False) -> int:
+    """
+    Copy one batch of sessions to the new keys (DUMP / RESTORE, TTL kept) and delete the old ones
+
+    Returns:
+        Number of keys moved
+    """
+    pipe = client.pipeline(transaction=False)
+    for session_id in session_ids:
+        for kind in MIGRATED_KINDS:
+            pipe.dump(legacy_session_key(session_id, kind))
+            pipe.pttl(legacy_session_key(session_id, kind))
+    results = pipe.execute()
+
+    moved = 0
+    pipe = client.pipeline(transaction=False)
+    for index, (session_id, kind) in enumerate((s, k) for s in session_ids for k in MIGRATED_KINDS):
+        dumped, ttl_ms = results[2 * index], results[2 * index + 1]
+        if dumped is None:
+            continue
+        pipe.restore(session_key(session_id, kind), max(ttl_ms, 0), dumped, replace=True)
+        pipe.delete(legacy_session_key(session_id, kind))
+        moved += 1
+    if not dry_run:
+        pipe.execute()
+    return moved
+
+
+def _activity(fields: List, legacy_score) -> float:
+    """Last activity for the index: active_at, else the old index score, else last_interaction"""
+    active_at, _, last_interaction = fields
+    if active_at:
+        return float(active_at)
+    if legacy_score is not None:
+        return float(legacy_score)
+    if last_interaction:
+        return datetime.fromisoformat(last_interaction.decode()).timestamp()
+    return time.time()
+
+
+def rebuild_indexes(client, shards: int, batch_size: int = 500, dry_run: bool = False) -> Dict:
+    """
+    Rebuild the bucketed indexes from the sessions' state hashes, then drop the old-layout indexes
+
+    Returns:
+        Dict with sessions indexed and index keys dropped
+    """
+    legacy_scores = {member.decode(): score for member, score in client.zscan_iter(LEGACY_ACTIVE_SESSIONS_KEY)}
+
+    # Old-layout and bucketed indexes alike (the bucketed keys extend the old names)
+    stale = list(client.scan_iter(match=f"{LEGACY_ACTIVE_SESSIONS_KEY}*", count=batch_size))
+    stale += client.scan_iter(match=f"{LEGACY_SUBSTATE_PREFIX}*", count=batch_size)
+    if not dry_run:
+        for keys in batches(stale, batch_size):
+            pipe = client.pipeline(transaction=False)
+            for key in keys:
+                pipe.unlink(key)
+            pipe.execute()
+
+    indexed = 0
+    for keys in batches(client.scan_iter(match="trt:session:{*}:state", count=batch_size), batch_size):
+        pipe = client.pipeline(transaction=False)
+        for key in keys:
+            pipe.hmget(key, ["active_at", "current_substate", "last_interaction"])
+        rows = pipe.execute()
+
+        pipe = client.pipeline(transaction=False)
+        for key, fields in zip(keys, rows):
+            session_id = _session_id(key)[1:-1]
+            if fields[1] is None:
+                continue  # Expired since the scan
+            score = _activity(fields, legacy_scores.get(session_id))
+            bucket = index_bucket(session_id, shards)
+            pipe.zadd(activity_key(bucket), {session_id: score})
+            pipe.zadd(substate_key(bucket, fields[1].decode()), {session_id: score})
+            if not fields[0]:
+                pipe.hset(key, "active_at", score)
+            indexed += 1
+        if not dry_run:
+            pipe.execute()
+
+    return {"sessions": indexed, "index_keys_dropped": len(stale)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--redis-url", default=os.getenv("REDIS_URL", "redis://:changeme@localhost:6379"))
+    parser.add_argument("--cluster", action="store_true",
+                        default=os.getenv("REDIS_CLUSTER", "false").lower() == "true")
+    parser.add_argument("--batch", type=int, default=500, help="Sessions per SCAN / pipeline batch")
+    parser.add_argument("--dry-run", action="store_true", help="Report what would change, write nothing")
+    parser.add_argument("--rebuild-index", action="store_true", help="Only rebuild the indexes")
+    args = parser.parse_args()
+
+    connect = redis.RedisCluster.from_url if args.cluster else redis.from_url
+    client = connect(args.redis_url, decode_responses=False)
+    prefix = "🔍 [dry run] " if args.dry_run else ""
+
+    if not args.rebuild_index:
+        sessions = keys = 0
+        for session_ids in batches(legacy_session_ids(client, args.batch), args.batch):
+            keys += move_sessions(client, session_ids, args.dry_run)
+            sessions += len(session_ids)
+        print(f"{prefix}✅ Moved {sessions} sessions ({keys} keys) to the hash-tagged layout")
+
+    shards = index_shards()
+    result = rebuild_indexes(client, shards, args.batch, args.dry_run)
+    print(f"{prefix}✅ Indexed {result['sessions']} sessions in {shards} buckets "
+          f"(dropped {result['index_keys_dropped']} old index keys)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,74 @@
+"""
+Replay a Session's State Events
+Prints a session's audit trail (every state write and the events it logged)
+and replays the log from its first reset event - or, once the capped log no
+longer reaches back to one, from the last snapshot - checking the result
+against the state the API loads (last snapshot plus the events since).
+
+Usage:
+    python scripts/replay_session_events.py SESSION_ID [--quiet]
+"""
+
+import argparse
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from src.core.session_state_manager import TRTSessionState
+from src.utils.redis_session_manager import RedisSessionManager
+from src.utils.session_codec import encode_state
+from src.utils.session_events import RESET, apply_events
+
+
+def describe(event) -> str:
+    if event.kind == RESET:
+        return f"reset ({len(event.value)} fields)"
+    if event.key is not None:
+        return f"{event.kind} {event.field}[{event.key!r}] = {event.value!r}"
+    return f"{event.kind} {event.field} {event.value!r}"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("session_id")
+    parser.add_argument("--quiet", action="store_true", help="Only check the replay, don't print the trail")
+    args = parser.parse_args()
+
+    manager = RedisSessionManager()
+    log = manager.get_state_events(args.session_id)
+    first = next((index for index, (_, _, events) in enumerate(log) if events and events[0].kind == RESET), None)
+    if first is not None:
+        session_state, start = TRTSessionState(args.session_id), "its first reset"
+    else:
+        # Trimmed past every reset: start from the snapshot (entries up to its own are in it)
+        snapshot = manager.get_state_snapshot(args.session_id)
+        if snapshot is None:
+            print(f"No replayable event log for {args.session_id} (created before state events, or expired)")
+            return 1
+        snapshot_event, session_state = snapshot
+        first = next((index + 1 for index, (entry_id, _, _) in enumerate(log) if entry_id == snapshot_event), 0)
+        start = "the last snapshot"
+
+    if not args.quiet and first > 0:
+        print(f"({first} earlier writes not replayed)")
+    for entry_id, version, events in log[first:]:
+        if not args.quiet:
+            print(f"{entry_id}  v{version}")
+            for event in events:
+                print(f"    {describe(event)}")
+        apply_events(session_state, events)
+
+    loaded = manager.load_session_state(args.session_id)
+    if loaded is None or "session_state" not in loaded:
+        print(f"Session {args.session_id} has no stored state to compare with")
+        return 1
+    if encode_state(session_state) != encode_state(loaded["session_state"]):
+        print(f"❌ Replaying {len(log) - first} writes from {start} does not give the stored state")
+        return 1
+    print(f"✅ Replaying {len(log) - first} writes from {start} gives the stored state (version {loaded['version']})")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -10,7 +10,6 @@ Key improvements:
 """
 
 import json
-import requests
 from src.utils.embedding_and_retrieval_setup import TRTRAGSystem
 from src.core.session_state_manager import TRTSessionState
 from src.utils.no_harm_framework import NoHarmFramework
@@ -21,20 +20,30 @@ from src.utils.psycho_education import PsychoEducation
 from src.core.alpha_sequence import AlphaSequence
 from src.utils.prompt_loader import get_prompt_loader
 from src.utils.detailed_logger import get_detailed_logger
+from src.utils.ollama_client import OllamaClient
+from src.utils.llm_scheduler import RequestPriority
+from src.utils.turn_context import current_turn, MIN_LLM_CALL_SECONDS
 import logging
 
 # Initialize detailed logger
 detailed_logger = get_detailed_logger("DialogueAgent")
 
+# Minimum turn budget (seconds) worth spending on RAG retrieval
+RETRIEVAL_MIN_SECONDS = 0.2
+
 class ImprovedOllamaDialogueAgent:
     """Improved Ollama Dialogue Agent following Dr. Q's real methodology"""
 
-    def __init__(self, rag_system: TRTRAGSystem, ollama_url="http://localhost:11434", model="llama3.1"):
+    def __init__(self, rag_system: TRTRAGSystem, ollama_url="http://localhost:11434", model="llama3.1",
+                 llm_client: OllamaClient = None):
         self.rag_system = rag_system
         self.ollama_url = ollama_url
         self.model = model
         self.api_endpoint = f"{ollama_url}/api/generate"
 
+        # Shared Ollama client (keep_alive, metrics) - one per agent if not provided
+        self.llm_client = llm_client or OllamaClient(ollama_url)
+
         # Initialize no-harm framework
         self.no_harm_framework = NoHarmFramework()
 
@@ -54,6 +63,13 @@ class ImprovedOllamaDialogueAgent:
         self.logger.info(f"✅ Improved Ollama Dialogue Agent initialized: {ollama_url} (model: {model})")
         self.logger.info(f"✅ Dr. Q Enhancement Modules loaded: Language Techniques, Engagement Tracking, Vision Templates, Psycho-Education, Alpha Sequence")
 
+    def preload_model(self, keep_alive: str = None) -> bool:
+        """Load the dialogue model into Ollama memory without generating any text"""
+        loaded = self.llm_client.preload(self.model, keep_alive=keep_alive)
+        if loaded:
+            self.logger.info(f"✅ Ollama model preloaded: {self.ollama_url} (model: {self.model})")
+        return loaded
+
     def generate_response(self, client_input: str, navigation_output: dict,
                          session_state: TRTSessionState) -> dict:
         """Generate therapeutic response using improved methodology"""
@@ -246,11 +262,7 @@ class ImprovedOllamaDialogueAgent:
 
         # Get RAG examples
         self.logger.info(f"🎯 USING RAG for decision: {navigation_output.get('navigation_decision')}")
-        rag_examples = self.rag_system.get_few_shot_examples(
-            navigation_output,
-            client_input,
-            max_examples=3
-        )
+        rag_examples = self._retrieve_rag_examples(navigation_output, client_input)
         self.logger.info(f"📚 RAG returned {len(rag_examples)} examples for LLM prompting")
 
         # HYBRID APPROACH: Decide when to use RAG+LLM vs Rules
@@ -362,6 +374,24 @@ class ImprovedOllamaDialogueAgent:
             "fallback_used": llm_response.get("fallback_used", False)
         }
 
+    def _retrieve_rag_examples(self, navigation_output: dict, client_input: str) -> list:
+        """Get RAG few-shot examples, skipping retrieval when the turn budget is nearly spent"""
+        turn = current_turn()
+        if turn is not None:
+            remaining = turn.remaining()
+            # Retrieval is only useful if there is still time to prompt the LLM with it
+            if remaining is not None and remaining < RETRIEVAL_MIN_SECONDS + MIN_LLM_CALL_SECONDS:
+                with turn.stage_scope("retrieval"):
+                    turn.mark_degraded("deadline")
+                self.logger.warning(f"⏱️ Skipping RAG retrieval: {max(remaining, 0):.2f}s left in turn budget")
+                return []
+
+        return self.rag_system.get_few_shot_examples(
+            navigation_output,
+            client_input,
+            max_examples=3
+        )
+
     def _should_affirm_and_proceed(self, client_input: str, session_state: TRTSessionState, navigation_output: dict) -> bool:
         """Check if we should just affirm and move forward (like Dr. Q does)"""
 
@@ -1260,27 +1290,19 @@ class ImprovedOllamaDialogueAgent:
                 prompt_preview=prompt[:300]
             )
 
-            response = requests.post(
-                self.api_endpoint,
-                json={
-                    "model": self.model,
-                    "prompt": prompt,
-                    "stream": False,
-                    "options": {
-                        "temperature": 0.3,  # Lower for more consistent responses
-                        "num_predict": 200   # Shorter responses like Dr. Q
-                    }
+            llm_response = self.llm_client.generate(
+                self.model,
+                prompt,
+                options={
+                    "temperature": 0.3,  # Lower for more consistent responses
+                    "num_predict": 200   # Shorter responses like Dr. Q
                 },
-                timeout=60
+                timeout=60,
+                prompt_type="dialogue",
+                priority=RequestPriority.DIALOGUE
             )
-
-            if response.status_code == 200:
-                result = response.json()
-                llm_response = result.get('response', '')
-                detailed_logger.log_llm_response(llm_response[:200])
-                return llm_response
-            else:
-                raise Exception(f"Ollama returned status {response.status_code}: {response.text}")
+            detailed_logger.log_llm_response(llm_response[:200])
+            return llm_response
 
         except Exception as e:
             self.logger.error(f"Ollama call failed: {e}")
@@ -4,9 +4,10 @@ Uses local Ollama with Llama 3.1
 """
 
 import json
-import requests
 import os
 from src.core.session_state_manager import TRTSessionState
+from src.utils.ollama_client import OllamaClient
+from src.utils.llm_scheduler import RequestPriority
 from src.utils.input_preprocessing import InputPreprocessor
 from src.utils.prompt_loader import get_prompt_loader
 from src.utils.detailed_logger import get_detailed_logger
@@ -18,11 +19,14 @@ detailed_logger = get_detailed_logger("MasterPlanningAgent")
 class OllamaLLMMasterPlanningAgent:
     """Ollama-powered Master Planning Agent using local Llama 3.1"""
 
-    def __init__(self, ollama_url="http://localhost:11434", model="llama3.1"):
+    def __init__(self, ollama_url="http://localhost:11434", model="llama3.1", llm_client: OllamaClient = None):
         self.ollama_url = ollama_url
         self.model = model
         self.api_endpoint = f"{ollama_url}/api/generate"
 
+        # Shared Ollama client (keep_alive, metrics) - one per agent if not provided
+        self.llm_client = llm_client or OllamaClient(ollama_url)
+
         # Get project root directory
         project_root = os.path.join(os.path.dirname(__file__), '..', '..')
 
@@ -44,28 +48,19 @@ class OllamaLLMMasterPlanningAgent:
         logging.basicConfig(level=logging.INFO)
         self.logger = logging.getLogger(__name__)
 
-        # Test Ollama connection
-        self._test_ollama_connection()
-
-    def _test_ollama_connection(self):
-        """Test if Ollama is accessible"""
-        try:
-            response = requests.post(
-                self.api_endpoint,
-                json={
-                    "model": self.model,
-                    "prompt": "test",
-                    "stream": False
-                },
-                timeout=10
-            )
-            if response.status_code == 200:
-                self.logger.info(f"✅ Ollama connected: {self.ollama_url} (model: {self.model})")
-            else:
-                self.logger.warning(f"⚠️ Ollama returned status {response.status_code}")
-        except Exception as e:
-            self.logger.error(f"❌ Cannot connect to Ollama: {e}")
+    def preload_model(self, keep_alive: str = None) -> bool:
+        """
+        Load the model into Ollama memory without generating any text
+
+        An empty generate request with keep_alive makes Ollama load the model
+        and keep it resident, so the first real turn doesn't pay the load time.
+        """
+        loaded = self.llm_client.preload(self.model, keep_alive=keep_alive)
+        if loaded:
+            self.logger.info(f"✅ Ollama model preloaded: {self.ollama_url} (model: {self.model})")
+        else:
             self.logger.info("Will use fallback rule-based logic")
+        return loaded
 
     def _check_strict_rule_overrides(self, client_input: str, session_state: TRTSessionState, events: list) -> dict:
         """STRICT RULE-BASED OVERRIDES - Take precedence over LLM"""
@@ -402,27 +397,19 @@ class OllamaLLMMasterPlanningAgent:
                 prompt_preview=prompt[:300]
             )
 
-            response = requests.post(
-                self.api_endpoint,
-                json={
-                    "model": self.model,
-                    "prompt": prompt,
-                    "stream": False,
-                    "options": {
-                        "temperature": 0.3,
-                        "num_predict": 512
-                    }
+            llm_response = self.llm_client.generate(
+                self.model,
+                prompt,
+                options={
+                    "temperature": 0.3,
+                    "num_predict": 512
                 },
-                timeout=60
+                timeout=60,
+                prompt_type="navigation",
+                priority=RequestPriority.NAVIGATION
             )
-
-            if response.status_code == 200:
-                result = response.json()
-                llm_response = result.get('response', '')
-                detailed_logger.log_llm_response(llm_response[:200])
-                return llm_response
-            else:
-                raise Exception(f"Ollama returned status {response.status_code}: {response.text}")
+            detailed_logger.log_llm_response(llm_response[:200])
+            return llm_response
 
         except Exception as e:
             self.logger.error(f"Ollama call failed: {e}")
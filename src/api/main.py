@@ -3,14 +3,18 @@ FastAPI Application for TRT AI Therapist
 Provides REST API endpoints for agentic workflow integration
 """
 
-from fastapi import FastAPI, HTTPException, status
+from fastapi import FastAPI, HTTPException, Query, Request, Response, status
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import JSONResponse
+from starlette.concurrency import run_in_threadpool
 from datetime import datetime
+import asyncio
 import sys
 import os
+import threading
+import time
 import uuid
-from typing import Dict
+from typing import Dict, List, Optional
 
 # Add parent directory to path for imports
 sys.path.append(os.path.join(os.path.dirname(__file__), '../..'))
@@ -18,13 +22,25 @@ sys.path.append(os.path.join(os.path.dirname(__file__), '../..'))
 from src.api.models import (
     SessionCreateRequest, SessionCreateResponse,
     ClientInputRequest, TherapistResponse,
-    SessionStatusResponse, HealthCheckResponse, ErrorResponse,
+    SessionStatusResponse, HealthCheckResponse, ReadinessResponse, ErrorResponse,
     PreprocessingResult, NavigationDecision, SessionProgress,
     EmotionalState, SafetyChecks
 )
-from src.api.therapy_system_wrapper import ImprovedOllamaTherapySystem
-from src.utils.redis_session_manager import RedisSessionManager
+from src.utils.session_store import (
+    create_session_store, SessionRecord, InvalidCursorError, BACKEND_REDIS, BACKEND_MEMORY, BACKEND_SQLITE
+)
 from src.utils.detailed_logger import get_detailed_logger
+from src.utils.metrics import get_metrics
+from src.utils.ollama_pool import OllamaEndpointPool
+from src.utils.message_coalescer import get_message_coalescer
+from src.utils.session_lock import create_session_lock, SessionBusyError, SessionLease
+from src.utils.session_sweeper import SessionSweeper
+from src.utils.history_writer import HistoryWriter
+from src.utils.idempotency import (
+    create_idempotency_store, request_fingerprint, IDEMPOTENCY_HEADER,
+    IdempotencyKeyReusedError, IdempotencyInProgressError
+)
+from src.utils.turn_context import default_turn_budget, get_in_flight_turns, CancelToken, TurnCancelled
 
 # Initialize detailed logger
 logger = get_detailed_logger("API.Main")
@@ -51,47 +67,143 @@ app.add_middleware(
 )
 
 # ============================================================
-# REDIS SESSION STORAGE
+# SESSION STORAGE
 # ============================================================
 
-# Initialize Redis Session Manager
-try:
-    redis_manager = RedisSessionManager()
-    print("✅ Redis session manager initialized")
-except Exception as e:
-    print(f"⚠️ Redis connection failed, using in-memory fallback: {e}")
-    redis_manager = None
+# Redis (shared by all workers), in-memory or on-disk - see TRT_SESSION_STORE.
+# Redis falls back to in-memory if the connection fails.
+session_store = create_session_store()
+print(f"✅ Session store initialized: {session_store.backend}")
+
+# One turn at a time per session, across workers (Redis lease) or within this process
+# (waiting for a busy session polls on the event loop, through the async Redis pool)
+session_locks = create_session_lock(
+    session_store.redis_client,
+    async_redis=(lambda: session_store.async_manager.redis) if getattr(session_store, "async_manager", None) else None
+)
+
+# Responses stored under client Idempotency-Keys, so gateway retries don't re-run turns
+idempotency_store = create_idempotency_store(session_store.redis_client)
 
-# In-memory fallback (only used if Redis fails)
-active_sessions: Dict[str, Dict] = {}
+# Removes inactive sessions (and their index entries) from Redis; one worker sweeps at a time
+session_sweeper = SessionSweeper(
+    session_store.manager, archive_store=session_store if session_store.archive is not None else None
+) if session_store.backend == BACKEND_REDIS else None
+
+# Writes conversation history behind the response (the turn's state is committed before
+# answering); TRT_HISTORY_WRITE_BEHIND=false writes it in the turn's commit instead
+history_writer = HistoryWriter(session_store) if (
+    session_store.backend == BACKEND_REDIS and os.getenv("TRT_HISTORY_WRITE_BEHIND", "true").lower() == "true"
+) else None
+
+# /health probes each Ollama endpoint concurrently, each for at most this long
+OLLAMA_HEALTH_TIMEOUT_SECONDS = float(os.getenv("OLLAMA_HEALTH_TIMEOUT_SECONDS", "1"))
 
 # ============================================================
 # GLOBAL THERAPY SYSTEM (Performance Optimization)
 # ============================================================
-# Initialize therapy system ONCE at module load instead of per-request
-# This prevents reloading RAG index and agents on every request
+# The therapy system is built ONCE per process, but not at import time:
+# it pulls in faiss and sentence-transformers and loads the RAG index, which
+# would delay uvicorn binding the port. Startup kicks off a background warm-up
+# instead, and /health/ready reports when this worker can take traffic.
+
+_global_therapy_system = None
+_therapy_system_lock = threading.Lock()
+_warmup_start_lock = threading.Lock()
+_warmup_task = None
+
+# Warm-up progress, reported by /health/ready
+warmup_state: Dict = {
+    "status": "pending",  # pending -> warming -> ready | failed
+    "started_at": None,
+    "completed_at": None,
+    "model_loaded": False,
+    "error": None
+}
+
+
+def _build_therapy_system():
+    """Import and construct the therapy system (heavy - imports ML libraries)"""
+    global _global_therapy_system
+    with _therapy_system_lock:
+        if _global_therapy_system is None:
+            # Imported here so that importing this module stays lightweight
+            from src.api.therapy_system_wrapper import ImprovedOllamaTherapySystem
+
+            print("🔧 Initializing global therapy system...", flush=True)
+            _global_therapy_system = ImprovedOllamaTherapySystem()
+            print(f"✅ Global therapy system ready: {type(_global_therapy_system).__name__}", flush=True)
+    return _global_therapy_system
 
-print("🔧 Initializing global therapy system (module level)...", flush=True)
-_global_therapy_system = ImprovedOllamaTherapySystem()
-print(f"✅ Global therapy system ready: {type(_global_therapy_system).__name__}", flush=True)
 
 def get_therapy_system():
-    """Get global therapy system instance"""
-    return _global_therapy_system
+    """
+    Get global therapy system instance
+
+    Never builds it on the event loop: until it is ready this raises 503, and
+    starts the warm-up in the background if none is running (startup events
+    not run, or a previous warm-up failed).
+    """
+    if _global_therapy_system is not None:
+        return _global_therapy_system
+
+    if warmup_state["status"] != "warming":
+        start_warm_up()
+    raise HTTPException(
+        status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+        detail="Therapy system is warming up. Please retry shortly.",
+        headers={"Retry-After": "5"}
+    )
+
+
+def start_warm_up():
+    """Run warm_up_therapy_system on a background thread, unless one is already running"""
+    global _warmup_task
+    with _warmup_start_lock:
+        if warmup_state["status"] == "warming":
+            return
+        warmup_state["status"] = "warming"
+        _warmup_task = threading.Thread(target=warm_up_therapy_system, name="therapy-warm-up", daemon=True)
+        _warmup_task.start()
+
+
+def warm_up_therapy_system():
+    """
+    Build the therapy system and preload the Ollama model
+
+    Runs on a worker thread so the event loop keeps answering health probes.
+    """
+    warmup_state["status"] = "warming"
+    warmup_state["started_at"] = datetime.now().isoformat()
+
+    try:
+        therapy_system = _build_therapy_system()
+        warmup_state["model_loaded"] = therapy_system.warm_up()
+        warmup_state["status"] = "ready"
+        print("✅ Warm-up complete, accepting traffic", flush=True)
+
+    except Exception as e:
+        warmup_state["status"] = "failed"
+        warmup_state["error"] = str(e)
+        logger.log_error("Therapy system warm-up", e)
+
+    finally:
+        warmup_state["completed_at"] = datetime.now().isoformat()
 
 
 # ============================================================
 # HELPER FUNCTIONS
 # ============================================================
 
-def get_session(session_id: str):
+async def get_session(session_id: str) -> SessionRecord:
     """Retrieve session or raise 404"""
-    if session_id not in active_sessions:
+    session = await session_store.load_async(session_id)
+    if session is None:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail=f"Session '{session_id}' not found"
         )
-    return active_sessions[session_id]
+    return session
 
 
 def create_session_id() -> str:
@@ -101,24 +213,291 @@ def create_session_id() -> str:
     return f"session_{timestamp}_{unique_id}"
 
 
+def build_therapist_response(result: Dict) -> TherapistResponse:
+    """Convert a therapy system result dict into the API response model"""
+    return TherapistResponse(
+        therapist_response=result["therapist_response"],
+        preprocessing=PreprocessingResult(
+            original_input=result["preprocessing"]["original_input"],
+            cleaned_input=result["preprocessing"]["cleaned_input"],
+            corrected_input=result["preprocessing"]["corrected_input"],
+            emotional_state=EmotionalState(**result["preprocessing"]["emotional_state"]),
+            input_category=result["preprocessing"]["input_category"],
+            spelling_corrections=result["preprocessing"]["spelling_corrections"],
+            safety_checks=SafetyChecks(
+                self_harm_detected=result["preprocessing"]["self_harm_detected"],
+                thinking_mode_detected=result["preprocessing"]["thinking_mode_detected"],
+                past_tense_detected=result["preprocessing"]["past_tense_detected"],
+                i_dont_know_detected=result["preprocessing"]["i_dont_know_detected"]
+            )
+        ),
+        navigation=NavigationDecision(
+            decision=result["navigation"].get("navigation_decision", "unknown"),
+            next_state=result["navigation"].get("current_substate"),
+            rag_query=result["navigation"].get("rag_query"),
+            reasoning=result["navigation"].get("reasoning")
+        ),
+        session_progress=SessionProgress(
+            current_substate=result["session_state"]["current_substate"],
+            body_question_count=result["session_state"]["body_question_count"],
+            completion_criteria={
+                k: v for k, v in result["session_state"]["stage_1_completion"].items()
+                if isinstance(v, bool)
+            }
+        ),
+        fallback_used=result.get("fallback_used", False),
+        degraded_stages=result.get("degraded_stages", []),
+        timestamp=datetime.now()
+    )
+
+
+def turn_deadline(request: ClientInputRequest) -> Optional[float]:
+    """
+    Absolute deadline (time.monotonic) for this turn
+
+    Starts counting at request arrival, so time spent waiting for a worker
+    thread is part of the budget. Per-request latency_budget_ms overrides
+    TRT_TURN_BUDGET_SECONDS.
+    """
+    if request.latency_budget_ms:
+        budget = request.latency_budget_ms / 1000.0
+    else:
+        budget = default_turn_budget()
+    return time.monotonic() + budget if budget else None
+
+
+# How often a running turn checks whether its HTTP client is still connected
+DISCONNECT_POLL_SECONDS = 0.25
+
+
+async def watch_disconnect(http_requests: List[Request], cancel_token: CancelToken):
+    """Cancel the turn as soon as every client waiting for it has closed the connection"""
+    while not cancel_token.cancelled:
+        disconnected = [await http_request.is_disconnected() for http_request in http_requests]
+        if all(disconnected):
+            cancel_token.cancel("client_disconnected")
+            return
+        await asyncio.sleep(DISCONNECT_POLL_SECONDS)
+
+
+async def run_turn(http_requests: List[Request], therapy_system, messages: List[str],
+                   session_state, deadline: Optional[float], cancel_token: CancelToken) -> Dict:
+    """
+    Run one turn on a worker thread (LLM calls block, and the scheduler needs concurrent turns)
+
+    The turn is cancelled - and its Ollama streams closed - if its clients
+    disconnect or a newer turn for the same session arrives (cancel_token,
+    registered by execute_session_turn). Several coalesced messages are
+    answered as one input.
+
+    Raises:
+        TurnCancelled if the turn was cancelled
+    """
+    # Requests with an Idempotency-Key aren't watched (None): their retry collects the result
+    watched = [http_request for http_request in http_requests if http_request is not None]
+    watcher = None
+    if len(watched) == len(http_requests):
+        watcher = asyncio.create_task(watch_disconnect(watched, cancel_token))
+    try:
+        return await run_in_threadpool(
+            therapy_system.process_client_input, "\n".join(messages), session_state, deadline,
+            cancel_token, messages
+        )
+    finally:
+        if watcher:
+            watcher.cancel()
+
+
+async def execute_session_turn(therapy_system, session_id: str, messages: List[str],
+                               http_requests: List[Request], deadline: Optional[float],
+                               new_session_metadata: Dict) -> TherapistResponse:
+    """
+    Load the session (creating it on first use), run the turn and save it once
+
+    Load -> process -> save runs under the session lock (renewed while the
+    turn runs), so concurrent requests (on any worker) can't overwrite each
+    other's updates. The turn
+    is registered before waiting for the lock: that cancels the session's
+    turn still running in this process (superseded), which then gives the
+    lock up early instead of finishing an answer nobody will read, and this
+    turn answers the superseded turn's messages along with its own.
+
+    Raises:
+        TurnCancelled if the turn was cancelled
+        SessionBusyError if the lock wasn't granted, or a newer turn saved first
+    """
+    in_flight = get_in_flight_turns()
+    cancel_token, messages = in_flight.takeover(session_id, messages)
+    try:
+        lease = await acquire_session_lock(session_id)
+    except BaseException:
+        in_flight.end(session_id, cancel_token)
+        raise
+    released_after_write = False
+    # A long turn (e.g. an unlimited budget) would outlive the lease: renew it while the turn runs
+    heartbeat = asyncio.create_task(session_locks.keep_alive(lease))
+    try:
+        # An even newer message arrived while this one waited for the lock
+        cancel_token.raise_if_cancelled()
+        session = await session_store.load_async(session_id)
+        if session is None:
+            logger.info(f"Creating new session: {session_id}")
+            session = SessionRecord(
+                session_id=session_id,
+                session_state=therapy_system.create_session(session_id),
+                metadata=dict(new_session_metadata)
+            )
+            if not await session_store.create_async(session):
+                # Created through /api/v1/session/create in the meantime
+                session = await session_store.load_async(session_id)
+
+        logger.info("Processing input through therapy system...")
+        result = await run_turn(http_requests, therapy_system, messages, session.session_state, deadline,
+                                cancel_token)
+        logger.info(f"Processing complete in {result.get('processing_time', 0):.3f}s")
+        if not in_flight.claim(session_id, cancel_token):
+            # Superseded after answering: the newer turn answers these messages instead
+            raise TurnCancelled("superseded")
+
+        # Update session metadata
+        session.last_interaction = datetime.now()
+        session.turn_count += 1
+
+        # Check if session is complete
+        if result["session_state"]["stage_1_completion"].get("ready_for_stage_2", False):
+            session.status = "completed"
+            logger.info(f"Session {session_id} marked as completed")
+
+        exchange = {
+            "turn": session.turn_count,
+            "client_input": "\n".join(messages),
+            "therapist_response": result["therapist_response"],
+            "navigation_decision": result["navigation"].get("navigation_decision"),
+            "current_substate": session.session_state.current_substate
+        }
+        if len(messages) > 1:
+            exchange["client_messages"] = messages
+
+        # Save updated state (and history, unless it's written behind) in one write
+        # (refused if our lease expired and a newer turn already saved)
+        if not await session_store.commit_async(session, None if history_writer else exchange,
+                                                fencing_token=lease.fencing_token):
+            raise SessionBusyError(f"Session {session_id} was updated by a newer turn")
+        if history_writer is not None:
+            # Answer now; the session lock is released once the exchange is stored,
+            # so the session's next turn (on any worker) finds its history in order
+            released_after_write = history_writer.submit(session_id, exchange,
+                                                         after_write=lambda: release_session_lock(lease))
+            if not released_after_write:
+                await session_store.add_exchanges_async([(session_id, exchange)])
+    except BaseException:
+        # The turn may have changed the loaded (possibly cached) state before failing
+        session_store.invalidate(session_id)
+        raise
+    finally:
+        heartbeat.cancel()
+        in_flight.end(session_id, cancel_token)
+        if not released_after_write:
+            await release_session_lock(lease)
+
+    # Convert result to response model
+    return build_therapist_response(result)
+
+
+async def submit_turn(endpoint: str, session_id: str, request: ClientInputRequest, http_request: Request,
+                      response: Response, execute_turn) -> TherapistResponse:
+    """
+    Hand the message to the coalescer - at most once per Idempotency-Key
+
+    With an Idempotency-Key header, a duplicate of a request that is still
+    running waits for it, and one that already finished gets the stored
+    response (marked with an Idempotent-Replayed header) without another turn.
+
+    Raises:
+        IdempotencyKeyReusedError, IdempotencyInProgressError
+    """
+    coalescer = get_message_coalescer()
+    idempotency_key = http_request.headers.get(IDEMPOTENCY_HEADER)
+    if not idempotency_key:
+        # Messages sent in quick succession are merged into one turn (TRT_COALESCE_WINDOW_MS)
+        return await coalescer.submit(session_id, request.user_input, execute_turn, http_request)
+
+    produced = {}
+
+    async def produce() -> str:
+        produced["response"] = await coalescer.submit(session_id, request.user_input, execute_turn, None)
+        return produced["response"].model_dump_json()
+
+    stored, replayed = await idempotency_store.run_once(
+        f"{session_id}:{idempotency_key}",
+        request_fingerprint(endpoint, session_id, request.user_input),
+        produce
+    )
+    if not replayed:
+        return produced["response"]
+    logger.info(f"🔁 Replaying stored response for session {session_id} (idempotency key {idempotency_key})")
+    response.headers["Idempotent-Replayed"] = "true"
+    return TherapistResponse.model_validate_json(stored)
+
+
+async def acquire_session_lock(session_id: str) -> SessionLease:
+    """Take the session's turn lock (waiting sleeps on the event loop, no worker thread held)"""
+    return await session_locks.acquire_async(session_id)
+
+
+async def release_session_lock(lease: SessionLease):
+    await session_locks.release_async(lease)
+
+
+def session_busy_error(exc: SessionBusyError) -> HTTPException:
+    """409 when another turn for the session holds the lock (reject policy, or queue wait exceeded)"""
+    return HTTPException(status_code=status.HTTP_409_CONFLICT, detail=str(exc))
+
+
+def idempotency_error(exc: Exception) -> HTTPException:
+    """422 when an Idempotency-Key is reused for a different input, 409 while the original still runs"""
+    if isinstance(exc, IdempotencyKeyReusedError):
+        return HTTPException(status_code=status.HTTP_422_UNPROCESSABLE_ENTITY, detail=str(exc))
+    return HTTPException(status_code=status.HTTP_409_CONFLICT, detail=str(exc))
+
+
+def cancelled_turn_error(exc: TurnCancelled) -> HTTPException:
+    """409 for a superseded turn; 499 (client closed request) when nobody is listening anyway"""
+    if exc.reason == "superseded":
+        return HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail="Turn superseded by a newer message for this session, which answers both"
+        )
+    return HTTPException(status_code=499, detail="Client closed request")
+
+
 # ============================================================
 # API ENDPOINTS
 # ============================================================
 
+def probe_ollama(ollama_url: str) -> bool:
+    """Whether an Ollama endpoint answers (blocking: run it in the threadpool)"""
+    import requests
+    try:
+        return requests.get(f"{ollama_url}/api/tags", timeout=OLLAMA_HEALTH_TIMEOUT_SECONDS).status_code == 200
+    except Exception:
+        return False
+
+
 @app.get("/health", response_model=HealthCheckResponse, tags=["Health"])
 async def health_check():
     """
     Health check endpoint
     Verifies that all system components are operational
     """
-    try:
-        # Check Ollama connection
-        import requests
-        ollama_url = os.getenv("OLLAMA_BASE_URL", "http://localhost:11434")
-        ollama_response = requests.get(f"{ollama_url}/api/tags", timeout=5)
-        ollama_status = "connected" if ollama_response.status_code == 200 else "disconnected"
-    except Exception:
-        ollama_status = "disconnected"
+    # Check Ollama connection (every endpoint in the pool, concurrently and off the
+    # event loop; one reachable is enough to serve)
+    if _global_therapy_system is not None:
+        ollama_urls = _global_therapy_system.llm_client.pool.urls
+    else:
+        ollama_urls = OllamaEndpointPool.from_env().urls
+    reachable = await asyncio.gather(*[run_in_threadpool(probe_ollama, ollama_url) for ollama_url in ollama_urls])
+    ollama_status = "connected" if any(reachable) else "disconnected"
 
     # Check if RAG embeddings exist
     embeddings_path = "/app/data/embeddings/trt_rag_index.faiss"
@@ -128,32 +507,132 @@ async def health_check():
     csv_path = "/app/config/STAGE1_COMPLETE.csv"
     state_machine_status = "loaded" if os.path.exists(csv_path) else "not_found"
 
-    # Check Redis connection
-    if redis_manager:
-        redis_health = redis_manager.health_check()
-        redis_status = redis_health.get("status", "unhealthy")
+    # Circuit breakers in front of Ollama (open on every endpoint = turns use rule-based fallbacks)
+    if _global_therapy_system is not None:
+        circuit_status = _global_therapy_system.llm_client.pool.get_status()["state"]
     else:
-        redis_status = "not_configured"
+        circuit_status = "not_initialized"
 
-    overall_status = "healthy" if all([
+    # Check the session store (Redis connection, or the local store's own health)
+    store_health = await session_store.health_check_async()
+    store_status = store_health.get("status", "unhealthy")
+    if session_store.backend == BACKEND_REDIS:
+        redis_health, redis_status = store_health, store_status
+    else:
+        redis_health, redis_status = {}, "not_configured"
+
+    if not all([
         ollama_status == "connected",
+        circuit_status != "open",
         rag_status == "ready",
         state_machine_status == "loaded",
-        redis_status == "healthy"
-    ]) else "unhealthy"
+        store_status in ("healthy", "degraded")
+    ]):
+        overall_status = "unhealthy"
+    else:
+        # Degraded: still serving (e.g. SQLite writes failing, sessions held in memory meanwhile)
+        overall_status = store_status
+
+    services = {
+        "ollama": ollama_status,
+        "ollama_circuit": circuit_status,
+        "rag": rag_status,
+        "state_machine": state_machine_status,
+        "redis": redis_status,
+        "session_store": session_store.backend
+    }
+    # This worker's async Redis pool: connections in use / max (at max = requests queueing)
+    if "pool" in redis_health:
+        pool = redis_health["pool"]
+        services["redis_pool"] = f"{pool['in_use']}/{pool['max_connections']}"
+    # Share of session loads served from this worker's cache
+    if redis_health.get("cache", {}).get("hit_rate") is not None:
+        services["session_cache_hit_rate"] = str(redis_health["cache"]["hit_rate"])
+    # Sessions moved out of Redis to the on-disk archive (resumed transparently)
+    if "archive" in redis_health:
+        services["session_archive"] = str(redis_health["archive"]["sessions"])
+    # In-memory store (no Redis): sessions and their estimated heap use held against the limits
+    if session_store.backend == BACKEND_MEMORY:
+        memory = store_health["memory"]
+        services["session_memory"] = (f"{memory['sessions']}/{memory['max_sessions'] or 'unbounded'} sessions, "
+                                      f"{memory['bytes'] / 1048576:.1f}/{memory['max_bytes'] / 1048576:.0f} MB")
+        if "spilled_sessions" in memory:
+            services["session_spill"] = str(memory["spilled_sessions"])
+    # Exchanges of answered turns not stored yet (this worker)
+    if history_writer is not None:
+        services["history_write_queue"] = str(history_writer.pending())
+    # SQLite store: writes queued behind the request path, not in the file yet
+    if session_store.backend == BACKEND_SQLITE:
+        sqlite = store_health["sqlite"]
+        services["session_sqlite_pending"] = str(sqlite["pending_writes"])
+        if store_status != "healthy":
+            services["session_sqlite"] = f"{store_status}: {sqlite['last_error']}"
 
     return HealthCheckResponse(
         status=overall_status,
         timestamp=datetime.now(),
-        services={
-            "ollama": ollama_status,
-            "rag": rag_status,
-            "state_machine": state_machine_status,
-            "redis": redis_status
-        }
+        services=services
+    )
+
+
+@app.get("/health/live", tags=["Health"])
+async def liveness_check():
+    """
+    Liveness probe
+    Answers as soon as the event loop is running - does not touch Ollama, Redis or the RAG index
+    """
+    return JSONResponse(
+        status_code=status.HTTP_200_OK,
+        content={"status": "alive", "timestamp": datetime.now().isoformat()}
+    )
+
+
+@app.get("/health/ready", response_model=ReadinessResponse, tags=["Health"])
+async def readiness_check():
+    """
+    Readiness probe
+    Returns 200 only once the therapy system is built and its models are loaded;
+    "degraded" (503) while a model failed to preload or Ollama has dropped it,
+    until the residency pinger reloads it
+    """
+    state = warmup_state["status"]
+    warmup = dict(warmup_state)
+    if state == "ready":
+        warmup["model_loaded"] = _global_therapy_system.residency_manager.models_ready()
+        if not warmup["model_loaded"]:
+            state = "degraded"
+    ready = state == "ready"
+
+    response = ReadinessResponse(
+        status=state,
+        timestamp=datetime.now(),
+        warmup=warmup
+    )
+
+    return JSONResponse(
+        status_code=status.HTTP_200_OK if ready else status.HTTP_503_SERVICE_UNAVAILABLE,
+        content=response.model_dump(mode="json")
     )
 
 
+@app.get("/metrics", tags=["Health"])
+async def metrics():
+    """
+    In-process metrics for this worker
+    LLM request timings, model load events and residency status
+    """
+    content = get_metrics().snapshot()
+    if _global_therapy_system is not None:
+        content["model_residency"] = _global_therapy_system.residency_manager.get_status()
+        content["llm_scheduler"] = _global_therapy_system.llm_scheduler.get_status()
+        content["ollama_endpoints"] = _global_therapy_system.llm_client.get_status()
+    content["in_flight_turns"] = len(get_in_flight_turns())
+    if session_sweeper is not None:
+        content["session_sweeper"] = session_sweeper.get_status()
+
+    return JSONResponse(status_code=status.HTTP_200_OK, content=content)
+
+
 @app.post("/api/v1/session/create", response_model=SessionCreateResponse, tags=["Session"])
 async def create_session(request: SessionCreateRequest):
     """
@@ -168,38 +647,30 @@ async def create_session(request: SessionCreateRequest):
     """
     try:
         # Use provided session_id or generate a new one
-        if request.session_id:
-            session_id = request.session_id
-
-            # Check if session ID already exists
-            if session_id in active_sessions:
-                raise HTTPException(
-                    status_code=status.HTTP_409_CONFLICT,
-                    detail=f"Session ID '{session_id}' already exists. Please use a different ID or omit it for auto-generation."
-                )
-        else:
-            # Auto-generate session ID
-            session_id = create_session_id()
+        session_id = request.session_id or create_session_id()
 
         # Get global therapy system (shared across all sessions)
         therapy_system = get_therapy_system()
         session_state = therapy_system.create_session(session_id)
 
         # Store session data (therapy_system is now global, only store session_state)
-        active_sessions[session_id] = {
-            "session_id": session_id,
-            "client_id": request.client_id,
-            "metadata": request.metadata,
-            "session_state": session_state,
-            "created_at": datetime.now(),
-            "last_interaction": datetime.now(),
-            "turn_count": 0,
-            "status": "active"
-        }
+        record = SessionRecord(
+            session_id=session_id,
+            session_state=session_state,
+            client_id=request.client_id,
+            metadata=request.metadata or {}
+        )
+
+        # Check if session ID already exists (atomic, so two workers can't both create it)
+        if not await session_store.create_async(record):
+            raise HTTPException(
+                status_code=status.HTTP_409_CONFLICT,
+                detail=f"Session ID '{session_id}' already exists. Please use a different ID or omit it for auto-generation."
+            )
 
         return SessionCreateResponse(
             session_id=session_id,
-            created_at=datetime.now(),
+            created_at=record.created_at,
             status="active",
             message="Session created successfully. Ready to begin therapy."
         )
@@ -214,7 +685,7 @@ async def create_session(request: SessionCreateRequest):
 
 
 @app.post("/api/v1/input", response_model=TherapistResponse, tags=["Session"])
-async def process_input_with_session(request: ClientInputRequest):
+async def process_input_with_session(request: ClientInputRequest, http_request: Request, response: Response):
     """
     Process client input and generate therapist response
 
@@ -228,6 +699,7 @@ async def process_input_with_session(request: ClientInputRequest):
     """
     try:
         session_id = request.session_id
+        deadline = turn_deadline(request)
 
         # Log endpoint input
         logger.log_endpoint_input(
@@ -237,126 +709,43 @@ async def process_input_with_session(request: ClientInputRequest):
             request_data={"metadata": request.metadata} if hasattr(request, 'metadata') else None
         )
 
-        # Check if session exists (Redis or fallback)
-        session_exists = False
-        if redis_manager:
-            session_exists = redis_manager.session_exists(session_id)
-            logger.info(f"Session check (Redis): {session_exists}")
-        else:
-            session_exists = session_id in active_sessions
-            logger.info(f"Session check (Memory): {session_exists}")
-
         # Get global therapy system (shared across all sessions)
         therapy_system = get_therapy_system()
 
-        # Create session if it doesn't exist (first call)
-        if not session_exists:
-            logger.info(f"Creating new session: {session_id}")
-            # Create new session state (lightweight)
-            session_state = therapy_system.create_session(session_id)
-
-            # Save to Redis or fallback to memory
-            if redis_manager:
-                redis_manager.save_session_state(session_id, session_state)
-                redis_manager.save_session_metadata(session_id, {"created_via": "input_endpoint"})
-            else:
-                active_sessions[session_id] = {
-                    "session_id": session_id,
-                    "client_id": None,
-                    "metadata": {"created_via": "input_endpoint"},
-                    "session_state": session_state,
-                    "created_at": datetime.now(),
-                    "last_interaction": datetime.now(),
-                    "turn_count": 0,
-                    "status": "active"
-                }
-        else:
-            # Load existing session state
-            if redis_manager:
-                session_data = redis_manager.load_session_state(session_id)
-                # Create session state and restore from Redis
-                session_state = therapy_system.create_session(session_id)
-                session_state.current_stage = session_data["current_stage"]
-                session_state.current_substate = session_data["current_substate"]
-                session_state.body_questions_asked = session_data["body_questions_asked"]
-                session_state.stage_1_completion = session_data["stage_1_completion"]
-            else:
-                session = active_sessions[session_id]
-                session_state = session["session_state"]
-
-        # Process client input through therapy system
-        logger.info("Processing input through therapy system...")
-        result = therapy_system.process_client_input(request.user_input, session_state)
-        logger.info(f"Processing complete in {result.get('processing_time', 0):.3f}s")
+        async def execute_turn(messages: List[str], http_requests: List[Request]) -> TherapistResponse:
+            """Run the turn and persist it once, however many coalesced requests it answers"""
+            return await execute_session_turn(
+                therapy_system, session_id, messages, http_requests, deadline,
+                new_session_metadata={"created_via": "input_endpoint"}
+            )
 
-        # Save updated state
-        if redis_manager:
-            redis_manager.save_session_state(session_id, session_state)
-            redis_manager.add_conversation_exchange(session_id, {
-                "client_input": request.user_input,
-                "therapist_response": result["therapist_response"],
-                "navigation_decision": result["navigation"].get("navigation_decision"),
-                "current_substate": session_state.current_substate
-            })
-        else:
-            # Update in-memory session
-            session = active_sessions[session_id]
-            session["last_interaction"] = datetime.now()
-            session["turn_count"] += 1
-
-        # Convert result to response model
-        response = TherapistResponse(
-            therapist_response=result["therapist_response"],
-            preprocessing=PreprocessingResult(
-                original_input=result["preprocessing"]["original_input"],
-                cleaned_input=result["preprocessing"]["cleaned_input"],
-                corrected_input=result["preprocessing"]["corrected_input"],
-                emotional_state=EmotionalState(**result["preprocessing"]["emotional_state"]),
-                input_category=result["preprocessing"]["input_category"],
-                spelling_corrections=result["preprocessing"]["spelling_corrections"],
-                safety_checks=SafetyChecks(
-                    self_harm_detected=result["preprocessing"]["self_harm_detected"],
-                    thinking_mode_detected=result["preprocessing"]["thinking_mode_detected"],
-                    past_tense_detected=result["preprocessing"]["past_tense_detected"],
-                    i_dont_know_detected=result["preprocessing"]["i_dont_know_detected"]
-                )
-            ),
-            navigation=NavigationDecision(
-                decision=result["navigation"].get("navigation_decision", "unknown"),
-                next_state=result["navigation"].get("current_substate"),
-                rag_query=result["navigation"].get("rag_query"),
-                reasoning=result["navigation"].get("reasoning")
-            ),
-            session_progress=SessionProgress(
-                current_substate=result["session_state"]["current_substate"],
-                body_question_count=result["session_state"]["body_question_count"],
-                completion_criteria={
-                    k: v for k, v in result["session_state"]["stage_1_completion"].items()
-                    if isinstance(v, bool)
-                }
-            ),
-            timestamp=datetime.now()
+        therapist_response = await submit_turn(
+            "/api/v1/input", session_id, request, http_request, response, execute_turn
         )
 
-        # Check if session is complete
-        if result["session_state"]["stage_1_completion"].get("ready_for_stage_2", False):
-            session["status"] = "completed"
-            logger.info(f"Session {session_id} marked as completed")
-
         # Log endpoint output
         logger.log_endpoint_output(
             endpoint="/api/v1/input",
             session_id=session_id,
-            response=response.therapist_response,
+            response=therapist_response.therapist_response,
             metadata={
-                "current_substate": response.session_progress.current_substate,
-                "navigation_decision": response.navigation.decision,
-                "processing_time": result.get('processing_time', 0)
+                "current_substate": therapist_response.session_progress.current_substate,
+                "navigation_decision": therapist_response.navigation.decision,
+                "degraded_stages": therapist_response.degraded_stages
             }
         )
 
-        return response
-
+        return therapist_response
+
+    except TurnCancelled as cancelled:
+        logger.info(f"Turn for session {session_id} cancelled ({cancelled.reason}), session not updated")
+        raise cancelled_turn_error(cancelled)
+    except SessionBusyError as busy:
+        logger.info(f"Turn for session {session_id} rejected: {busy}")
+        raise session_busy_error(busy)
+    except (IdempotencyKeyReusedError, IdempotencyInProgressError) as duplicate:
+        logger.info(f"Duplicate request for session {session_id} rejected: {duplicate}")
+        raise idempotency_error(duplicate)
     except HTTPException as http_exc:
         logger.log_error("API Endpoint /api/v1/input", http_exc, {"session_id": session_id, "user_input": request.user_input})
         raise
@@ -369,7 +758,8 @@ async def process_input_with_session(request: ClientInputRequest):
 
 
 @app.post("/api/v1/session/{session_id}/input", response_model=TherapistResponse, tags=["Session"])
-async def process_input_path_based(session_id: str, request: ClientInputRequest):
+async def process_input_path_based(session_id: str, request: ClientInputRequest, http_request: Request,
+                                   response: Response):
     """
     Process client input and generate therapist response
 
@@ -383,77 +773,28 @@ async def process_input_path_based(session_id: str, request: ClientInputRequest)
         TherapistResponse: Complete response with preprocessing, navigation, and progress
     """
     try:
+        deadline = turn_deadline(request)
+
         # Get global therapy system (shared across all sessions)
         therapy_system = get_therapy_system()
 
-        # Auto-create session if it doesn't exist
-        if session_id not in active_sessions:
-            # Create new session state (lightweight)
-            session_state = therapy_system.create_session(session_id)
-
-            # Store session data (therapy_system is now global, only store session_state)
-            active_sessions[session_id] = {
-                "session_id": session_id,
-                "client_id": None,  # Not needed in simplified flow
-                "metadata": {"auto_created": True},
-                "session_state": session_state,
-                "created_at": datetime.now(),
-                "last_interaction": datetime.now(),
-                "turn_count": 0,
-                "status": "active"
-            }
-
-        # Retrieve session state
-        session = active_sessions[session_id]
-        session_state = session["session_state"]
-
-        # Process client input through therapy system
-        result = therapy_system.process_client_input(request.user_input, session_state)
+        async def execute_turn(messages: List[str], http_requests: List[Request]) -> TherapistResponse:
+            """Run the turn and update the session once, however many coalesced requests it answers"""
+            return await execute_session_turn(
+                therapy_system, session_id, messages, http_requests, deadline,
+                new_session_metadata={"auto_created": True}
+            )
 
-        # Update session metadata
-        session["last_interaction"] = datetime.now()
-        session["turn_count"] += 1
-
-        # Convert result to response model
-        response = TherapistResponse(
-            therapist_response=result["therapist_response"],
-            preprocessing=PreprocessingResult(
-                original_input=result["preprocessing"]["original_input"],
-                cleaned_input=result["preprocessing"]["cleaned_input"],
-                corrected_input=result["preprocessing"]["corrected_input"],
-                emotional_state=EmotionalState(**result["preprocessing"]["emotional_state"]),
-                input_category=result["preprocessing"]["input_category"],
-                spelling_corrections=result["preprocessing"]["spelling_corrections"],
-                safety_checks=SafetyChecks(
-                    self_harm_detected=result["preprocessing"]["self_harm_detected"],
-                    thinking_mode_detected=result["preprocessing"]["thinking_mode_detected"],
-                    past_tense_detected=result["preprocessing"]["past_tense_detected"],
-                    i_dont_know_detected=result["preprocessing"]["i_dont_know_detected"]
-                )
-            ),
-            navigation=NavigationDecision(
-                decision=result["navigation"].get("navigation_decision", "unknown"),
-                next_state=result["navigation"].get("current_substate"),
-                rag_query=result["navigation"].get("rag_query"),
-                reasoning=result["navigation"].get("reasoning")
-            ),
-            session_progress=SessionProgress(
-                current_substate=result["session_state"]["current_substate"],
-                body_question_count=result["session_state"]["body_question_count"],
-                completion_criteria={
-                    k: v for k, v in result["session_state"]["stage_1_completion"].items()
-                    if isinstance(v, bool)
-                }
-            ),
-            timestamp=datetime.now()
+        return await submit_turn(
+            "/api/v1/session/input", session_id, request, http_request, response, execute_turn
         )
 
-        # Check if session is complete
-        if result["session_state"]["stage_1_completion"].get("ready_for_stage_2", False):
-            session["status"] = "completed"
-
-        return response
-
+    except TurnCancelled as cancelled:
+        raise cancelled_turn_error(cancelled)
+    except SessionBusyError as busy:
+        raise session_busy_error(busy)
+    except (IdempotencyKeyReusedError, IdempotencyInProgressError) as duplicate:
+        raise idempotency_error(duplicate)
     except HTTPException:
         raise
     except Exception as e:
@@ -476,21 +817,21 @@ async def get_session_status(session_id: str):
     """
     try:
         # Retrieve session
-        session = get_session(session_id)
-        session_state = session["session_state"]
+        session = await get_session(session_id)
+        session_state = session.session_state
 
         return SessionStatusResponse(
             session_id=session_id,
-            status=session["status"],
+            status=session.status,
             current_substate=session_state.current_substate,
             body_question_count=session_state.body_questions_asked,
             completion_criteria={
                 k: v for k, v in session_state.stage_1_completion.items()
                 if isinstance(v, bool)
             },
-            turn_count=session["turn_count"],
-            created_at=session["created_at"],
-            last_interaction=session["last_interaction"]
+            turn_count=session.turn_count,
+            created_at=session.created_at,
+            last_interaction=session.last_interaction
         )
 
     except HTTPException:
@@ -514,9 +855,12 @@ async def delete_session(session_id: str):
         Success message
     """
     try:
-        # Retrieve and delete session
-        session = get_session(session_id)
-        del active_sessions[session_id]
+        # Delete session (404 if it doesn't exist)
+        if not await session_store.delete_async(session_id):
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail=f"Session '{session_id}' not found"
+            )
 
         return JSONResponse(
             status_code=status.HTTP_200_OK,
@@ -536,50 +880,40 @@ async def delete_session(session_id: str):
 
 
 @app.get("/api/v1/sessions", tags=["Session"])
-async def list_sessions():
+async def list_sessions(limit: int = Query(100, ge=1, le=1000),
+                        cursor: Optional[str] = None,
+                        substate: Optional[str] = None,
+                        active_since: Optional[datetime] = None,
+                        active_before: Optional[datetime] = None):
     """
-    List all active sessions
+    List active sessions, most recently active first, a page at a time
+
+    Args:
+        limit: Page size (max 1000)
+        cursor: next_cursor from the previous page
+        substate: Only sessions currently in this substate (e.g. 1.2_problem_and_body)
+        active_since: Only sessions active at or after this time (ISO 8601)
+        active_before: Only sessions last active before this time (ISO 8601)
 
     Returns:
-        List of active session IDs with metadata
+        One page of sessions with metadata, the total matching the filters,
+        and next_cursor (null on the last page)
     """
     try:
-        sessions_list = []
-
-        if redis_manager:
-            # Get from Redis
-            session_ids = redis_manager.list_active_sessions(limit=100)
-            for session_id in session_ids:
-                session_data = redis_manager.load_session_state(session_id)
-                if session_data:
-                    sessions_list.append({
-                        "session_id": session_id,
-                        "current_substate": session_data.get("current_substate"),
-                        "last_interaction": session_data.get("last_interaction"),
-                        "storage": "redis"
-                    })
-        else:
-            # Get from memory
-            for session_id, session_data in active_sessions.items():
-                sessions_list.append({
-                    "session_id": session_id,
-                    "client_id": session_data.get("client_id"),
-                    "status": session_data["status"],
-                    "created_at": session_data["created_at"].isoformat(),
-                    "last_interaction": session_data["last_interaction"].isoformat(),
-                    "turn_count": session_data["turn_count"],
-                    "storage": "memory"
-                })
+        page = await session_store.list_page_async(limit, cursor, substate, active_since, active_before)
 
         return JSONResponse(
             status_code=status.HTTP_200_OK,
             content={
-                "total_sessions": len(sessions_list),
-                "sessions": sessions_list,
+                "total_sessions": page.total,
+                "sessions": page.sessions,
+                "next_cursor": page.next_cursor,
                 "timestamp": datetime.now().isoformat()
             }
         )
 
+    except InvalidCursorError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
     except Exception as e:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
@@ -629,13 +963,26 @@ async def startup_event():
     print(f"📋 ReDoc: http://localhost:8000/redoc")
     print(f"🩺 Health Check: http://localhost:8000/health")
 
+    # Warm up in the background so the port is bound immediately
+    start_warm_up()
+
+    if session_sweeper is not None:
+        session_sweeper.start()
+
 
 @app.on_event("shutdown")
 async def shutdown_event():
     """Application shutdown tasks"""
     print("🛑 TRT AI Therapist API shutting down...")
-    # Clean up sessions
-    active_sessions.clear()
+    if _global_therapy_system is not None:
+        _global_therapy_system.shutdown()
+    if session_sweeper is not None:
+        session_sweeper.stop()
+    # Store history still queued behind answered turns
+    if history_writer is not None:
+        await history_writer.close()
+    # Clean up sessions (drops in-memory sessions; Redis and disk keep theirs)
+    await session_store.close_async()
 
 
 # ============================================================
@@ -35,6 +35,10 @@ class ClientInputRequest(BaseModel):
     """Request to process client input in a session"""
     session_id: str = Field(..., description="Unique session identifier", min_length=1)
     user_input: str = Field(..., description="Client's text input", min_length=1)
+    latency_budget_ms: Optional[int] = Field(
+        None, ge=100, le=300000,
+        description="Optional per-turn latency budget; stages that would exceed it fall back to rule-based responses"
+    )
 
     class Config:
         schema_extra = {
@@ -114,6 +118,8 @@ class TherapistResponse(BaseModel):
     preprocessing: PreprocessingResult = Field(..., description="Input preprocessing results")
     navigation: NavigationDecision = Field(..., description="Navigation decision")
     session_progress: SessionProgress = Field(..., description="Session progress")
+    fallback_used: bool = Field(False, description="True if any stage used a rule-based fallback instead of the LLM")
+    degraded_stages: List[str] = Field(default_factory=list, description="Stages that fell back and why, e.g. 'navigation:deadline'")
     timestamp: datetime = Field(default_factory=datetime.now, description="Response timestamp")
 
     class Config:
@@ -207,6 +213,28 @@ class HealthCheckResponse(BaseModel):
         }
 
 
+class ReadinessResponse(BaseModel):
+    """Readiness probe response"""
+    status: str = Field(..., description="Readiness status (pending/warming/ready/degraded/failed)")
+    timestamp: datetime = Field(default_factory=datetime.now, description="Readiness check timestamp")
+    warmup: Dict[str, Any] = Field(default_factory=dict, description="Background warm-up progress")
+
+    class Config:
+        schema_extra = {
+            "example": {
+                "status": "ready",
+                "timestamp": "2025-10-14T12:34:56",
+                "warmup": {
+                    "status": "ready",
+                    "started_at": "2025-10-14T12:34:10",
+                    "completed_at": "2025-10-14T12:34:41",
+                    "model_loaded": True,
+                    "error": None
+                }
+            }
+        }
+
+
 class ErrorResponse(BaseModel):
     """Error response"""
     error: str = Field(..., description="Error type")
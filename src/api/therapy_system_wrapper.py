@@ -21,9 +21,16 @@ from src.utils.input_preprocessing import InputPreprocessor
 from src.agents.ollama_llm_master_planning_agent import OllamaLLMMasterPlanningAgent
 from src.agents.improved_ollama_dialogue_agent import ImprovedOllamaDialogueAgent
 from src.utils.detailed_logger import get_detailed_logger
+from src.utils.ollama_client import OllamaClient
+from src.utils.ollama_pool import OllamaEndpointPool
+from src.utils.model_residency import ModelResidencyManager
+from src.utils.llm_scheduler import LLMScheduler
+from src.utils.turn_context import TurnContext, CancelToken, turn_scope, default_turn_budget
 
+import copy
 import time
 from datetime import datetime
+from typing import List
 
 # Initialize detailed logger
 logger = get_detailed_logger("TherapySystem")
@@ -35,16 +42,33 @@ class ImprovedOllamaTherapySystem:
     Compatible with FastAPI and Docker environments
     """
 
-    def __init__(self, ollama_url=None, model="llama3.1"):
+    def __init__(self, ollama_url=None, model=None):
         """Initialize the therapy system"""
 
         # Use environment variable or default
         if ollama_url is None:
             ollama_url = os.getenv("OLLAMA_BASE_URL", "http://localhost:11434")
+        if model is None:
+            model = os.getenv("OLLAMA_MODEL", "llama3.1")
+
+        # Navigation and dialogue can run on different models
+        navigation_model = os.getenv("OLLAMA_NAVIGATION_MODEL", model)
+        dialogue_model = os.getenv("OLLAMA_DIALOGUE_MODEL", model)
 
         print(f"🚀 Initializing TRT System...")
-        print(f"📡 Ollama URL: {ollama_url}")
-        print(f"🤖 Model: {model}")
+        print(f"📡 Ollama URL: {os.getenv('OLLAMA_BASE_URLS') or ollama_url}")
+        print(f"🤖 Models: navigation={navigation_model}, dialogue={dialogue_model}")
+
+        # Shared Ollama client + residency policy (keep_alive on every request, idle pings)
+        # The pool spreads calls over OLLAMA_BASE_URLS; the scheduler caps concurrent
+        # generations at Ollama's parallel slots times the number of endpoints
+        self.llm_pool = OllamaEndpointPool.from_env(ollama_url)
+        self.llm_scheduler = LLMScheduler(endpoint_count=len(self.llm_pool))
+        self.llm_client = OllamaClient(scheduler=self.llm_scheduler, pool=self.llm_pool)
+        self.residency_manager = ModelResidencyManager.from_config(
+            self.llm_client,
+            {"navigation": navigation_model, "dialogue": dialogue_model}
+        )
 
         # Initialize RAG system
         print("📚 Loading RAG system...")
@@ -62,30 +86,83 @@ class ImprovedOllamaTherapySystem:
 
         # Initialize agents
         print("🧠 Initializing Master Planning Agent...")
-        self.master_agent = OllamaLLMMasterPlanningAgent(ollama_url=ollama_url, model=model)
+        self.master_agent = OllamaLLMMasterPlanningAgent(
+            ollama_url=ollama_url, model=navigation_model, llm_client=self.llm_client
+        )
 
         print("💬 Initializing Dialogue Agent...")
-        self.dialogue_agent = ImprovedOllamaDialogueAgent(self.rag_system, ollama_url=ollama_url, model=model)
+        self.dialogue_agent = ImprovedOllamaDialogueAgent(
+            self.rag_system, ollama_url=ollama_url, model=dialogue_model, llm_client=self.llm_client
+        )
 
         # Initialize preprocessor
         self.preprocessor = InputPreprocessor()
 
         print("✅ TRT System Ready!")
 
+    def warm_up(self) -> bool:
+        """
+        Preload every Ollama model in the residency policy and start the idle pinger
+
+        Returns:
+            True if every model was loaded
+        """
+        print("🔥 Preloading Ollama models...")
+        loaded = self.residency_manager.preload_all()
+        self.residency_manager.start()
+        return loaded
+
+    def shutdown(self):
+        """Stop background threads"""
+        self.residency_manager.stop()
+        self.llm_client.close()
+
     def create_session(self, session_id):
         """Create a new session state"""
         return TRTSessionState(session_id)
 
-    def process_client_input(self, client_input: str, session_state: TRTSessionState = None) -> dict:
+    def process_client_input(self, client_input: str, session_state: TRTSessionState = None,
+                             deadline: float = None, cancel_token: CancelToken = None,
+                             client_messages: List[str] = None) -> dict:
         """
         Process client input through the therapy system
 
         If session_state is None, creates a temporary one (for testing)
+
+        Args:
+            client_input: Client's text
+            session_state: Session to advance
+            deadline: time.monotonic() by which the turn must be answered
+                      (defaults to now + TRT_TURN_BUDGET_SECONDS)
+            cancel_token: Set by the API when the client disconnects or sends a newer turn
+            client_messages: Separate messages coalesced into client_input (kept in history)
+
+        Raises:
+            TurnCancelled if the turn was cancelled; the session is not updated
         """
 
         if session_state is None:
             session_state = TRTSessionState("temp_session")
 
+        if deadline is None:
+            budget = default_turn_budget()
+            deadline = time.monotonic() + budget if budget else None
+
+        # LLM calls made during this turn are scheduled fairly per session and
+        # bounded by the turn deadline; stages that run out of budget fall back to rules
+        turn = TurnContext(session_id=session_state.session_id, deadline=deadline,
+                           cancel_token=cancel_token or CancelToken())
+        # The turn works on a copy so a cancelled (or restarted) turn leaves the session untouched
+        working_state = copy.deepcopy(session_state)
+        with turn_scope(turn):
+            result = self._process_turn(client_input, working_state, turn, client_messages)
+        session_state.__dict__.update(working_state.__dict__)
+        return result
+
+    def _process_turn(self, client_input: str, session_state: TRTSessionState, turn: TurnContext,
+                      client_messages: List[str] = None) -> dict:
+        """Run preprocessing, navigation and dialogue for one turn"""
+
         start_time = time.time()
 
         # Step 1: Preprocessing
@@ -93,9 +170,14 @@ class ImprovedOllamaTherapySystem:
         preprocessing_result = self.preprocessor.preprocess_input(client_input)
         logger.log_preprocessing_result(preprocessing_result)
 
+        # Crisis turns jump the LLM queue
+        turn.crisis = preprocessing_result.get("self_harm_detected", {}).get("detected", False)
+
         # Step 2: Master Planning
         logger.log_navigation_start(session_state)
-        navigation_output = self.master_agent.make_navigation_decision(client_input, session_state)
+        with turn.stage_scope("navigation", reserve_seconds=self._dialogue_reserve(turn)):
+            navigation_output = self.master_agent.make_navigation_decision(client_input, session_state)
+        turn.check_cancelled()
         logger.log_navigation_decision(navigation_output)
 
         # Track body questions
@@ -146,7 +228,9 @@ class ImprovedOllamaTherapySystem:
             navigation_decision=navigation_output.get("navigation_decision", "unknown"),
             rag_examples_count=0  # Will be updated by dialogue agent
         )
-        dialogue_output = self.dialogue_agent.generate_response(client_input, navigation_output, session_state)
+        with turn.stage_scope("dialogue"):
+            dialogue_output = self.dialogue_agent.generate_response(client_input, navigation_output, session_state)
+        turn.check_cancelled()
         logger.log_dialogue_output(
             response=dialogue_output["therapeutic_response"],
             metadata={
@@ -160,7 +244,8 @@ class ImprovedOllamaTherapySystem:
         session_state.add_exchange(
             client_input=client_input,
             therapist_response=dialogue_output["therapeutic_response"],
-            navigation_output=navigation_output
+            navigation_output=navigation_output,
+            client_messages=client_messages
         )
         logger.log_session_update(session_state)
 
@@ -177,5 +262,19 @@ class ImprovedOllamaTherapySystem:
                 "body_question_count": session_state.body_questions_asked,
                 "stage_1_completion": session_state.stage_1_completion
             },
-            "processing_time": processing_time
+            "processing_time": processing_time,
+            "fallback_used": bool(
+                navigation_output.get("fallback_used") or
+                dialogue_output.get("fallback_used") or
+                turn.degraded_stages
+            ),
+            "degraded_stages": list(turn.degraded_stages)
         }
+
+    def _dialogue_reserve(self, turn: TurnContext) -> float:
+        """Share of the remaining budget navigation must leave for dialogue generation"""
+        remaining = turn.remaining()
+        if remaining is None:
+            return 0.0
+        share = float(os.getenv("TRT_DIALOGUE_BUDGET_SHARE", "0.5"))
+        return max(0.0, remaining * share)
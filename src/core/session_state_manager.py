@@ -72,8 +72,13 @@ class TRTSessionState:
         # Track most recent emotion/problem for body location questions
         self.most_recent_emotion_or_problem = None
 
-    def add_exchange(self, client_input: str, therapist_response: str, navigation_output: Dict):
-        """Add exchange to conversation history"""
+    def add_exchange(self, client_input: str, therapist_response: str, navigation_output: Dict,
+                     client_messages: List[str] = None):
+        """Add exchange to conversation history
+
+        client_messages: the separate messages merged into client_input when the
+        client sent several in quick succession (recorded only if more than one)
+        """
         exchange = {
             "turn": len(self.conversation_history) + 1,
             "timestamp": datetime.now().isoformat(),
@@ -82,6 +87,8 @@ class TRTSessionState:
             "substate": self.current_substate,
             "navigation_output": navigation_output
         }
+        if client_messages and len(client_messages) > 1:
+            exchange["client_messages"] = list(client_messages)
         self.conversation_history.append(exchange)
 
         # Track response patterns to avoid loops
@@ -0,0 +1,312 @@
+"""
+Async Redis Session Manager for TRT System
+Non-blocking counterpart of RedisSessionManager for the API's event loop:
+redis.asyncio over a bounded, health-checked connection pool with timeouts
+"""
+
+import asyncio
+import os
+import weakref
+import logging
+from typing import Dict, List, Optional, Tuple
+
+import redis.asyncio as aioredis
+
+from src.utils.redis_session_manager import (
+    _RedisSessionBase, _COMMIT_SCRIPT, _INDEX_SCRIPT, _LOAD_SCRIPT, SUMMARY_STATE_FIELDS, SUMMARY_META_FIELDS
+)
+from src.utils.redis_keys import session_key, session_keys, activity_key, substate_key
+
+logger = logging.getLogger(__name__)
+
+
+class AsyncRedisSessionManager(_RedisSessionBase):
+    """
+    Manages TRT therapy sessions in Redis without blocking the event loop
+
+    Same keys, TTLs and commit script as RedisSessionManager (which stays the
+    client for scripts and tests). Connections are opened lazily; asyncio
+    connections belong to the loop that opened them, so each event loop gets
+    its own pool.
+    """
+
+    def __init__(self, redis_url: str = None, max_connections: int = None, pool_timeout: float = None,
+                 socket_timeout: float = None, connect_timeout: float = None,
+                 health_check_interval: int = None, cluster: bool = None):
+        """
+        Args:
+            redis_url: Redis connection URL (REDIS_URL)
+            max_connections: Pool size per worker; requests beyond it wait for a free
+                             connection (REDIS_MAX_CONNECTIONS)
+            pool_timeout: Max wait for a free connection (REDIS_POOL_TIMEOUT_SECONDS)
+            socket_timeout: Max wait for a command's reply (REDIS_SOCKET_TIMEOUT_SECONDS)
+            connect_timeout: Max wait to open a connection (REDIS_CONNECT_TIMEOUT_SECONDS)
+            health_check_interval: PING connections idle this long before reuse
+                                   (REDIS_HEALTH_CHECK_INTERVAL_SECONDS)
+            cluster: Connect to a Redis Cluster (REDIS_CLUSTER); max_connections then
+                     applies per node and requests beyond it fail instead of waiting
+        """
+        if redis_url is None:
+            redis_url = os.getenv("REDIS_URL", "redis://:changeme@localhost:6379")
+        if max_connections is None:
+            max_connections = int(os.getenv("REDIS_MAX_CONNECTIONS", "50"))
+        if pool_timeout is None:
+            pool_timeout = float(os.getenv("REDIS_POOL_TIMEOUT_SECONDS", "5"))
+        if socket_timeout is None:
+            socket_timeout = float(os.getenv("REDIS_SOCKET_TIMEOUT_SECONDS", "2"))
+        if connect_timeout is None:
+            connect_timeout = float(os.getenv("REDIS_CONNECT_TIMEOUT_SECONDS", "1"))
+        if health_check_interval is None:
+            health_check_interval = int(os.getenv("REDIS_HEALTH_CHECK_INTERVAL_SECONDS", "30"))
+
+        self.redis_url = redis_url
+        self._configure(cluster)
+        self.pool_settings = {
+            "max_connections": max_connections,
+            "timeout": pool_timeout,
+            "socket_timeout": socket_timeout,
+            "socket_connect_timeout": connect_timeout,
+            "socket_keepalive": True,
+            "health_check_interval": health_check_interval,
+            "retry_on_timeout": True
+        }
+        self._clients = weakref.WeakKeyDictionary()  # event loop -> (client, commit script, index script)
+
+    def _connect(self) -> aioredis.Redis:
+        """Build a client for the running loop (binary: state blobs are not text)"""
+        if self.cluster:
+            settings = dict(self.pool_settings)
+            del settings["timeout"], settings["retry_on_timeout"]  # No blocking pool in cluster mode
+            return aioredis.RedisCluster.from_url(self.redis_url, decode_responses=False, **settings)
+        pool = aioredis.BlockingConnectionPool.from_url(self.redis_url, decode_responses=False,
+                                                        **self.pool_settings)
+        return aioredis.Redis(connection_pool=pool)
+
+    def _client(self) -> Tuple[aioredis.Redis, object]:
+        loop = asyncio.get_running_loop()
+        entry = self._clients.get(loop)
+        if entry is None:
+            client = self._connect()
+            entry = (client, client.register_script(_COMMIT_SCRIPT), client.register_script(_INDEX_SCRIPT),
+                     client.register_script(_LOAD_SCRIPT))
+            self._clients[loop] = entry
+            logger.info(f"✅ Async Redis pool opened "
+                        f"(max {self.pool_settings['max_connections']} connections)")
+        return entry
+
+    @property
+    def redis(self) -> aioredis.Redis:
+        """Client for the running event loop"""
+        return self._client()[0]
+
+    async def commit_turn(self, session_id: str, session_state, metadata: Dict = None, exchange: Dict = None,
+                          fencing_token: int = None, create_only: bool = False) -> int:
+        """
+        Write everything a turn changed in a single round trip (see RedisSessionManager.commit_turn)
+
+        Returns:
+            The session's new version if written (truthy); 0 when refused as stale,
+            or the session exists with create_only
+        """
+        try:
+            keys, args, plan = self._commit_args(session_id, session_state, metadata, exchange,
+                                                 fencing_token, create_only)
+            client, commit, index, _ = self._client()
+            result = await commit(keys=keys, args=args)
+            if int(result[0]) == -2:
+                keys, args, plan = self._commit_args(session_id, session_state, metadata, exchange,
+                                                     fencing_token, create_only, rebase=True)
+                result = await commit(keys=keys, args=args)
+            version = self._commit_result(session_id, result, fencing_token)
+            self._committed(session_state, plan, version)
+            if version and self.cluster:
+                keys, args = self._index_args(session_id, session_state.current_substate, result[1],
+                                              args[4], args[6])
+                await index(keys=keys, args=args)
+            return version
+
+        except Exception as e:
+            logger.error(f"❌ Failed to save session {session_id}: {e}")
+            return 0
+
+    async def create_session(self, session_id: str, session_state, metadata: Dict = None) -> int:
+        """Create a session atomically across workers; its version, or 0 if the ID is already taken"""
+        return await self.commit_turn(session_id, session_state, metadata=metadata, create_only=True)
+
+    async def load_turn(self, session_id: str) -> Optional[Tuple[Dict, Dict]]:
+        """
+        Load state and metadata for a turn in a single round trip (snapshot plus
+        the state events since, see RedisSessionManager.load_turn)
+
+        Returns:
+            (state data, metadata) or None if not found
+        """
+        try:
+            load = self._client()[3]
+            raw_state, raw_meta, batches = self._loaded(
+                await load(keys=session_keys(session_id, ("state", "meta", "events"))))
+
+            if not raw_state:
+                logger.info(f"ℹ️ Session not found: {session_id}")
+                return None
+
+            return self._parse_turn(raw_state, raw_meta, batches)
+
+        except Exception as e:
+            logger.error(f"❌ Failed to load session {session_id}: {e}")
+            return None
+
+    async def add_conversation_exchanges(self, exchanges: List[Tuple[str, Dict]]) -> bool:
+        """Add a batch of (session_id, exchange) to history in one round trip, in order"""
+        try:
+            pipe = self.redis.pipeline(transaction=False)
+            self._append_exchanges(pipe, exchanges)
+            await pipe.execute()
+            return True
+        except Exception as e:
+            logger.error(f"❌ Failed to save conversation exchanges: {e}")
+            return False
+
+    async def get_version(self, session_id: str) -> Optional[int]:
+        """Current version of a session's state, or None if it doesn't exist"""
+        try:
+            version = await self.redis.hget(session_key(session_id, "state"), "version")
+            return int(version) if version else None
+        except Exception as e:
+            logger.error(f"❌ Failed to read session version {session_id}: {e}")
+            return None
+
+    async def session_exists(self, session_id: str) -> bool:
+        try:
+            return await self.redis.exists(session_key(session_id, "state")) > 0
+        except Exception as e:
+            logger.error(f"❌ Failed to check session existence: {e}")
+            return False
+
+    async def delete_session(self, session_id: str) -> bool:
+        """
+        Delete a session's keys and index entry
+
+        Returns:
+            True if the session existed and was deleted
+        """
+        try:
+            substate = await self.redis.hget(session_key(session_id, "state"), "current_substate")
+            bucket = self._bucket(session_id)
+            # The index entries live in another slot: no MULTI across them
+            pipe = self.redis.pipeline(transaction=False)
+            pipe.delete(session_key(session_id, "state"))
+            pipe.delete(*session_keys(session_id, ("stream", "history", "events", "meta", "fence")))
+            pipe.zrem(activity_key(bucket), session_id)
+            if substate:
+                pipe.zrem(substate_key(bucket, substate.decode()), session_id)
+            existed = (await pipe.execute())[0]
+            if existed:
+                logger.info(f"✅ Session deleted: {session_id}")
+            return bool(existed)
+
+        except Exception as e:
+            logger.error(f"❌ Failed to delete session {session_id}: {e}")
+            return False
+
+    async def list_active_sessions(self, limit: int = 100) -> List[str]:
+        """Active session IDs, most recent first"""
+        try:
+            pipe = self.redis.pipeline(transaction=False)
+            for key in self._listing_keys():
+                pipe.zrevrange(key, 0, limit - 1, withscores=True)
+            entries = [(session_id.decode(), score) for batch in await pipe.execute() for session_id, score in batch]
+            entries.sort(key=lambda entry: (entry[1], entry[0]), reverse=True)
+            return [session_id for session_id, _ in entries[:limit]]
+        except Exception as e:
+            logger.error(f"❌ Failed to list active sessions: {e}")
+            return []
+
+    async def page_sessions(self, limit: int = 100, after: Tuple[float, str] = None, substate: str = None,
+                            since: float = None,
+                            before: float = None) -> Tuple[List[Dict], Optional[Tuple[float, str]], int]:
+        """One page of session summaries (see RedisSessionManager.page_sessions)"""
+        keys = self._listing_keys(substate)
+        lower, upper = self._score_range(since, before)
+        page_upper = self._page_upper(upper, after)
+
+        fetched, wanted = {}, {index: limit + 1 for index in range(len(keys))}
+        while wanted:
+            pipe = self.redis.pipeline(transaction=False)
+            for index, num in wanted.items():
+                pipe.zrevrangebyscore(keys[index], page_upper, lower, start=0, num=num, withscores=True)
+            for (index, num), batch in zip(wanted.items(), await pipe.execute()):
+                fetched[index] = (batch, num)
+            wanted = self._short_buckets(fetched, after, limit)
+        entries, has_more = self._merge_buckets(fetched, after, limit)
+
+        pipe = self.redis.pipeline(transaction=False)
+        for session_id, _ in entries:
+            pipe.hmget(session_key(session_id, "state"), SUMMARY_STATE_FIELDS)
+            pipe.hmget(session_key(session_id, "meta"), SUMMARY_META_FIELDS)
+        for key in keys:
+            pipe.zcount(key, lower, upper)
+        results = await pipe.execute()
+
+        summaries = []
+        for index, (session_id, _) in enumerate(entries):
+            summary = self._summary(session_id, results[2 * index], results[2 * index + 1])
+            if summary:
+                summaries.append(summary)
+        next_position = (entries[-1][1], entries[-1][0]) if has_more else None
+        return summaries, next_position, sum(results[2 * len(entries):])
+
+    async def get_session_count(self) -> int:
+        try:
+            pipe = self.redis.pipeline(transaction=False)
+            for key in self._listing_keys():
+                pipe.zcard(key)
+            return sum(await pipe.execute())
+        except Exception as e:
+            logger.error(f"❌ Failed to get session count: {e}")
+            return 0
+
+    async def health_check(self) -> Dict:
+        """Connection health plus pool usage for this worker's event loop"""
+        try:
+            client = self.redis
+            pipe = client.pipeline(transaction=False)
+            pipe.ping()
+            pipe.info("server")
+            pipe.info("memory")
+            for key in self._listing_keys():
+                pipe.zcard(key)
+            _, server, memory, *bucket_sizes = await pipe.execute()
+
+            health = {
+                "status": "healthy",
+                "connected": True,
+                "active_sessions": sum(bucket_sizes),
+                "redis_version": server.get("redis_version"),
+                "used_memory_human": memory.get("used_memory_human")
+            }
+            if not self.cluster:
+                pool = client.connection_pool
+                # The pool exposes no public counters; in_use reaching max_connections
+                # means requests are queueing for a connection
+                health["pool"] = {
+                    "max_connections": pool.max_connections,
+                    "in_use": len(pool._in_use_connections),
+                    "idle": len(pool._available_connections)
+                }
+            return health
+
+        except Exception as e:
+            return {
+                "status": "unhealthy",
+                "connected": False,
+                "error": str(e)
+            }
+
+    async def close(self):
+        """Close the running loop's pool"""
+        entry = self._clients.pop(asyncio.get_running_loop(), None)
+        if entry is not None:
+            await entry[0].aclose()
+            if not self.cluster:
+                await entry[0].connection_pool.disconnect()
@@ -0,0 +1,208 @@
+"""
+Circuit Breaker for Ollama Calls
+Stops sending requests to an Ollama that is down or overloaded so turns go
+straight to the rule-based fallbacks instead of waiting for timeouts
+"""
+
+import os
+import random
+import threading
+import time
+import logging
+from collections import deque
+from typing import Callable, Dict
+
+from src.utils.metrics import get_metrics
+
+logger = logging.getLogger(__name__)
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+_STATE_GAUGE = {CLOSED: 0, HALF_OPEN: 1, OPEN: 2}
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling Ollama while the circuit is open"""
+    pass
+
+
+class CircuitBreaker:
+    """
+    Closed / open / half-open breaker over a sliding window of recent calls
+
+    - CLOSED: calls flow; the breaker opens when, over the last `window_size`
+      calls (at least `minimum_calls`), the failure rate or the slow-call rate
+      reaches its threshold.
+    - OPEN: calls are rejected immediately. After a jittered delay that grows
+      with each failed probe, the breaker moves to HALF_OPEN.
+    - HALF_OPEN: up to `half_open_max_calls` probes are let through. A good
+      probe closes the breaker, a failed or slow one re-opens it.
+    """
+
+    def __init__(self, name: str = "ollama", failure_rate_threshold: float = 0.5,
+                 slow_call_seconds: float = 30.0, slow_call_rate_threshold: float = 0.8,
+                 window_size: int = 20, minimum_calls: int = 5, open_seconds: float = 15.0,
+                 max_open_seconds: float = 120.0, jitter: float = 0.2, half_open_max_calls: int = 1,
+                 clock: Callable[[], float] = None):
+        self.name = name
+        self.failure_rate_threshold = failure_rate_threshold
+        self.slow_call_seconds = slow_call_seconds
+        self.slow_call_rate_threshold = slow_call_rate_threshold
+        self.window_size = window_size
+        self.minimum_calls = minimum_calls
+        self.open_seconds = open_seconds
+        self.max_open_seconds = max_open_seconds
+        self.jitter = jitter
+        self.half_open_max_calls = half_open_max_calls
+        self.clock = clock or time.monotonic
+        self.metrics = get_metrics()
+
+        self._lock = threading.Lock()
+        self.state = CLOSED
+        self._window = deque(maxlen=window_size)  # (failed, slow) per call
+        self._opened_at = 0.0
+        self._retry_at = 0.0
+        self._consecutive_opens = 0
+        self._half_open_in_flight = 0
+        self._set_state_gauge()
+
+    @classmethod
+    def from_env(cls, name: str = "ollama") -> "CircuitBreaker":
+        """Build a breaker from OLLAMA_CB_* environment variables"""
+        return cls(
+            name=name,
+            failure_rate_threshold=float(os.getenv("OLLAMA_CB_FAILURE_RATE", "0.5")),
+            slow_call_seconds=float(os.getenv("OLLAMA_CB_SLOW_CALL_SECONDS", "30")),
+            slow_call_rate_threshold=float(os.getenv("OLLAMA_CB_SLOW_CALL_RATE", "0.8")),
+            window_size=int(os.getenv("OLLAMA_CB_WINDOW", "20")),
+            minimum_calls=int(os.getenv("OLLAMA_CB_MIN_CALLS", "5")),
+            open_seconds=float(os.getenv("OLLAMA_CB_OPEN_SECONDS", "15")),
+            max_open_seconds=float(os.getenv("OLLAMA_CB_MAX_OPEN_SECONDS", "120"))
+        )
+
+    def is_open(self) -> bool:
+        """True while calls would be rejected (cheap check, no state change)"""
+        with self._lock:
+            return self.state == OPEN and self.clock() < self._retry_at
+
+    def allow_request(self) -> bool:
+        """
+        Ask permission for one call
+
+        Returns:
+            True if the call may proceed; the caller must then report it with
+            record_success() or record_failure()
+        """
+        with self._lock:
+            if self.state == OPEN:
+                if self.clock() < self._retry_at:
+                    self.metrics.increment("circuit_rejections_total", labels={"breaker": self.name})
+                    return False
+                self._transition(HALF_OPEN)
+
+            if self.state == HALF_OPEN:
+                if self._half_open_in_flight >= self.half_open_max_calls:
+                    self.metrics.increment("circuit_rejections_total", labels={"breaker": self.name})
+                    return False
+                self._half_open_in_flight += 1
+
+            return True
+
+    def record_success(self, duration: float):
+        """Report a completed call"""
+        slow = duration >= self.slow_call_seconds
+        with self._lock:
+            if self.state == HALF_OPEN:
+                self._half_open_in_flight = max(0, self._half_open_in_flight - 1)
+                if slow:
+                    self._trip("slow probe")
+                else:
+                    self._window.clear()
+                    self._consecutive_opens = 0
+                    self._transition(CLOSED)
+                return
+
+            self._window.append((False, slow))
+            self._evaluate()
+
+    def record_failure(self, duration: float = 0.0):
+        """Report a failed call (connection error, timeout, 5xx)"""
+        with self._lock:
+            if self.state == HALF_OPEN:
+                self._half_open_in_flight = max(0, self._half_open_in_flight - 1)
+                self._trip("failed probe")
+                return
+
+            self._window.append((True, duration >= self.slow_call_seconds))
+            self._evaluate()
+
+    def record_cancelled(self):
+        """Report a call abandoned by the caller (e.g. losing hedge) - says nothing about health"""
+        with self._lock:
+            if self.state == HALF_OPEN:
+                self._half_open_in_flight = max(0, self._half_open_in_flight - 1)
+
+    def record_deadline(self, duration: float):
+        """
+        Report a call cut off by the caller's own deadline (e.g. a short turn budget)
+
+        Not a failure; it only counts, as a slow call, if it had already run
+        past slow_call_seconds.
+        """
+        if duration >= self.slow_call_seconds:
+            self.record_success(duration)
+        else:
+            self.record_cancelled()
+
+    def _evaluate(self):
+        """Open the breaker if the closed-state window crosses a threshold"""
+        if self.state != CLOSED or len(self._window) < self.minimum_calls:
+            return
+        calls = len(self._window)
+        failure_rate = sum(1 for failed, _ in self._window if failed) / calls
+        slow_rate = sum(1 for _, slow in self._window if slow) / calls
+
+        if failure_rate >= self.failure_rate_threshold:
+            self._trip(f"failure rate {failure_rate:.0%}")
+        elif slow_rate >= self.slow_call_rate_threshold:
+            self._trip(f"slow call rate {slow_rate:.0%}")
+
+    def _trip(self, reason: str):
+        """Open the breaker; each consecutive open doubles the (jittered) wait"""
+        delay = min(self.max_open_seconds, self.open_seconds * (2 ** self._consecutive_opens))
+        delay *= random.uniform(1 - self.jitter, 1 + self.jitter)
+        self._consecutive_opens += 1
+        self._opened_at = self.clock()
+        self._retry_at = self._opened_at + delay
+        self._window.clear()
+        self._transition(OPEN)
+        logger.warning(f"⚡ Circuit '{self.name}' OPEN ({reason}), next probe in {delay:.1f}s")
+
+    def _transition(self, new_state: str):
+        if new_state == self.state:
+            return
+        self.metrics.increment("circuit_transitions_total", labels={"breaker": self.name, "to": new_state})
+        if new_state == CLOSED:
+            logger.info(f"✅ Circuit '{self.name}' CLOSED")
+        self.state = new_state
+        self._half_open_in_flight = 0
+        self._set_state_gauge()
+
+    def _set_state_gauge(self):
+        self.metrics.set_gauge("circuit_state", _STATE_GAUGE[self.state], labels={"breaker": self.name})
+
+    def get_status(self) -> Dict:
+        """Breaker status for /health"""
+        with self._lock:
+            calls = len(self._window)
+            status = {
+                "state": self.state,
+                "recent_calls": calls,
+                "failure_rate": round(sum(1 for f, _ in self._window if f) / calls, 3) if calls else 0.0,
+                "slow_call_rate": round(sum(1 for _, s in self._window if s) / calls, 3) if calls else 0.0
+            }
+            if self.state == OPEN:
+                status["retry_in_seconds"] = round(max(0.0, self._retry_at - self.clock()), 1)
+            return status
@@ -0,0 +1,299 @@
+"""
+Conversation History Codec for TRT System
+Compact binary form of conversation exchanges: field names as small integer
+codes, known substates / decisions as enum codes, timestamps as integers,
+optionally zstd-compressed with a shared trained dictionary
+"""
+
+import json
+import os
+import threading
+import logging
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional
+
+import msgpack
+
+try:
+    import zstandard
+except ImportError:  # Compression is optional; uncompressed entries are always readable
+    zstandard = None
+
+logger = logging.getLogger(__name__)
+
+# Entry layout: MAGIC | format version (1 byte) | flags (1 byte) | msgpack payload.
+# Entries written before this codec are JSON text (they start with '{').
+MAGIC = b"TH"
+FORMAT_VERSION = 1
+FLAG_ZSTD = 0x01
+FLAG_DICTIONARY = 0x02
+_HEADER_SIZE = len(MAGIC) + 2
+
+# Compacted dicts are plain msgpack maps with code keys, expanded by expand()
+# as the object_hook; a dict that can't be compacted unambiguously is stored
+# as this extension type instead
+EXT_RAW_MAP = 3
+
+# Code tables. APPEND ONLY: an entry's position is its code in stored data.
+FIELDS = (
+    # Exchange
+    "turn", "timestamp", "client_input", "therapist_response", "substate", "current_substate",
+    "navigation_output", "navigation_decision", "client_messages",
+    # Navigation output
+    "current_stage", "situation_type", "rag_query", "completion_status", "ready_for_next",
+    "advancement_blocked_by", "reasoning", "recent_events", "llm_reasoning", "llm_confidence",
+    "fallback_used", "rule_override", "in_cycle_2", "confidence", "therapeutic_focus",
+    # Stage 1 completion criteria
+    "goal_stated", "goal_content", "vision_presented", "vision_accepted", "psycho_education_provided",
+    "education_understood", "problem_identified", "problem_content", "emotion_identified",
+    "emotion_content", "body_awareness_present", "present_moment_focus", "pattern_understood",
+    "rapport_established", "ready_for_stage_2",
+)
+SUBSTATES = (
+    "1.1_goal_and_vision", "1.1.5_psycho_education", "1.2_problem_and_body", "1.3_readiness_assessment",
+    "2.1_seek", "2.2_location", "2.3_sensation", "3.1_assess_readiness", "3.1.5_alpha_permission",
+    "3.2_alpha_sequence",
+)
+DECISIONS = (
+    "clarify_goal", "build_vision", "explore_problem", "body_awareness_inquiry", "pattern_inquiry",
+    "assess_readiness", "general_inquiry", "present_moment_focus", "body_symptoms_exploration", "continue",
+    "continue_current", "advance_substate", "redirect_focus", "emergency_stabilize", "advance_to_stage_2",
+)
+SITUATIONS = (
+    "goal_needs_clarification", "goal_stated_needs_vision", "problem_needs_exploration",
+    "body_symptoms_exploration", "explore_trigger_pattern", "readiness_for_stage_2",
+    "general_therapeutic_inquiry", "initial_goal_inquiry", "future_vision_building",
+    "body_symptom_exploration", "body_enquiry_cycle_2", "readiness_for_alpha",
+)
+RAG_QUERIES = (
+    "dr_q_goal_clarification", "dr_q_future_self_vision_building", "dr_q_problem_construction",
+    "dr_q_body_symptom_present_moment_inquiry", "dr_q_how_do_you_know_technique",
+    "dr_q_transition_to_intervention", "general_dr_q_approach", "dr_q_redirect_outcome", "dr_q_ready",
+    "dr_q_body_location", "dr_q_present_moment", "dr_q_sensation",
+)
+STAGES = ("stage_1_safety_building",)
+
+# Fields whose (string) values are stored as a code from their table
+ENUM_FIELDS = {
+    "substate": SUBSTATES,
+    "current_substate": SUBSTATES,
+    "navigation_decision": DECISIONS,
+    "situation_type": SITUATIONS,
+    "rag_query": RAG_QUERIES,
+    "current_stage": STAGES,
+}
+
+_FIELD_CODES = {name: code for code, name in enumerate(FIELDS)}
+_ENUM_CODES = {field: {value: code for code, value in enumerate(table)} for field, table in ENUM_FIELDS.items()}
+_EPOCH = datetime(1970, 1, 1)
+_MICROSECOND = timedelta(microseconds=1)
+
+_local = threading.local()
+_dictionary_lock = threading.Lock()
+_dictionaries: Dict[str, object] = {}  # path -> zstandard.ZstdCompressionDict
+
+
+class HistoryCodecError(Exception):
+    """Raised for entries that are not conversation history or can't be decompressed here"""
+    pass
+
+
+class RawMap:
+    """A dict stored as-is (flat [key, value, ...]), its values still compacted"""
+
+    __slots__ = ("pairs",)
+
+    def __init__(self, pairs: List):
+        self.pairs = pairs
+
+
+def _compactable(value: Dict) -> bool:
+    # Codes are ints, so a dict is only compacted when decoding can't confuse
+    # them with the original keys / values
+    return all(isinstance(key, str) for key in value) and all(
+        isinstance(value[field], str) for field in (*ENUM_FIELDS, "timestamp") if field in value)
+
+
+def _timestamp_code(text: str):
+    """Naive ISO timestamp -> microseconds since the epoch, if that round-trips exactly"""
+    try:
+        moment = datetime.fromisoformat(text)
+    except ValueError:
+        return text
+    if moment.tzinfo is not None or moment.isoformat() != text:
+        return text
+    return (moment - _EPOCH) // _MICROSECOND
+
+
+def compact(value):
+    """Recursively replace dict keys and known values by their codes (lists become lists)"""
+    if isinstance(value, dict):
+        if not _compactable(value):
+            return RawMap([part for key, item in value.items() for part in (key, compact(item))])
+        result = {}
+        for key, item in value.items():
+            if key in _ENUM_CODES:
+                item = _ENUM_CODES[key].get(item, item)
+            elif key == "timestamp":
+                item = _timestamp_code(item)
+            else:
+                item = compact(item)
+            result[_FIELD_CODES.get(key, key)] = item
+        return result
+    if isinstance(value, (list, tuple)):
+        return [compact(item) for item in value]
+    return value
+
+
+def expand(value: Dict) -> Dict:
+    """Rebuild a compacted dict (msgpack object_hook: nested maps are already expanded)"""
+    result = {}
+    for key, item in value.items():
+        if isinstance(key, int):
+            key = FIELDS[key]
+        if isinstance(item, int) and not isinstance(item, bool):
+            if key in ENUM_FIELDS:
+                item = ENUM_FIELDS[key][item]
+            elif key == "timestamp":
+                item = (_EPOCH + item * _MICROSECOND).isoformat()
+        result[key] = item
+    return result
+
+
+def raw_map(pairs: List) -> Dict:
+    """Rebuild a RawMap's dict"""
+    return dict(zip(pairs[::2], pairs[1::2]))
+
+
+def _default(value):
+    if isinstance(value, RawMap):
+        return msgpack.ExtType(EXT_RAW_MAP, _pack(value.pairs))
+    raise TypeError(f"Can't encode {type(value).__name__} in conversation history")
+
+
+def _ext_hook(code: int, data: bytes):
+    if code == EXT_RAW_MAP:
+        return raw_map(_unpack(data))
+    return msgpack.ExtType(code, data)
+
+
+def _pack(value) -> bytes:
+    return msgpack.packb(value, default=_default, use_bin_type=True)
+
+
+def _unpack(data: bytes):
+    return msgpack.unpackb(data, object_hook=expand, ext_hook=_ext_hook, raw=False, strict_map_key=False)
+
+
+def _compression_min_bytes() -> int:
+    return int(os.getenv("TRT_HISTORY_COMPRESSION_MIN_BYTES", "512"))
+
+
+def _dictionary():
+    """Trained zstd dictionary from TRT_HISTORY_ZSTD_DICT, or None"""
+    path = os.getenv("TRT_HISTORY_ZSTD_DICT")
+    if not path or zstandard is None:
+        return None
+    with _dictionary_lock:
+        if path not in _dictionaries:
+            with open(path, "rb") as f:
+                _dictionaries[path] = zstandard.ZstdCompressionDict(f.read())
+            logger.info(f"✅ History compression dictionary loaded: {path} "
+                        f"(id {_dictionaries[path].dict_id()})")
+        return _dictionaries[path]
+
+
+def _codecs(dictionary=None):
+    # zstd (de)compressor objects are not thread-safe; keep one pair per thread and dictionary
+    if not hasattr(_local, "codecs"):
+        _local.codecs = {}
+    key = dictionary.dict_id() if dictionary is not None else 0
+    if key not in _local.codecs:
+        _local.codecs[key] = (zstandard.ZstdCompressor(level=3, dict_data=dictionary),
+                              zstandard.ZstdDecompressor(dict_data=dictionary))
+    return _local.codecs[key]
+
+
+def encode_exchange(exchange: Dict, compress: bool = None, dictionary=None) -> bytes:
+    """
+    Serialize one conversation exchange for the history list
+
+    Args:
+        exchange: Exchange dict (JSON-compatible values)
+        compress: Force zstd on/off (default: always with a dictionary, otherwise
+                  from TRT_HISTORY_COMPRESSION_MIN_BYTES up, if zstandard is installed)
+        dictionary: zstandard.ZstdCompressionDict (default: TRT_HISTORY_ZSTD_DICT)
+
+    Returns:
+        Self-describing entry for decode_exchange()
+    """
+    payload = _pack(compact(exchange))
+
+    if dictionary is None:
+        dictionary = _dictionary()
+    if compress is None:
+        compress = zstandard is not None and (dictionary is not None or len(payload) >= _compression_min_bytes())
+    flags = 0
+    if compress:
+        if zstandard is None:
+            raise HistoryCodecError("zstd compression requested but zstandard is not installed")
+        payload = _codecs(dictionary)[0].compress(payload)
+        flags |= FLAG_ZSTD | (FLAG_DICTIONARY if dictionary is not None else 0)
+
+    return MAGIC + bytes([FORMAT_VERSION, flags]) + payload
+
+
+def decode_exchange(entry, dictionary=None) -> Dict:
+    """
+    Rebuild an exchange from encode_exchange() output, or from a JSON entry written before it
+
+    Raises:
+        HistoryCodecError if the entry can't be read here (e.g. compressed with another dictionary)
+    """
+    if isinstance(entry, str):
+        entry = entry.encode("utf-8")
+    if not entry.startswith(MAGIC):
+        return json.loads(entry)
+    if len(entry) < _HEADER_SIZE:
+        raise HistoryCodecError("Truncated history entry")
+    version, flags = entry[len(MAGIC)], entry[len(MAGIC) + 1]
+    if version > FORMAT_VERSION:
+        raise HistoryCodecError(f"History format {version} is newer than supported ({FORMAT_VERSION})")
+
+    payload = entry[_HEADER_SIZE:]
+    if flags & FLAG_ZSTD and zstandard is None:
+        raise HistoryCodecError("History entry is zstd-compressed but zstandard is not installed")
+    try:
+        if flags & FLAG_ZSTD:
+            if flags & FLAG_DICTIONARY:
+                if dictionary is None:
+                    dictionary = _dictionary()
+                dict_id = zstandard.get_frame_parameters(payload).dict_id
+                if dictionary is None or dictionary.dict_id() != dict_id:
+                    raise HistoryCodecError(f"History entry needs compression dictionary {dict_id}, not loaded")
+            else:
+                dictionary = None
+            payload = _codecs(dictionary)[1].decompress(payload)
+        return _unpack(payload)
+    except HistoryCodecError:
+        raise
+    except Exception as e:  # zstd / msgpack errors: a corrupt entry
+        raise HistoryCodecError(f"Unreadable history entry: {e}") from e
+
+
+def train_dictionary(exchanges: List[Dict], size: int = 16384) -> bytes:
+    """
+    Train a zstd dictionary on sample exchanges (save it and point TRT_HISTORY_ZSTD_DICT at the file)
+
+    Returns:
+        Dictionary bytes
+    """
+    if zstandard is None:
+        raise HistoryCodecError("Training a dictionary needs zstandard")
+    samples = [_pack(compact(exchange)) for exchange in exchanges]
+    return zstandard.train_dictionary(size, samples).as_bytes()
+
+
+def dictionary_from_bytes(data: bytes) -> Optional[object]:
+    """ZstdCompressionDict for encode_exchange / decode_exchange (None if zstandard is missing)"""
+    return zstandard.ZstdCompressionDict(data) if zstandard is not None else None
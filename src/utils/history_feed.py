@@ -0,0 +1,136 @@
+"""
+Conversation History Feed for TRT System
+Every exchange a turn records is also appended to its index bucket's feed
+stream; analytics and export jobs read the feed through a consumer group
+instead of scanning the sessions' own history
+"""
+
+import logging
+from dataclasses import dataclass
+from typing import Dict, List, Optional
+
+import redis
+
+from src.utils.history_codec import decode_exchange, HistoryCodecError
+from src.utils.redis_keys import index_shards, all_buckets, feed_key
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class FeedEntry:
+    """One exchange read from the feed (exchange is None if it can't be decoded here)"""
+    bucket: str
+    entry_id: str
+    session_id: str
+    exchange: Optional[Dict]
+
+
+class HistoryFeed:
+    """
+    Consumer-group reader over the bucketed history feed (at-least-once:
+    entries stay pending until acked, and can be claimed from a consumer
+    that died holding them)
+    """
+
+    def __init__(self, client, group: str, consumer: str, shards: int = None):
+        """
+        Args:
+            client: Redis or RedisCluster client with decode_responses=False
+            group: Consumer group name (one per downstream job)
+            consumer: This reader's name within the group
+            shards: Index bucket count (TRT_ACTIVITY_INDEX_SHARDS)
+        """
+        self.client = client
+        self.group = group
+        self.consumer = consumer
+        self.buckets = all_buckets(shards or index_shards())
+
+    def ensure_group(self, start_id: str = "0") -> int:
+        """
+        Create the consumer group on every feed bucket that doesn't have it yet
+
+        Args:
+            start_id: Where a new group starts: "0" for everything still in the feed, "$" for new entries only
+
+        Returns:
+            Number of buckets the group was created on
+        """
+        created = 0
+        for bucket in self.buckets:
+            try:
+                self.client.xgroup_create(feed_key(bucket), self.group, id=start_id, mkstream=True)
+                created += 1
+            except redis.ResponseError as e:
+                if "BUSYGROUP" not in str(e):
+                    raise
+        if created:
+            logger.info(f"✅ History feed group '{self.group}' created on {created} buckets")
+        return created
+
+    def _entries(self, bucket: str, messages: List) -> List[FeedEntry]:
+        entries = []
+        for entry_id, fields in messages:
+            session_id = fields[b"session_id"].decode()
+            try:
+                exchange = decode_exchange(fields[b"entry"])
+            except HistoryCodecError as e:
+                logger.warning(f"⚠️ Unreadable feed entry {entry_id.decode()} of {session_id}: {e}")
+                exchange = None
+            entries.append(FeedEntry(bucket, entry_id.decode(), session_id, exchange))
+        return entries
+
+    def read(self, count: int = 100) -> List[FeedEntry]:
+        """
+        New entries for this consumer, up to count per bucket (one pipelined round trip)
+
+        Returns:
+            Entries in feed order within each bucket; ack() them once processed
+        """
+        pipe = self.client.pipeline(transaction=False)
+        for bucket in self.buckets:
+            pipe.xreadgroup(self.group, self.consumer, {feed_key(bucket): ">"}, count=count)
+        entries = []
+        for bucket, result in zip(self.buckets, pipe.execute()):
+            for _, messages in result or []:
+                entries += self._entries(bucket, messages)
+        return entries
+
+    def claim_stale(self, min_idle_ms: int, count: int = 100) -> List[FeedEntry]:
+        """
+        Take over entries another consumer read but didn't ack within min_idle_ms
+
+        Returns:
+            The claimed entries, now pending for this consumer
+        """
+        pipe = self.client.pipeline(transaction=False)
+        for bucket in self.buckets:
+            pipe.xautoclaim(feed_key(bucket), self.group, self.consumer, min_idle_ms, count=count)
+        entries = []
+        for bucket, result in zip(self.buckets, pipe.execute()):
+            entries += self._entries(bucket, [message for message in result[1] if message[1]])
+        return entries
+
+    def ack(self, entries: List[FeedEntry]) -> int:
+        """
+        Mark entries processed
+
+        Returns:
+            Number of entries acknowledged
+        """
+        ids: Dict[str, List[str]] = {}
+        for entry in entries:
+            ids.setdefault(entry.bucket, []).append(entry.entry_id)
+        if not ids:
+            return 0
+        pipe = self.client.pipeline(transaction=False)
+        for bucket, entry_ids in ids.items():
+            pipe.xack(feed_key(bucket), self.group, *entry_ids)
+        return sum(pipe.execute())
+
+    def pending(self) -> int:
+        """Entries read by the group's consumers but not acked yet"""
+        pipe = self.client.pipeline(transaction=False)
+        for bucket in self.buckets:
+            pipe.xpending(feed_key(bucket), self.group)
+        return sum(summary["pending"] for summary in pipe.execute())
@@ -0,0 +1,187 @@
+"""
+Write-Behind History Writer for TRT System
+Persists conversation exchanges after the turn has been answered: queued in
+the worker, written to the session store in batches (one round trip each),
+oldest first, with retries
+"""
+
+import asyncio
+import os
+import time
+import logging
+from collections import deque
+from datetime import datetime
+from itertools import islice
+from typing import Awaitable, Callable, Deque, Dict, Optional, Tuple
+
+from src.utils.metrics import get_metrics
+
+logger = logging.getLogger(__name__)
+
+# Runs once the exchange is stored (or given up on)
+AfterWrite = Callable[[], Awaitable]
+
+
+class HistoryWriter:
+    """
+    Queue of exchanges waiting to be written
+
+    - One flusher task writes the queue oldest first, so a session's
+      exchanges are stored in turn order.
+    - Submissions arriving within the interval share a batch; a batch is a
+      single add_exchanges_async call.
+    - A failed batch is retried with exponential backoff, then dropped and
+      logged (the session state keeps its own copy of the conversation).
+    - Each exchange may carry an after-write callback. The API releases the
+      session lock there, so the session's next turn (on any worker) starts
+      only once this turn's exchange is stored.
+
+    The task belongs to the event loop of the first submit (the API's loop).
+    """
+
+    def __init__(self, store, interval_ms: float = None, batch_size: int = None, max_pending: int = None,
+                 max_attempts: int = None, backoff_seconds: float = 0.1, max_backoff_seconds: float = 5.0):
+        """
+        Args:
+            store: SessionStore the exchanges go to
+            interval_ms: How long the first queued exchange waits for others to batch with
+                         (TRT_HISTORY_WRITE_INTERVAL_MS)
+            batch_size: Exchanges per write at most (TRT_HISTORY_WRITE_BATCH_SIZE)
+            max_pending: Queue bound; submit() refuses beyond it (TRT_HISTORY_WRITE_MAX_PENDING)
+            max_attempts: Tries per batch before it is dropped (TRT_HISTORY_WRITE_MAX_ATTEMPTS)
+            backoff_seconds: Wait after the first failed try, doubled after each further one
+            max_backoff_seconds: Longest wait between tries
+        """
+        if interval_ms is None:
+            interval_ms = float(os.getenv("TRT_HISTORY_WRITE_INTERVAL_MS", "5"))
+        if batch_size is None:
+            batch_size = int(os.getenv("TRT_HISTORY_WRITE_BATCH_SIZE", "200"))
+        if max_pending is None:
+            max_pending = int(os.getenv("TRT_HISTORY_WRITE_MAX_PENDING", "10000"))
+        if max_attempts is None:
+            max_attempts = int(os.getenv("TRT_HISTORY_WRITE_MAX_ATTEMPTS", "6"))
+
+        self.store = store
+        self.interval_seconds = max(0.0, interval_ms) / 1000.0
+        self.batch_size = max(1, batch_size)
+        self.max_pending = max_pending
+        self.max_attempts = max(1, max_attempts)
+        self.backoff_seconds = backoff_seconds
+        self.max_backoff_seconds = max_backoff_seconds
+        self.metrics = get_metrics()
+
+        self._queue: Deque[Tuple[str, Dict, Optional[AfterWrite]]] = deque()
+        self._task: Optional[asyncio.Task] = None
+        self._wakeup: Optional[asyncio.Event] = None
+        self._drained: Optional[asyncio.Event] = None
+        self._flushing = False
+        self.written = 0
+        self.dropped = 0
+
+    def _ensure_task(self):
+        if self._task is None or self._task.done():
+            self._wakeup = asyncio.Event()
+            self._drained = asyncio.Event()
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    def submit(self, session_id: str, exchange: Dict, after_write: AfterWrite = None) -> bool:
+        """
+        Queue an exchange (call from the event loop)
+
+        Returns:
+            False if the queue is full: write the exchange synchronously instead
+        """
+        if len(self._queue) >= self.max_pending:
+            self.metrics.increment("history_write_queue_full_total")
+            logger.warning(f"⚠️ History write queue full ({self.max_pending}), writing {session_id} inline")
+            return False
+        exchange.setdefault("timestamp", datetime.now().isoformat())
+        self._ensure_task()
+        self._queue.append((session_id, exchange, after_write))
+        self._drained.clear()
+        self._wakeup.set()
+        return True
+
+    def pending(self) -> int:
+        return len(self._queue)
+
+    async def _run(self):
+        while True:
+            await self._wakeup.wait()
+            self._wakeup.clear()
+            if self.interval_seconds and not self._flushing and len(self._queue) < self.batch_size:
+                await asyncio.sleep(self.interval_seconds)
+            while self._queue:
+                batch = list(islice(self._queue, self.batch_size))
+                await self._write(batch)
+                for _ in batch:
+                    self._queue.popleft()
+                await self._after_write(batch)
+            self._drained.set()
+
+    async def _write(self, batch):
+        """Write one batch, retrying with backoff; dropped after max_attempts"""
+        exchanges = [(session_id, exchange) for session_id, exchange, _ in batch]
+        start = time.monotonic()
+        for attempt in range(1, self.max_attempts + 1):
+            try:
+                written = await self.store.add_exchanges_async(exchanges)
+            except Exception as e:
+                logger.error(f"❌ History write failed: {e}")
+                written = False
+            if written:
+                self.written += len(batch)
+                self.metrics.increment("history_writes_total", len(batch))
+                self.metrics.observe("history_write_batch_size", len(batch))
+                self.metrics.observe("history_write_seconds", time.monotonic() - start)
+                return
+            if attempt < self.max_attempts:
+                self.metrics.increment("history_write_retries_total")
+                await asyncio.sleep(min(self.backoff_seconds * 2 ** (attempt - 1), self.max_backoff_seconds))
+
+        self.dropped += len(batch)
+        self.metrics.increment("history_writes_dropped_total", len(batch))
+        logger.error(f"❌ Dropped {len(batch)} conversation exchanges after {self.max_attempts} attempts "
+                     f"(sessions: {', '.join(sorted({session_id for session_id, _ in exchanges}))})")
+
+    @staticmethod
+    async def _after_write(batch):
+        callbacks = [after_write() for _, _, after_write in batch if after_write is not None]
+        for result in await asyncio.gather(*callbacks, return_exceptions=True):
+            if isinstance(result, Exception):
+                logger.error(f"❌ History after-write callback failed: {result}")
+
+    async def flush(self, timeout: float = None) -> bool:
+        """
+        Write everything queued now, without waiting for the batching interval
+
+        Returns:
+            False if the timeout passed first
+        """
+        if not self._queue or self._task is None or self._task.done():
+            return not self._queue
+        self._flushing = True
+        self._wakeup.set()
+        try:
+            await asyncio.wait_for(self._drained.wait(), timeout)
+            return True
+        except asyncio.TimeoutError:
+            return False
+        finally:
+            self._flushing = False
+
+    async def close(self, timeout: float = 10.0):
+        """Flush (on shutdown), then stop the flusher task"""
+        if not await self.flush(timeout):
+            logger.error(f"❌ {len(self._queue)} conversation exchanges not written before shutdown")
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def stats(self) -> Dict:
+        """Queue depth and totals, for /health"""
+        return {"pending": len(self._queue), "written": self.written, "dropped": self.dropped}
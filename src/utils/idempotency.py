@@ -0,0 +1,248 @@
+"""
+Idempotency Keys for TRT Input Endpoints
+Stores the in-progress or final response of a request under its client-sent
+Idempotency-Key, so a retried request waits for / replays that response
+instead of running the LLM calls (and appending the exchange) again
+"""
+
+import asyncio
+import hashlib
+import os
+import threading
+import time
+import uuid
+import logging
+from abc import ABC, abstractmethod
+from dataclasses import dataclass
+from typing import Awaitable, Callable, Dict, Optional, Tuple
+
+from src.utils.metrics import get_metrics
+
+logger = logging.getLogger(__name__)
+
+IDEMPOTENCY_HEADER = "Idempotency-Key"
+
+STATE_PENDING = "pending"
+STATE_COMPLETED = "completed"
+
+# How often a duplicate request checks whether the original has finished
+POLL_SECONDS = 0.1
+
+# Claim the key if nobody has, otherwise report what is stored
+_CLAIM_SCRIPT = """
+if redis.call('EXISTS', KEYS[1]) == 0 then
+    redis.call('HSET', KEYS[1], 'state', 'pending', 'fingerprint', ARGV[1], 'owner', ARGV[2])
+    redis.call('PEXPIRE', KEYS[1], ARGV[3])
+    return {1}
+end
+return {0, redis.call('HGET', KEYS[1], 'state'), redis.call('HGET', KEYS[1], 'fingerprint'),
+        redis.call('HGET', KEYS[1], 'owner') or '', redis.call('HGET', KEYS[1], 'response') or ''}
+"""
+
+# Drop a pending claim (the request failed) only if it is still ours
+_ABANDON_SCRIPT = """
+if redis.call('HGET', KEYS[1], 'owner') == ARGV[1] and redis.call('HGET', KEYS[1], 'state') == 'pending' then
+    return redis.call('DEL', KEYS[1])
+end
+return 0
+"""
+
+# Store the final response, unless our claim expired and another request took
+# the key (a key nobody holds any more is stored: the response is still final)
+# ARGV: owner, fingerprint, response, ttl seconds
+_COMPLETE_SCRIPT = """
+local owner = redis.call('HGET', KEYS[1], 'owner')
+if owner and owner ~= ARGV[1] then
+    return 0
+end
+redis.call('HSET', KEYS[1], 'state', 'completed', 'fingerprint', ARGV[2], 'owner', ARGV[1], 'response', ARGV[3])
+redis.call('EXPIRE', KEYS[1], ARGV[4])
+return 1
+"""
+
+
+class IdempotencyKeyReusedError(Exception):
+    """The key was already used for a request with a different body"""
+    pass
+
+
+class IdempotencyInProgressError(Exception):
+    """The original request is still running after the duplicate waited as long as it may"""
+    pass
+
+
+@dataclass
+class IdempotencyRecord:
+    """What is stored under an idempotency key"""
+    state: str
+    fingerprint: str
+    owner: str
+    response: Optional[str] = None
+
+
+def request_fingerprint(*parts: str) -> str:
+    """Hash of the request identity (endpoint, session, body) a key is bound to"""
+    return hashlib.sha256("\x1f".join(parts).encode("utf-8")).hexdigest()
+
+
+class _IdempotencyStoreBase(ABC):
+    """TTL settings and the claim / wait / replay flow shared by the stores"""
+
+    def __init__(self, ttl_seconds: float = None, pending_seconds: float = None):
+        """
+        Args:
+            ttl_seconds: How long a final response is kept for replays (TRT_IDEMPOTENCY_TTL_SECONDS)
+            pending_seconds: How long an in-progress claim lives - and a duplicate waits for it;
+                             must outlast the slowest turn (TRT_IDEMPOTENCY_PENDING_SECONDS)
+        """
+        if ttl_seconds is None:
+            ttl_seconds = float(os.getenv("TRT_IDEMPOTENCY_TTL_SECONDS", "86400"))
+        if pending_seconds is None:
+            pending_seconds = float(os.getenv("TRT_IDEMPOTENCY_PENDING_SECONDS", "120"))
+
+        self.ttl_seconds = ttl_seconds
+        self.pending_seconds = pending_seconds
+        self.metrics = get_metrics()
+
+    async def run_once(self, key: str, fingerprint: str, produce: Callable[[], Awaitable[str]],
+                       wait_seconds: float = None) -> Tuple[str, bool]:
+        """
+        Run `produce` at most once per key, or wait for / replay the stored result
+
+        Args:
+            key: Scoped idempotency key
+            fingerprint: request_fingerprint() of the request
+            produce: Coroutine function returning the serialized response
+            wait_seconds: How long a duplicate waits for the original (default pending_seconds;
+                          a claim whose worker died expires by then and is taken over)
+
+        Returns:
+            (serialized response, replayed)
+
+        Raises:
+            IdempotencyKeyReusedError if the key belongs to a different request
+            IdempotencyInProgressError if the original is still running after wait_seconds
+        """
+        loop = asyncio.get_running_loop()
+        if wait_seconds is None:
+            wait_seconds = self.pending_seconds
+        wait_until = time.monotonic() + wait_seconds
+        waited = False
+        while True:
+            owner = uuid.uuid4().hex
+            record = await loop.run_in_executor(None, self.claim, key, fingerprint, owner)
+            if record is None:
+                break
+            if record.fingerprint != fingerprint:
+                self.metrics.increment("idempotency_key_reused_total")
+                raise IdempotencyKeyReusedError(f"Idempotency key {key} was used for a different request")
+            if record.state == STATE_COMPLETED:
+                self.metrics.increment("idempotency_replays_total", labels={"waited": str(waited).lower()})
+                return record.response, True
+            if time.monotonic() >= wait_until:
+                raise IdempotencyInProgressError(f"Request with idempotency key {key} is still being processed")
+            if not waited:
+                waited = True
+                logger.info(f"⏳ Duplicate request for idempotency key {key}: waiting for the original")
+            await asyncio.sleep(POLL_SECONDS)
+
+        try:
+            response = await produce()
+        except BaseException:
+            # Failed or cancelled: let a retry run it
+            await loop.run_in_executor(None, self.abandon, key, owner)
+            raise
+        if not await loop.run_in_executor(None, self.complete, key, fingerprint, owner, response):
+            self.metrics.increment("idempotency_claims_lost_total")
+            logger.warning(f"⚠️ Idempotency claim for {key} expired and was taken over before the response "
+                           f"was stored; a retry may run the request again")
+        return response, False
+
+    @abstractmethod
+    def claim(self, key: str, fingerprint: str, owner: str) -> Optional[IdempotencyRecord]:
+        """Mark the key pending for `owner`; returns None if claimed, else the existing record"""
+
+    @abstractmethod
+    def complete(self, key: str, fingerprint: str, owner: str, response: str) -> bool:
+        """Store the final response for ttl_seconds; False if another owner holds the key now"""
+
+    @abstractmethod
+    def abandon(self, key: str, owner: str):
+        """Remove our pending claim so the request can be retried"""
+
+
+class RedisIdempotencyStore(_IdempotencyStoreBase):
+    """
+    Idempotency records in Redis, shared by every worker and replica
+
+    Key:
+        trt:idempotency:{key}  hash of state, fingerprint, owner and (once completed) response
+    """
+
+    def __init__(self, redis_client, **kwargs):
+        super().__init__(**kwargs)
+        self.redis = redis_client
+        self._claim = redis_client.register_script(_CLAIM_SCRIPT)
+        self._complete = redis_client.register_script(_COMPLETE_SCRIPT)
+        self._abandon = redis_client.register_script(_ABANDON_SCRIPT)
+
+    @staticmethod
+    def record_key(key: str) -> str:
+        return f"trt:idempotency:{key}"
+
+    def claim(self, key: str, fingerprint: str, owner: str) -> Optional[IdempotencyRecord]:
+        result = self._claim(keys=[self.record_key(key)],
+                             args=[fingerprint, owner, int(self.pending_seconds * 1000)])
+        if int(result[0]) == 1:
+            return None
+        state, stored_fingerprint, stored_owner, response = result[1:5]
+        return IdempotencyRecord(state, stored_fingerprint, stored_owner, response or None)
+
+    def complete(self, key: str, fingerprint: str, owner: str, response: str) -> bool:
+        return bool(self._complete(keys=[self.record_key(key)],
+                                   args=[owner, fingerprint, response, int(self.ttl_seconds)]))
+
+    def abandon(self, key: str, owner: str):
+        self._abandon(keys=[self.record_key(key)], args=[owner])
+
+
+class LocalIdempotencyStore(_IdempotencyStoreBase):
+    """In-process fallback when Redis is not configured (single worker only)"""
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self._lock = threading.Lock()
+        self._records: Dict[str, Tuple[IdempotencyRecord, float]] = {}  # key -> (record, expires_at)
+
+    def claim(self, key: str, fingerprint: str, owner: str) -> Optional[IdempotencyRecord]:
+        now = time.monotonic()
+        with self._lock:
+            # Drop expired records while we're here
+            for stale in [k for k, (_, expires_at) in self._records.items() if expires_at <= now]:
+                del self._records[stale]
+            if key in self._records:
+                return self._records[key][0]
+            self._records[key] = (IdempotencyRecord(STATE_PENDING, fingerprint, owner), now + self.pending_seconds)
+            return None
+
+    def complete(self, key: str, fingerprint: str, owner: str, response: str) -> bool:
+        with self._lock:
+            entry = self._records.get(key)
+            if entry and entry[0].owner != owner and entry[1] > time.monotonic():
+                return False
+            record = IdempotencyRecord(STATE_COMPLETED, fingerprint, owner, response)
+            self._records[key] = (record, time.monotonic() + self.ttl_seconds)
+            return True
+
+    def abandon(self, key: str, owner: str):
+        with self._lock:
+            entry = self._records.get(key)
+            if entry and entry[0].owner == owner and entry[0].state == STATE_PENDING:
+                del self._records[key]
+
+
+def create_idempotency_store(redis_client=None, **kwargs) -> _IdempotencyStoreBase:
+    """Redis store when a Redis client is available, otherwise the in-process store"""
+    if redis_client is not None:
+        return RedisIdempotencyStore(redis_client, **kwargs)
+    return LocalIdempotencyStore(**kwargs)
@@ -0,0 +1,206 @@
+"""
+Priority-Aware LLM Request Scheduler
+Caps concurrent Ollama generations at the server's parallel slots and decides
+who goes next: crisis > in-turn dialogue > navigation > background, with
+round-robin between sessions inside each priority class
+"""
+
+import os
+import threading
+import time
+import logging
+from collections import OrderedDict, deque
+from contextlib import contextmanager
+from enum import IntEnum
+from typing import Dict, Optional
+
+from src.utils.metrics import get_metrics
+from src.utils.turn_context import CancelToken, TurnCancelled
+
+logger = logging.getLogger(__name__)
+
+
+class RequestPriority(IntEnum):
+    """Lower value = served first"""
+    CRISIS = 0
+    DIALOGUE = 1
+    NAVIGATION = 2
+    BACKGROUND = 3
+
+
+class SchedulerTimeout(Exception):
+    """Raised when a request waited longer than its queue timeout for an LLM slot"""
+    pass
+
+
+class _Ticket:
+    """A queued request waiting for a slot"""
+
+    __slots__ = ("priority", "session_id", "enqueued_at", "granted")
+
+    def __init__(self, priority: RequestPriority, session_id: str):
+        self.priority = priority
+        self.session_id = session_id
+        self.enqueued_at = time.time()
+        self.granted = False
+
+
+class LLMScheduler:
+    """
+    Client-side admission control for Ollama generations
+
+    Requests beyond max_concurrency wait in per-priority queues. Inside a
+    priority class each session has its own FIFO and sessions are served
+    round-robin, so one chatty session cannot starve the others.
+    """
+
+    def __init__(self, max_concurrency: int = None, queue_timeout_seconds: float = None,
+                 endpoint_count: int = 1):
+        """
+        Args:
+            max_concurrency: Concurrent generations allowed (default: OLLAMA_NUM_PARALLEL per endpoint)
+            queue_timeout_seconds: Default max wait for a slot
+            endpoint_count: Number of Ollama servers behind this scheduler
+        """
+        if max_concurrency is None:
+            per_endpoint = int(os.getenv("OLLAMA_MAX_CONCURRENCY", os.getenv("OLLAMA_NUM_PARALLEL", "4")))
+            max_concurrency = per_endpoint * max(1, endpoint_count)
+        if queue_timeout_seconds is None:
+            queue_timeout_seconds = float(os.getenv("OLLAMA_QUEUE_TIMEOUT_SECONDS", "30"))
+
+        self.max_concurrency = max(1, max_concurrency)
+        self.queue_timeout_seconds = queue_timeout_seconds
+        self.active = 0
+        self.metrics = get_metrics()
+
+        self._condition = threading.Condition()
+        # priority -> OrderedDict(session_id -> deque of tickets); order = round-robin order
+        self._queues: Dict[RequestPriority, "OrderedDict[str, deque]"] = {
+            priority: OrderedDict() for priority in RequestPriority
+        }
+
+    @contextmanager
+    def slot(self, priority: RequestPriority = RequestPriority.BACKGROUND, session_id: str = None,
+             timeout: float = None, cancel_token: CancelToken = None):
+        """
+        Hold one LLM slot for the duration of the block
+
+        Raises:
+            SchedulerTimeout if no slot was granted within the timeout
+            TurnCancelled if the turn was cancelled while waiting
+        """
+        self.acquire(priority, session_id, timeout, cancel_token)
+        try:
+            yield
+        finally:
+            self.release()
+
+    def acquire(self, priority: RequestPriority = RequestPriority.BACKGROUND, session_id: str = None,
+                timeout: float = None, cancel_token: CancelToken = None):
+        """Block until a slot is granted (see slot())"""
+        if timeout is None:
+            timeout = self.queue_timeout_seconds
+        session_key = session_id or "_anonymous"
+        ticket = _Ticket(priority, session_key)
+        labels = {"priority": priority.name.lower()}
+
+        with self._condition:
+            # Fast path: free slot and nobody queued ahead of us
+            if self.active < self.max_concurrency and self._queued_count() == 0:
+                self.active += 1
+                self._update_gauges()
+                self.metrics.observe("llm_queue_wait_seconds", 0.0, labels=labels)
+                return
+
+            self._queues[priority].setdefault(session_key, deque()).append(ticket)
+            self._update_gauges()
+
+            deadline = time.time() + timeout
+            while not ticket.granted:
+                remaining = deadline - time.time()
+                if remaining <= 0:
+                    self._remove(ticket)
+                    self._update_gauges()
+                    self.metrics.increment("llm_queue_timeouts_total", labels=labels)
+                    raise SchedulerTimeout(
+                        f"No LLM slot within {timeout:.1f}s ({priority.name} priority, "
+                        f"{self.active} active, {self._queued_count()} queued)"
+                    )
+                if cancel_token is not None:
+                    if cancel_token.cancelled:
+                        self._remove(ticket)
+                        self._update_gauges()
+                        raise TurnCancelled(cancel_token.reason)
+                    remaining = min(remaining, 0.1)  # Cancellation does not notify the condition
+                self._condition.wait(remaining)
+
+            self.metrics.observe("llm_queue_wait_seconds", time.time() - ticket.enqueued_at, labels=labels)
+
+    def try_acquire(self, priority: RequestPriority = RequestPriority.BACKGROUND) -> bool:
+        """Take a slot only if one is free and nobody is queued (never waits); release() it after"""
+        with self._condition:
+            if self.active < self.max_concurrency and self._queued_count() == 0:
+                self.active += 1
+                self._update_gauges()
+                self.metrics.observe("llm_queue_wait_seconds", 0.0, labels={"priority": priority.name.lower()})
+                return True
+            return False
+
+    def release(self):
+        """Free a slot and hand it to the next waiter, if any"""
+        with self._condition:
+            self.active -= 1
+            next_ticket = self._next_ticket()
+            if next_ticket is not None:
+                # Slot passes directly to the waiter, active count stays the same
+                next_ticket.granted = True
+                self.active += 1
+                self._condition.notify_all()
+            self._update_gauges()
+
+    def _next_ticket(self) -> Optional[_Ticket]:
+        """Pop the next ticket: highest priority, then round-robin across sessions"""
+        for priority in RequestPriority:
+            sessions = self._queues[priority]
+            if not sessions:
+                continue
+            session_key, tickets = next(iter(sessions.items()))
+            ticket = tickets.popleft()
+            if tickets:
+                sessions.move_to_end(session_key)  # Other sessions go first next time
+            else:
+                del sessions[session_key]
+            return ticket
+        return None
+
+    def _remove(self, ticket: _Ticket):
+        sessions = self._queues[ticket.priority]
+        tickets = sessions.get(ticket.session_id)
+        if tickets is None:
+            return
+        try:
+            tickets.remove(ticket)
+        except ValueError:
+            return
+        if not tickets:
+            del sessions[ticket.session_id]
+
+    def _queued_count(self, priority: RequestPriority = None) -> int:
+        priorities = [priority] if priority is not None else list(RequestPriority)
+        return sum(len(t) for p in priorities for t in self._queues[p].values())
+
+    def _update_gauges(self):
+        self.metrics.set_gauge("llm_active_requests", self.active)
+        for priority in RequestPriority:
+            self.metrics.set_gauge("llm_queue_depth", self._queued_count(priority),
+                                   labels={"priority": priority.name.lower()})
+
+    def get_status(self) -> Dict:
+        """Queue status for health/metrics endpoints"""
+        with self._condition:
+            return {
+                "max_concurrency": self.max_concurrency,
+                "active": self.active,
+                "queued": {p.name.lower(): self._queued_count(p) for p in RequestPriority},
+                "queue_timeout_seconds": self.queue_timeout_seconds
+            }
@@ -0,0 +1,153 @@
+"""
+Per-Session Message Coalescing
+Merges messages a client sends in quick succession ("yeah" ... "my chest feels
+tight") into one turn, so they get one reply instead of racing each other
+"""
+
+import asyncio
+import os
+import logging
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from src.utils.metrics import get_metrics
+from src.utils.turn_context import get_in_flight_turns
+
+logger = logging.getLogger(__name__)
+
+# Runs one turn for the merged messages; receives the messages and the waiters
+# (one per HTTP request) the turn answers
+TurnRunner = Callable[[List[str], List[Any]], Awaitable[Any]]
+
+
+class _Batch:
+    """Messages waiting for (or being answered by) one turn"""
+
+    def __init__(self):
+        self.entries: List[Tuple[str, Any, asyncio.Future]] = []  # (message, waiter, future)
+        self.generation = 0  # Bumped whenever a newer message restarts the turn
+        self.running = False
+
+
+class MessageCoalescer:
+    """
+    Coalesces a session's messages into single turns
+
+    - A message opens a batch; anything else from the session within the
+      window joins it, then one turn runs for all of them.
+    - A message arriving while the batch's turn is running cancels that turn
+      and restarts it (after a fresh window) with every unanswered message.
+    - All requests answered by a turn receive the same response.
+
+    With a window of 0 (the default) every message is its own turn.
+    """
+
+    def __init__(self, window_ms: float = None, max_messages: int = None):
+        """
+        Args:
+            window_ms: How long to wait for follow-up messages (TRT_COALESCE_WINDOW_MS, 0 = off)
+            max_messages: Messages merged into one turn at most (TRT_COALESCE_MAX_MESSAGES)
+        """
+        if window_ms is None:
+            window_ms = float(os.getenv("TRT_COALESCE_WINDOW_MS", "0"))
+        if max_messages is None:
+            max_messages = int(os.getenv("TRT_COALESCE_MAX_MESSAGES", "5"))
+
+        self.window_seconds = max(0.0, window_ms) / 1000.0
+        self.max_messages = max(1, max_messages)
+        self.metrics = get_metrics()
+        self._batches: Dict[str, _Batch] = {}
+
+    @property
+    def enabled(self) -> bool:
+        return self.window_seconds > 0
+
+    async def submit(self, session_id: str, message: str, run_turn: TurnRunner, waiter: Any = None) -> Any:
+        """
+        Add a message and wait for the turn that answers it
+
+        Args:
+            session_id: Session the message belongs to
+            message: Client message text
+            run_turn: Coroutine function running a turn for a list of messages;
+                      the most recently submitted one is used for a restarted turn
+            waiter: Opaque per-request object handed to run_turn (e.g. the HTTP request)
+
+        Returns:
+            Result of the turn (shared by every message merged into it)
+        """
+        batch = self._batches.get(session_id)
+        if not self.enabled or (batch is not None and len(batch.entries) >= self.max_messages):
+            return await run_turn([message], [waiter])
+
+        future = asyncio.get_running_loop().create_future()
+        if batch is None:
+            batch = self._batches[session_id] = _Batch()
+            batch.entries.append((message, waiter, future))
+            asyncio.create_task(self._run(session_id, batch, batch.generation, run_turn))
+        else:
+            self.metrics.increment("turn_messages_coalesced_total")
+            batch.entries.append((message, waiter, future))
+            if batch.running:
+                # A turn is already generating for the earlier messages; restart it with all of them
+                batch.generation += 1
+                batch.running = False
+                get_in_flight_turns().cancel(session_id, "coalesced")
+                logger.info(f"🔗 Session {session_id}: restarting turn with {len(batch.entries)} messages")
+                asyncio.create_task(self._run(session_id, batch, batch.generation, run_turn))
+
+        # Shield: one waiter going away must not cancel the turn for the others
+        return await asyncio.shield(future)
+
+    async def _run(self, session_id: str, batch: _Batch, generation: int, run_turn: TurnRunner):
+        """Wait out the window, then run one turn for every unanswered message in the batch"""
+        await asyncio.sleep(self.window_seconds)
+        if generation != batch.generation or not batch.entries:
+            self._cleanup(session_id, batch)
+            return
+
+        batch.running = True
+        entries = list(batch.entries)
+        if len(entries) > 1:
+            self.metrics.observe("turn_coalesced_batch_size", len(entries))
+
+        try:
+            result = await run_turn([m for m, _, _ in entries], [w for _, w, _ in entries])
+        except Exception as e:
+            if generation == batch.generation:
+                # Nobody restarted the turn: its messages get the error
+                self._resolve(batch, entries, error=e)
+            # Otherwise the restarted turn answers these messages too
+        else:
+            # Answered (even if a restart raced the commit); the restarted turn skips these
+            self._resolve(batch, entries, result=result)
+        finally:
+            if generation == batch.generation:
+                batch.running = False
+            self._cleanup(session_id, batch)
+
+    def _resolve(self, batch: _Batch, entries: List, result: Any = None, error: Exception = None):
+        for entry in entries:
+            if entry in batch.entries:
+                batch.entries.remove(entry)
+            future = entry[2]
+            if future.done():
+                continue
+            if error is not None:
+                future.set_exception(error)
+            else:
+                future.set_result(result)
+
+    def _cleanup(self, session_id: str, batch: _Batch):
+        if not batch.entries and self._batches.get(session_id) is batch:
+            del self._batches[session_id]
+
+
+_coalescer: Optional[MessageCoalescer] = None
+
+
+def get_message_coalescer() -> MessageCoalescer:
+    """Get the process-wide message coalescer"""
+    global _coalescer
+    if _coalescer is None:
+        _coalescer = MessageCoalescer()
+    return _coalescer
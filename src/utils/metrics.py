@@ -0,0 +1,120 @@
+"""
+In-Process Metrics for TRT System
+Lightweight counters, gauges and timing summaries exposed via /metrics
+"""
+
+import threading
+import time
+from collections import deque
+from typing import Dict, Optional
+
+
+def _metric_key(name: str, labels: Optional[Dict[str, str]]) -> str:
+    """Build a flat key like 'ollama_requests_total{model=llama3.1}'"""
+    if not labels:
+        return name
+    label_str = ",".join(f"{k}={v}" for k, v in sorted(labels.items()))
+    return f"{name}{{{label_str}}}"
+
+
+class TimingSummary:
+    """Running count/sum/max plus a window of recent samples for percentiles"""
+
+    def __init__(self, window: int = 1000):
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.samples = deque(maxlen=window)
+
+    def observe(self, value: float):
+        self.count += 1
+        self.total += value
+        self.max = max(self.max, value)
+        self.samples.append(value)
+
+    def percentile(self, pct: float) -> float:
+        """Percentile over the recent window (0 if no samples)"""
+        if not self.samples:
+            return 0.0
+        ordered = sorted(self.samples)
+        index = min(len(ordered) - 1, int(round(pct / 100.0 * (len(ordered) - 1))))
+        return ordered[index]
+
+    def to_dict(self) -> Dict:
+        return {
+            "count": self.count,
+            "sum": round(self.total, 6),
+            "avg": round(self.total / self.count, 6) if self.count else 0.0,
+            "max": round(self.max, 6),
+            "p50": round(self.percentile(50), 6),
+            "p95": round(self.percentile(95), 6),
+            "p99": round(self.percentile(99), 6)
+        }
+
+
+class MetricsRegistry:
+    """Thread-safe registry of counters, gauges and timing summaries"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.counters: Dict[str, float] = {}
+        self.gauges: Dict[str, float] = {}
+        self.timings: Dict[str, TimingSummary] = {}
+        self.started_at = time.time()
+
+    def increment(self, name: str, value: float = 1, labels: Dict[str, str] = None):
+        """Increment a counter"""
+        key = _metric_key(name, labels)
+        with self._lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def set_gauge(self, name: str, value: float, labels: Dict[str, str] = None):
+        """Set a gauge to an absolute value"""
+        key = _metric_key(name, labels)
+        with self._lock:
+            self.gauges[key] = value
+
+    def observe(self, name: str, value: float, labels: Dict[str, str] = None):
+        """Record a timing/size observation"""
+        key = _metric_key(name, labels)
+        with self._lock:
+            if key not in self.timings:
+                self.timings[key] = TimingSummary()
+            self.timings[key].observe(value)
+
+    def get_counter(self, name: str, labels: Dict[str, str] = None) -> float:
+        with self._lock:
+            return self.counters.get(_metric_key(name, labels), 0)
+
+    def get_timing(self, name: str, labels: Dict[str, str] = None) -> Optional[TimingSummary]:
+        with self._lock:
+            return self.timings.get(_metric_key(name, labels))
+
+    def snapshot(self) -> Dict:
+        """Point-in-time copy of all metrics (JSON serializable)"""
+        with self._lock:
+            return {
+                "uptime_seconds": round(time.time() - self.started_at, 3),
+                "counters": dict(self.counters),
+                "gauges": dict(self.gauges),
+                "timings": {k: v.to_dict() for k, v in self.timings.items()}
+            }
+
+    def reset(self):
+        """Clear all metrics (used by tests)"""
+        with self._lock:
+            self.counters.clear()
+            self.gauges.clear()
+            self.timings.clear()
+
+
+# Global instance for easy access
+_metrics = None
+
+
+def get_metrics() -> MetricsRegistry:
+    """Get global metrics registry"""
+    global _metrics
+    if _metrics is None:
+        _metrics = MetricsRegistry()
+    return _metrics
@@ -0,0 +1,263 @@
+"""
+Model Residency Manager for Ollama
+Keeps the navigation/dialogue models loaded so user turns never pay the
+cold-load penalty during business hours
+"""
+
+import json
+import os
+import threading
+import time
+import logging
+from dataclasses import dataclass, field
+from datetime import datetime, time as dtime
+from typing import Callable, Dict, List, Optional, Union
+
+from src.utils.metrics import get_metrics
+from src.utils.ollama_client import OllamaClient, normalize_model_name, normalize_keep_alive
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class BusinessHours:
+    """Window (server local time) during which models must stay resident"""
+    start: dtime = dtime(7, 0)
+    end: dtime = dtime(21, 0)
+    days: List[int] = field(default_factory=lambda: [0, 1, 2, 3, 4, 5, 6])  # Monday = 0
+
+    def contains(self, moment: datetime) -> bool:
+        if moment.weekday() not in self.days:
+            return False
+        now = moment.time()
+        if self.start <= self.end:
+            return self.start <= now < self.end
+        # Window wraps past midnight (e.g. 20:00-06:00)
+        return now >= self.start or now < self.end
+
+    @classmethod
+    def from_dict(cls, data: Dict) -> "BusinessHours":
+        return cls(
+            start=dtime.fromisoformat(data.get("start", "07:00")),
+            end=dtime.fromisoformat(data.get("end", "21:00")),
+            days=data.get("days", [0, 1, 2, 3, 4, 5, 6])
+        )
+
+
+@dataclass
+class ModelPolicy:
+    """Residency policy for one Ollama model"""
+    model: str
+    roles: List[str] = field(default_factory=list)
+    keep_alive: Union[int, str] = -1               # During business hours (-1 = never unload)
+    off_hours_keep_alive: Union[int, str] = "10m"  # Outside business hours (seconds, or a duration)
+    keep_warm_off_hours: bool = False   # Keep pinging outside business hours too
+
+
+class ModelResidencyManager:
+    """
+    Sets keep_alive on every request and pings idle models on a schedule
+
+    One pass of the pinger (check_residency) asks Ollama which models are
+    loaded, reloads any policy model that was evicted, and refreshes the
+    keep_alive of models that have been idle longer than ping_interval.
+    """
+
+    def __init__(self, client: OllamaClient, policies: List[ModelPolicy],
+                 business_hours: BusinessHours = None, ping_interval_seconds: float = 60,
+                 clock: Callable[[], datetime] = None):
+        self.client = client
+        self.policies: Dict[str, ModelPolicy] = {}
+        for policy in policies:
+            # Several roles may share one model - merge them into a single policy
+            if policy.model in self.policies:
+                self.policies[policy.model].roles.extend(policy.roles)
+            else:
+                self.policies[policy.model] = policy
+
+        self.business_hours = business_hours or BusinessHours()
+        self.ping_interval_seconds = ping_interval_seconds
+        self.clock = clock or datetime.now
+        self.metrics = get_metrics()
+
+        self.last_used: Dict[str, float] = {}
+        self.resident: Dict[str, bool] = {}
+        self._stop_event = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+        # Wire into the client: every request carries our keep_alive and marks the model used
+        client.keep_alive_provider = self.keep_alive_for
+        client.on_model_used = self.record_use
+
+    @classmethod
+    def from_config(cls, client: OllamaClient, role_models: Dict[str, str],
+                    config_path: str = None) -> "ModelResidencyManager":
+        """
+        Build policies from config/system/model_residency.json
+
+        Args:
+            client: Shared Ollama client
+            role_models: Model used by each role, e.g. {"navigation": "llama3.1", "dialogue": "llama3.1"}
+            config_path: Optional override for the residency config file
+        """
+        if config_path is None:
+            config_path = os.getenv("OLLAMA_RESIDENCY_CONFIG")
+        if config_path is None:
+            project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '../..'))
+            config_path = os.path.join(project_root, 'config/system/model_residency.json')
+
+        try:
+            with open(config_path, 'r') as f:
+                config = json.load(f)
+        except FileNotFoundError:
+            logger.warning(f"⚠️ Residency config not found at {config_path}, using defaults")
+            config = {}
+
+        defaults = config.get("defaults", {})
+        role_config = config.get("roles", {})
+
+        policies = []
+        for role, model in role_models.items():
+            settings = {**defaults, **role_config.get(role, {})}
+            policies.append(ModelPolicy(
+                model=settings.get("model", model),
+                roles=[role],
+                keep_alive=normalize_keep_alive(settings.get("keep_alive", -1)),
+                off_hours_keep_alive=normalize_keep_alive(settings.get("off_hours_keep_alive", "10m")),
+                keep_warm_off_hours=settings.get("keep_warm_off_hours", False)
+            ))
+
+        # Extra models to keep warm that no agent role points at (e.g. canary models)
+        for extra in config.get("extra_models", []):
+            policies.append(ModelPolicy(
+                model=extra["model"],
+                roles=extra.get("roles", ["extra"]),
+                keep_alive=normalize_keep_alive(extra.get("keep_alive", defaults.get("keep_alive", -1))),
+                off_hours_keep_alive=normalize_keep_alive(
+                    extra.get("off_hours_keep_alive", defaults.get("off_hours_keep_alive", "10m"))),
+                keep_warm_off_hours=extra.get("keep_warm_off_hours", False)
+            ))
+
+        return cls(
+            client,
+            policies,
+            business_hours=BusinessHours.from_dict(config.get("business_hours", {})),
+            ping_interval_seconds=float(os.getenv(
+                "OLLAMA_PING_INTERVAL_SECONDS", config.get("ping_interval_seconds", 60)
+            ))
+        )
+
+    def in_business_hours(self) -> bool:
+        return self.business_hours.contains(self.clock())
+
+    def keep_alive_for(self, model: str) -> Union[int, str]:
+        """keep_alive to send for this model right now"""
+        policy = self.policies.get(model)
+        if policy is None:
+            return normalize_keep_alive(os.getenv("OLLAMA_KEEP_ALIVE", "30m"))
+        if self.in_business_hours() or policy.keep_warm_off_hours:
+            return policy.keep_alive
+        return policy.off_hours_keep_alive
+
+    def record_use(self, model: str):
+        """Called by the client after every successful request"""
+        self.last_used[model] = time.time()
+        self.resident[model] = True
+
+    def preload_all(self) -> bool:
+        """Load every policy model (startup warm-up). Returns True if all loaded."""
+        all_loaded = True
+        for model in self.policies:
+            start = time.time()
+            loaded = self.client.preload(model)
+            self.resident[model] = loaded
+            if loaded:
+                logger.info(f"🔥 Preloaded {model} in {time.time() - start:.2f}s")
+            all_loaded = all_loaded and loaded
+        return all_loaded
+
+    def models_ready(self) -> bool:
+        """True if every model that should be warm now was last seen loaded (readiness probe)"""
+        business_hours = self.in_business_hours()
+        return all(self.resident.get(model, False) for model, policy in self.policies.items()
+                   if business_hours or policy.keep_warm_off_hours)
+
+    def check_residency(self) -> Dict[str, str]:
+        """
+        One pinger pass
+
+        Returns:
+            Dict of model -> action taken ("reloaded", "pinged", "resident", "skipped", "unreachable")
+        """
+        actions = {}
+        business_hours = self.in_business_hours()
+        loaded = self.client.loaded_models()
+        loaded_names = {normalize_model_name(name) for name in loaded or []}
+
+        for model, policy in self.policies.items():
+            if not business_hours and not policy.keep_warm_off_hours:
+                actions[model] = "skipped"
+                continue
+
+            if loaded is None:
+                self.resident[model] = False
+                actions[model] = "unreachable"
+                continue
+
+            is_resident = normalize_model_name(model) in loaded_names
+            self.resident[model] = is_resident
+            self.metrics.set_gauge("ollama_model_resident", 1 if is_resident else 0, labels={"model": model})
+
+            if not is_resident:
+                logger.warning(f"⚠️ Model {model} was unloaded by Ollama, reloading")
+                self.metrics.increment("ollama_residency_reloads_total", labels={"model": model})
+                self.resident[model] = self.client.preload(model)
+                actions[model] = "reloaded"
+            elif time.time() - self.last_used.get(model, 0) >= self.ping_interval_seconds:
+                # Refresh the keep_alive expiry on an idle model (skipped if slots are busy)
+                self.client.preload(model, queue_timeout=1)
+                self.metrics.increment("ollama_residency_pings_total", labels={"model": model})
+                actions[model] = "pinged"
+            else:
+                actions[model] = "resident"
+
+        return actions
+
+    def start(self):
+        """Start the background pinger thread"""
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._run, name="ollama-residency", daemon=True)
+        self._thread.start()
+        logger.info(f"✅ Model residency pinger started (interval {self.ping_interval_seconds}s, models: {list(self.policies)})")
+
+    def stop(self):
+        """Stop the background pinger thread"""
+        self._stop_event.set()
+        if self._thread:
+            self._thread.join(timeout=5)
+
+    def _run(self):
+        while not self._stop_event.wait(self.ping_interval_seconds):
+            try:
+                self.check_residency()
+            except Exception as e:
+                logger.error(f"❌ Residency check failed: {e}")
+
+    def get_status(self) -> Dict:
+        """Residency status for health/metrics endpoints"""
+        return {
+            "business_hours": self.in_business_hours(),
+            "ping_interval_seconds": self.ping_interval_seconds,
+            "models": {
+                model: {
+                    "roles": policy.roles,
+                    "keep_alive": self.keep_alive_for(model),
+                    "resident": self.resident.get(model),
+                    "last_used": datetime.fromtimestamp(self.last_used[model]).isoformat()
+                    if model in self.last_used else None
+                }
+                for model, policy in self.policies.items()
+            }
+        }
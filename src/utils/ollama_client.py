@@ -0,0 +1,500 @@
+"""
+Shared Ollama Client for TRT Agents
+Single place where generate requests are sent, so keep_alive, timing,
+model load tracking and endpoint routing apply to every LLM call
+"""
+
+import json
+import os
+import threading
+import time
+import requests
+import logging
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from typing import Callable, Dict, List, Optional, Union
+
+from src.utils.metrics import get_metrics, TimingSummary
+from src.utils.llm_scheduler import LLMScheduler, RequestPriority, SchedulerTimeout
+from src.utils.turn_context import current_turn, DeadlineExceeded, CancelToken, TurnCancelled
+from src.utils.circuit_breaker import CircuitOpenError
+from src.utils.ollama_pool import OllamaEndpoint, OllamaEndpointPool
+
+logger = logging.getLogger(__name__)
+
+# Ollama reports load_duration on every response; anything above this is a cold load
+COLD_LOAD_THRESHOLD_SECONDS = 0.5
+
+# Calls a user is actively waiting on; only these are worth a hedged second request
+HEDGE_PRIORITIES = (RequestPriority.CRISIS, RequestPriority.DIALOGUE)
+
+
+def normalize_model_name(model: str) -> str:
+    """Ollama lists models with an explicit tag ('llama3.1' -> 'llama3.1:latest')"""
+    return model if ":" in model else f"{model}:latest"
+
+
+def normalize_keep_alive(value: Union[int, float, str]) -> Union[int, str]:
+    """
+    keep_alive as Ollama accepts it: a number of seconds (-1 = never unload) or a
+    duration string with a unit ("10m", "24h"). Ollama parses any string as a Go
+    duration, so a bare number in a string ("-1", "300") is sent as an integer.
+    """
+    if isinstance(value, (int, float)):
+        return int(value)
+    try:
+        return int(value.strip())
+    except ValueError:
+        return value.strip()
+
+
+class GenerationCancelled(Exception):
+    """Raised inside a hedged generation that lost to the other endpoint"""
+    pass
+
+
+class GenerationDeadline(requests.Timeout):
+    """Raised when a generation runs past the call's deadline (the caller's budget, not an Ollama error)"""
+    pass
+
+
+class OllamaClient:
+    """Thin wrapper around the Ollama HTTP API shared by all agents"""
+
+    def __init__(self, base_url: str = None, keep_alive_provider: Callable[[str], str] = None,
+                 scheduler: LLMScheduler = None, pool: OllamaEndpointPool = None):
+        """
+        Initialize Ollama client
+
+        Args:
+            base_url: Ollama server URL, used when OLLAMA_BASE_URLS is not set
+            keep_alive_provider: Callable returning the keep_alive value for a model
+            scheduler: Admission control shared by everything talking to these Ollama servers
+            pool: Ollama endpoints to route across (default: built from the environment)
+        """
+        self.pool = pool or OllamaEndpointPool.from_env(base_url)
+        self.base_url = self.pool.endpoints[0].url
+        self.keep_alive_provider = keep_alive_provider
+        self.scheduler = scheduler or LLMScheduler(endpoint_count=len(self.pool))
+        self.metrics = get_metrics()
+
+        # Hedging: resend a slow latency-critical call to a second endpoint once it
+        # passes the recent p95 for its prompt type; the first answer wins
+        self.hedge_enabled = os.getenv("OLLAMA_HEDGE_ENABLED", "true").lower() == "true"
+        self.hedge_min_delay = float(os.getenv("OLLAMA_HEDGE_MIN_DELAY_SECONDS", "1.0"))
+        self.hedge_min_samples = int(os.getenv("OLLAMA_HEDGE_MIN_SAMPLES", "20"))
+        self._latency: Dict[str, TimingSummary] = {}
+        self._latency_lock = threading.Lock()
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._executor_lock = threading.Lock()
+
+        # Called with the model name after every successful request (residency tracking)
+        self.on_model_used: Optional[Callable[[str], None]] = None
+
+    def keep_alive_for(self, model: str) -> Union[int, str]:
+        """keep_alive value to send with a request for this model"""
+        if self.keep_alive_provider:
+            return normalize_keep_alive(self.keep_alive_provider(model))
+        return normalize_keep_alive(os.getenv("OLLAMA_KEEP_ALIVE", "30m"))
+
+    def generate(self, model: str, prompt: str, options: Dict = None, timeout: float = 60,
+                 prompt_type: str = "generate",
+                 priority: RequestPriority = RequestPriority.BACKGROUND) -> str:
+        """
+        Run a generation on one of the pool's endpoints
+
+        Args:
+            model: Ollama model name
+            prompt: Prompt text
+            options: Ollama sampling options (temperature, num_predict, ...)
+            timeout: Request timeout in seconds
+            prompt_type: Label used for metrics and hedging thresholds
+            priority: Scheduler priority class (raised to CRISIS inside a crisis turn)
+
+        Returns:
+            Generated text
+
+        Raises:
+            CircuitOpenError if every endpoint's breaker is open (no request is sent)
+            DeadlineExceeded if the turn budget is used up
+            SchedulerTimeout if no slot was free in time
+            TurnCancelled if the turn was cancelled (the stream is closed so Ollama stops)
+            Exception if Ollama is unreachable or returns an error status
+        """
+        turn = current_turn()
+        session_id = turn.session_id if turn else None
+        cancel_token = turn.cancel_token if turn else None
+        if turn and turn.crisis:
+            priority = RequestPriority.CRISIS
+
+        try:
+            if turn is not None:
+                turn.check_cancelled()
+
+            # Don't even queue for a slot while every Ollama is known to be down
+            if self.pool.all_open():
+                raise CircuitOpenError("Every Ollama endpoint circuit is open")
+
+            # Inside a turn the call gets at most what is left of the stage budget,
+            # and time spent waiting in the queue comes out of that budget too
+            queue_timeout = None
+            if turn is not None:
+                timeout = turn.llm_timeout(timeout)
+                if turn.deadline is not None:
+                    queue_timeout = min(self.scheduler.queue_timeout_seconds, timeout)
+
+            with self.scheduler.slot(priority, session_id, timeout=queue_timeout, cancel_token=cancel_token):
+                if turn is not None:
+                    timeout = turn.llm_timeout(timeout)
+                deadline = time.monotonic() + timeout
+                if self._should_hedge(priority, prompt_type):
+                    return self._generate_hedged(model, prompt, options, deadline, prompt_type, session_id,
+                                                 cancel_token, priority)
+                return self._generate_with_failover(model, prompt, options, deadline, prompt_type, session_id,
+                                                    cancel_token)
+
+        except TurnCancelled:
+            # Not a degradation: nobody is waiting for this answer any more
+            raise
+        except CircuitOpenError:
+            self._mark_degraded(turn, "circuit_open", prompt_type)
+            raise
+        except DeadlineExceeded:
+            self._mark_degraded(turn, "deadline", prompt_type)
+            raise
+        except SchedulerTimeout:
+            self._mark_degraded(turn, "queue_timeout", prompt_type)
+            raise
+        except requests.Timeout:
+            self._mark_degraded(turn, "deadline" if turn and turn.deadline else "timeout", prompt_type)
+            raise
+        except Exception:
+            self._mark_degraded(turn, "llm_error", prompt_type)
+            raise
+
+    def _mark_degraded(self, turn, reason: str, prompt_type: str):
+        """Tag the turn so the response reports which stage fell back and why"""
+        self.metrics.increment("llm_degraded_calls_total", labels={"type": prompt_type, "reason": reason})
+        if turn is not None:
+            turn.mark_degraded(reason)
+
+    def _acquire_endpoint(self, session_id: str = None, exclude: List[OllamaEndpoint] = ()) -> Optional[OllamaEndpoint]:
+        """Pick an endpoint whose breaker grants this call (skips half-open endpoints already probing)"""
+        excluded = list(exclude)
+        while True:
+            endpoint = self.pool.choose(session_id, exclude=excluded)
+            if endpoint is None:
+                return None
+            if endpoint.breaker.allow_request():
+                return endpoint
+            excluded.append(endpoint)
+
+    def _generate_with_failover(self, model: str, prompt: str, options: Dict, deadline: float,
+                                prompt_type: str, session_id: str, cancel_token: CancelToken = None) -> str:
+        """Send to the chosen endpoint; if it cannot be reached at all, try the next one"""
+        tried: List[OllamaEndpoint] = []
+        last_error: Optional[Exception] = None
+
+        while time.monotonic() < deadline:
+            endpoint = self._acquire_endpoint(session_id, exclude=tried)
+            if endpoint is None:
+                break
+            tried.append(endpoint)
+            try:
+                return self._generate(endpoint, model, prompt, options, deadline, prompt_type,
+                                      cancel_token=cancel_token)
+            except requests.ConnectionError as e:
+                # Nothing was generated, so another endpoint costs only the connect attempt
+                last_error = e
+                if len(tried) < len(self.pool):
+                    logger.warning(f"⚠️ Ollama endpoint {endpoint.url} unreachable, failing over")
+                    self.metrics.increment("ollama_failovers_total", labels={"type": prompt_type})
+
+        if last_error is not None:
+            raise last_error
+        if not tried:
+            raise CircuitOpenError("No Ollama endpoint is accepting requests")
+        raise requests.Timeout(f"Ollama {prompt_type} call ran out of time")
+
+    def _generate_hedged(self, model: str, prompt: str, options: Dict, deadline: float,
+                         prompt_type: str, session_id: str, cancel_token: CancelToken = None,
+                         priority: RequestPriority = RequestPriority.DIALOGUE) -> str:
+        """
+        Send to one endpoint and, if it has not answered within the hedge delay
+        (or failed), send the same request to a second endpoint. The first
+        successful answer wins and the other stream is closed, which makes
+        Ollama stop generating for it.
+
+        The hedge is a second generation, so it needs a scheduler slot of its
+        own; it is skipped rather than queued when none is free.
+        """
+        primary = self._acquire_endpoint(session_id)
+        if primary is None:
+            raise CircuitOpenError("No Ollama endpoint is accepting requests")
+
+        executor = self._hedge_executor()
+        attempts = {}  # future -> (label, cancel event)
+
+        def launch(endpoint: OllamaEndpoint, label: str):
+            cancel = threading.Event()
+            future = executor.submit(self._generate, endpoint, model, prompt, options, deadline,
+                                     prompt_type, cancel, cancel_token)
+            attempts[future] = (label, cancel)
+            return future
+
+        launch(primary, "primary")
+        hedge_delay = self._hedge_delay(prompt_type)
+        done, _ = wait(list(attempts), timeout=max(0.0, min(hedge_delay, deadline - time.monotonic())))
+
+        if done:
+            future = next(iter(done))
+            if future.exception() is None:
+                return future.result()
+
+        turn_cancelled = cancel_token is not None and cancel_token.cancelled
+        if time.monotonic() < deadline and not turn_cancelled:
+            # Slot first, so a skipped hedge does not use up a half-open endpoint's probe
+            if not self.scheduler.try_acquire(priority):
+                self.metrics.increment("llm_hedges_skipped_total", labels={"type": prompt_type, "reason": "no_slot"})
+            else:
+                secondary = self._acquire_endpoint(session_id, exclude=[primary])
+                if secondary is None:
+                    self.scheduler.release()
+                else:
+                    # The hedge's slot is freed when its stream ends (won, lost or closed)
+                    launch(secondary, "hedge").add_done_callback(lambda _: self.scheduler.release())
+                    self.metrics.increment("llm_hedged_requests_total", labels={"type": prompt_type})
+
+        pending = set(f for f in attempts if f not in done)
+        last_error = next(iter(done)).exception() if done else None
+        while pending:
+            # Each attempt enforces the deadline itself; the margin only guards against a stuck socket
+            finished, pending = wait(pending, timeout=max(0.0, deadline - time.monotonic()) + 1.0,
+                                     return_when=FIRST_COMPLETED)
+            if not finished:
+                break
+            for future in finished:
+                if future.exception() is not None:
+                    last_error = future.exception()
+                    continue
+                for other in pending:
+                    attempts[other][1].set()
+                if len(attempts) > 1:
+                    self.metrics.increment("llm_hedge_wins_total",
+                                           labels={"type": prompt_type, "winner": attempts[future][0]})
+                return future.result()
+
+        for other in pending:
+            attempts[other][1].set()
+        if last_error:
+            raise last_error
+        raise requests.Timeout(f"Ollama {prompt_type} call ran out of time")
+
+    def _should_hedge(self, priority: RequestPriority, prompt_type: str) -> bool:
+        if not self.hedge_enabled or len(self.pool) < 2 or priority not in HEDGE_PRIORITIES:
+            return False
+        with self._latency_lock:
+            summary = self._latency.get(prompt_type)
+            return summary is not None and summary.count >= self.hedge_min_samples
+
+    def _hedge_delay(self, prompt_type: str) -> float:
+        """Recent p95 for this prompt type (never below OLLAMA_HEDGE_MIN_DELAY_SECONDS)"""
+        with self._latency_lock:
+            summary = self._latency.get(prompt_type)
+            p95 = summary.percentile(95) if summary else 0.0
+        return max(self.hedge_min_delay, p95)
+
+    def _record_latency(self, prompt_type: str, seconds: float):
+        with self._latency_lock:
+            self._latency.setdefault(prompt_type, TimingSummary(window=200)).observe(seconds)
+
+    def _hedge_executor(self) -> ThreadPoolExecutor:
+        with self._executor_lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(
+                    max_workers=2 * self.scheduler.max_concurrency, thread_name_prefix="ollama-hedge"
+                )
+            return self._executor
+
+    def _generate(self, endpoint: OllamaEndpoint, model: str, prompt: str, options: Dict,
+                  deadline: float, prompt_type: str, cancel: threading.Event = None,
+                  cancel_token: CancelToken = None) -> str:
+        """
+        Stream one generation from one endpoint (caller holds a scheduler slot and breaker permission)
+
+        Streaming lets a call be abandoned between tokens: leaving the block closes
+        the connection and Ollama stops generating.
+
+        Args:
+            cancel: Set when a hedged sibling already answered
+            cancel_token: The turn's token, set when the client went away or the turn was superseded
+        """
+        payload = {
+            "model": model,
+            "prompt": prompt,
+            "stream": True,
+            "keep_alive": self.keep_alive_for(model)
+        }
+        if options:
+            payload["options"] = options
+
+        start = time.monotonic()
+        labels = {"model": model, "type": prompt_type}
+        endpoint.begin()
+
+        try:
+            # The requests timeout bounds each socket read; the loop bounds the whole call
+            with requests.post(endpoint.generate_endpoint, json=payload, stream=True,
+                               timeout=max(0.01, deadline - start)) as response:
+                if response.status_code != 200:
+                    raise Exception(f"Ollama returned status {response.status_code}: {response.text}")
+
+                pieces = []
+                result: Dict = {}
+                for line in response.iter_lines():
+                    if cancel_token is not None:
+                        cancel_token.raise_if_cancelled()
+                    if cancel is not None and cancel.is_set():
+                        raise GenerationCancelled(f"{prompt_type} call to {endpoint.url} lost the hedge")
+                    if time.monotonic() > deadline:
+                        raise GenerationDeadline(f"{prompt_type} call to {endpoint.url} ran past its deadline")
+                    if not line:
+                        continue
+                    chunk = json.loads(line)
+                    if chunk.get("error"):
+                        raise Exception(f"Ollama error: {chunk['error']}")
+                    pieces.append(chunk.get("response", ""))
+                    if chunk.get("done"):
+                        result = chunk
+                        break
+                else:
+                    raise Exception(f"Ollama stream from {endpoint.url} ended before completion")
+
+        except (GenerationCancelled, TurnCancelled) as e:
+            endpoint.breaker.record_cancelled()
+            reason = e.reason if isinstance(e, TurnCancelled) else "hedge_lost"
+            self.metrics.increment("ollama_requests_cancelled_total", labels={**labels, "reason": reason})
+            raise
+        except (GenerationDeadline, requests.ReadTimeout):
+            # Socket reads are bounded by the deadline too: the budget ran out, which
+            # only says something about Ollama if the call was slow by any measure
+            endpoint.breaker.record_deadline(time.monotonic() - start)
+            self.metrics.increment("ollama_requests_deadline_total", labels=labels)
+            raise
+        except Exception:
+            endpoint.breaker.record_failure(time.monotonic() - start)
+            self.metrics.increment("ollama_request_errors_total", labels=labels)
+            raise
+        finally:
+            endpoint.end()
+
+        elapsed = time.monotonic() - start
+        endpoint.breaker.record_success(elapsed)
+        self._record_latency(prompt_type, elapsed)
+        self.metrics.observe("ollama_request_seconds", elapsed, labels=labels)
+        self.metrics.increment("ollama_requests_total", labels=labels)
+        self.metrics.increment("ollama_endpoint_requests_total", labels={"endpoint": endpoint.url})
+        self._record_model_load(model, result, source="request")
+        self._mark_used(model)
+
+        return "".join(pieces)
+
+    def preload(self, model: str, keep_alive: Union[int, str] = None, timeout: float = 120,
+                queue_timeout: float = None) -> bool:
+        """
+        Load a model into memory on every endpoint without generating text
+
+        Runs at BACKGROUND priority, so residency pings never delay user turns.
+
+        Args:
+            model: Ollama model name
+            keep_alive: How long Ollama should keep the model loaded (seconds, or a duration like "10m")
+            timeout: Request timeout in seconds (model loads can be slow)
+            queue_timeout: Max wait for a scheduler slot
+
+        Returns:
+            True if every endpoint confirmed the load
+        """
+        keep_alive = self.keep_alive_for(model) if keep_alive is None else normalize_keep_alive(keep_alive)
+
+        return all([
+            self._preload_endpoint(endpoint, model, keep_alive, timeout, queue_timeout)
+            for endpoint in self.pool.endpoints
+        ])
+
+    def _preload_endpoint(self, endpoint: OllamaEndpoint, model: str, keep_alive: Union[int, str],
+                          timeout: float, queue_timeout: float) -> bool:
+        try:
+            with self.scheduler.slot(RequestPriority.BACKGROUND, timeout=queue_timeout):
+                response = requests.post(
+                    endpoint.generate_endpoint,
+                    json={"model": model, "keep_alive": keep_alive},
+                    timeout=timeout
+                )
+            if response.status_code != 200:
+                logger.warning(f"⚠️ Ollama preload of {model} on {endpoint.url} returned status {response.status_code}")
+                return False
+
+            self._record_model_load(model, response.json(), source="preload")
+            self._mark_used(model)
+            return True
+
+        except SchedulerTimeout:
+            logger.info(f"ℹ️ Skipped preload of {model}: all LLM slots busy")
+            return False
+
+        except Exception as e:
+            logger.error(f"❌ Ollama preload of {model} on {endpoint.url} failed: {e}")
+            return False
+
+    def loaded_models(self, timeout: float = 5) -> Optional[List[str]]:
+        """
+        List models resident on every reachable endpoint (GET /api/ps)
+
+        A model missing from any one endpoint is left out, so residency checks reload it.
+
+        Returns:
+            List of model names, or None if no endpoint could be queried
+        """
+        resident: Optional[List[str]] = None
+        for endpoint in self.pool.endpoints:
+            try:
+                response = requests.get(f"{endpoint.url}/api/ps", timeout=timeout)
+                if response.status_code != 200:
+                    continue
+                models = [m.get("name") or m.get("model") for m in response.json().get("models", [])]
+            except Exception:
+                continue
+            resident = models if resident is None else [m for m in resident if m in models]
+        return resident
+
+    def get_status(self) -> Dict:
+        """Endpoint pool and hedging status for health/metrics endpoints"""
+        status = self.pool.get_status()
+        status["hedging"] = {
+            "enabled": self.hedge_enabled and len(self.pool) > 1,
+            "delays": {prompt_type: round(self._hedge_delay(prompt_type), 3) for prompt_type in list(self._latency)}
+        }
+        return status
+
+    def close(self):
+        """Stop the hedge worker threads"""
+        with self._executor_lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=False)
+                self._executor = None
+
+    def _record_model_load(self, model: str, result: Dict, source: str):
+        """Turn Ollama's load_duration (nanoseconds) into load event metrics"""
+        load_seconds = (result.get("load_duration") or 0) / 1e9
+        if load_seconds >= COLD_LOAD_THRESHOLD_SECONDS:
+            labels = {"model": model, "source": source}
+            self.metrics.increment("ollama_model_loads_total", labels=labels)
+            self.metrics.observe("ollama_model_load_seconds", load_seconds, labels=labels)
+            if source == "request":
+                logger.warning(f"🥶 Cold model load during request: {model} took {load_seconds:.2f}s")
+            else:
+                logger.info(f"🔥 Model {model} loaded in {load_seconds:.2f}s")
+
+    def _mark_used(self, model: str):
+        if self.on_model_used:
+            self.on_model_used(model)
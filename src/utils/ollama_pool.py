@@ -0,0 +1,143 @@
+"""
+Ollama Endpoint Pool
+Routes generations across several Ollama servers by health and outstanding
+requests, with optional session affinity so a session keeps hitting the
+server that already holds its prompt cache
+"""
+
+import hashlib
+import os
+import random
+import threading
+import logging
+from typing import Dict, Iterable, List, Optional
+
+from src.utils.circuit_breaker import CircuitBreaker, OPEN
+
+logger = logging.getLogger(__name__)
+
+
+class OllamaEndpoint:
+    """One Ollama server: its URL, in-flight request count and circuit breaker"""
+
+    def __init__(self, url: str, breaker: CircuitBreaker = None):
+        self.url = url.rstrip("/")
+        self.generate_endpoint = f"{self.url}/api/generate"
+        self.breaker = breaker or CircuitBreaker.from_env(name=f"ollama:{self.url}")
+        self.outstanding = 0
+        self._lock = threading.Lock()
+
+    def begin(self):
+        with self._lock:
+            self.outstanding += 1
+
+    def end(self):
+        with self._lock:
+            self.outstanding = max(0, self.outstanding - 1)
+
+    def is_available(self) -> bool:
+        return not self.breaker.is_open()
+
+    def __repr__(self):
+        return f"OllamaEndpoint({self.url}, outstanding={self.outstanding}, state={self.breaker.state})"
+
+
+class OllamaEndpointPool:
+    """
+    Picks an endpoint for each call
+
+    - Endpoints whose breaker is open are skipped.
+    - Without affinity, the endpoint with the fewest outstanding requests wins.
+    - With affinity, a session is pinned to its rendezvous-hash endpoint
+      unless that endpoint is `affinity_slack` requests busier than the
+      least-loaded one (or unhealthy).
+    """
+
+    def __init__(self, urls: Iterable[str], session_affinity: bool = True, affinity_slack: int = 2,
+                 breaker_factory=None):
+        urls = [u.strip() for u in urls if u and u.strip()]
+        if not urls:
+            raise ValueError("OllamaEndpointPool needs at least one endpoint URL")
+
+        self.endpoints: List[OllamaEndpoint] = [
+            OllamaEndpoint(url, breaker=breaker_factory(url) if breaker_factory else None)
+            for url in dict.fromkeys(urls)  # De-duplicate, keep order
+        ]
+        self.session_affinity = session_affinity
+        self.affinity_slack = affinity_slack
+
+    @classmethod
+    def from_env(cls, base_url: str = None) -> "OllamaEndpointPool":
+        """
+        Build the pool from OLLAMA_BASE_URLS (comma separated), falling back to
+        base_url / OLLAMA_BASE_URL for single-server deployments
+        """
+        urls = os.getenv("OLLAMA_BASE_URLS", "")
+        if urls.strip():
+            url_list = urls.split(",")
+        else:
+            url_list = [base_url or os.getenv("OLLAMA_BASE_URL", "http://localhost:11434")]
+
+        return cls(
+            url_list,
+            session_affinity=os.getenv("OLLAMA_SESSION_AFFINITY", "true").lower() == "true",
+            affinity_slack=int(os.getenv("OLLAMA_AFFINITY_SLACK", "2"))
+        )
+
+    def __len__(self):
+        return len(self.endpoints)
+
+    @property
+    def urls(self) -> List[str]:
+        return [e.url for e in self.endpoints]
+
+    def choose(self, session_id: str = None, exclude: Iterable[OllamaEndpoint] = ()) -> Optional[OllamaEndpoint]:
+        """
+        Pick the endpoint for a call
+
+        Returns:
+            Endpoint to use, or None if every (non-excluded) endpoint is unavailable
+        """
+        excluded = set(id(e) for e in exclude)
+        candidates = [e for e in self.endpoints if id(e) not in excluded and e.is_available()]
+        if not candidates:
+            return None
+
+        least_busy = min(e.outstanding for e in candidates)
+
+        if self.session_affinity and session_id:
+            preferred = self._rendezvous(session_id, candidates)
+            if preferred.outstanding <= least_busy + self.affinity_slack:
+                return preferred
+
+        return random.choice([e for e in candidates if e.outstanding == least_busy])
+
+    def _rendezvous(self, session_id: str, candidates: List[OllamaEndpoint]) -> OllamaEndpoint:
+        """Highest-random-weight hashing: stable per session, minimal reshuffle when endpoints change"""
+        def weight(endpoint):
+            digest = hashlib.md5(f"{session_id}|{endpoint.url}".encode()).hexdigest()
+            return int(digest[:16], 16)
+        return max(candidates, key=weight)
+
+    def all_open(self) -> bool:
+        """True if every endpoint's breaker is open (nothing to route to)"""
+        return all(not e.is_available() for e in self.endpoints)
+
+    def get_status(self) -> Dict:
+        """Pool status for /health and /metrics"""
+        states = [e.breaker.get_status() for e in self.endpoints]
+        if all(s["state"] == OPEN for s in states):
+            overall = "open"
+        elif any(s["state"] != "closed" for s in states):
+            overall = "degraded"
+        else:
+            overall = "closed"
+
+        return {
+            "state": overall,
+            "session_affinity": self.session_affinity,
+            "endpoints": {
+                e.url: {"outstanding": e.outstanding, **state}
+                for e, state in zip(self.endpoints, states)
+            }
+        }
@@ -0,0 +1,75 @@
+"""
+Redis Key Layout for TRT Sessions
+Every key a session owns carries the session ID as a Redis Cluster hash tag,
+so one session's keys share a slot; the activity and substate indexes are
+split into buckets so no single key takes every session's writes
+"""
+
+import os
+import zlib
+from typing import List
+
+# Per session (one slot, so scripts and pipelines may touch them together):
+#   trt:session:{<id>}:state    hash: summary fields, state_blob (last snapshot), snapshot_event,
+#                               pending_events, version, active_at
+#   trt:session:{<id>}:meta     hash: client_id, metadata, created_at, turn_count, status
+#   trt:session:{<id>}:stream   stream: one entry per exchange (field "entry"), capped at the history limit
+#   trt:session:{<id>}:history  list: newest exchange first (written before streams; read until it expires)
+#   trt:session:{<id>}:events   stream: one entry per state write (fields "version", "events": a batch of
+#                               state events), the state's replayable audit trail (capped length)
+#   trt:session:{<id>}:lock     turn lease, trt:session:{<id>}:fence  fencing counter
+#
+# Per index bucket (one slot per bucket; a session always lands in the same bucket):
+#   trt:active_sessions:{<bucket>}              sorted set: session_id -> last activity (unix time)
+#   trt:sessions:substate:{<bucket>}:<substate> sorted set, same scores, sessions now in <substate>
+#   trt:history:feed:{<bucket>}                 stream: every exchange of the bucket's sessions (fields
+#                                               "session_id", "entry"), for consumer groups
+SESSION_KINDS = ("state", "meta", "stream", "history", "events", "lock", "fence")
+
+
+def index_shards() -> int:
+    """Number of index buckets (TRT_ACTIVITY_INDEX_SHARDS); changing it needs an index rebuild"""
+    return int(os.getenv("TRT_ACTIVITY_INDEX_SHARDS", "16"))
+
+
+def session_key(session_id: str, kind: str) -> str:
+    return f"trt:session:{{{session_id}}}:{kind}"
+
+
+def session_keys(session_id: str, kinds=SESSION_KINDS) -> List[str]:
+    return [session_key(session_id, kind) for kind in kinds]
+
+
+def index_bucket(session_id: str, shards: int) -> str:
+    """Bucket a session's index entries live in (stable across processes)"""
+    return f"{zlib.crc32(session_id.encode('utf-8')) % shards:02d}"
+
+
+def activity_key(bucket: str) -> str:
+    return f"trt:active_sessions:{{{bucket}}}"
+
+
+def substate_prefix(bucket: str) -> str:
+    """Prefix of a bucket's substate indexes (the substate name follows)"""
+    return f"trt:sessions:substate:{{{bucket}}}:"
+
+
+def substate_key(bucket: str, substate: str) -> str:
+    return f"{substate_prefix(bucket)}{substate}"
+
+
+def feed_key(bucket: str) -> str:
+    return f"trt:history:feed:{{{bucket}}}"
+
+
+def all_buckets(shards: int) -> List[str]:
+    return [f"{bucket:02d}" for bucket in range(shards)]
+
+
+# Layout before hash tags (read by scripts/migrate_redis_keys.py only)
+LEGACY_ACTIVE_SESSIONS_KEY = "trt:active_sessions"
+LEGACY_SUBSTATE_PREFIX = "trt:sessions:substate:"
+
+
+def legacy_session_key(session_id: str, kind: str) -> str:
+    return f"trt:session:{session_id}:{kind}"
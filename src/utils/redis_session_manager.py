@@ -5,29 +5,517 @@ Handles session persistence with self-hosted Redis
 
 import redis
 import json
+import math
 import os
-from typing import Dict, Optional, List
+import time
+from typing import Dict, NamedTuple, Optional, List, Tuple
 from datetime import datetime
 import logging
 
+from src.utils.session_codec import encode_state, decode_state
+from src.utils.session_events import (
+    StateBase, StateEvent, encode_events, apply_events, decode_events, reset_event, track, base_of, state_changes
+)
+from src.utils.history_codec import encode_exchange, decode_exchange, HistoryCodecError
+from src.utils.redis_keys import (
+    session_key, session_keys, index_shards, index_bucket, all_buckets, activity_key, substate_prefix,
+    substate_key, feed_key
+)
+
 logger = logging.getLogger(__name__)
 
+# Fields a session listing reads (HMGET) instead of the whole state
+SUMMARY_STATE_FIELDS = ("current_substate", "last_interaction", "created_at")
+SUMMARY_META_FIELDS = ("client_id", "status", "turn_count", "created_at")
+
+# Everything a turn writes to the session's own keys in one round trip: the
+# (fenced) state hash, metadata, the new history stream entry, the turn's
+# state events and TTLs. On a single Redis it also updates the session's index
+# bucket (activity and substate indexes) and appends the exchange to the
+# bucket's history feed; in cluster mode those live in another slot and
+# _INDEX_SCRIPT does it next.
+# The state hash holds a snapshot (state_blob, written every few turns) and
+# the events logged since (pending_events, after snapshot_event); a turn in
+# between only appends its events, refused if the state isn't at the version
+# they were computed against. The events stream is capped at about
+# events_maxlen entries, never fewer than the snapshot and the events since.
+# KEYS: state, meta, history stream, state events [, activity bucket, new
+#       substate's index in that bucket [, history feed of that bucket]]
+# ARGV: session_id, fencing_token ('' = unfenced), create_only ('1'/'0'), ttl, now,
+#       history_max, exchange ('' = none), state field count, the bucket's substate
+#       index prefix, feed length, event batch ('' = none), snapshot ('1'/'0': the
+#       state fields include state_blob), expected version ('' = any), events stream
+#       length ('0' = uncapped), state field/value pairs, then meta field/value pairs
+# Returns {version, previous substate}: version is the session's new version
+# (bumped on every write, so caches can tell whether they are current), 0 if
+# create_only and the session exists, -1 if a turn with a newer fencing token
+# already wrote the state, -2 if the state is not at the expected version
+_COMMIT_SCRIPT = """
+local ttl = tonumber(ARGV[4])
+if ARGV[3] == '1' and redis.call('EXISTS', KEYS[1]) == 1 then
+    return {0, ''}
+end
+if ARGV[2] ~= '' then
+    local current = tonumber(redis.call('HGET', KEYS[1], 'fencing_token') or '0')
+    if tonumber(ARGV[2]) < current then
+        return {-1, ''}
+    end
+end
+if ARGV[13] ~= '' and (redis.call('HGET', KEYS[1], 'version') or '0') ~= ARGV[13] then
+    return {-2, ''}
+end
+if ARGV[2] ~= '' then
+    redis.call('HSET', KEYS[1], 'fencing_token', ARGV[2])
+end
+local version = redis.call('HINCRBY', KEYS[1], 'version', 1)
+local previous_substate = redis.call('HGET', KEYS[1], 'current_substate') or ''
+
+local state_first = 15
+local meta_first = state_first + tonumber(ARGV[8]) * 2
+redis.call('HSET', KEYS[1], 'active_at', ARGV[5], unpack(ARGV, state_first, meta_first - 1))
+if ARGV[11] ~= '' then
+    if ARGV[14] ~= '0' then
+        redis.call('XADD', KEYS[4], 'MAXLEN', '~', ARGV[14], '*', 'version', version, 'events', ARGV[11])
+    else
+        redis.call('XADD', KEYS[4], '*', 'version', version, 'events', ARGV[11])
+    end
+    redis.call('EXPIRE', KEYS[4], ttl)
+end
+if ARGV[12] == '1' then
+    local last = redis.call('XREVRANGE', KEYS[4], '+', '-', 'COUNT', 1)[1]
+    redis.call('HSET', KEYS[1], 'snapshot_event', last and last[1] or '0-0', 'pending_events', 0)
+elseif ARGV[11] ~= '' then
+    redis.call('HINCRBY', KEYS[1], 'pending_events', 1)
+end
+redis.call('EXPIRE', KEYS[1], ttl)
+if #ARGV >= meta_first then
+    redis.call('HSET', KEYS[2], unpack(ARGV, meta_first, #ARGV))
+    redis.call('EXPIRE', KEYS[2], ttl)
+end
+if ARGV[7] ~= '' then
+    redis.call('XADD', KEYS[3], 'MAXLEN', ARGV[6], '*', 'entry', ARGV[7])
+    redis.call('EXPIRE', KEYS[3], ttl)
+end
+if #KEYS >= 6 then
+    redis.call('ZADD', KEYS[5], ARGV[5], ARGV[1])
+    if previous_substate ~= '' and ARGV[9] .. previous_substate ~= KEYS[6] then
+        redis.call('ZREM', ARGV[9] .. previous_substate, ARGV[1])
+    end
+    redis.call('ZADD', KEYS[6], ARGV[5], ARGV[1])
+    if #KEYS == 7 then
+        redis.call('XADD', KEYS[7], 'MAXLEN', '~', ARGV[10], '*', 'session_id', ARGV[1], 'entry', ARGV[7])
+    end
+end
+return {version, previous_substate}
+"""
+
+# A session's state hash, metadata and the state events logged since its
+# snapshot, in one round trip (the snapshot's own event is read too and skipped)
+# KEYS: state, meta, state events
+# Returns {state hash, meta hash, event entries} (hashes as flat field/value lists)
+_LOAD_SCRIPT = """
+local state = redis.call('HGETALL', KEYS[1])
+if #state == 0 then
+    return {state, {}, {}}
+end
+local events = {}
+if tonumber(redis.call('HGET', KEYS[1], 'pending_events') or '0') > 0 then
+    events = redis.call('XRANGE', KEYS[3], redis.call('HGET', KEYS[1], 'snapshot_event') or '-', '+')
+end
+return {state, redis.call('HGETALL', KEYS[2]), events}
+"""
+
+# Cluster mode: move a session's entries within its index bucket after a
+# commit, and append the turn's exchange to the bucket's history feed
+# KEYS: activity bucket, new substate's index, previous substate's index
+#       [, history feed] (all one slot)
+# ARGV: session_id, last activity [, exchange, feed length]
+_INDEX_SCRIPT = """
+redis.call('ZADD', KEYS[1], ARGV[2], ARGV[1])
+if KEYS[3] ~= KEYS[2] then
+    redis.call('ZREM', KEYS[3], ARGV[1])
+end
+redis.call('ZADD', KEYS[2], ARGV[2], ARGV[1])
+if #KEYS == 4 then
+    redis.call('XADD', KEYS[4], 'MAXLEN', '~', ARGV[4], '*', 'session_id', ARGV[1], 'entry', ARGV[3])
+end
+return 1
+"""
+
+# Sweep, step 1 (session's slot): delete the session unless a turn has touched it
+# since it was picked (or, when archiving, holds the turn lock right now).
+# UNLINK frees memory off Redis' main thread.
+# KEYS: state, meta, history stream, history list (pre-stream), state events, fence [, lock]
+# ARGV: cutoff
+# Returns the session's substate ('' if its state had already expired), or nil if kept
+_SWEEP_SESSION_SCRIPT = """
+local active_at = tonumber(redis.call('HGET', KEYS[1], 'active_at') or '0')
+if active_at > tonumber(ARGV[1]) then
+    return false
+end
+if #KEYS == 7 and redis.call('EXISTS', KEYS[7]) == 1 then
+    return false
+end
+local substate = redis.call('HGET', KEYS[1], 'current_substate') or ''
+redis.call('UNLINK', unpack(KEYS))
+return substate
+"""
+
+# Sweep, step 2 (bucket's slot): drop swept sessions' index entries, unless a
+# turn re-indexed them meanwhile
+# KEYS: activity bucket, then the substate index of each session (the activity
+# bucket again if unknown)
+# ARGV: cutoff, then the session IDs (in KEYS order)
+# Returns the number of sessions removed from the index
+_SWEEP_INDEX_SCRIPT = """
+local cutoff = tonumber(ARGV[1])
+local removed = 0
+for i = 2, #ARGV do
+    local score = redis.call('ZSCORE', KEYS[1], ARGV[i])
+    if score and tonumber(score) <= cutoff then
+        redis.call('ZREM', KEYS[1], ARGV[i])
+        redis.call('ZREM', KEYS[i], ARGV[i])
+        removed = removed + 1
+    end
+end
+return removed
+"""
+
+
+def _text(value) -> Optional[str]:
+    return value.decode() if isinstance(value, bytes) else value
+
+
+class _CommitPlan(NamedTuple):
+    """What a commit writes besides the summary fields"""
+    snapshot: Optional[bytes]   # Complete state blob, None if only events are logged
+    batch: Optional[bytes]      # Encoded state events, None if nothing changed
+    base: Optional[StateBase]   # What the events were computed against
+
+
+class _RedisSessionBase:
+    """Key layout, TTLs and state (de)serialization shared by the sync and async managers"""
+
+    # Default TTL: 24 hours
+    session_ttl = 86400
+
+    # Exchanges kept per session
+    history_limit = 50
+
+    @staticmethod
+    def _state_fields(session_id: str, session_state, snapshot: bytes = None) -> Dict:
+        """Readable summary fields (listing, redis-cli), plus the complete state blob when snapshotting"""
+        fields = {
+            "session_id": session_id,
+            "current_stage": session_state.current_stage,
+            "current_substate": session_state.current_substate,
+            "body_questions_asked": str(session_state.body_questions_asked),
+            "stage_1_completion": json.dumps(session_state.stage_1_completion),
+            "last_interaction": datetime.now().isoformat(),
+            "created_at": getattr(session_state, 'created_at', datetime.now().isoformat())
+        }
+        if snapshot is not None:
+            fields["state_blob"] = snapshot
+        return fields
+
+    @staticmethod
+    def _parse_state_hash(raw: Dict, batches: List[bytes] = ()) -> Dict:
+        """Decode a state hash read through the binary client, replaying the event batches logged since"""
+        blob = raw.pop(b"state_blob", None)
+        data = {name.decode(): value.decode() for name, value in raw.items()}
+        data["version"] = int(data.get("version") or 0)
+        if blob:
+            session_state = decode_state(blob)
+            for batch in batches:
+                apply_events(session_state, decode_events(batch))
+            track(session_state, blob, batches, data["version"])
+            data["session_state"] = session_state
+
+        # Parse JSON fields
+        if "stage_1_completion" in data:
+            data["stage_1_completion"] = json.loads(data["stage_1_completion"])
+
+        # Convert numeric fields
+        if "body_questions_asked" in data:
+            data["body_questions_asked"] = int(data["body_questions_asked"])
+        return data
+
+    @classmethod
+    def _parse_turn(cls, raw_state: Dict, raw_meta: Dict, batches: List[bytes] = ()) -> Tuple[Dict, Dict]:
+        """Decode the state and meta hashes read by load_turn"""
+        metadata = {name.decode(): value.decode() for name, value in raw_meta.items()}
+        return cls._parse_state_hash(raw_state, batches), metadata
+
+    @staticmethod
+    def _loaded(result: List) -> Tuple[Dict, Dict, List[bytes]]:
+        """(state hash, meta hash, event batches since the snapshot) from _LOAD_SCRIPT"""
+        raw_state, raw_meta, entries = result
+        raw_state = dict(zip(raw_state[::2], raw_state[1::2]))
+        snapshot_event = raw_state.get(b"snapshot_event")
+        batches = []
+        for entry_id, fields in entries:
+            if entry_id != snapshot_event:
+                fields = dict(zip(fields[::2], fields[1::2]))
+                batches.append(fields[b"events"])
+        return raw_state, dict(zip(raw_meta[::2], raw_meta[1::2])), batches
+
+    def _configure(self, cluster: bool = None):
+        """
+        Deployment mode, index bucket count, history feed length, snapshot interval and event log length
+        (REDIS_CLUSTER, TRT_ACTIVITY_INDEX_SHARDS, TRT_HISTORY_FEED_MAXLEN, TRT_STATE_SNAPSHOT_EVERY,
+        TRT_STATE_EVENTS_MAXLEN)
+        """
+        if cluster is None:
+            cluster = os.getenv("REDIS_CLUSTER", "false").lower() == "true"
+        self.cluster = cluster
+        self.index_shards = index_shards()
+        # Approximate entries kept per feed bucket; 0 turns the feed off
+        self.feed_maxlen = int(os.getenv("TRT_HISTORY_FEED_MAXLEN", "10000"))
+        # Writes between state snapshots (the others log events only); 0 = whole state every write
+        self.snapshot_every = int(os.getenv("TRT_STATE_SNAPSHOT_EVERY", "20"))
+        # Approximate state events kept per session (the audit trail); 0 = all. Never fewer
+        # than a snapshot interval, so loading always finds the snapshot's entry
+        events_maxlen = int(os.getenv("TRT_STATE_EVENTS_MAXLEN", "1000"))
+        self.events_maxlen = max(events_maxlen, self.snapshot_every + 1) if events_maxlen > 0 else 0
+
+    def _bucket(self, session_id: str) -> str:
+        return index_bucket(session_id, self.index_shards)
+
+    def _listing_keys(self, substate: str = None) -> List[str]:
+        """Sorted sets a listing pages through, one per index bucket"""
+        return [substate_key(bucket, substate) if substate else activity_key(bucket)
+                for bucket in all_buckets(self.index_shards)]
+
+    @staticmethod
+    def _score_range(since: float = None, before: float = None) -> Tuple[str, str]:
+        """(min, max) for ZREVRANGEBYSCORE / ZCOUNT: since inclusive, before exclusive"""
+        return ("-inf" if since is None else repr(float(since)),
+                "+inf" if before is None else f"({float(before)!r}")
+
+    @staticmethod
+    def _page_upper(upper: str, after: Tuple[float, str] = None) -> str:
+        # Resume at the cursor's score (inclusive: other sessions may share it)
+        if after is None or (upper != "+inf" and float(upper.lstrip("(")) <= after[0]):
+            return upper
+        return repr(after[0])
+
+    @staticmethod
+    def _past_cursor(entries: List, after: Tuple[float, str] = None) -> List[Tuple[str, float]]:
+        """Drop entries up to the cursor (equal scores come in descending ID order)"""
+        entries = [(_text(member), score) for member, score in entries]
+        if after is None:
+            return entries
+        score, session_id = after
+        return [(member, member_score) for member, member_score in entries
+                if member_score < score or (member_score == score and member < session_id)]
+
+    @classmethod
+    def _summary(cls, session_id: str, state_values: List, meta_values: List) -> Optional[Dict]:
+        """Listing entry from the HMGET of SUMMARY_STATE_FIELDS / SUMMARY_META_FIELDS"""
+        state = dict(zip(SUMMARY_STATE_FIELDS, map(_text, state_values)))
+        if state["last_interaction"] is None:
+            return None  # Expired since it was indexed
+        meta = dict(zip(SUMMARY_META_FIELDS, map(_text, meta_values)))
+        return {
+            "session_id": session_id,
+            "client_id": meta["client_id"] or None,
+            "status": meta["status"] or "active",
+            "current_substate": state["current_substate"],
+            "created_at": meta["created_at"] or state["created_at"],
+            "last_interaction": state["last_interaction"],
+            "turn_count": int(meta["turn_count"] or 0)
+        }
+
+    @classmethod
+    def _short_buckets(cls, fetched: Dict[int, Tuple[List, int]], after: Tuple[float, str],
+                       limit: int) -> Dict[int, int]:
+        """Buckets whose full batch lost entries to the cursor: read them again, twice as deep"""
+        return {index: num * 2 for index, (batch, num) in fetched.items()
+                if len(batch) == num and len(cls._past_cursor(batch, after)) <= limit}
+
+    @classmethod
+    def _merge_buckets(cls, fetched: Dict[int, Tuple[List, int]], after: Tuple[float, str],
+                       limit: int) -> Tuple[List[Tuple[str, float]], bool]:
+        """The page's entries across all buckets (same order as one sorted set), and whether more follow"""
+        entries = [entry for batch, _ in fetched.values() for entry in cls._past_cursor(batch, after)]
+        entries.sort(key=lambda entry: (entry[1], entry[0]), reverse=True)
+        return entries[:limit], len(entries) > limit
+
+    def _commit_args(self, session_id: str, session_state, metadata: Dict = None, exchange: Dict = None,
+                     fencing_token: int = None, create_only: bool = False,
+                     rebase: bool = False) -> Tuple[List, List, "_CommitPlan"]:
+        """
+        KEYS and ARGV for _COMMIT_SCRIPT, and the plan to pass to _committed() once written
+
+        The turn's events are its changes since the state was loaded, checked
+        against the version it was loaded at; a new session, a state loaded
+        without a snapshot, or rebase (after a -2) logs the whole state instead
+        and writes a snapshot. So does every snapshot_every-th write.
+        """
+        if exchange is not None:
+            # Add timestamp
+            exchange["timestamp"] = datetime.now().isoformat()
+
+        base = batch = None
+        expected = ""
+        snapshot = True
+        if self.snapshot_every > 0:
+            base = None if create_only or rebase else base_of(session_state)
+            if base is None:
+                batch = encode_events([reset_event(session_state)])
+            else:
+                events = state_changes(session_state)
+                batch = encode_events(events) if events else None
+                expected = base.version
+                snapshot = len(base.batches) + 1 >= self.snapshot_every
+        plan = _CommitPlan(encode_state(session_state) if snapshot else None, batch, base)
+
+        state_fields = self._state_fields(session_id, session_state, plan.snapshot)
+        args = [
+            session_id,
+            "" if fencing_token is None else fencing_token,
+            "1" if create_only else "0",
+            self.session_ttl,
+            datetime.now().timestamp(),
+            self.history_limit,
+            encode_exchange(exchange) if exchange is not None else "",
+            len(state_fields)
+        ]
+        for field_name, value in state_fields.items():
+            args.extend([field_name, value])
+        for field_name, value in (metadata or {}).items():
+            args.extend([field_name, value])
+
+        bucket = self._bucket(session_id)
+        args[8:8] = [substate_prefix(bucket), self.feed_maxlen, batch or "", "1" if snapshot else "0", expected,
+                     self.events_maxlen]
+        keys = session_keys(session_id, ("state", "meta", "stream", "events"))
+        if not self.cluster:
+            # One node: index the session (and feed the exchange) in the same script
+            keys += [activity_key(bucket), substate_key(bucket, session_state.current_substate)]
+            if exchange is not None and self.feed_maxlen > 0:
+                keys.append(feed_key(bucket))
+        return keys, args, plan
+
+    @staticmethod
+    def _committed(session_state, plan: "_CommitPlan", version: int):
+        """Make what was just written the state's base for the next write's events"""
+        if not version:
+            return
+        if plan.snapshot is not None:
+            track(session_state, plan.snapshot, [], version)
+        elif plan.base is not None:
+            track(session_state, plan.base.snapshot,
+                  plan.base.batches + ([plan.batch] if plan.batch else []), version)
+
+    def _index_args(self, session_id: str, substate: str, previous_substate, active_at,
+                    entry=b"") -> Tuple[List, List]:
+        """KEYS and ARGV for _INDEX_SCRIPT (cluster mode, after a commit; entry: the encoded exchange)"""
+        bucket = self._bucket(session_id)
+        previous_substate = _text(previous_substate) or substate
+        keys = [activity_key(bucket), substate_key(bucket, substate), substate_key(bucket, previous_substate)]
+        args = [session_id, active_at]
+        if entry and self.feed_maxlen > 0:
+            keys.append(feed_key(bucket))
+            args += [entry, self.feed_maxlen]
+        return keys, args
+
+    def _sweep_index_args(self, bucket: str, cutoff: float, session_ids: List[str],
+                          substates: List) -> Tuple[List, List]:
+        """KEYS and ARGV for _SWEEP_INDEX_SCRIPT: the sessions step 1 deleted (substate not nil)"""
+        keys, args = [activity_key(bucket)], [cutoff]
+        for session_id, substate in zip(session_ids, substates):
+            if substate is None:
+                continue
+            substate = _text(substate)
+            keys.append(substate_key(bucket, substate) if substate else activity_key(bucket))
+            args.append(session_id)
+        return keys, args
+
+    def _append_exchanges(self, pipe, exchanges: List[Tuple[str, Dict]]):
+        """
+        Queue a batch of exchanges on a pipeline, in order: each goes to its
+        session's stream (the last history_limit kept) and its bucket's feed,
+        with one EXPIRE per session
+        """
+        for session_id, exchange in exchanges:
+            # Stamped when the turn ran, not when a write-behind batch gets to it
+            exchange.setdefault("timestamp", datetime.now().isoformat())
+            entry = encode_exchange(exchange)
+            pipe.xadd(session_key(session_id, "stream"), {"entry": entry}, maxlen=self.history_limit,
+                      approximate=False)
+            if self.feed_maxlen > 0:
+                pipe.xadd(feed_key(self._bucket(session_id)), {"session_id": session_id, "entry": entry},
+                          maxlen=self.feed_maxlen, approximate=True)
+        for session_id in dict.fromkeys(session_id for session_id, _ in exchanges):
+            pipe.expire(session_key(session_id, "stream"), self.session_ttl)
+
+    @staticmethod
+    def _decode_history(session_id: str, entries: List) -> List[Dict]:
+        """Decode history entries, skipping (and logging) any this process can't read"""
+        exchanges = []
+        for entry in entries:
+            try:
+                exchanges.append(decode_exchange(entry))
+            except HistoryCodecError as e:
+                logger.warning(f"⚠️ Skipping unreadable history entry of {session_id}: {e}")
+        return exchanges
+
+    @staticmethod
+    def _stream_range(since: float = None, before: float = None) -> Tuple[str, str]:
+        """(min, max) stream IDs for XRANGE: since inclusive, before exclusive (milliseconds)"""
+        # Rounded to microseconds first, so float noise can't move a bound by a millisecond
+        return ("-" if since is None else str(math.ceil(round(since * 1000, 3))),
+                "+" if before is None else str(math.ceil(round(before * 1000, 3)) - 1))
+
+    @staticmethod
+    def _in_turns(exchange: Dict, first_turn: int = None, last_turn: int = None) -> bool:
+        turn = exchange.get("turn")
+        if first_turn is None and last_turn is None:
+            return True
+        if not isinstance(turn, int):
+            return False
+        return (first_turn is None or turn >= first_turn) and (last_turn is None or turn <= last_turn)
+
+    def _commit_result(self, session_id: str, result: List, fencing_token: int = None) -> int:
+        """Log and interpret _COMMIT_SCRIPT's version (the new version, or 0 if not written)"""
+        result = int(result[0])
+        if result == -2:
+            logger.warning(f"⚠️ Session {session_id} changed since it was loaded, its events were not written")
+            return 0
+        if result == -1:
+            logger.warning(f"⚠️ Stale write refused for session {session_id} "
+                           f"(fencing token {fencing_token})")
+            return 0
+        if result == 0:
+            logger.info(f"ℹ️ Session already exists: {session_id}")
+            return 0
 
-class RedisSessionManager:
+        logger.info(f"✅ Session saved: {session_id}")
+        return result
+
+
+class RedisSessionManager(_RedisSessionBase):
     """Manages TRT therapy sessions in Redis"""
 
-    def __init__(self, redis_url: str = None):
+    def __init__(self, redis_url: str = None, cluster: bool = None):
         """
         Initialize Redis connection
 
         Args:
             redis_url: Redis connection URL (from environment or parameter)
+            cluster: Connect to a Redis Cluster (REDIS_CLUSTER); session keys are
+                     hash-tagged either way
         """
         if redis_url is None:
             redis_url = os.getenv("REDIS_URL", "redis://:changeme@localhost:6379")
+        self._configure(cluster)
 
         try:
-            self.redis = redis.from_url(redis_url, decode_responses=True)
+            connect = redis.RedisCluster.from_url if self.cluster else redis.from_url
+            self.redis = connect(redis_url, decode_responses=True)
+            # Session state blobs are binary; read/write the state hash undecoded
+            self.redis_binary = connect(redis_url, decode_responses=False)
 
             # Test connection
             self.redis.ping()
@@ -37,49 +525,79 @@ class RedisSessionManager:
             logger.error(f"❌ Redis connection failed: {e}")
             raise
 
-        # Default TTL: 24 hours
-        self.session_ttl = 86400
+        self._commit = self.redis_binary.register_script(_COMMIT_SCRIPT)
+        self._load = self.redis_binary.register_script(_LOAD_SCRIPT)
+        self._index = self.redis.register_script(_INDEX_SCRIPT)
+        self._sweep_index = self.redis.register_script(_SWEEP_INDEX_SCRIPT)
 
-    def save_session_state(self, session_id: str, session_state) -> bool:
+    def commit_turn(self, session_id: str, session_state, metadata: Dict = None, exchange: Dict = None,
+                    fencing_token: int = None, create_only: bool = False) -> int:
         """
-        Save session state to Redis
+        Write everything a turn changed in a single round trip (one server-side script)
+
+        The state's changes since it was loaded are appended to its event log
+        as one batch, and the whole state is rewritten only as a periodic
+        snapshot. If the session moved on meanwhile (another writer), the
+        write is retried once as a snapshot. In cluster mode the session's
+        index entries live in another slot and are updated by a second script
+        call once the state is written.
 
         Args:
             session_id: Unique session identifier
             session_state: TRTSessionState object
+            metadata: Metadata fields to set (optional)
+            exchange: Conversation exchange to append to history (optional)
+            fencing_token: Token of the session lease this turn holds; the write is
+                           refused if a turn with a newer token already saved
+            create_only: Only write if the session doesn't exist yet
 
         Returns:
-            True if successful
+            The session's new version if written (truthy); 0 when refused as stale,
+            or the session exists with create_only
         """
         try:
-            key = f"trt:session:{session_id}:state"
-
-            # Convert session state to dict
-            data = {
-                "session_id": session_id,
-                "current_stage": session_state.current_stage,
-                "current_substate": session_state.current_substate,
-                "body_questions_asked": str(session_state.body_questions_asked),
-                "stage_1_completion": json.dumps(session_state.stage_1_completion),
-                "last_interaction": datetime.now().isoformat(),
-                "created_at": getattr(session_state, 'created_at', datetime.now().isoformat())
-            }
+            keys, args, plan = self._commit_args(session_id, session_state, metadata, exchange,
+                                                 fencing_token, create_only)
+            result = self._commit(keys=keys, args=args)
+            if int(result[0]) == -2:
+                keys, args, plan = self._commit_args(session_id, session_state, metadata, exchange,
+                                                     fencing_token, create_only, rebase=True)
+                result = self._commit(keys=keys, args=args)
+            version = self._commit_result(session_id, result, fencing_token)
+            self._committed(session_state, plan, version)
+            if version and self.cluster:
+                keys, args = self._index_args(session_id, session_state.current_substate, result[1],
+                                              args[4], args[6])
+                self._index(keys=keys, args=args)
+            return version
 
-            # Save as hash
-            self.redis.hset(key, mapping=data)
+        except Exception as e:
+            logger.error(f"❌ Failed to save session {session_id}: {e}")
+            return 0
 
-            # Set TTL (24 hours)
-            self.redis.expire(key, self.session_ttl)
+    def create_session(self, session_id: str, session_state, metadata: Dict = None) -> int:
+        """
+        Create a session atomically across workers (one round trip)
 
-            # Add to active sessions index (sorted by timestamp)
-            self.redis.zadd("trt:active_sessions", {session_id: datetime.now().timestamp()})
+        Returns:
+            The session's version if created (truthy), 0 if the session ID is already taken
+        """
+        return self.commit_turn(session_id, session_state, metadata=metadata, create_only=True)
 
-            logger.info(f"✅ Session saved: {session_id}")
-            return True
+    def save_session_state(self, session_id: str, session_state, fencing_token: int = None) -> bool:
+        """
+        Save session state to Redis
 
-        except Exception as e:
-            logger.error(f"❌ Failed to save session {session_id}: {e}")
-            return False
+        Args:
+            session_id: Unique session identifier
+            session_state: TRTSessionState object
+            fencing_token: Token of the session lease this turn holds; the write is
+                           refused if a turn with a newer token already saved
+
+        Returns:
+            True if successful (False also when refused as stale)
+        """
+        return bool(self.commit_turn(session_id, session_state, fencing_token=fencing_token))
 
     def load_session_state(self, session_id: str) -> Optional[Dict]:
         """
@@ -89,31 +607,53 @@ class RedisSessionManager:
             session_id: Unique session identifier
 
         Returns:
-            Dict with session data or None if not found
+            Dict with session data or None if not found; "session_state" holds the
+            complete TRTSessionState, its last snapshot with the events since
+            replayed (absent for sessions saved before the blob existed)
         """
-        try:
-            key = f"trt:session:{session_id}:state"
+        loaded = self.load_turn(session_id)
+        if loaded is None:
+            return None
+        logger.info(f"✅ Session loaded: {session_id}")
+        return loaded[0]
+
+    def load_turn(self, session_id: str) -> Optional[Tuple[Dict, Dict]]:
+        """
+        Load state and metadata for a turn in a single round trip (one server-side
+        script reads the snapshot, metadata and the state events since)
 
-            # Get hash data
-            data = self.redis.hgetall(key)
+        Args:
+            session_id: Unique session identifier
 
-            if not data:
+        Returns:
+            (state data as from load_session_state, metadata) or None if not found
+        """
+        try:
+            raw_state, raw_meta, batches = self._loaded(
+                self._load(keys=session_keys(session_id, ("state", "meta", "events"))))
+
+            if not raw_state:
                 logger.info(f"ℹ️ Session not found: {session_id}")
                 return None
 
-            # Parse JSON fields
-            if "stage_1_completion" in data:
-                data["stage_1_completion"] = json.loads(data["stage_1_completion"])
+            return self._parse_turn(raw_state, raw_meta, batches)
 
-            # Convert numeric fields
-            if "body_questions_asked" in data:
-                data["body_questions_asked"] = int(data["body_questions_asked"])
+        except Exception as e:
+            logger.error(f"❌ Failed to load session {session_id}: {e}")
+            return None
 
-            logger.info(f"✅ Session loaded: {session_id}")
-            return data
+    def get_version(self, session_id: str) -> Optional[int]:
+        """
+        Current version of a session's state (a single small read, to validate a cached copy)
 
+        Returns:
+            The version, or None if the session doesn't exist (or predates versioning)
+        """
+        try:
+            version = self.redis.hget(session_key(session_id, "state"), "version")
+            return int(version) if version else None
         except Exception as e:
-            logger.error(f"❌ Failed to load session {session_id}: {e}")
+            logger.error(f"❌ Failed to read session version {session_id}: {e}")
             return None
 
     def session_exists(self, session_id: str) -> bool:
@@ -127,7 +667,7 @@ class RedisSessionManager:
             True if session exists
         """
         try:
-            return self.redis.exists(f"trt:session:{session_id}:state") > 0
+            return self.redis.exists(session_key(session_id, "state")) > 0
         except Exception as e:
             logger.error(f"❌ Failed to check session existence: {e}")
             return False
@@ -143,17 +683,16 @@ class RedisSessionManager:
             True if successful
         """
         try:
-            # Delete all keys for this session
-            keys = [
-                f"trt:session:{session_id}:state",
-                f"trt:session:{session_id}:history",
-                f"trt:session:{session_id}:meta"
-            ]
+            substate = self.redis.hget(session_key(session_id, "state"), "current_substate")
+            bucket = self._bucket(session_id)
 
-            self.redis.delete(*keys)
-
-            # Remove from active sessions index
-            self.redis.zrem("trt:active_sessions", session_id)
+            # Delete all keys for this session, then its index entries (another slot)
+            pipe = self.redis.pipeline(transaction=False)
+            pipe.delete(*session_keys(session_id, ("state", "stream", "history", "events", "meta", "fence")))
+            pipe.zrem(activity_key(bucket), session_id)
+            if substate:
+                pipe.zrem(substate_key(bucket, substate), session_id)
+            pipe.execute()
 
             logger.info(f"✅ Session deleted: {session_id}")
             return True
@@ -173,21 +712,20 @@ class RedisSessionManager:
         Returns:
             True if successful
         """
-        try:
-            key = f"trt:session:{session_id}:history"
-
-            # Add timestamp
-            exchange["timestamp"] = datetime.now().isoformat()
+        return self.add_conversation_exchanges([(session_id, exchange)])
 
-            # Add to list (newest first)
-            self.redis.lpush(key, json.dumps(exchange))
-
-            # Keep only last 50 exchanges (trim old ones)
-            self.redis.ltrim(key, 0, 49)
-
-            # Set TTL
-            self.redis.expire(key, self.session_ttl)
+    def add_conversation_exchanges(self, exchanges: List[Tuple[str, Dict]]) -> bool:
+        """
+        Add a batch of (session_id, exchange) to history in one round trip, in order
 
+        Returns:
+            True if successful
+        """
+        try:
+            # Streams and feeds live in other slots in cluster mode: no transaction
+            pipe = self.redis_binary.pipeline(transaction=False)
+            self._append_exchanges(pipe, exchanges)
+            pipe.execute()
             return True
 
         except Exception as e:
@@ -206,18 +744,97 @@ class RedisSessionManager:
             List of conversation exchanges (newest first)
         """
         try:
-            key = f"trt:session:{session_id}:history"
+            # Get last N exchanges: the stream, then the list written before it
+            pipe = self.redis_binary.pipeline(transaction=False)
+            pipe.xrevrange(session_key(session_id, "stream"), count=limit)
+            pipe.lrange(session_key(session_id, "history"), 0, limit - 1)
+            streamed, listed = pipe.execute()
 
-            # Get last N exchanges
-            history = self.redis.lrange(key, 0, limit - 1)
-
-            # Parse JSON
-            return [json.loads(exchange) for exchange in history]
+            history = [fields[b"entry"] for _, fields in streamed] + listed
+            return self._decode_history(session_id, history[:limit])
 
         except Exception as e:
             logger.error(f"❌ Failed to get conversation history: {e}")
             return []
 
+    def get_history_range(self, session_id: str, since: float = None, before: float = None,
+                          first_turn: int = None, last_turn: int = None,
+                          count: int = None) -> List[Tuple[str, Dict]]:
+        """
+        Exchanges of a session by time and/or turn number, oldest first
+
+        Time bounds select by stream entry ID (millisecond resolution); turn
+        bounds match the exchanges' "turn" field. Exchanges stored before
+        history moved to streams are not included.
+
+        Args:
+            session_id: Unique session identifier
+            since: Unix time, inclusive
+            before: Unix time, exclusive
+            first_turn: First turn number, inclusive
+            last_turn: Last turn number, inclusive
+            count: Maximum number of exchanges to return
+
+        Returns:
+            List of (stream entry ID, exchange)
+        """
+        try:
+            turns = first_turn is not None or last_turn is not None
+            entries = self.redis_binary.xrange(session_key(session_id, "stream"),
+                                               *self._stream_range(since, before),
+                                               count=None if turns else count)
+            exchanges = []
+            for entry_id, fields in entries:
+                exchange = self._decode_history(session_id, [fields[b"entry"]])
+                if exchange and self._in_turns(exchange[0], first_turn, last_turn):
+                    exchanges.append((entry_id.decode(), exchange[0]))
+            return exchanges[:count] if count is not None else exchanges
+
+        except Exception as e:
+            logger.error(f"❌ Failed to get conversation history range: {e}")
+            return []
+
+    def get_state_events(self, session_id: str) -> List[Tuple[str, int, List[StateEvent]]]:
+        """
+        A session's state event log, oldest first: its audit trail
+
+        Replaying it from its first (reset) event gives the current state, as
+        long as the session was created after state events were introduced and
+        the log (capped at about TRT_STATE_EVENTS_MAXLEN entries) still reaches
+        back to it. Otherwise, replay the entries after the snapshot's onto
+        get_state_snapshot().
+
+        Returns:
+            List of (stream entry ID, version written, events)
+        """
+        try:
+            entries = self.redis_binary.xrange(session_key(session_id, "events"))
+            return [(entry_id.decode(), int(fields[b"version"]), decode_events(fields[b"events"]))
+                    for entry_id, fields in entries]
+
+        except Exception as e:
+            logger.error(f"❌ Failed to get state events for {session_id}: {e}")
+            return []
+
+    def get_state_snapshot(self, session_id: str) -> Optional[Tuple[str, object]]:
+        """
+        A session's last snapshot, as written (without the events logged since)
+
+        Returns:
+            (stream entry ID of the snapshot's write, TRTSessionState), or None
+            if the session has no snapshot
+        """
+        try:
+            blob, snapshot_event = self.redis_binary.hmget(session_key(session_id, "state"),
+                                                           "state_blob", "snapshot_event")
+            if not blob:
+                return None
+            return (snapshot_event or b"0-0").decode(), decode_state(blob)
+
+        except Exception as e:
+            logger.error(f"❌ Failed to get state snapshot for {session_id}: {e}")
+            return None
+
     def save_session_metadata(self, session_id: str, metadata: Dict) -> bool:
         """
         Save session metadata
@@ -230,7 +847,7 @@ class RedisSessionManager:
             True if successful
         """
         try:
-            key = f"trt:session:{session_id}:meta"
+            key = session_key(session_id, "meta")
 
             # Save as hash
             self.redis.hset(key, mapping=metadata)
@@ -244,6 +861,22 @@ class RedisSessionManager:
             logger.error(f"❌ Failed to save metadata: {e}")
             return False
 
+    def load_session_metadata(self, session_id: str) -> Dict:
+        """
+        Load session metadata
+
+        Args:
+            session_id: Unique session identifier
+
+        Returns:
+            Dict with metadata (empty if none)
+        """
+        try:
+            return self.redis.hgetall(session_key(session_id, "meta"))
+        except Exception as e:
+            logger.error(f"❌ Failed to load metadata: {e}")
+            return {}
+
     def list_active_sessions(self, limit: int = 100) -> List[str]:
         """
         List active sessions (most recent first)
@@ -255,13 +888,67 @@ class RedisSessionManager:
             List of session IDs
         """
         try:
-            # Get from sorted set (most recent first)
-            return self.redis.zrevrange("trt:active_sessions", 0, limit - 1)
+            # Newest of each bucket, merged (most recent first)
+            pipe = self.redis.pipeline(transaction=False)
+            for key in self._listing_keys():
+                pipe.zrevrange(key, 0, limit - 1, withscores=True)
+            entries = [entry for batch in pipe.execute() for entry in batch]
+            entries.sort(key=lambda entry: (entry[1], entry[0]), reverse=True)
+            return [session_id for session_id, _ in entries[:limit]]
 
         except Exception as e:
             logger.error(f"❌ Failed to list active sessions: {e}")
             return []
 
+    def page_sessions(self, limit: int = 100, after: Tuple[float, str] = None, substate: str = None,
+                      since: float = None, before: float = None) -> Tuple[List[Dict], Optional[Tuple[float, str]], int]:
+        """
+        One page of session summaries, most recently active first (two round trips)
+
+        Reads only the indexes and the summary fields (HMGET, pipelined),
+        never the state blobs, so the cost is per page, not per live session.
+        Every index bucket is read in the same pipeline and the results merged.
+
+        Args:
+            limit: Page size
+            after: Cursor from the previous page: (last activity, session_id) of its last entry
+            substate: Only sessions currently in this substate
+            since: Only sessions active at or after this unix time
+            before: Only sessions last active before this unix time
+
+        Returns:
+            (summaries, cursor for the next page or None, sessions matching the filters)
+        """
+        keys = self._listing_keys(substate)
+        lower, upper = self._score_range(since, before)
+        page_upper = self._page_upper(upper, after)
+
+        fetched, wanted = {}, {index: limit + 1 for index in range(len(keys))}
+        while wanted:
+            pipe = self.redis.pipeline(transaction=False)
+            for index, num in wanted.items():
+                pipe.zrevrangebyscore(keys[index], page_upper, lower, start=0, num=num, withscores=True)
+            for (index, num), batch in zip(wanted.items(), pipe.execute()):
+                fetched[index] = (batch, num)
+            wanted = self._short_buckets(fetched, after, limit)
+        entries, has_more = self._merge_buckets(fetched, after, limit)
+
+        pipe = self.redis.pipeline(transaction=False)
+        for session_id, _ in entries:
+            pipe.hmget(session_key(session_id, "state"), SUMMARY_STATE_FIELDS)
+            pipe.hmget(session_key(session_id, "meta"), SUMMARY_META_FIELDS)
+        for key in keys:
+            pipe.zcount(key, lower, upper)
+        results = pipe.execute()
+
+        summaries = []
+        for index, (session_id, _) in enumerate(entries):
+            summary = self._summary(session_id, results[2 * index], results[2 * index + 1])
+            if summary:
+                summaries.append(summary)
+        next_position = (entries[-1][1], entries[-1][0]) if has_more else None
+        return summaries, next_position, sum(results[2 * len(entries):])
+
     def get_session_count(self) -> int:
         """
         Get total number of active sessions
@@ -270,11 +957,158 @@ class RedisSessionManager:
             Number of active sessions
         """
         try:
-            return self.redis.zcard("trt:active_sessions")
+            pipe = self.redis.pipeline(transaction=False)
+            for key in self._listing_keys():
+                pipe.zcard(key)
+            return sum(pipe.execute())
         except Exception as e:
             logger.error(f"❌ Failed to get session count: {e}")
             return 0
 
+    def sweep_inactive_sessions(self, cutoff: float, batch_size: int = 500) -> Dict:
+        """
+        Remove every session last active at or before `cutoff`, a batch at a time
+
+        Each index bucket is swept in batches: one ZRANGEBYSCORE ... LIMIT, one
+        pipeline of per-session scripts that UNLINK the keys of sessions still
+        idle, then one script dropping those sessions' index entries. Substate
+        index entries of sessions whose state already expired are trimmed by score.
+
+        Args:
+            cutoff: Unix time; sessions with older activity are removed
+            batch_size: Sessions per batch
+
+        Returns:
+            Dict with sessions removed, batches run and stale index entries trimmed
+        """
+        removed = batches = 0
+        for bucket in all_buckets(self.index_shards):
+            after = None  # Sessions up to here were swept, or touched since they were indexed and left in place
+            while True:
+                page = self.idle_sessions(bucket, cutoff, after, batch_size)
+                if not page:
+                    break
+                batch = [session_id for session_id, _ in page]
+                pipe = self.redis.pipeline(transaction=False)
+                for session_id in batch:
+                    pipe.eval(_SWEEP_SESSION_SCRIPT, 6, *session_keys(
+                        session_id, ("state", "meta", "stream", "history", "events", "fence")), cutoff)
+                substates = pipe.execute()
+                keys, args = self._sweep_index_args(bucket, cutoff, batch, substates)
+                if len(args) > 1:
+                    removed += int(self._sweep_index(keys=keys, args=args))
+                after = (page[-1][1], page[-1][0])
+                batches += 1
+                if len(batch) < batch_size:
+                    break
+
+        index_entries = 0
+        for key in self.redis.scan_iter(match=f"{substate_prefix('*')}*", count=100):
+            index_entries += self.redis.zremrangebyscore(key, "-inf", cutoff)
+
+        return {"sessions": removed, "batches": batches, "index_entries": index_entries}
+
+    def idle_sessions(self, bucket: str, cutoff: float, after: Tuple[float, str] = None,
+                      num: int = 500) -> List[Tuple[str, float]]:
+        """
+        A batch of an index bucket's sessions last active at or before `cutoff`, oldest first
+
+        Paged by (last activity, session_id) cursor rather than by offset, so
+        sessions of earlier batches that were left in place - or touched and
+        moved out of the range meanwhile - don't shift the next batch.
+
+        Args:
+            after: (last activity, session_id) of the previous batch's last entry
+
+        Returns:
+            List of (session_id, last activity)
+        """
+        lower = "-inf" if after is None else repr(float(after[0]))
+        fetch = num
+        while True:
+            # Resume at the cursor's score (inclusive: other sessions may share it,
+            # in ascending ID order) and drop what the cursor already covered
+            entries = [(_text(member), score) for member, score in self.redis.zrangebyscore(
+                activity_key(bucket), lower, cutoff, start=0, num=fetch, withscores=True)]
+            page = [(member, score) for member, score in entries
+                    if after is None or score > after[0] or (score == after[0] and member > after[1])]
+            if len(page) >= num or len(entries) < fetch:
+                return page[:num]
+            fetch *= 2
+
+    def export_sessions(self, session_ids: List[str]) -> List[Optional[Tuple[Dict, Dict, List[bytes]]]]:
+        """
+        Everything stored for each session, for archiving (one pipeline)
+
+        Returns:
+            Per session: (state data as from load_session_state, metadata, encoded
+            history entries oldest first), or None if it's gone
+        """
+        pipe = self.redis_binary.pipeline(transaction=False)
+        for session_id in session_ids:
+            pipe.eval(_LOAD_SCRIPT, 3, *session_keys(session_id, ("state", "meta", "events")))
+            pipe.xrange(session_key(session_id, "stream"))
+            pipe.lrange(session_key(session_id, "history"), 0, -1)
+        results = pipe.execute()
+
+        exported = []
+        for index in range(len(session_ids)):
+            loaded, streamed, listed = results[3 * index:3 * index + 3]
+            raw_state, raw_meta, batches = self._loaded(loaded)
+            if not raw_state:
+                exported.append(None)
+                continue
+            data, meta = self._parse_turn(raw_state, raw_meta, batches)
+            history = listed[::-1] + [fields[b"entry"] for _, fields in streamed]
+            exported.append((data, meta, history))
+        return exported
+
+    def evict_sessions(self, bucket: str, sessions: Dict[str, str], cutoff: float) -> List[str]:
+        """
+        Delete archived sessions from Redis, except those a turn has touched
+        (or is running on) since they were exported
+
+        Args:
+            bucket: Index bucket of every session
+            sessions: session_id -> active_at as exported
+            cutoff: Upper bound of the archived sessions' activity (their index entries are dropped)
+
+        Returns:
+            Sessions evicted
+        """
+        session_ids = list(sessions)
+        pipe = self.redis.pipeline(transaction=False)
+        for session_id in session_ids:
+            pipe.eval(_SWEEP_SESSION_SCRIPT, 7,
+                      *session_keys(session_id, ("state", "meta", "stream", "history", "events", "fence", "lock")),
+                      sessions[session_id])
+        substates = pipe.execute()
+        keys, args = self._sweep_index_args(bucket, cutoff, session_ids, substates)
+        if len(args) > 1:
+            self._sweep_index(keys=keys, args=args)
+        return [session_id for session_id, substate in zip(session_ids, substates) if substate is not None]
+
+    def restore_history(self, session_id: str, entries: List[bytes]) -> bool:
+        """
+        Put a rehydrated session's encoded history entries (oldest first) back in its stream
+
+        Returns:
+            True if successful
+        """
+        if not entries:
+            return True
+        try:
+            key = session_key(session_id, "stream")
+            pipe = self.redis_binary.pipeline(transaction=False)
+            for entry in entries[-self.history_limit:]:
+                pipe.xadd(key, {"entry": entry}, maxlen=self.history_limit, approximate=False)
+            pipe.expire(key, self.session_ttl)
+            pipe.execute()
+            return True
+        except Exception as e:
+            logger.error(f"❌ Failed to restore conversation history of {session_id}: {e}")
+            return False
+
     def cleanup_inactive_sessions(self, hours: int = 24) -> int:
         """
         Remove sessions inactive for X hours
@@ -286,17 +1120,7 @@ class RedisSessionManager:
             Number of sessions cleaned up
         """
         try:
-            import time
-            cutoff = time.time() - (hours * 3600)
-
-            # Get inactive sessions
-            inactive = self.redis.zrangebyscore("trt:active_sessions", "-inf", cutoff)
-
-            # Delete each
-            count = 0
-            for session_id in inactive:
-                if self.delete_session(session_id):
-                    count += 1
+            count = self.sweep_inactive_sessions(time.time() - (hours * 3600))["sessions"]
 
             if count > 0:
                 logger.info(f"✅ Cleaned up {count} inactive sessions")
@@ -0,0 +1,310 @@
+"""
+Session Archive for TRT System
+Cold tier for sessions evicted from Redis: compressed records in append-only
+segment files on local disk, found through an append-only index by session
+ID, so an idle client can resume long after its Redis keys are gone
+"""
+
+import fcntl
+import os
+import struct
+import threading
+import time
+import zlib
+import logging
+from contextlib import contextmanager
+from typing import Dict, List, NamedTuple, Optional
+from urllib.parse import quote, unquote
+
+import msgpack
+
+try:
+    import zstandard
+except ImportError:  # Compression is optional; uncompressed entries are always readable
+    zstandard = None
+
+logger = logging.getLogger(__name__)
+
+# Segment entry: header (magic, flags, payload length, CRC32 of the payload) | payload,
+# the payload being msgpack {session_id, archived_at, record, history}, zstd-compressed if FLAG_ZSTD
+_HEADER = struct.Struct(">2sBII")
+MAGIC = b"TA"
+FLAG_ZSTD = 0x01
+
+SEGMENT_PREFIX = "segment-"
+SEGMENT_SUFFIX = ".trta"
+
+# Index lines: <session_id, percent-encoded> TAB <segment> TAB <offset> TAB <length> TAB <archived_at>;
+# the last line for a session wins, segment -1 marks it removed
+INDEX_NAME = "index.log"
+LOCK_NAME = ".lock"
+_REMOVED = -1
+
+_local = threading.local()
+
+
+class SessionArchiveError(Exception):
+    """Raised for an archive entry that is corrupt or can't be read here"""
+    pass
+
+
+class ArchivedSession(NamedTuple):
+    """A session as archived: the store's encoded record plus its history entries, oldest first"""
+    session_id: str
+    record: bytes
+    history: List[bytes]
+    archived_at: float
+
+
+class _Location(NamedTuple):
+    segment: int
+    offset: int
+    length: int
+    archived_at: float
+
+
+def _codecs():
+    # zstd (de)compressor objects are not thread-safe; keep one pair per thread
+    if not hasattr(_local, "codecs"):
+        _local.codecs = (zstandard.ZstdCompressor(level=6), zstandard.ZstdDecompressor())
+    return _local.codecs
+
+
+class SessionArchive:
+    """
+    Append-only archive of session records in a local directory
+
+    Any number of processes may share the directory: appends and compaction
+    take an exclusive file lock, and readers pick up other processes' index
+    lines before each lookup.
+    """
+
+    def __init__(self, directory: str = None, segment_bytes: int = None, retention_seconds: float = None):
+        """
+        Args:
+            directory: Where segments and the index live (TRT_SESSION_ARCHIVE_DIR)
+            segment_bytes: Start a new segment past this size (TRT_SESSION_ARCHIVE_SEGMENT_MB)
+            retention_seconds: compact() drops sessions archived longer ago than this, 0 = keep
+                               (TRT_SESSION_ARCHIVE_RETENTION_DAYS)
+        """
+        if segment_bytes is None:
+            segment_bytes = int(float(os.getenv("TRT_SESSION_ARCHIVE_SEGMENT_MB", "64")) * 1024 * 1024)
+        if retention_seconds is None:
+            retention_seconds = float(os.getenv("TRT_SESSION_ARCHIVE_RETENTION_DAYS", "30")) * 86400
+
+        self.directory = directory or os.getenv("TRT_SESSION_ARCHIVE_DIR", "data/archive")
+        self.segment_bytes = segment_bytes
+        self.retention_seconds = retention_seconds
+        os.makedirs(self.directory, exist_ok=True)
+
+        self._lock = threading.Lock()
+        self._index: Dict[str, _Location] = {}
+        self._index_inode = None
+        self._index_position = 0
+
+    def _path(self, name: str) -> str:
+        return os.path.join(self.directory, name)
+
+    def _segment_path(self, segment: int) -> str:
+        return self._path(f"{SEGMENT_PREFIX}{segment:06d}{SEGMENT_SUFFIX}")
+
+    def _segments(self) -> List[int]:
+        return sorted(int(name[len(SEGMENT_PREFIX):-len(SEGMENT_SUFFIX)]) for name in os.listdir(self.directory)
+                      if name.startswith(SEGMENT_PREFIX) and name.endswith(SEGMENT_SUFFIX))
+
+    @contextmanager
+    def _exclusive(self):
+        """In-process and cross-process write lock"""
+        with self._lock, open(self._path(LOCK_NAME), "a") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _refresh(self):
+        """Apply index lines written since the last look (by any process); caller holds self._lock"""
+        try:
+            f = open(self._path(INDEX_NAME), "rb")
+        except FileNotFoundError:
+            self._index, self._index_inode, self._index_position = {}, None, 0
+            return
+        with f:
+            status = os.fstat(f.fileno())
+            if status.st_ino != self._index_inode or status.st_size < self._index_position:
+                # First look, or compaction replaced the file: read it all
+                self._index, self._index_inode, self._index_position = {}, status.st_ino, 0
+            f.seek(self._index_position)
+            data = f.read()
+        complete = data.rfind(b"\n") + 1  # A line being appended right now is read next time
+        for line in data[:complete].splitlines():
+            session_id, segment, offset, length, archived_at = line.decode("utf-8").split("\t")
+            if int(segment) == _REMOVED:
+                self._index.pop(unquote(session_id), None)
+            else:
+                self._index[unquote(session_id)] = _Location(int(segment), int(offset), int(length),
+                                                             float(archived_at))
+        self._index_position += complete
+
+    def _append_index(self, lines: List[str]):
+        with open(self._path(INDEX_NAME), "ab") as f:
+            f.write("".join(lines).encode("utf-8"))
+
+    @staticmethod
+    def _index_line(session_id: str, location: _Location) -> str:
+        return f"{quote(session_id, safe='')}\t{location.segment}\t{location.offset}\t" \
+               f"{location.length}\t{location.archived_at!r}\n"
+
+    @staticmethod
+    def _encode(session: ArchivedSession) -> bytes:
+        payload = msgpack.packb({"session_id": session.session_id, "archived_at": session.archived_at,
+                                 "record": session.record, "history": session.history}, use_bin_type=True)
+        flags = 0
+        if zstandard is not None:
+            payload = _codecs()[0].compress(payload)
+            flags |= FLAG_ZSTD
+        return _HEADER.pack(MAGIC, flags, len(payload), zlib.crc32(payload)) + payload
+
+    @staticmethod
+    def _decode(entry: bytes) -> ArchivedSession:
+        if len(entry) < _HEADER.size:
+            raise SessionArchiveError("Truncated archive entry")
+        magic, flags, length, crc = _HEADER.unpack_from(entry)
+        payload = entry[_HEADER.size:_HEADER.size + length]
+        if magic != MAGIC or len(payload) != length or zlib.crc32(payload) != crc:
+            raise SessionArchiveError("Corrupt archive entry")
+        if flags & FLAG_ZSTD:
+            if zstandard is None:
+                raise SessionArchiveError("Archive entry is zstd-compressed but zstandard is not installed")
+            payload = _codecs()[1].decompress(payload)
+        fields = msgpack.unpackb(payload, raw=False)
+        return ArchivedSession(fields["session_id"], fields["record"], fields["history"], fields["archived_at"])
+
+    def put_many(self, sessions: List[ArchivedSession]) -> int:
+        """
+        Append sessions to the current segment (one write, one index append), superseding earlier copies
+
+        Returns:
+            Bytes written
+        """
+        if not sessions:
+            return 0
+        entries = [self._encode(session) for session in sessions]
+        with self._exclusive():
+            segments = self._segments()
+            segment = segments[-1] if segments else 1
+            path = self._segment_path(segment)
+            if os.path.exists(path) and os.path.getsize(path) >= self.segment_bytes:
+                segment += 1
+                path = self._segment_path(segment)
+
+            with open(path, "ab") as f:
+                offset = f.seek(0, os.SEEK_END)
+                f.write(b"".join(entries))
+                f.flush()
+                os.fsync(f.fileno())
+
+            lines = []
+            for session, entry in zip(sessions, entries):
+                lines.append(self._index_line(session.session_id,
+                                              _Location(segment, offset, len(entry), session.archived_at)))
+                offset += len(entry)
+            self._append_index(lines)
+            self._refresh()
+        return sum(len(entry) for entry in entries)
+
+    def put(self, session: ArchivedSession) -> int:
+        return self.put_many([session])
+
+    def get(self, session_id: str) -> Optional[ArchivedSession]:
+        """
+        The archived copy of a session, or None
+
+        Raises:
+            SessionArchiveError if the entry can't be read
+        """
+        with self._lock:
+            self._refresh()
+            location = self._index.get(session_id)
+        if location is None:
+            return None
+        try:
+            with open(self._segment_path(location.segment), "rb") as f:
+                f.seek(location.offset)
+                entry = f.read(location.length)
+        except FileNotFoundError as e:
+            raise SessionArchiveError(f"Archive segment {location.segment} is missing") from e
+        return self._decode(entry)
+
+    def contains(self, session_id: str) -> bool:
+        with self._lock:
+            self._refresh()
+            return session_id in self._index
+
+    def remove(self, session_id: str) -> bool:
+        """
+        Drop a session from the archive (its bytes go at the next compact())
+
+        Returns:
+            True if it was archived
+        """
+        with self._exclusive():
+            self._refresh()
+            if session_id not in self._index:
+                return False
+            self._append_index([self._index_line(session_id, _Location(_REMOVED, 0, 0, time.time()))])
+            self._refresh()
+        return True
+
+    def compact(self) -> Dict:
+        """
+        Drop sessions past retention, rewrite the index with live entries only
+        and delete segments no live entry points into (never the newest)
+
+        Returns:
+            Dict with sessions expired and segments / bytes reclaimed
+        """
+        with self._exclusive():
+            self._refresh()
+            expired = []
+            if self.retention_seconds > 0:
+                cutoff = time.time() - self.retention_seconds
+                expired = [session_id for session_id, location in self._index.items()
+                           if location.archived_at < cutoff]
+            for session_id in expired:
+                del self._index[session_id]
+
+            tmp_path = self._path(f"{INDEX_NAME}.{os.getpid()}.tmp")
+            with open(tmp_path, "wb") as f:
+                f.write("".join(self._index_line(session_id, location)
+                                for session_id, location in self._index.items()).encode("utf-8"))
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, self._path(INDEX_NAME))
+            self._refresh()
+
+            live = {location.segment for location in self._index.values()}
+            segments = self._segments()
+            dead = [segment for segment in segments[:-1] if segment not in live]
+            reclaimed = 0
+            for segment in dead:
+                reclaimed += os.path.getsize(self._segment_path(segment))
+                os.remove(self._segment_path(segment))
+            dropped = len(dead)
+
+        if expired or dropped:
+            logger.info(f"✅ Session archive compacted: {len(expired)} sessions past retention, "
+                        f"{dropped} segments ({reclaimed} bytes) reclaimed")
+        return {"expired": len(expired), "segments_dropped": dropped, "bytes_reclaimed": reclaimed}
+
+    def stats(self) -> Dict:
+        """Archive size for /health"""
+        with self._lock:
+            self._refresh()
+            sessions = len(self._index)
+        segments = self._segments()
+        return {
+            "sessions": sessions,
+            "segments": len(segments),
+            "bytes": sum(os.path.getsize(self._segment_path(segment)) for segment in segments)
+        }
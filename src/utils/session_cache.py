@@ -0,0 +1,105 @@
+"""
+In-Process Session Cache for TRT System
+Bounded LRU of deserialized sessions in front of Redis, keyed by the version
+counter Redis bumps on every commit, so a worker serving consecutive turns
+of a session skips the full state fetch and decode
+"""
+
+import os
+import threading
+import time
+import logging
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+
+from src.utils.metrics import get_metrics
+
+logger = logging.getLogger(__name__)
+
+
+class SessionCache:
+    """
+    Write-through L1 cache: session_id -> (record, version)
+
+    Entries are only served after the caller confirms the version still
+    matches Redis; the TTL bounds how long an idle session's state is held.
+    """
+
+    def __init__(self, max_entries: int = None, ttl_seconds: float = None):
+        """
+        Args:
+            max_entries: Sessions kept per worker, least recently used evicted first;
+                         0 disables the cache (TRT_SESSION_CACHE_SIZE)
+            ttl_seconds: Drop entries not used for this long (TRT_SESSION_CACHE_TTL_SECONDS)
+        """
+        if max_entries is None:
+            max_entries = int(os.getenv("TRT_SESSION_CACHE_SIZE", "1000"))
+        if ttl_seconds is None:
+            ttl_seconds = float(os.getenv("TRT_SESSION_CACHE_TTL_SECONDS", "300"))
+
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.metrics = get_metrics()
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[str, Tuple[object, int, float]]" = OrderedDict()  # -> (record, version, expires_at)
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_entries > 0
+
+    def peek(self, session_id: str) -> Optional[Tuple[object, int]]:
+        """Cached (record, version) to validate against Redis, or None"""
+        if not self.enabled:
+            return None
+        with self._lock:
+            entry = self._entries.get(session_id)
+            if entry is None:
+                return None
+            record, version, expires_at = entry
+            if expires_at <= time.monotonic():
+                del self._entries[session_id]
+                return None
+            return record, version
+
+    def hit(self, session_id: str):
+        """The cached entry was current: refresh its recency and TTL"""
+        with self._lock:
+            entry = self._entries.get(session_id)
+            if entry is not None:
+                self._entries[session_id] = (entry[0], entry[1], time.monotonic() + self.ttl_seconds)
+                self._entries.move_to_end(session_id)
+        self.metrics.increment("session_cache_hits_total")
+
+    def miss(self, session_id: str, stale: bool = False):
+        """Not cached (or, if stale, written by another worker since): drop any entry"""
+        self.invalidate(session_id)
+        self.metrics.increment("session_cache_misses_total", labels={"reason": "stale" if stale else "absent"})
+
+    def put(self, session_id: str, record, version: int):
+        """Cache a record as of `version` (a version of 0 is never cached)"""
+        if not self.enabled or not version:
+            return
+        with self._lock:
+            self._entries[session_id] = (record, version, time.monotonic() + self.ttl_seconds)
+            self._entries.move_to_end(session_id)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.metrics.increment("session_cache_evictions_total")
+
+    def invalidate(self, session_id: str):
+        with self._lock:
+            self._entries.pop(session_id, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict:
+        hits = self.metrics.get_counter("session_cache_hits_total")
+        misses = sum(self.metrics.get_counter("session_cache_misses_total", labels={"reason": reason})
+                     for reason in ("absent", "stale"))
+        return {
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "hit_rate": round(hits / (hits + misses), 3) if hits + misses else None
+        }
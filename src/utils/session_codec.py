@@ -0,0 +1,152 @@
+"""
+Session State Codec for TRT System
+Versioned binary serialization of the complete TRTSessionState (msgpack,
+zstd-compressed when large), so a session survives a trip through Redis or
+disk with every field intact
+"""
+
+import enum
+import os
+import threading
+import logging
+from datetime import datetime
+from typing import Callable, Dict
+
+import msgpack
+
+try:
+    import zstandard
+except ImportError:  # Compression is optional; uncompressed blobs are always readable
+    zstandard = None
+
+from src.core.session_state_manager import TRTSessionState
+
+logger = logging.getLogger(__name__)
+
+# Blob layout: MAGIC | format version (1 byte) | flags (1 byte) | msgpack payload
+MAGIC = b"TS"
+FORMAT_VERSION = 1
+FLAG_ZSTD = 0x01
+_HEADER_SIZE = len(MAGIC) + 2
+
+# Version of the field layout inside the payload. Bump it when a field is
+# renamed or changes meaning, and register a migration from the old version.
+# Added fields need no bump: older blobs simply get the constructor default.
+SCHEMA_VERSION = 1
+
+# schema version N -> function upgrading N's field dict to N + 1
+_MIGRATIONS: Dict[int, Callable[[Dict], Dict]] = {}
+
+# msgpack extension types for values msgpack has no native form for
+# (tuples are packed natively, as lists)
+_EXT_SET = 1
+_EXT_DATETIME = 2
+
+_local = threading.local()
+
+
+class SessionCodecError(Exception):
+    """Raised for blobs that are not session state or come from a newer format"""
+    pass
+
+
+def _compression_min_bytes() -> int:
+    return int(os.getenv("TRT_STATE_COMPRESSION_MIN_BYTES", "512"))
+
+
+def _compressor():
+    # zstd (de)compressor objects are not thread-safe; keep one per thread
+    if not hasattr(_local, "compressor"):
+        _local.compressor = zstandard.ZstdCompressor(level=3)
+        _local.decompressor = zstandard.ZstdDecompressor()
+    return _local.compressor, _local.decompressor
+
+
+def _default(value):
+    """Encode values msgpack doesn't handle natively"""
+    if isinstance(value, (set, frozenset)):
+        return msgpack.ExtType(_EXT_SET, _pack(sorted(value, key=repr)))
+    if isinstance(value, datetime):
+        return msgpack.ExtType(_EXT_DATETIME, value.isoformat().encode("utf-8"))
+    if isinstance(value, enum.Enum):
+        return value.value
+    # Anything else (e.g. an object an agent left in navigation_output) is kept as text
+    logger.debug(f"Session codec storing {type(value).__name__} as text")
+    return str(value)
+
+
+def _ext_hook(code: int, data: bytes):
+    if code == _EXT_SET:
+        return set(_unpack(data))
+    if code == _EXT_DATETIME:
+        return datetime.fromisoformat(data.decode("utf-8"))
+    return msgpack.ExtType(code, data)
+
+
+def _pack(value) -> bytes:
+    return msgpack.packb(value, default=_default, use_bin_type=True)
+
+
+def _unpack(data: bytes):
+    return msgpack.unpackb(data, ext_hook=_ext_hook, raw=False, strict_map_key=False)
+
+
+def encode_state(session_state: TRTSessionState, compress: bool = None) -> bytes:
+    """
+    Serialize every attribute of a session state
+
+    Args:
+        session_state: State to serialize
+        compress: Force zstd on/off (default: compress payloads of
+                  TRT_STATE_COMPRESSION_MIN_BYTES or more, if zstandard is installed)
+
+    Returns:
+        Self-describing blob for decode_state()
+    """
+    payload = _pack({"schema": SCHEMA_VERSION, "fields": vars(session_state)})
+
+    if compress is None:
+        compress = zstandard is not None and len(payload) >= _compression_min_bytes()
+    flags = 0
+    if compress:
+        if zstandard is None:
+            raise SessionCodecError("zstd compression requested but zstandard is not installed")
+        payload = _compressor()[0].compress(payload)
+        flags |= FLAG_ZSTD
+
+    return MAGIC + bytes([FORMAT_VERSION, flags]) + payload
+
+
+def decode_state(blob: bytes) -> TRTSessionState:
+    """
+    Rebuild a session state from encode_state() output (of this or any older schema)
+
+    Raises:
+        SessionCodecError if the blob is not a session state this code can read
+    """
+    if len(blob) < _HEADER_SIZE or not blob.startswith(MAGIC):
+        raise SessionCodecError("Not a session state blob")
+    version, flags = blob[len(MAGIC)], blob[len(MAGIC) + 1]
+    if version > FORMAT_VERSION:
+        raise SessionCodecError(f"Session state format {version} is newer than supported ({FORMAT_VERSION})")
+
+    payload = blob[_HEADER_SIZE:]
+    if flags & FLAG_ZSTD:
+        if zstandard is None:
+            raise SessionCodecError("Session state is zstd-compressed but zstandard is not installed")
+        payload = _compressor()[1].decompress(payload)
+
+    document = _unpack(payload)
+    schema, fields = document["schema"], document["fields"]
+    if schema > SCHEMA_VERSION:
+        raise SessionCodecError(f"Session state schema {schema} is newer than supported ({SCHEMA_VERSION})")
+    while schema < SCHEMA_VERSION:
+        fields = _MIGRATIONS[schema](fields)
+        schema += 1
+
+    # Start from the constructor defaults so fields added since the blob was
+    # written get their initial value; unknown (newer) fields are kept as-is
+    session_state = TRTSessionState(fields.get("session_id"))
+    for name, value in fields.items():
+        setattr(session_state, name, value)
+    return session_state
@@ -0,0 +1,148 @@
+"""
+Session State Events for TRT System
+A turn's changes to TRTSessionState as small typed events: found by diffing
+the state against what it was loaded from, replayed onto the last snapshot
+when the session is loaded, and kept as the session's audit trail
+"""
+
+import weakref
+from typing import Any, Dict, Iterable, List, NamedTuple, Optional
+
+from src.core.session_state_manager import TRTSessionState
+from src.utils.session_codec import decode_state, _pack, _unpack
+
+# Event kinds
+SET = "set"          # field = value
+SET_KEY = "set_key"  # field[key] = value (dict fields, e.g. stage_1_completion)
+APPEND = "append"    # list field extended by value (the new items)
+ADD = "add"          # set field gained value (the new members)
+RESET = "reset"      # every field replaced by value (a dict): creation, or a write without a known base
+
+# Batch layout: msgpack {"format": EVENTS_FORMAT, "events": [[kind, field, value, key], ...]}
+EVENTS_FORMAT = 1
+
+
+class SessionEventError(Exception):
+    """Raised for an event batch this code can't read or apply"""
+    pass
+
+
+class StateEvent(NamedTuple):
+    """One change to a session state"""
+    kind: str
+    field: Optional[str] = None
+    value: Any = None
+    key: Any = None
+
+
+class StateBase(NamedTuple):
+    """What a loaded (or just written) state is stored as: snapshot blob plus the event batches since"""
+    snapshot: bytes
+    batches: List[bytes]
+    version: int
+
+
+# Loaded state -> its StateBase (dropped with the state object)
+_bases: "weakref.WeakKeyDictionary[TRTSessionState, StateBase]" = weakref.WeakKeyDictionary()
+
+
+def encode_events(events: List[StateEvent]) -> bytes:
+    return _pack({"format": EVENTS_FORMAT, "events": [list(event) for event in events]})
+
+
+def decode_events(batch: bytes) -> List[StateEvent]:
+    """
+    Raises:
+        SessionEventError if the batch comes from a newer format or is damaged
+    """
+    try:
+        document = _unpack(batch)
+        if document["format"] > EVENTS_FORMAT:
+            raise SessionEventError(f"Event format {document['format']} is newer than supported ({EVENTS_FORMAT})")
+        return [StateEvent(*event) for event in document["events"]]
+    except (ValueError, TypeError, KeyError) as e:
+        raise SessionEventError(f"Unreadable event batch: {e}") from e
+
+
+def _same(old, new) -> bool:
+    if old == new and type(old) is type(new):
+        return True
+    # Equal once stored (e.g. a tuple and the list it comes back as)
+    return _pack(old) == _pack(new)
+
+
+def _field_events(name: str, old, new) -> List[StateEvent]:
+    if isinstance(old, dict) and isinstance(new, dict) and old.keys() <= new.keys():
+        return [StateEvent(SET_KEY, name, value, key) for key, value in new.items()
+                if key not in old or not _same(old[key], value)]
+    if isinstance(old, list) and isinstance(new, list) and len(new) > len(old) and _same(new[:len(old)], old):
+        return [StateEvent(APPEND, name, new[len(old):])]
+    if isinstance(old, set) and isinstance(new, set) and old < new:
+        return [StateEvent(ADD, name, new - old)]
+    return [] if _same(old, new) else [StateEvent(SET, name, new)]
+
+
+def diff_fields(before: Dict, after: Dict) -> List[StateEvent]:
+    """Events turning the `before` fields into the `after` fields"""
+    events = []
+    for name, value in after.items():
+        if name not in before:
+            events.append(StateEvent(SET, name, value))
+        elif not (before[name] is value or (before[name] == value and type(before[name]) is type(value))):
+            events += _field_events(name, before[name], value)
+    return events
+
+
+def reset_event(session_state: TRTSessionState) -> StateEvent:
+    return StateEvent(RESET, value=dict(vars(session_state)))
+
+
+def apply_events(session_state: TRTSessionState, events: Iterable[StateEvent]):
+    """Apply decoded events, in order (their values become part of the state)"""
+    for event in events:
+        if event.kind == SET:
+            setattr(session_state, event.field, event.value)
+        elif event.kind == SET_KEY:
+            getattr(session_state, event.field)[event.key] = event.value
+        elif event.kind == APPEND:
+            getattr(session_state, event.field).extend(event.value)
+        elif event.kind == ADD:
+            getattr(session_state, event.field).update(event.value)
+        elif event.kind == RESET:
+            # Constructor defaults first, as decode_state does, then every recorded field
+            fields = vars(session_state)
+            fields.clear()
+            fields.update(vars(TRTSessionState(event.value.get("session_id"))))
+            fields.update(event.value)
+        else:
+            raise SessionEventError(f"Unknown session event kind: {event.kind}")
+
+
+def replay(snapshot: bytes, batches: Iterable[bytes]) -> TRTSessionState:
+    """State from a snapshot blob plus the event batches logged after it"""
+    session_state = decode_state(snapshot)
+    for batch in batches:
+        apply_events(session_state, decode_events(batch))
+    return session_state
+
+
+def track(session_state: TRTSessionState, snapshot: bytes, batches: List[bytes], version: int):
+    """Remember what a state was loaded from (or written as), for state_changes()"""
+    _bases[session_state] = StateBase(snapshot, list(batches), version)
+
+
+def base_of(session_state: TRTSessionState) -> Optional[StateBase]:
+    return _bases.get(session_state)
+
+
+def state_changes(session_state: TRTSessionState) -> Optional[List[StateEvent]]:
+    """
+    Events since the state was loaded or last written
+
+    Returns:
+        The events (possibly none), or None if the state's base is unknown
+    """
+    base = _bases.get(session_state)
+    if base is None:
+        return None
+    return diff_fields(vars(replay(base.snapshot, base.batches)), vars(session_state))
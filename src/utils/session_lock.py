@@ -0,0 +1,372 @@
+"""
+Per-Session Turn Lock for TRT System
+Serializes turns for one session across uvicorn workers and replicas with a
+Redis lease lock; each lease carries a fencing token so a writer whose lease
+expired cannot overwrite a newer turn's state
+"""
+
+import asyncio
+import os
+import random
+import threading
+import time
+import uuid
+import logging
+from abc import ABC, abstractmethod
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from typing import Callable, Dict, Optional, Tuple
+
+from src.utils.metrics import get_metrics
+from src.utils.redis_keys import session_key
+
+logger = logging.getLogger(__name__)
+
+POLICY_QUEUE = "queue"    # Wait (up to wait_seconds) for the session's current turn to finish
+POLICY_REJECT = "reject"  # Fail straight away if a turn is running
+
+# Take the lock and hand out the next fencing token in one step. The fence
+# outlives the session's state (ARGV[3] ms from the last turn), so it is
+# never reset under a state that still carries a token.
+_ACQUIRE_SCRIPT = """
+if redis.call('SET', KEYS[1], ARGV[1], 'NX', 'PX', ARGV[2]) then
+    local token = redis.call('INCR', KEYS[2])
+    redis.call('PEXPIRE', KEYS[2], ARGV[3])
+    return token
+end
+return 0
+"""
+
+# Delete / extend the lock only if we still own it
+_RELEASE_SCRIPT = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('DEL', KEYS[1])
+end
+return 0
+"""
+
+_EXTEND_SCRIPT = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('PEXPIRE', KEYS[1], ARGV[2])
+end
+return 0
+"""
+
+
+class SessionBusyError(Exception):
+    """Raised when another turn holds the session lock longer than we may wait"""
+    pass
+
+
+@dataclass
+class SessionLease:
+    """A held session lock"""
+    session_id: str
+    owner: str
+    fencing_token: int
+    expires_at: float
+    acquired_at: float = field(default_factory=time.monotonic)
+
+
+class _SessionLockBase(ABC):
+    """Shared policy handling for the Redis and local locks"""
+
+    def __init__(self, lease_seconds: float = None, wait_seconds: float = None, policy: str = None):
+        """
+        Args:
+            lease_seconds: Lock expiry, renewed by keep_alive() while a turn runs
+                           (TRT_SESSION_LOCK_LEASE_SECONDS)
+            wait_seconds: Max wait for a busy session under the queue policy (TRT_SESSION_LOCK_WAIT_SECONDS)
+            policy: 'queue' or 'reject' (TRT_SESSION_LOCK_POLICY)
+        """
+        if lease_seconds is None:
+            lease_seconds = float(os.getenv("TRT_SESSION_LOCK_LEASE_SECONDS", "60"))
+        if wait_seconds is None:
+            wait_seconds = float(os.getenv("TRT_SESSION_LOCK_WAIT_SECONDS", "30"))
+        if policy is None:
+            policy = os.getenv("TRT_SESSION_LOCK_POLICY", POLICY_QUEUE).lower()
+        if policy not in (POLICY_QUEUE, POLICY_REJECT):
+            raise ValueError(f"Unknown session lock policy: {policy}")
+
+        self.lease_seconds = lease_seconds
+        self.wait_seconds = wait_seconds
+        self.policy = policy
+        self.metrics = get_metrics()
+
+    def acquire(self, session_id: str, wait_seconds: float = None) -> SessionLease:
+        """
+        Take the session lock
+
+        Args:
+            session_id: Session whose turns are being serialized
+            wait_seconds: Override the policy's wait (0 = don't wait)
+
+        Returns:
+            The lease; pass it to release() and to fenced writes
+
+        Raises:
+            SessionBusyError if the lock could not be taken in time
+        """
+        start = time.monotonic()
+        deadline = start + self._wait_seconds(wait_seconds)
+        delay = 0.01
+        while True:
+            lease = self._try_acquire(session_id)
+            if lease is not None:
+                return self._granted(lease, start)
+            pause, delay = self._backoff(session_id, deadline, delay)
+            time.sleep(pause)
+
+    async def acquire_async(self, session_id: str, wait_seconds: float = None) -> SessionLease:
+        """
+        Take the session lock from the event loop (see acquire)
+
+        Waiting sleeps on the loop instead of holding a worker thread, so
+        turns queued behind a busy session don't starve the threadpool.
+        """
+        start = time.monotonic()
+        deadline = start + self._wait_seconds(wait_seconds)
+        delay = 0.01
+        while True:
+            lease = await self._try_acquire_async(session_id)
+            if lease is not None:
+                return self._granted(lease, start)
+            pause, delay = self._backoff(session_id, deadline, delay)
+            await asyncio.sleep(pause)
+
+    def _wait_seconds(self, wait_seconds: Optional[float]) -> float:
+        if wait_seconds is None:
+            return self.wait_seconds if self.policy == POLICY_QUEUE else 0.0
+        return wait_seconds
+
+    def _granted(self, lease: SessionLease, start: float) -> SessionLease:
+        waited = time.monotonic() - start
+        self.metrics.observe("session_lock_wait_seconds", waited)
+        if waited > 0.05:
+            self.metrics.increment("session_lock_contended_total")
+        return lease
+
+    def _backoff(self, session_id: str, deadline: float, delay: float) -> Tuple[float, float]:
+        """
+        (how long to wait before the next try, the delay after that)
+
+        Raises:
+            SessionBusyError once the deadline has passed
+        """
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            self.metrics.increment("session_lock_busy_total", labels={"policy": self.policy})
+            raise SessionBusyError(f"Session {session_id} is busy with another turn")
+        # Jittered backoff so waiters on different workers don't poll in lockstep
+        return min(remaining, delay * random.uniform(0.5, 1.5)), min(delay * 2, 0.2)
+
+    def release(self, lease: SessionLease) -> bool:
+        """
+        Release a lease
+
+        Returns:
+            False if the lease had already expired (another turn may have run meanwhile)
+        """
+        return self._released(lease, self._release(lease))
+
+    async def release_async(self, lease: SessionLease) -> bool:
+        """Release a lease from the event loop (see release)"""
+        return self._released(lease, await self._release_async(lease))
+
+    def _released(self, lease: SessionLease, released: bool) -> bool:
+        self.metrics.observe("session_lock_held_seconds", time.monotonic() - lease.acquired_at)
+        if not released:
+            self.metrics.increment("session_lock_expired_total")
+            logger.warning(f"⚠️ Session lock for {lease.session_id} expired before release "
+                           f"(fencing token {lease.fencing_token})")
+        return released
+
+    def extend(self, lease: SessionLease, lease_seconds: float = None) -> bool:
+        """Push the lease expiry out (for long turns); False if it was already lost"""
+        lease_seconds = lease_seconds or self.lease_seconds
+        return self._extended(lease, lease_seconds, self._extend(lease, lease_seconds))
+
+    async def extend_async(self, lease: SessionLease, lease_seconds: float = None) -> bool:
+        """Push the lease expiry out from the event loop (see extend)"""
+        lease_seconds = lease_seconds or self.lease_seconds
+        return self._extended(lease, lease_seconds, await self._extend_async(lease, lease_seconds))
+
+    def _extended(self, lease: SessionLease, lease_seconds: float, extended: bool) -> bool:
+        if extended:
+            lease.expires_at = time.monotonic() + lease_seconds
+        return extended
+
+    async def keep_alive(self, lease: SessionLease):
+        """
+        Renew the lease every third of its length until cancelled (run it as a
+        task for the duration of the turn), so a long turn keeps the session
+        and its fenced commit isn't refused after all the work is done
+        """
+        while True:
+            await asyncio.sleep(self.lease_seconds / 3)
+            try:
+                renewed = await self.extend_async(lease)
+            except Exception as e:
+                # Redis hiccup: the lease still has two thirds left, try again next time
+                logger.warning(f"⚠️ Could not renew session lock for {lease.session_id}: {e}")
+                continue
+            if not renewed:
+                self.metrics.increment("session_lock_expired_total")
+                logger.warning(f"⚠️ Session lock for {lease.session_id} expired mid-turn "
+                               f"(fencing token {lease.fencing_token})")
+                return
+
+    @contextmanager
+    def hold(self, session_id: str, wait_seconds: float = None):
+        """Hold the session lock for the duration of the block"""
+        lease = self.acquire(session_id, wait_seconds)
+        try:
+            yield lease
+        finally:
+            self.release(lease)
+
+    @abstractmethod
+    def _try_acquire(self, session_id: str) -> Optional[SessionLease]:
+        """Take the lock if it is free (None if another lease holds it)"""
+
+    @abstractmethod
+    def _release(self, lease: SessionLease) -> bool:
+        """Drop the lock if this lease still holds it"""
+
+    @abstractmethod
+    def _extend(self, lease: SessionLease, lease_seconds: float) -> bool:
+        """Reset the lock's expiry if this lease still holds it"""
+
+    async def _try_acquire_async(self, session_id: str) -> Optional[SessionLease]:
+        # In-process: never blocks
+        return self._try_acquire(session_id)
+
+    async def _release_async(self, lease: SessionLease) -> bool:
+        return self._release(lease)
+
+    async def _extend_async(self, lease: SessionLease, lease_seconds: float) -> bool:
+        return self._extend(lease, lease_seconds)
+
+
+class RedisSessionLock(_SessionLockBase):
+    """
+    Lease lock in Redis (SET NX PX) shared by every worker and replica
+
+    Keys:
+        trt:session:{id}:lock   owner id of the current lease (expires after lease_seconds)
+        trt:session:{id}:fence  monotonically increasing fencing token (expires
+                                fence_ttl_seconds after the session's last turn)
+    Both carry the session's hash tag, so the acquire script is cluster-safe.
+    """
+
+    def __init__(self, redis_client, async_redis: Callable[[], object] = None, fence_ttl_seconds: float = None,
+                 **kwargs):
+        """
+        Args:
+            redis_client: Redis client (blocking calls)
+            async_redis: Returns an asyncio Redis client for the running loop, used by
+                         acquire_async/release_async (default: the blocking client on a thread)
+            fence_ttl_seconds: Fence expiry after a turn; at least the session TTL
+                               (TRT_SESSION_FENCE_TTL_SECONDS, default the 24h session TTL)
+        """
+        super().__init__(**kwargs)
+        if fence_ttl_seconds is None:
+            fence_ttl_seconds = float(os.getenv("TRT_SESSION_FENCE_TTL_SECONDS", "86400"))
+        self.redis = redis_client
+        self.async_redis = async_redis
+        # The state's TTL is refreshed by the commit, up to a lease after the acquire
+        self.fence_ttl_ms = int((fence_ttl_seconds + self.lease_seconds) * 1000)
+        self._acquire = redis_client.register_script(_ACQUIRE_SCRIPT)
+        self._release_script = redis_client.register_script(_RELEASE_SCRIPT)
+        self._extend_script = redis_client.register_script(_EXTEND_SCRIPT)
+
+    @staticmethod
+    def lock_key(session_id: str) -> str:
+        return session_key(session_id, "lock")
+
+    @staticmethod
+    def fence_key(session_id: str) -> str:
+        return session_key(session_id, "fence")
+
+    def _try_acquire(self, session_id: str) -> Optional[SessionLease]:
+        owner = uuid.uuid4().hex
+        token = int(self._acquire(
+            keys=[self.lock_key(session_id), self.fence_key(session_id)],
+            args=[owner, int(self.lease_seconds * 1000), self.fence_ttl_ms]
+        ))
+        return self._lease(session_id, owner, token)
+
+    def _lease(self, session_id: str, owner: str, token: int) -> Optional[SessionLease]:
+        if not token:
+            return None
+        return SessionLease(session_id, owner, token, time.monotonic() + self.lease_seconds)
+
+    def _release(self, lease: SessionLease) -> bool:
+        return bool(self._release_script(keys=[self.lock_key(lease.session_id)], args=[lease.owner]))
+
+    async def _try_acquire_async(self, session_id: str) -> Optional[SessionLease]:
+        if self.async_redis is None:
+            return await asyncio.to_thread(self._try_acquire, session_id)
+        owner = uuid.uuid4().hex
+        token = int(await self.async_redis().eval(
+            _ACQUIRE_SCRIPT, 2, self.lock_key(session_id), self.fence_key(session_id),
+            owner, int(self.lease_seconds * 1000), self.fence_ttl_ms
+        ))
+        return self._lease(session_id, owner, token)
+
+    async def _release_async(self, lease: SessionLease) -> bool:
+        if self.async_redis is None:
+            return await asyncio.to_thread(self._release, lease)
+        return bool(await self.async_redis().eval(_RELEASE_SCRIPT, 1, self.lock_key(lease.session_id), lease.owner))
+
+    def _extend(self, lease: SessionLease, lease_seconds: float) -> bool:
+        return bool(self._extend_script(keys=[self.lock_key(lease.session_id)],
+                                        args=[lease.owner, int(lease_seconds * 1000)]))
+
+    async def _extend_async(self, lease: SessionLease, lease_seconds: float) -> bool:
+        if self.async_redis is None:
+            return await asyncio.to_thread(self._extend, lease, lease_seconds)
+        return bool(await self.async_redis().eval(_EXTEND_SCRIPT, 1, self.lock_key(lease.session_id),
+                                                  lease.owner, int(lease_seconds * 1000)))
+
+
+class LocalSessionLock(_SessionLockBase):
+    """In-process fallback when Redis is not configured (single worker only)"""
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self._lock = threading.Lock()
+        self._held: Dict[str, SessionLease] = {}
+        self._fences: Dict[str, int] = {}
+
+    def _try_acquire(self, session_id: str) -> Optional[SessionLease]:
+        with self._lock:
+            current = self._held.get(session_id)
+            if current is not None and current.expires_at > time.monotonic():
+                return None
+            token = self._fences.get(session_id, 0) + 1
+            self._fences[session_id] = token
+            lease = SessionLease(session_id, uuid.uuid4().hex, token, time.monotonic() + self.lease_seconds)
+            self._held[session_id] = lease
+            return lease
+
+    def _release(self, lease: SessionLease) -> bool:
+        with self._lock:
+            if self._held.get(lease.session_id) is not lease:
+                return False
+            del self._held[lease.session_id]
+            return lease.expires_at > time.monotonic()
+
+    def _extend(self, lease: SessionLease, lease_seconds: float) -> bool:
+        with self._lock:
+            if self._held.get(lease.session_id) is not lease or lease.expires_at <= time.monotonic():
+                return False
+            lease.expires_at = time.monotonic() + lease_seconds
+            return True
+
+
+def create_session_lock(redis_client=None, async_redis: Callable[[], object] = None, **kwargs) -> _SessionLockBase:
+    """Redis lock when a Redis client is available, otherwise the in-process lock"""
+    if redis_client is not None:
+        return RedisSessionLock(redis_client, async_redis=async_redis, **kwargs)
+    return LocalSessionLock(**kwargs)
@@ -0,0 +1,117 @@
+"""
+Session Spill for TRT System
+Local SQLite file (WAL) holding the sessions the bounded in-memory store
+evicted, so they come back on the next load instead of being lost
+"""
+
+import json
+import sqlite3
+import threading
+import logging
+from typing import Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS spilled_sessions (
+    session_id TEXT PRIMARY KEY,
+    last_active REAL NOT NULL,
+    substate TEXT NOT NULL,
+    summary TEXT NOT NULL,
+    record BLOB NOT NULL
+);
+CREATE INDEX IF NOT EXISTS spilled_sessions_by_activity ON spilled_sessions (last_active, session_id);
+"""
+
+
+class SessionSpill:
+    """
+    Evicted sessions keyed by ID, with the summary fields a listing needs
+    (so listing never decodes a spilled record)
+    """
+
+    def __init__(self, path: str):
+        """
+        Args:
+            path: SQLite file (created if missing)
+        """
+        self.path = path
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        # A spilled session is a cache overflow, not the only copy of a commit: skip the per-write fsync
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.executescript(_SCHEMA)
+
+    def put(self, session_id: str, last_active: float, substate: str, summary: Dict, record: bytes):
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO spilled_sessions (session_id, last_active, substate, summary, record) "
+                "VALUES (?, ?, ?, ?, ?)", (session_id, last_active, substate, json.dumps(summary), record))
+
+    def take(self, session_id: str) -> Optional[bytes]:
+        """Remove a session from the spill and return its encoded record (None if not spilled)"""
+        with self._lock:
+            row = self._db.execute("DELETE FROM spilled_sessions WHERE session_id = ? RETURNING record",
+                                   (session_id,)).fetchone()
+        return row[0] if row else None
+
+    def contains(self, session_id: str) -> bool:
+        with self._lock:
+            return self._db.execute("SELECT 1 FROM spilled_sessions WHERE session_id = ?",
+                                    (session_id,)).fetchone() is not None
+
+    def delete(self, session_id: str) -> bool:
+        with self._lock:
+            return self._db.execute("DELETE FROM spilled_sessions WHERE session_id = ?",
+                                    (session_id,)).rowcount > 0
+
+    def count(self) -> int:
+        with self._lock:
+            return self._db.execute("SELECT COUNT(*) FROM spilled_sessions").fetchone()[0]
+
+    def page(self, limit: int, after: Tuple[float, str] = None, substate: str = None, since: float = None,
+             before: float = None) -> Tuple[List[Tuple[float, str, Dict]], int]:
+        """
+        Spilled sessions' summaries, most recently active first
+
+        Returns:
+            (up to limit (last active, session_id, summary) past the cursor, sessions matching the filters)
+        """
+        conditions, params = [], []
+        if substate is not None:
+            conditions.append("substate = ?")
+            params.append(substate)
+        if since is not None:
+            conditions.append("last_active >= ?")
+            params.append(since)
+        if before is not None:
+            conditions.append("last_active < ?")
+            params.append(before)
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+        cursor_where = where
+        cursor_params = list(params)
+        if after is not None:
+            cursor_where = f"{where} {'AND' if where else 'WHERE'} (last_active, session_id) < (?, ?)"
+            cursor_params += list(after)
+
+        with self._lock:
+            total = self._db.execute(f"SELECT COUNT(*) FROM spilled_sessions {where}", params).fetchone()[0]
+            rows = self._db.execute(
+                f"SELECT last_active, session_id, summary FROM spilled_sessions {cursor_where} "
+                f"ORDER BY last_active DESC, session_id DESC LIMIT ?", cursor_params + [limit]).fetchall()
+        return [(last_active, session_id, json.loads(summary)) for last_active, session_id, summary in rows], total
+
+    def prune(self, cutoff: float) -> int:
+        """
+        Drop sessions last active before `cutoff`
+
+        Returns:
+            Number of sessions dropped
+        """
+        with self._lock:
+            return self._db.execute("DELETE FROM spilled_sessions WHERE last_active < ?", (cutoff,)).rowcount
+
+    def close(self):
+        with self._lock:
+            self._db.close()
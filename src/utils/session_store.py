@@ -0,0 +1,909 @@
+"""
+Session Store for TRT System
+One interface for session persistence used by every API endpoint, with
+Redis (shared by all workers and replicas), in-memory and on-disk backends
+"""
+
+import asyncio
+import base64
+import binascii
+import functools
+import json
+import os
+import threading
+import time
+import logging
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import quote
+
+import msgpack
+
+from src.core.session_state_manager import TRTSessionState
+from src.utils.session_codec import encode_state, decode_state
+from src.utils.session_cache import SessionCache
+from src.utils.session_spill import SessionSpill
+from src.utils.session_archive import SessionArchive, ArchivedSession, SessionArchiveError
+from src.utils.redis_keys import all_buckets
+from src.utils.metrics import get_metrics
+
+logger = logging.getLogger(__name__)
+
+BACKEND_REDIS = "redis"
+BACKEND_MEMORY = "memory"
+BACKEND_DISK = "disk"
+BACKEND_SQLITE = "sqlite"
+
+# Estimated heap use of a session held as live objects: measured at about 2x its
+# uncompressed encoding plus ~2.5 KB of object overhead (an empty state ~4 KB,
+# 50 exchanges ~60 KB), several times the zstd-compressed blob
+LIVE_BYTES_PER_ENCODED_BYTE = 2
+LIVE_BYTES_PER_SESSION = 2500
+
+
+@dataclass
+class SessionRecord:
+    """A session as the API sees it: therapy state plus bookkeeping"""
+    session_id: str
+    session_state: TRTSessionState
+    client_id: Optional[str] = None
+    metadata: Dict = field(default_factory=dict)
+    created_at: datetime = field(default_factory=datetime.now)
+    last_interaction: datetime = field(default_factory=datetime.now)
+    turn_count: int = 0
+    status: str = "active"
+
+    def summary(self) -> Dict:
+        """JSON-friendly listing entry"""
+        return {
+            "session_id": self.session_id,
+            "client_id": self.client_id,
+            "status": self.status,
+            "current_substate": self.session_state.current_substate,
+            "created_at": self.created_at.isoformat(),
+            "last_interaction": self.last_interaction.isoformat(),
+            "turn_count": self.turn_count
+        }
+
+
+@dataclass
+class SessionPage:
+    """One page of a session listing"""
+    sessions: List[Dict]
+    next_cursor: Optional[str] = None  # None on the last page
+    total: int = 0                     # Sessions matching the filters, across all pages
+
+
+class InvalidCursorError(ValueError):
+    """The listing cursor was not produced by this API"""
+    pass
+
+
+def encode_cursor(position: Tuple[float, str]) -> str:
+    """Opaque listing cursor for (last activity as unix time, session_id)"""
+    timestamp, session_id = position
+    return base64.urlsafe_b64encode(f"{timestamp!r}:{session_id}".encode("utf-8")).decode("ascii")
+
+
+def decode_cursor(cursor: str) -> Tuple[float, str]:
+    try:
+        timestamp, session_id = base64.urlsafe_b64decode(cursor.encode("ascii")).decode("utf-8").split(":", 1)
+        return float(timestamp), session_id
+    except (binascii.Error, UnicodeError, ValueError) as e:
+        raise InvalidCursorError(f"Invalid cursor: {cursor}") from e
+
+
+class SessionStore(ABC):
+    """
+    Session persistence interface
+
+    Writes are whole-record (load, run the turn, save) and should run under
+    the session lock; save() accepts the lease's fencing token so a turn
+    whose lease expired cannot overwrite a newer one.
+
+    The API calls the *_async variants, which never block the event loop:
+    by default they run the sync method in the threadpool.
+    """
+
+    backend = ""
+
+    # Redis client for the session lock and idempotency records (None = in-process)
+    redis_client = None
+
+    # False if the sync methods never wait on I/O (then *_async calls them inline)
+    blocking_io = True
+
+    def exists(self, session_id: str) -> bool:
+        return self.load(session_id) is not None
+
+    @abstractmethod
+    def load(self, session_id: str) -> Optional[SessionRecord]:
+        """Load a session (None if it doesn't exist)"""
+
+    @abstractmethod
+    def create(self, record: SessionRecord) -> bool:
+        """Store a new session; False if the session ID is already taken"""
+
+    @abstractmethod
+    def save(self, record: SessionRecord, fencing_token: int = None) -> bool:
+        """
+        Save a session after a turn
+
+        Returns:
+            False if the write failed or was refused as stale
+        """
+
+    @abstractmethod
+    def delete(self, session_id: str) -> bool:
+        """Delete a session; False if it didn't exist"""
+
+    def add_exchange(self, session_id: str, exchange: Dict) -> bool:
+        """Record a conversation exchange outside the session state (no-op by default)"""
+        return True
+
+    def add_exchanges(self, exchanges: List[Tuple[str, Dict]]) -> bool:
+        """Record a batch of (session_id, exchange) in order (backends may write them in one round trip)"""
+        return all([self.add_exchange(session_id, exchange) for session_id, exchange in exchanges])
+
+    def invalidate(self, session_id: str):
+        """Drop any cached copy of a session (a turn failed after changing the loaded record)"""
+        pass
+
+    def commit(self, record: SessionRecord, exchange: Dict = None, fencing_token: int = None) -> bool:
+        """
+        Save a session and record the turn's exchange (backends may do both in one write)
+
+        Returns:
+            False if the write failed or was refused as stale
+        """
+        if not self.save(record, fencing_token=fencing_token):
+            return False
+        if exchange is not None:
+            self.add_exchange(record.session_id, exchange)
+        return True
+
+    @abstractmethod
+    def list_page(self, limit: int = 100, cursor: str = None, substate: str = None,
+                  active_since: datetime = None, active_before: datetime = None) -> SessionPage:
+        """
+        Session summaries, most recently active first, a page at a time
+
+        Args:
+            limit: Page size
+            cursor: next_cursor of the previous page
+            substate: Only sessions currently in this substate
+            active_since: Only sessions active at or after this time
+            active_before: Only sessions last active before this time
+
+        Raises:
+            InvalidCursorError
+        """
+
+    def list_sessions(self, limit: int = 100) -> List[Dict]:
+        """Summaries of the most recently active sessions"""
+        return self.list_page(limit).sessions
+
+    @abstractmethod
+    def count(self) -> int:
+        """Sessions stored"""
+
+    def health_check(self) -> Dict:
+        return {"status": "healthy", "backend": self.backend, "active_sessions": self.count()}
+
+    def close(self):
+        pass
+
+    async def _offload(self, method, *args, **kwargs):
+        if not self.blocking_io:
+            return method(*args, **kwargs)
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(None, functools.partial(method, *args, **kwargs))
+
+    async def load_async(self, session_id: str) -> Optional[SessionRecord]:
+        return await self._offload(self.load, session_id)
+
+    async def create_async(self, record: SessionRecord) -> bool:
+        return await self._offload(self.create, record)
+
+    async def commit_async(self, record: SessionRecord, exchange: Dict = None, fencing_token: int = None) -> bool:
+        return await self._offload(self.commit, record, exchange, fencing_token=fencing_token)
+
+    async def delete_async(self, session_id: str) -> bool:
+        return await self._offload(self.delete, session_id)
+
+    async def add_exchanges_async(self, exchanges: List[Tuple[str, Dict]]) -> bool:
+        return await self._offload(self.add_exchanges, exchanges)
+
+    async def list_page_async(self, limit: int = 100, cursor: str = None, substate: str = None,
+                              active_since: datetime = None, active_before: datetime = None) -> SessionPage:
+        return await self._offload(self.list_page, limit, cursor, substate, active_since, active_before)
+
+    async def list_sessions_async(self, limit: int = 100) -> List[Dict]:
+        return (await self.list_page_async(limit)).sessions
+
+    async def health_check_async(self) -> Dict:
+        return await self._offload(self.health_check)
+
+    async def close_async(self):
+        await self._offload(self.close)
+
+
+class _ScanningSessionStore(SessionStore):
+    """A store without indexes: listings filter and sort every record"""
+
+    def list_page(self, limit: int = 100, cursor: str = None, substate: str = None,
+                  active_since: datetime = None, active_before: datetime = None) -> SessionPage:
+        after = decode_cursor(cursor) if cursor else None
+        matching = self._matching(substate, active_since, active_before)
+        remaining = [entry for entry in matching if after is None or entry[:2] < after]
+        page = remaining[:limit]
+        next_cursor = encode_cursor(page[-1][:2]) if len(remaining) > limit else None
+        return SessionPage([dict(record.summary(), storage=self.backend) for _, _, record in page],
+                           next_cursor, len(matching))
+
+    def _matching(self, substate: str = None, active_since: datetime = None,
+                  active_before: datetime = None) -> List[Tuple[float, str, SessionRecord]]:
+        """(last activity, session_id, record) of every matching record, most recent first"""
+        since = active_since.timestamp() if active_since else None
+        before = active_before.timestamp() if active_before else None
+
+        # No index to use: filter and sort every record
+        return sorted(
+            ((record.last_interaction.timestamp(), record.session_id, record) for record in self._all_records()
+             if (substate is None or record.session_state.current_substate == substate)
+             and (since is None or record.last_interaction.timestamp() >= since)
+             and (before is None or record.last_interaction.timestamp() < before)),
+            key=lambda entry: entry[:2], reverse=True
+        )
+
+    @abstractmethod
+    def _all_records(self) -> List[SessionRecord]:
+        """Every stored record"""
+
+
+class InMemorySessionStore(_ScanningSessionStore):
+    """
+    Process-local sessions (single worker, lost on restart)
+
+    Bounded by session count and estimated heap use (from each session's
+    uncompressed encoding, see LIVE_BYTES_PER_ENCODED_BYTE): past either
+    limit the least recently used sessions are evicted, into a local SQLite
+    spill file if one is configured (and loaded back on their next use),
+    otherwise dropped.
+    """
+
+    backend = BACKEND_MEMORY
+    blocking_io = False
+
+    def __init__(self, max_sessions: int = None, max_bytes: int = None, spill_path: str = None,
+                 spill_ttl_seconds: float = None):
+        """
+        Args:
+            max_sessions: Sessions kept in memory, 0 = no limit (TRT_MEMORY_STORE_MAX_SESSIONS)
+            max_bytes: Estimated heap use of the sessions kept in memory, 0 = no limit
+                       (TRT_MEMORY_STORE_MAX_MB)
+            spill_path: SQLite file for evicted sessions, unset = drop them (TRT_MEMORY_STORE_SPILL_PATH)
+            spill_ttl_seconds: Drop spilled sessions inactive this long, 0 = keep
+                               (TRT_MEMORY_STORE_SPILL_TTL_SECONDS)
+        """
+        if max_sessions is None:
+            max_sessions = int(os.getenv("TRT_MEMORY_STORE_MAX_SESSIONS", "10000"))
+        if max_bytes is None:
+            max_bytes = int(float(os.getenv("TRT_MEMORY_STORE_MAX_MB", "256")) * 1024 * 1024)
+        if spill_path is None:
+            spill_path = os.getenv("TRT_MEMORY_STORE_SPILL_PATH") or None
+        if spill_ttl_seconds is None:
+            spill_ttl_seconds = float(os.getenv("TRT_MEMORY_STORE_SPILL_TTL_SECONDS", "86400"))
+
+        self.max_sessions = max_sessions
+        self.max_bytes = max_bytes
+        self.spill_ttl_seconds = spill_ttl_seconds
+        self.spill = SessionSpill(spill_path) if spill_path else None
+        # SQLite reads and writes: run the *_async variants in the threadpool
+        self.blocking_io = self.spill is not None
+        self.metrics = get_metrics()
+        self.evicted = 0
+
+        self._lock = threading.Lock()
+        self._sessions: "OrderedDict[str, Tuple[SessionRecord, int]]" = OrderedDict()  # Least recent first
+        self._bytes = 0
+        self._last_prune = time.monotonic()
+
+    @staticmethod
+    def _live_size(record: SessionRecord) -> int:
+        """Estimated bytes the record takes as live objects"""
+        encoded = len(encode_state(record.session_state, compress=False)) + len(msgpack.packb(record.metadata, default=str))
+        return LIVE_BYTES_PER_SESSION + LIVE_BYTES_PER_ENCODED_BYTE * encoded
+
+    def _put(self, record: SessionRecord):
+        """Store a record as the most recently used, then evict past the limits (caller holds the lock)"""
+        size = self._live_size(record) if self.max_bytes else 0
+        previous = self._sessions.pop(record.session_id, None)
+        if previous is not None:
+            self._bytes -= previous[1]
+        self._sessions[record.session_id] = (record, size)
+        self._bytes += size
+
+        # The newest session always stays, even if it alone is over the size limit
+        while len(self._sessions) > 1 and (
+                (self.max_sessions and len(self._sessions) > self.max_sessions)
+                or (self.max_bytes and self._bytes > self.max_bytes)):
+            _, (evicted, evicted_size) = self._sessions.popitem(last=False)
+            self._bytes -= evicted_size
+            self._evict(evicted)
+
+    def _evict(self, record: SessionRecord):
+        # Under the lock, so a load can't miss a session on its way to the spill
+        self.evicted += 1
+        self.metrics.increment("memory_store_evictions_total")
+        if self.spill is None:
+            logger.warning(f"⚠️ In-memory session store full: dropped least recently used session "
+                           f"{record.session_id}")
+            return
+        self.spill.put(record.session_id, record.last_interaction.timestamp(),
+                       record.session_state.current_substate, record.summary(), FileSessionStore._encode(record))
+
+        if self.spill_ttl_seconds > 0 and time.monotonic() - self._last_prune >= 60:
+            self._last_prune = time.monotonic()
+            pruned = self.spill.prune(time.time() - self.spill_ttl_seconds)
+            if pruned:
+                logger.info(f"✅ Dropped {pruned} spilled sessions inactive for {self.spill_ttl_seconds}s")
+
+    def load(self, session_id: str) -> Optional[SessionRecord]:
+        with self._lock:
+            entry = self._sessions.get(session_id)
+            if entry is not None:
+                self._sessions.move_to_end(session_id)
+                return entry[0]
+            if self.spill is None:
+                return None
+            data = self.spill.take(session_id)
+            if data is None:
+                return None
+            record = FileSessionStore._decode(data)
+            self._put(record)
+            self.metrics.increment("memory_store_unspilled_total")
+            return record
+
+    def exists(self, session_id: str) -> bool:
+        with self._lock:
+            return session_id in self._sessions or (self.spill is not None and self.spill.contains(session_id))
+
+    def create(self, record: SessionRecord) -> bool:
+        with self._lock:
+            if record.session_id in self._sessions or (
+                    self.spill is not None and self.spill.contains(record.session_id)):
+                return False
+            self._put(record)
+            return True
+
+    def save(self, record: SessionRecord, fencing_token: int = None) -> bool:
+        with self._lock:
+            if record.session_id not in self._sessions and self.spill is not None:
+                # Evicted while its turn ran: this copy is newer than the spilled one
+                self.spill.delete(record.session_id)
+            self._put(record)
+        return True
+
+    def delete(self, session_id: str) -> bool:
+        with self._lock:
+            entry = self._sessions.pop(session_id, None)
+            if entry is not None:
+                self._bytes -= entry[1]
+                return True
+            return self.spill is not None and self.spill.delete(session_id)
+
+    def _all_records(self) -> List[SessionRecord]:
+        with self._lock:
+            return [record for record, _ in self._sessions.values()]
+
+    def list_page(self, limit: int = 100, cursor: str = None, substate: str = None,
+                  active_since: datetime = None, active_before: datetime = None) -> SessionPage:
+        if self.spill is None:
+            return super().list_page(limit, cursor, substate, active_since, active_before)
+
+        # Memory and spill hold disjoint sessions: merge the two listings
+        after = decode_cursor(cursor) if cursor else None
+        matching = self._matching(substate, active_since, active_before)
+        spilled, spilled_total = self.spill.page(
+            limit + 1, after, substate, active_since.timestamp() if active_since else None,
+            active_before.timestamp() if active_before else None)
+        remaining = sorted([entry for entry in matching if after is None or entry[:2] < after] + spilled,
+                           key=lambda entry: entry[:2], reverse=True)
+        page = remaining[:limit]
+        next_cursor = encode_cursor(page[-1][:2]) if len(remaining) > limit else None
+        return SessionPage([dict(item.summary() if isinstance(item, SessionRecord) else item, storage=self.backend)
+                            for _, _, item in page], next_cursor, len(matching) + spilled_total)
+
+    def count(self) -> int:
+        return len(self._sessions) + (self.spill.count() if self.spill is not None else 0)
+
+    def stats(self) -> Dict:
+        """Memory use against the limits, for /health"""
+        with self._lock:
+            stats = {
+                "sessions": len(self._sessions),
+                "bytes": self._bytes,
+                "max_sessions": self.max_sessions,
+                "max_bytes": self.max_bytes,
+                "evicted": self.evicted
+            }
+        if self.spill is not None:
+            stats["spilled_sessions"] = self.spill.count()
+        return stats
+
+    def health_check(self) -> Dict:
+        return dict(super().health_check(), memory=self.stats())
+
+    def close(self):
+        with self._lock:
+            self._sessions.clear()
+            self._bytes = 0
+        if self.spill is not None:
+            self.spill.close()
+
+
+class FileSessionStore(_ScanningSessionStore):
+    """
+    One file per session in a local directory (msgpack record + state blob)
+
+    Survives restarts; files are replaced atomically, but turns are only
+    serialized within a process (multiple workers need the Redis store).
+    """
+
+    backend = BACKEND_DISK
+    suffix = ".session"
+
+    def __init__(self, directory: str = None):
+        """
+        Args:
+            directory: Where session files live (TRT_SESSION_DIR)
+        """
+        self.directory = directory or os.getenv("TRT_SESSION_DIR", "data/sessions")
+        os.makedirs(self.directory, exist_ok=True)
+
+    def _path(self, session_id: str) -> str:
+        # Session IDs come from clients: percent-encode so they stay inside the directory
+        return os.path.join(self.directory, f"{quote(session_id, safe='')}{self.suffix}")
+
+    @staticmethod
+    def _encode(record: SessionRecord, fencing_token: int = None) -> bytes:
+        return msgpack.packb({
+            "session_id": record.session_id,
+            "client_id": record.client_id,
+            "metadata": record.metadata,
+            "created_at": record.created_at.isoformat(),
+            "last_interaction": record.last_interaction.isoformat(),
+            "turn_count": record.turn_count,
+            "status": record.status,
+            "fencing_token": fencing_token or 0,
+            "session_state": encode_state(record.session_state)
+        }, use_bin_type=True)
+
+    @staticmethod
+    def _decode(data: bytes) -> SessionRecord:
+        fields = msgpack.unpackb(data, raw=False)
+        return SessionRecord(
+            session_id=fields["session_id"],
+            session_state=decode_state(fields["session_state"]),
+            client_id=fields.get("client_id"),
+            metadata=fields.get("metadata") or {},
+            created_at=datetime.fromisoformat(fields["created_at"]),
+            last_interaction=datetime.fromisoformat(fields["last_interaction"]),
+            turn_count=fields.get("turn_count", 0),
+            status=fields.get("status", "active")
+        )
+
+    def _read(self, path: str) -> Optional[bytes]:
+        try:
+            with open(path, "rb") as f:
+                return f.read()
+        except FileNotFoundError:
+            return None
+
+    def _write(self, path: str, data: bytes):
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+
+    def load(self, session_id: str) -> Optional[SessionRecord]:
+        data = self._read(self._path(session_id))
+        return self._decode(data) if data else None
+
+    def create(self, record: SessionRecord) -> bool:
+        try:
+            # O_EXCL: exactly one creator wins, even across processes
+            fd = os.open(self._path(record.session_id), os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+        except FileExistsError:
+            return False
+        with os.fdopen(fd, "wb") as f:
+            f.write(self._encode(record))
+        return True
+
+    def save(self, record: SessionRecord, fencing_token: int = None) -> bool:
+        path = self._path(record.session_id)
+        try:
+            if fencing_token is not None:
+                current = self._read(path)
+                if current and msgpack.unpackb(current, raw=False).get("fencing_token", 0) > fencing_token:
+                    logger.warning(f"⚠️ Stale write refused for session {record.session_id} "
+                                   f"(fencing token {fencing_token})")
+                    return False
+            self._write(path, self._encode(record, fencing_token))
+            return True
+        except OSError as e:
+            logger.error(f"❌ Failed to save session {record.session_id}: {e}")
+            return False
+
+    def delete(self, session_id: str) -> bool:
+        try:
+            os.remove(self._path(session_id))
+            return True
+        except FileNotFoundError:
+            return False
+
+    def _all_records(self) -> List[SessionRecord]:
+        records = []
+        for name in os.listdir(self.directory):
+            if not name.endswith(self.suffix):
+                continue
+            data = self._read(os.path.join(self.directory, name))
+            if data:
+                records.append(self._decode(data))
+        return records
+
+
+    def count(self) -> int:
+        return sum(1 for name in os.listdir(self.directory) if name.endswith(self.suffix))
+
+
+class RedisSessionStore(SessionStore):
+    """
+    Sessions in Redis via RedisSessionManager, shared by every worker and replica
+
+    With an AsyncRedisSessionManager, the *_async methods use its pooled
+    asyncio connections instead of the threadpool. Loaded records are kept in
+    a SessionCache; a cached record is only used while its version still
+    matches the one in Redis (one HGET instead of the full state fetch).
+
+    With a SessionArchive, idle and completed sessions are moved out of Redis
+    by archive_inactive_sessions(), and loading an archived session puts it
+    back (rehydration), so Redis only holds the hot sessions.
+    """
+
+    backend = BACKEND_REDIS
+
+    def __init__(self, manager, async_manager=None, cache: SessionCache = None, archive: SessionArchive = None):
+        """
+        Args:
+            manager: Connected RedisSessionManager
+            async_manager: AsyncRedisSessionManager for the same Redis (optional)
+            cache: In-process cache of loaded sessions (default: SessionCache())
+            archive: Cold tier for sessions evicted from Redis (optional)
+        """
+        self.manager = manager
+        self.async_manager = async_manager
+        self.cache = cache if cache is not None else SessionCache()
+        self.archive = archive
+        self.redis_client = manager.redis
+        self.metrics = get_metrics()
+
+    def exists(self, session_id: str) -> bool:
+        if self.manager.session_exists(session_id):
+            return True
+        return self.archive is not None and self.archive.contains(session_id)
+
+    @staticmethod
+    def _record(session_id: str, loaded) -> Optional[SessionRecord]:
+        """SessionRecord from a manager's load_turn() result"""
+        if not loaded:
+            return None
+        data, meta = loaded
+        session_state = data.get("session_state")
+        if session_state is None:
+            # Saved before complete state was stored: only the summary fields survive
+            session_state = TRTSessionState(session_id)
+            session_state.current_stage = data["current_stage"]
+            session_state.current_substate = data["current_substate"]
+            session_state.body_questions_asked = data["body_questions_asked"]
+            session_state.stage_1_completion = data["stage_1_completion"]
+
+        created_at = meta.get("created_at") or data.get("created_at")
+        return SessionRecord(
+            session_id=session_id,
+            session_state=session_state,
+            client_id=meta.get("client_id") or None,
+            metadata=json.loads(meta.get("metadata") or "{}"),
+            created_at=datetime.fromisoformat(created_at) if created_at else datetime.now(),
+            last_interaction=datetime.fromisoformat(data["last_interaction"]),
+            turn_count=int(meta.get("turn_count") or 0),
+            status=meta.get("status") or "active"
+        )
+
+    def _validate(self, session_id: str, cached, version: Optional[int]) -> Optional[SessionRecord]:
+        """The cached record if `version` (read from Redis) is still the cached one"""
+        record, cached_version = cached
+        if version == cached_version:
+            self.cache.hit(session_id)
+            return record
+        self.cache.miss(session_id, stale=True)
+        return None
+
+    def _fill(self, session_id: str, loaded) -> Optional[SessionRecord]:
+        record = self._record(session_id, loaded)
+        if record is not None:
+            self.cache.put(session_id, record, loaded[0]["version"])
+        return record
+
+    def _written(self, record: SessionRecord, version: int) -> bool:
+        # Write-through: what we just wrote is the current version
+        if version:
+            self.cache.put(record.session_id, record, version)
+        else:
+            self.cache.invalidate(record.session_id)
+        return bool(version)
+
+    def load(self, session_id: str) -> Optional[SessionRecord]:
+        cached = self.cache.peek(session_id)
+        if cached is not None:
+            record = self._validate(session_id, cached, self.manager.get_version(session_id))
+            if record is not None:
+                return record
+        elif self.cache.enabled:
+            self.cache.miss(session_id)
+        record = self._fill(session_id, self.manager.load_turn(session_id))
+        if record is None and self.archive is not None:
+            record = self._rehydrate(session_id)
+        return record
+
+    def _rehydrate(self, session_id: str) -> Optional[SessionRecord]:
+        """Move an archived session back into Redis; None if it isn't archived"""
+        try:
+            archived = self.archive.get(session_id)
+        except SessionArchiveError as e:
+            logger.error(f"❌ Failed to read archived session {session_id}: {e}")
+            return None
+        if archived is None:
+            return None
+
+        record = FileSessionStore._decode(archived.record)
+        if not self.create(record):
+            # Another worker rehydrated it first
+            return self._fill(session_id, self.manager.load_turn(session_id))
+        self.manager.restore_history(session_id, archived.history)
+        self.archive.remove(session_id)
+
+        self.metrics.increment("session_rehydrated_total")
+        logger.info(f"✅ Session rehydrated from the archive: {session_id} "
+                    f"(archived {datetime.fromtimestamp(archived.archived_at).isoformat()})")
+        return record
+
+    def archive_inactive_sessions(self, idle_cutoff: float, completed_cutoff: float = None,
+                                  batch_size: int = 500) -> Dict:
+        """
+        Move sessions idle since `idle_cutoff` (completed ones since `completed_cutoff`)
+        from Redis to the archive, a batch per index bucket at a time
+
+        Each batch is written to the archive before it is evicted; a session a
+        turn touches (or is running on) in between stays in Redis and its
+        archived copy is dropped again.
+
+        Args:
+            idle_cutoff: Unix time; sessions with older activity are archived
+            completed_cutoff: Unix time, the same for completed sessions (default: idle_cutoff)
+            batch_size: Sessions per batch
+
+        Returns:
+            Dict with sessions archived and archive bytes written
+        """
+        completed_cutoff = max(idle_cutoff, completed_cutoff or idle_cutoff)
+        archived = written = 0
+        for bucket in all_buckets(self.manager.index_shards):
+            after = None  # Sessions up to here were archived, or not (yet) archivable and left in place
+            while True:
+                page = self.manager.idle_sessions(bucket, completed_cutoff, after, batch_size)
+                if not page:
+                    break
+                batch = [session_id for session_id, _ in page]
+                sessions, active_at = [], {}
+                for session_id, exported in zip(batch, self.manager.export_sessions(batch)):
+                    if exported is None:
+                        continue
+                    data, meta, history = exported
+                    if float(data.get("active_at") or 0) > idle_cutoff and meta.get("status") != "completed":
+                        continue
+                    record = self._record(session_id, (data, meta))
+                    sessions.append(ArchivedSession(session_id, FileSessionStore._encode(record), history,
+                                                    time.time()))
+                    active_at[session_id] = data.get("active_at") or "0"
+
+                written += self.archive.put_many(sessions)
+                evicted = self.manager.evict_sessions(bucket, active_at, completed_cutoff) if active_at else []
+                for session_id in set(active_at) - set(evicted):
+                    self.archive.remove(session_id)  # Redis has a newer copy
+                for session_id in evicted:
+                    self.cache.invalidate(session_id)
+
+                archived += len(evicted)
+                after = (page[-1][1], page[-1][0])
+                if len(batch) < batch_size:
+                    break
+
+        self.metrics.increment("session_archived_total", archived)
+        self.metrics.increment("session_archive_bytes_total", written)
+        return {"sessions": archived, "bytes": written}
+
+    @staticmethod
+    def _meta(record: SessionRecord) -> Dict:
+        return {
+            "client_id": record.client_id or "",
+            "metadata": json.dumps(record.metadata or {}),
+            "created_at": record.created_at.isoformat(),
+            "turn_count": str(record.turn_count),
+            "status": record.status
+        }
+
+    def create(self, record: SessionRecord) -> bool:
+        record.session_state.created_at = record.created_at.isoformat()
+        version = self.manager.create_session(record.session_id, record.session_state, self._meta(record))
+        # A taken ID keeps whatever is cached for it
+        return self._written(record, version) if version else False
+
+    def save(self, record: SessionRecord, fencing_token: int = None) -> bool:
+        return self.commit(record, fencing_token=fencing_token)
+
+    def commit(self, record: SessionRecord, exchange: Dict = None, fencing_token: int = None) -> bool:
+        # State, metadata, history and activity index in one round trip
+        version = self.manager.commit_turn(record.session_id, record.session_state, metadata=self._meta(record),
+                                           exchange=exchange, fencing_token=fencing_token)
+        return self._written(record, version)
+
+    def invalidate(self, session_id: str):
+        self.cache.invalidate(session_id)
+
+    def delete(self, session_id: str) -> bool:
+        self.cache.invalidate(session_id)
+        archived = self.archive is not None and self.archive.remove(session_id)
+        if not self.manager.session_exists(session_id):
+            return archived
+        return self.manager.delete_session(session_id)
+
+    def add_exchange(self, session_id: str, exchange: Dict) -> bool:
+        return self.manager.add_conversation_exchange(session_id, exchange)
+
+    def add_exchanges(self, exchanges: List[Tuple[str, Dict]]) -> bool:
+        return self.manager.add_conversation_exchanges(exchanges)
+
+    def _page(self, listed) -> SessionPage:
+        summaries, next_position, total = listed
+        return SessionPage([dict(summary, storage=self.backend) for summary in summaries],
+                           encode_cursor(next_position) if next_position else None, total)
+
+    @staticmethod
+    def _page_args(cursor: str, active_since: datetime, active_before: datetime) -> Dict:
+        return {
+            "after": decode_cursor(cursor) if cursor else None,
+            "since": active_since.timestamp() if active_since else None,
+            "before": active_before.timestamp() if active_before else None
+        }
+
+    def list_page(self, limit: int = 100, cursor: str = None, substate: str = None,
+                  active_since: datetime = None, active_before: datetime = None) -> SessionPage:
+        # Served from the activity / substate indexes plus summary fields
+        return self._page(self.manager.page_sessions(limit, substate=substate,
+                                                     **self._page_args(cursor, active_since, active_before)))
+
+    def count(self) -> int:
+        return self.manager.get_session_count()
+
+    def _health(self, health: Dict) -> Dict:
+        health = dict(health, backend=self.backend, cache=self.cache.stats())
+        if self.archive is not None:
+            health["archive"] = self.archive.stats()
+        return health
+
+    def health_check(self) -> Dict:
+        return self._health(self.manager.health_check())
+
+    def close(self):
+        self.cache.clear()
+
+    async def load_async(self, session_id: str) -> Optional[SessionRecord]:
+        if self.async_manager is None:
+            return await super().load_async(session_id)
+        cached = self.cache.peek(session_id)
+        if cached is not None:
+            record = self._validate(session_id, cached, await self.async_manager.get_version(session_id))
+            if record is not None:
+                return record
+        elif self.cache.enabled:
+            self.cache.miss(session_id)
+        record = self._fill(session_id, await self.async_manager.load_turn(session_id))
+        if record is None and self.archive is not None:
+            record = await self._offload(self._rehydrate, session_id)
+        return record
+
+    async def create_async(self, record: SessionRecord) -> bool:
+        if self.async_manager is None:
+            return await super().create_async(record)
+        record.session_state.created_at = record.created_at.isoformat()
+        version = await self.async_manager.create_session(record.session_id, record.session_state,
+                                                          self._meta(record))
+        return self._written(record, version) if version else False
+
+    async def commit_async(self, record: SessionRecord, exchange: Dict = None, fencing_token: int = None) -> bool:
+        if self.async_manager is None:
+            return await super().commit_async(record, exchange, fencing_token=fencing_token)
+        version = await self.async_manager.commit_turn(record.session_id, record.session_state,
+                                                       metadata=self._meta(record), exchange=exchange,
+                                                       fencing_token=fencing_token)
+        return self._written(record, version)
+
+    async def delete_async(self, session_id: str) -> bool:
+        if self.async_manager is None:
+            return await super().delete_async(session_id)
+        self.cache.invalidate(session_id)
+        archived = self.archive is not None and await self._offload(self.archive.remove, session_id)
+        return await self.async_manager.delete_session(session_id) or archived
+
+    async def add_exchanges_async(self, exchanges: List[Tuple[str, Dict]]) -> bool:
+        if self.async_manager is None:
+            return await super().add_exchanges_async(exchanges)
+        return await self.async_manager.add_conversation_exchanges(exchanges)
+
+    async def list_page_async(self, limit: int = 100, cursor: str = None, substate: str = None,
+                              active_since: datetime = None, active_before: datetime = None) -> SessionPage:
+        if self.async_manager is None:
+            return await super().list_page_async(limit, cursor, substate, active_since, active_before)
+        return self._page(await self.async_manager.page_sessions(
+            limit, substate=substate, **self._page_args(cursor, active_since, active_before)))
+
+    async def health_check_async(self) -> Dict:
+        if self.async_manager is None:
+            return await super().health_check_async()
+        health = await self.async_manager.health_check()
+        return await self._offload(self._health, health)
+
+    async def close_async(self):
+        self.close()
+        if self.async_manager is not None:
+            await self.async_manager.close()
+
+
+def create_session_store(backend: str = None) -> SessionStore:
+    """
+    Build the configured session store (TRT_SESSION_STORE)
+
+    'redis' (default) falls back to 'memory' when Redis is unreachable;
+    'memory', 'disk' and 'sqlite' never touch Redis. With TRT_SESSION_ARCHIVE=true the
+    Redis store archives inactive sessions to disk (TRT_SESSION_ARCHIVE_DIR).
+    """
+    backend = (backend or os.getenv("TRT_SESSION_STORE", BACKEND_REDIS)).lower()
+    if backend == BACKEND_MEMORY:
+        return InMemorySessionStore()
+    if backend == BACKEND_DISK:
+        store = FileSessionStore()
+        logger.info(f"✅ Session store: disk ({store.directory})")
+        return store
+    if backend == BACKEND_SQLITE:
+        from src.utils.sqlite_session_store import SqliteSessionStore
+        return SqliteSessionStore()
+    if backend != BACKEND_REDIS:
+        raise ValueError(f"Unknown session store backend: {backend}")
+
+    from src.utils.redis_session_manager import RedisSessionManager
+    from src.utils.async_redis_session_manager import AsyncRedisSessionManager
+    try:
+        manager = RedisSessionManager()
+        archive = None
+        if os.getenv("TRT_SESSION_ARCHIVE", "false").lower() == "true":
+            archive = SessionArchive()
+            logger.info(f"✅ Session archive: {archive.directory}")
+        return RedisSessionStore(manager, AsyncRedisSessionManager(), archive=archive)
+    except Exception as e:
+        logger.warning(f"⚠️ Redis unavailable, using in-memory session store: {e}")
+        return InMemorySessionStore()
@@ -0,0 +1,178 @@
+"""
+Session Sweeper for TRT System
+Background removal of inactive sessions from Redis: one worker at a time
+(leader lease in Redis) sweeps the activity index in batches, so the index
+and Redis memory stay bounded as session keys expire; with a session archive
+it first moves idle and completed sessions to disk
+"""
+
+import os
+import threading
+import time
+import uuid
+import logging
+from datetime import datetime
+from typing import Dict, Optional
+
+from src.utils.metrics import get_metrics
+
+logger = logging.getLogger(__name__)
+
+LEADER_KEY = "trt:sweeper:leader"
+
+# Take the leader lease, or extend it if we already hold it
+_LEAD_SCRIPT = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('PEXPIRE', KEYS[1], ARGV[2])
+end
+if redis.call('SET', KEYS[1], ARGV[1], 'NX', 'PX', ARGV[2]) then
+    return 1
+end
+return 0
+"""
+
+_RESIGN_SCRIPT = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('DEL', KEYS[1])
+end
+return 0
+"""
+
+
+class SessionSweeper:
+    """
+    Periodically sweeps sessions idle longer than idle_seconds
+
+    Every worker runs the thread; only the holder of the leader lease sweeps.
+    The lease outlives two intervals, so if the leader dies another worker
+    takes over within about that long.
+    """
+
+    def __init__(self, manager, interval_seconds: float = None, idle_seconds: float = None,
+                 batch_size: int = None, archive_store=None, archive_idle_seconds: float = None,
+                 archive_completed_seconds: float = None):
+        """
+        Args:
+            manager: Connected RedisSessionManager
+            interval_seconds: Time between sweeps (TRT_SESSION_SWEEP_INTERVAL_SECONDS)
+            idle_seconds: Remove sessions inactive this long (TRT_SESSION_SWEEP_IDLE_SECONDS,
+                          default: the session TTL, i.e. sessions whose keys have expired)
+            batch_size: Sessions per ZRANGEBYSCORE / UNLINK batch (TRT_SESSION_SWEEP_BATCH_SIZE)
+            archive_store: RedisSessionStore with an archive: archive inactive sessions before sweeping
+            archive_idle_seconds: Archive sessions inactive this long (TRT_SESSION_ARCHIVE_IDLE_SECONDS;
+                                  must be below the session TTL, or keys expire unarchived)
+            archive_completed_seconds: Archive completed sessions inactive this long
+                                       (TRT_SESSION_ARCHIVE_COMPLETED_SECONDS)
+        """
+        if interval_seconds is None:
+            interval_seconds = float(os.getenv("TRT_SESSION_SWEEP_INTERVAL_SECONDS", "300"))
+        if idle_seconds is None:
+            idle_seconds = float(os.getenv("TRT_SESSION_SWEEP_IDLE_SECONDS", str(manager.session_ttl)))
+        if batch_size is None:
+            batch_size = int(os.getenv("TRT_SESSION_SWEEP_BATCH_SIZE", "500"))
+        if archive_idle_seconds is None:
+            archive_idle_seconds = float(os.getenv("TRT_SESSION_ARCHIVE_IDLE_SECONDS", "21600"))
+        if archive_completed_seconds is None:
+            archive_completed_seconds = float(os.getenv("TRT_SESSION_ARCHIVE_COMPLETED_SECONDS", "900"))
+
+        self.manager = manager
+        self.interval_seconds = interval_seconds
+        self.idle_seconds = idle_seconds
+        self.batch_size = batch_size
+        self.archive_store = archive_store
+        self.archive_idle_seconds = archive_idle_seconds
+        self.archive_completed_seconds = archive_completed_seconds
+        self.owner = uuid.uuid4().hex
+        self.metrics = get_metrics()
+        self.last_sweep: Optional[Dict] = None
+        self._last_compaction = time.monotonic()
+
+        if archive_store is not None and archive_idle_seconds + interval_seconds >= manager.session_ttl:
+            logger.warning(f"⚠️ Sessions are archived after {archive_idle_seconds}s idle (swept every "
+                           f"{interval_seconds}s) but expire after {manager.session_ttl}s: "
+                           f"some will expire before they are archived")
+
+        self._lead = manager.redis.register_script(_LEAD_SCRIPT)
+        self._resign = manager.redis.register_script(_RESIGN_SCRIPT)
+        self._stop_event = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def is_leader(self) -> bool:
+        """Take or extend the leader lease; True if this worker should sweep"""
+        lease_ms = int(self.interval_seconds * 2 * 1000) + 1000
+        return bool(self._lead(keys=[LEADER_KEY], args=[self.owner, lease_ms]))
+
+    def sweep_once(self) -> Optional[Dict]:
+        """
+        Sweep now if this worker is the leader
+
+        Returns:
+            Sweep result (sessions, batches, index_entries, duration_seconds), or None if not the leader
+        """
+        if not self.is_leader():
+            return None
+
+        start = time.monotonic()
+        archived = None
+        if self.archive_store is not None:
+            archived = self.archive_store.archive_inactive_sessions(
+                time.time() - self.archive_idle_seconds, time.time() - self.archive_completed_seconds,
+                self.batch_size)
+            # Compaction rewrites the archive index: at most hourly
+            if time.monotonic() - self._last_compaction >= 3600:
+                self.archive_store.archive.compact()
+                self._last_compaction = time.monotonic()
+        result = self.manager.sweep_inactive_sessions(time.time() - self.idle_seconds, self.batch_size)
+        duration = time.monotonic() - start
+        if archived is not None:
+            result = dict(result, archived=archived["sessions"], archived_bytes=archived["bytes"])
+
+        self.metrics.observe("session_sweep_seconds", duration)
+        self.metrics.increment("session_sweep_removed_total", result["sessions"])
+        self.metrics.increment("session_sweep_index_entries_total", result["index_entries"])
+        self.metrics.set_gauge("session_index_size", self.manager.get_session_count())
+
+        self.last_sweep = dict(result, duration_seconds=round(duration, 3), finished_at=datetime.now().isoformat())
+        if result["sessions"] or result["index_entries"]:
+            logger.info(f"✅ Swept {result['sessions']} inactive sessions in {result['batches']} batches "
+                        f"({result['index_entries']} stale index entries, {duration:.3f}s)")
+        if result.get("archived"):
+            logger.info(f"✅ Archived {result['archived']} inactive sessions ({result['archived_bytes']} bytes)")
+        return self.last_sweep
+
+    def start(self):
+        """Start the background sweeper thread"""
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._run, name="session-sweeper", daemon=True)
+        self._thread.start()
+        logger.info(f"✅ Session sweeper started (interval {self.interval_seconds}s, "
+                    f"idle threshold {self.idle_seconds}s)")
+
+    def stop(self):
+        """Stop the thread and hand leadership to another worker"""
+        self._stop_event.set()
+        if self._thread:
+            self._thread.join(timeout=5)
+        try:
+            self._resign(keys=[LEADER_KEY], args=[self.owner])
+        except Exception as e:
+            logger.warning(f"⚠️ Could not release sweeper leadership: {e}")
+
+    def _run(self):
+        while not self._stop_event.wait(self.interval_seconds):
+            try:
+                self.sweep_once()
+            except Exception as e:
+                logger.error(f"❌ Session sweep failed: {e}")
+
+    def get_status(self) -> Dict:
+        """Sweeper status for the metrics endpoint"""
+        return {
+            "interval_seconds": self.interval_seconds,
+            "idle_seconds": self.idle_seconds,
+            "batch_size": self.batch_size,
+            "archive_idle_seconds": self.archive_idle_seconds if self.archive_store is not None else None,
+            "last_sweep": self.last_sweep
+        }
@@ -0,0 +1,437 @@
+"""
+SQLite Session Store for TRT System
+Durable sessions without an external service: one SQLite file in WAL mode,
+written behind the request path by a single writer thread that applies
+queued writes in batched transactions
+"""
+
+import os
+import sqlite3
+import threading
+import time
+import logging
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+from src.utils.history_codec import encode_exchange, decode_exchange, HistoryCodecError
+from src.utils.metrics import get_metrics
+from src.utils.session_store import (
+    SessionStore, SessionRecord, SessionPage, FileSessionStore, encode_cursor, decode_cursor, BACKEND_SQLITE
+)
+
+logger = logging.getLogger(__name__)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS sessions (
+    session_id TEXT PRIMARY KEY,
+    client_id TEXT,
+    status TEXT NOT NULL,
+    current_substate TEXT NOT NULL,
+    created_at TEXT NOT NULL,
+    last_interaction TEXT NOT NULL,
+    last_active REAL NOT NULL,
+    turn_count INTEGER NOT NULL,
+    fencing_token INTEGER NOT NULL,
+    record BLOB NOT NULL
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS sessions_by_activity ON sessions (last_active, session_id);
+CREATE INDEX IF NOT EXISTS sessions_by_substate ON sessions (current_substate, last_active, session_id);
+CREATE TABLE IF NOT EXISTS history (
+    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+    session_id TEXT NOT NULL,
+    entry BLOB NOT NULL
+);
+CREATE INDEX IF NOT EXISTS history_by_session ON history (session_id, seq);
+"""
+
+# Statements are constant strings, so each connection prepares them once (sqlite3's statement cache)
+_UPSERT = """
+INSERT INTO sessions (session_id, client_id, status, current_substate, created_at, last_interaction,
+                      last_active, turn_count, fencing_token, record)
+VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+ON CONFLICT (session_id) DO UPDATE SET
+    client_id = excluded.client_id, status = excluded.status, current_substate = excluded.current_substate,
+    created_at = excluded.created_at, last_interaction = excluded.last_interaction,
+    last_active = excluded.last_active, turn_count = excluded.turn_count,
+    fencing_token = excluded.fencing_token, record = excluded.record
+"""
+_DELETE = "DELETE FROM sessions WHERE session_id = ?"
+_DELETE_HISTORY = "DELETE FROM history WHERE session_id = ?"
+_APPEND_HISTORY = "INSERT INTO history (session_id, entry) VALUES (?, ?)"
+_TRIM_HISTORY = """
+DELETE FROM history WHERE session_id = ? AND seq <= (
+    SELECT seq FROM history WHERE session_id = ? ORDER BY seq DESC LIMIT 1 OFFSET ?)
+"""
+_LOAD = "SELECT record FROM sessions WHERE session_id = ?"
+_FENCING_TOKEN = "SELECT fencing_token FROM sessions WHERE session_id = ?"
+_HISTORY = "SELECT entry FROM history WHERE session_id = ? ORDER BY seq DESC LIMIT ?"
+_SUMMARY_COLUMNS = "session_id, client_id, status, current_substate, created_at, last_interaction, turn_count"
+
+# Row layout (as bound to _UPSERT)
+_ROW_FENCING_TOKEN = 8
+_ROW_RECORD = 9
+
+
+class SqliteSessionStore(SessionStore):
+    """
+    Sessions in a local SQLite file, for single-node deployments without Redis
+
+    create / save / commit / delete update an in-process overlay and queue
+    the write; the writer thread applies everything queued in one
+    transaction per batch, so a turn never waits on the disk. Loads read the
+    overlay first. Listings and counts flush pending writes, then use the
+    activity / substate indexes. One process per file: pending writes are
+    only visible to the process that queued them.
+
+    A failed batch is retried with backoff for as long as it keeps failing
+    (the overlay still serves its sessions); readers wait at most
+    flush_timeout for it and then answer from the file, and health_check
+    reports the store degraded meanwhile.
+    """
+
+    backend = BACKEND_SQLITE
+
+    # Exchanges kept per session
+    history_limit = 50
+
+    def __init__(self, path: str = None, flush_interval: float = None, batch_size: int = None,
+                 synchronous: str = None, flush_timeout: float = None):
+        """
+        Args:
+            path: Database file (TRT_SQLITE_PATH)
+            flush_interval: Seconds the writer waits to gather a batch (TRT_SQLITE_FLUSH_MS)
+            batch_size: Writes that trigger a batch right away (TRT_SQLITE_BATCH_SIZE)
+            synchronous: SQLite synchronous pragma: NORMAL (default; in WAL mode, commits
+                         survive a process crash, the last ones may be lost on power loss) or FULL
+                         (TRT_SQLITE_SYNCHRONOUS)
+            flush_timeout: Longest a listing or count waits for pending writes
+                           (TRT_SQLITE_FLUSH_TIMEOUT_SECONDS)
+        """
+        if flush_interval is None:
+            flush_interval = float(os.getenv("TRT_SQLITE_FLUSH_MS", "50")) / 1000
+        if batch_size is None:
+            batch_size = int(os.getenv("TRT_SQLITE_BATCH_SIZE", "500"))
+        if synchronous is None:
+            synchronous = os.getenv("TRT_SQLITE_SYNCHRONOUS", "NORMAL").upper()
+        if flush_timeout is None:
+            flush_timeout = float(os.getenv("TRT_SQLITE_FLUSH_TIMEOUT_SECONDS", "5"))
+        if synchronous not in ("OFF", "NORMAL", "FULL", "EXTRA"):
+            raise ValueError(f"Invalid SQLite synchronous setting: {synchronous}")
+
+        self.path = path or os.getenv("TRT_SQLITE_PATH", "data/sessions.db")
+        self.flush_interval = flush_interval
+        self.batch_size = batch_size
+        self.synchronous = synchronous
+        self.flush_timeout = flush_timeout
+        self.metrics = get_metrics()
+        if os.path.dirname(self.path):
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+
+        # Overlay of queued writes: session_id -> row (None = deleted), plus queued history entries
+        self._lock = threading.Lock()
+        self._changed = threading.Condition(self._lock)
+        self._pending: Dict[str, Optional[Tuple]] = {}
+        self._dirty: set = set()
+        self._history: List[Tuple[str, bytes]] = []
+        self._queued = 0      # Writes queued so far
+        self._committed = 0   # ... of which on disk
+        self._flush_requested = False
+        self._stopping = False
+        self.batches = 0
+        self.failures = 0
+        self.failing = 0          # Consecutive failed batches (0 = the writer is keeping up)
+        self.last_error: Optional[str] = None
+
+        self._local = threading.local()
+        self._connections: List[sqlite3.Connection] = []
+        self._connections_lock = threading.Lock()
+        self._connect().executescript(_SCHEMA)
+
+        self._writer = threading.Thread(target=self._run, name="sqlite-session-writer", daemon=True)
+        self._writer.start()
+        logger.info(f"✅ SQLite session store: {self.path} (synchronous={synchronous})")
+
+    def _connect(self) -> sqlite3.Connection:
+        """This thread's connection (sqlite3 connections must stay on their thread)"""
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            connection = sqlite3.connect(self.path, isolation_level=None, cached_statements=64,
+                                         check_same_thread=False)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute(f"PRAGMA synchronous={self.synchronous}")
+            connection.execute("PRAGMA busy_timeout=5000")
+            self._local.connection = connection
+            with self._connections_lock:
+                self._connections.append(connection)
+        return connection
+
+    @staticmethod
+    def _row(record: SessionRecord, fencing_token: int) -> Tuple:
+        return (record.session_id, record.client_id, record.status, record.session_state.current_substate,
+                record.created_at.isoformat(), record.last_interaction.isoformat(),
+                record.last_interaction.timestamp(), record.turn_count, fencing_token,
+                FileSessionStore._encode(record, fencing_token))
+
+    def _queue(self, session_id: str, row: Optional[Tuple]):
+        """Record a write in the overlay and wake the writer (caller holds the lock)"""
+        self._pending[session_id] = row
+        self._dirty.add(session_id)
+        self._queued += 1
+        self._wake()
+
+    def _wake(self):
+        """Wake the writer when the queue becomes non-empty or a batch is full (caller holds the lock)"""
+        queued = len(self._dirty) + len(self._history)
+        if queued == 1 or queued >= self.batch_size:
+            self._changed.notify_all()
+
+    def _current(self, session_id: str):
+        """The session's row as this process sees it: the overlay's (None = deleted), else the table's"""
+        if session_id in self._pending:
+            return self._pending[session_id]
+        row = self._connect().execute(_FENCING_TOKEN, (session_id,)).fetchone()
+        return None if row is None else (None,) * _ROW_FENCING_TOKEN + (row[0],)
+
+    def load(self, session_id: str) -> Optional[SessionRecord]:
+        with self._lock:
+            if session_id in self._pending:
+                row = self._pending[session_id]
+                return FileSessionStore._decode(row[_ROW_RECORD]) if row else None
+        row = self._connect().execute(_LOAD, (session_id,)).fetchone()
+        return FileSessionStore._decode(row[0]) if row else None
+
+    def exists(self, session_id: str) -> bool:
+        with self._lock:
+            return self._current(session_id) is not None
+
+    def create(self, record: SessionRecord) -> bool:
+        with self._lock:
+            if self._current(record.session_id) is not None:
+                return False
+            self._queue(record.session_id, self._row(record, 0))
+        return True
+
+    def save(self, record: SessionRecord, fencing_token: int = None) -> bool:
+        with self._lock:
+            current = self._current(record.session_id)
+            stored_token = current[_ROW_FENCING_TOKEN] if current else 0
+            if fencing_token is not None and stored_token > fencing_token:
+                logger.warning(f"⚠️ Stale write refused for session {record.session_id} "
+                               f"(fencing token {fencing_token})")
+                return False
+            self._queue(record.session_id, self._row(record, max(fencing_token or 0, stored_token)))
+        return True
+
+    def delete(self, session_id: str) -> bool:
+        with self._lock:
+            if self._current(session_id) is None:
+                return False
+            # Queued history of the deleted session must not outlive it
+            self._history = [entry for entry in self._history if entry[0] != session_id]
+            self._queue(session_id, None)
+        return True
+
+    def add_exchange(self, session_id: str, exchange: Dict) -> bool:
+        exchange["timestamp"] = datetime.now().isoformat()
+        entry = encode_exchange(exchange)
+        with self._lock:
+            self._history.append((session_id, entry))
+            self._queued += 1
+            self._wake()
+        return True
+
+    def get_conversation_history(self, session_id: str, limit: int = 10) -> List[Dict]:
+        """Exchanges of a session, newest first (queued ones included)"""
+        with self._lock:
+            if session_id in self._pending and self._pending[session_id] is None:
+                return []
+            queued = [entry for queued_id, entry in self._history if queued_id == session_id]
+        entries = queued[::-1][:limit]
+        if len(entries) < limit:
+            entries += [row[0] for row in self._connect().execute(_HISTORY, (session_id, limit - len(entries)))]
+        exchanges = []
+        for entry in entries:
+            try:
+                exchanges.append(decode_exchange(entry))
+            except HistoryCodecError as e:
+                logger.warning(f"⚠️ Skipping unreadable history entry of {session_id}: {e}")
+        return exchanges
+
+    def _write_batch(self, rows: Dict[str, Optional[Tuple]], history: List[Tuple[str, bytes]]):
+        """Apply one batch in a single transaction"""
+        db = self._connect()
+        db.execute("BEGIN IMMEDIATE")
+        try:
+            deleted = [(session_id,) for session_id, row in rows.items() if row is None]
+            db.executemany(_DELETE, deleted)
+            db.executemany(_DELETE_HISTORY, deleted)
+            db.executemany(_UPSERT, [row for row in rows.values() if row is not None])
+            db.executemany(_APPEND_HISTORY, history)
+            db.executemany(_TRIM_HISTORY, [(session_id, session_id, self.history_limit)
+                                           for session_id in {session_id for session_id, _ in history}])
+            db.execute("COMMIT")
+        except BaseException:
+            db.execute("ROLLBACK")
+            raise
+
+    def _run(self):
+        while True:
+            with self._lock:
+                while not (self._dirty or self._history) and not self._stopping:
+                    self._changed.wait()
+                if self._stopping and not (self._dirty or self._history):
+                    return
+                # Gather a batch, unless it's full already or someone is waiting for it
+                deadline = time.monotonic() + self.flush_interval
+                while (len(self._dirty) + len(self._history) < self.batch_size and not self._flush_requested
+                       and not self._stopping and time.monotonic() < deadline):
+                    self._changed.wait(deadline - time.monotonic())
+                rows = {session_id: self._pending[session_id] for session_id in self._dirty}
+                history, target = self._history, self._queued
+                self._dirty, self._history = set(), []
+
+            start = time.monotonic()
+            try:
+                self._write_batch(rows, history)
+            except Exception as e:
+                self.failures += 1
+                self.metrics.increment("sqlite_batch_failures_total")
+                with self._lock:
+                    self.failing += 1
+                    self.last_error = str(e)
+                    if self._stopping:
+                        logger.error(f"❌ SQLite session write failed on shutdown, {len(rows)} sessions and "
+                                     f"{len(history)} exchanges not written: {e}")
+                        return
+                    logger.error(f"❌ SQLite session write failed ({len(rows)} sessions, {len(history)} "
+                                 f"exchanges, attempt {self.failing}), retrying: {e}")
+                    # Requeue: the overlay still holds the rows, history goes back in front
+                    self._dirty |= set(rows)
+                    self._history = history + self._history
+                    # Back off; close() cuts it short
+                    retry_at = time.monotonic() + min(0.05 * 2 ** self.failing, 5.0)
+                    while not self._stopping and time.monotonic() < retry_at:
+                        self._changed.wait(retry_at - time.monotonic())
+                continue
+
+            self.metrics.observe("sqlite_batch_seconds", time.monotonic() - start)
+            with self._lock:
+                self.batches += 1
+                self.failing = 0
+                for session_id, row in rows.items():
+                    # Written; the overlay may already hold a newer row for it
+                    if session_id not in self._dirty and self._pending.get(session_id, row) is row:
+                        del self._pending[session_id]
+                self._committed = target
+                self._flush_requested = False
+                self._changed.notify_all()
+
+    def flush(self, timeout: float = None) -> bool:
+        """
+        Wait until everything queued so far is on disk
+
+        Returns:
+            False if the timeout passed first
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._lock:
+            target = self._queued
+            while self._committed < target:
+                self._flush_requested = True
+                self._changed.notify_all()
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self._changed.wait(remaining)
+        return True
+
+    def _flush_for_read(self):
+        """Let a listing see pending writes - waiting at most flush_timeout, and not at all while writes fail"""
+        if self.failing:
+            return
+        if not self.flush(self.flush_timeout):
+            self.metrics.increment("sqlite_flush_timeouts_total")
+            logger.warning(f"⚠️ SQLite writes still pending after {self.flush_timeout}s, reading the file as is")
+
+    @staticmethod
+    def _summary(row: Tuple) -> Dict:
+        session_id, client_id, status, substate, created_at, last_interaction, turn_count = row
+        return {
+            "session_id": session_id,
+            "client_id": client_id,
+            "status": status,
+            "current_substate": substate,
+            "created_at": created_at,
+            "last_interaction": last_interaction,
+            "turn_count": turn_count
+        }
+
+    def list_page(self, limit: int = 100, cursor: str = None, substate: str = None,
+                  active_since: datetime = None, active_before: datetime = None) -> SessionPage:
+        after = decode_cursor(cursor) if cursor else None
+        self._flush_for_read()
+
+        conditions, params = [], []
+        if substate is not None:
+            conditions.append("current_substate = ?")
+            params.append(substate)
+        if active_since is not None:
+            conditions.append("last_active >= ?")
+            params.append(active_since.timestamp())
+        if active_before is not None:
+            conditions.append("last_active < ?")
+            params.append(active_before.timestamp())
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+        page_where, page_params = where, list(params)
+        if after is not None:
+            page_where = f"{where} {'AND' if where else 'WHERE'} (last_active, session_id) < (?, ?)"
+            page_params += list(after)
+
+        db = self._connect()
+        total = db.execute(f"SELECT COUNT(*) FROM sessions {where}", params).fetchone()[0]
+        rows = db.execute(f"SELECT last_active, {_SUMMARY_COLUMNS} FROM sessions {page_where} "
+                          f"ORDER BY last_active DESC, session_id DESC LIMIT ?", page_params + [limit + 1]).fetchall()
+        page = rows[:limit]
+        next_cursor = encode_cursor((page[-1][0], page[-1][1])) if len(rows) > limit else None
+        return SessionPage([dict(self._summary(row[1:]), storage=self.backend) for row in page],
+                           next_cursor, total)
+
+    def count(self) -> int:
+        self._flush_for_read()
+        return self._connect().execute("SELECT COUNT(*) FROM sessions").fetchone()[0]
+
+    def stats(self) -> Dict:
+        """Write-behind queue and file size, for /health"""
+        with self._lock:
+            pending = len(self._dirty) + len(self._history)
+        return {
+            "path": self.path,
+            "pending_writes": pending,
+            "batches": self.batches,
+            "failed_batches": self.failures,
+            "failing": self.failing,
+            "last_error": self.last_error if self.failing else None,
+            "bytes": sum(os.path.getsize(path) for path in (self.path, f"{self.path}-wal")
+                         if os.path.exists(path))
+        }
+
+    def health_check(self) -> Dict:
+        health = dict(super().health_check(), sqlite=self.stats())
+        if health["sqlite"]["failing"]:
+            # Sessions are served from the overlay, but nothing reaches the file
+            health["status"] = "degraded"
+        return health
+
+    def close(self, timeout: float = 10.0):
+        """Write everything queued (waiting at most `timeout`), stop the writer and close the connections"""
+        if not self.flush(timeout):
+            logger.error(f"❌ {self.stats()['pending_writes']} SQLite session writes not stored before shutdown")
+        with self._lock:
+            self._stopping = True
+            self._changed.notify_all()
+        self._writer.join(timeout=5)
+        with self._connections_lock:
+            connections, self._connections = self._connections, []
+        for connection in connections:
+            connection.close()
+
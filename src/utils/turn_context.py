@@ -0,0 +1,238 @@
+"""
+Turn Context for TRT Pipeline
+Per-turn information (session, crisis flag, latency deadline) visible to the
+LLM client and agents without threading extra arguments through every method
+"""
+
+import contextvars
+import os
+import threading
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Tuple
+
+from src.utils.metrics import get_metrics
+
+# Below this much remaining budget an LLM call is not worth starting
+MIN_LLM_CALL_SECONDS = float(os.getenv("TRT_MIN_LLM_CALL_SECONDS", "0.5"))
+
+
+class DeadlineExceeded(Exception):
+    """Raised when a stage has no budget left; callers switch to their rule-based fallback"""
+    pass
+
+
+class TurnCancelled(Exception):
+    """Raised when nobody is waiting for the turn any more (client gone or turn superseded)"""
+
+    def __init__(self, reason: str = "cancelled"):
+        super().__init__(f"Turn cancelled: {reason}")
+        self.reason = reason
+
+
+class CancelToken:
+    """Thread-safe cancellation flag shared by a turn's HTTP request, pipeline and LLM calls"""
+
+    def __init__(self):
+        self._event = threading.Event()
+        self.reason: Optional[str] = None
+
+    def cancel(self, reason: str) -> bool:
+        """
+        Cancel the turn (first reason wins)
+
+        Returns:
+            True if this call cancelled it, False if it already was
+        """
+        if self._event.is_set():
+            return False
+        self.reason = reason
+        self._event.set()
+        get_metrics().increment("turn_cancellations_total", labels={"reason": reason})
+        return True
+
+    @property
+    def cancelled(self) -> bool:
+        return self._event.is_set()
+
+    def raise_if_cancelled(self):
+        if self._event.is_set():
+            raise TurnCancelled(self.reason)
+
+
+def default_turn_budget() -> Optional[float]:
+    """Per-turn latency budget from config (TRT_TURN_BUDGET_SECONDS, 0 = unlimited)"""
+    budget = float(os.getenv("TRT_TURN_BUDGET_SECONDS", "20"))
+    return budget if budget > 0 else None
+
+
+@dataclass
+class TurnContext:
+    """Information about the turn currently being processed on this thread"""
+    session_id: Optional[str] = None
+    crisis: bool = False  # Self-harm detected - every LLM call in this turn jumps the queue
+
+    # Latency budget: absolute time.monotonic() deadline for the whole turn
+    deadline: Optional[float] = None
+    stage: Optional[str] = None
+    stage_reserve: float = 0.0  # Seconds the current stage must leave for later stages
+    degraded_stages: List[str] = field(default_factory=list)
+    cancel_token: CancelToken = field(default_factory=CancelToken)
+
+    def remaining(self) -> Optional[float]:
+        """Seconds left in the turn budget (None = no deadline)"""
+        if self.deadline is None:
+            return None
+        return self.deadline - time.monotonic()
+
+    def stage_remaining(self) -> Optional[float]:
+        """Seconds the current stage may spend (remaining budget minus later-stage reserve)"""
+        remaining = self.remaining()
+        if remaining is None:
+            return None
+        return remaining - self.stage_reserve
+
+    def llm_timeout(self, default: float) -> float:
+        """
+        Timeout for an LLM call in the current stage
+
+        Raises:
+            DeadlineExceeded if the stage has too little budget left to bother
+        """
+        available = self.stage_remaining()
+        if available is None:
+            return default
+        if available < MIN_LLM_CALL_SECONDS:
+            raise DeadlineExceeded(
+                f"{self.stage or 'turn'} budget exhausted ({max(available, 0):.2f}s left)"
+            )
+        return min(default, available)
+
+    def check_cancelled(self):
+        """Stop the pipeline between stages once the turn has been cancelled"""
+        self.cancel_token.raise_if_cancelled()
+
+    def mark_degraded(self, reason: str):
+        """Record that the current stage fell back (e.g. 'navigation:deadline')"""
+        tag = f"{self.stage or 'turn'}:{reason}"
+        if tag not in self.degraded_stages:
+            self.degraded_stages.append(tag)
+
+    @contextmanager
+    def stage_scope(self, name: str, reserve_seconds: float = 0.0):
+        """Mark the pipeline stage being run and how much budget it must leave behind"""
+        previous = (self.stage, self.stage_reserve)
+        self.stage, self.stage_reserve = name, reserve_seconds
+        try:
+            yield self
+        finally:
+            self.stage, self.stage_reserve = previous
+
+
+_current_turn: contextvars.ContextVar = contextvars.ContextVar("trt_current_turn", default=None)
+
+
+def current_turn() -> Optional[TurnContext]:
+    """Turn being processed on this thread/task, or None outside a turn"""
+    return _current_turn.get()
+
+
+@contextmanager
+def turn_scope(context: TurnContext):
+    """Make `context` the current turn for the duration of the block"""
+    token = _current_turn.set(context)
+    try:
+        yield context
+    finally:
+        _current_turn.reset(token)
+
+
+@dataclass
+class _InFlightTurn:
+    token: CancelToken
+    messages: List[str]
+    claimed: bool = False  # Committing its answer: its messages can no longer be taken over
+
+
+class InFlightTurns:
+    """
+    Per-process registry of turns being processed, at most one per session
+
+    When a session sends a new message (or retries) while its previous turn is
+    still running, the old turn is cancelled so its LLM calls stop early, and
+    the new turn answers the old turn's messages along with its own - unless
+    the old turn already claimed them (it is committing its answer).
+    """
+
+    def __init__(self, supersede: bool = None):
+        if supersede is None:
+            supersede = os.getenv("TRT_SUPERSEDE_TURNS", "true").lower() == "true"
+        self.supersede = supersede
+        self._lock = threading.Lock()
+        self._turns: Dict[str, _InFlightTurn] = {}
+
+    def begin(self, session_id: str) -> CancelToken:
+        """Register a new turn for the session, cancelling the one in flight"""
+        return self.takeover(session_id, [])[0]
+
+    def takeover(self, session_id: str, messages: List[str]) -> Tuple[CancelToken, List[str]]:
+        """
+        Register a new turn for `messages`, superseding the session's turn in flight
+
+        Returns:
+            (the new turn's token, the messages it must answer: those of the
+            superseded turn first, then its own)
+        """
+        turn = _InFlightTurn(CancelToken(), list(messages))
+        with self._lock:
+            previous = self._turns.get(session_id)
+            self._turns[session_id] = turn
+            if (self.supersede and previous is not None and not previous.claimed
+                    and previous.token.cancel("superseded")):
+                # A retry of the same message isn't answered twice
+                turn.messages = [m for m in previous.messages if m not in messages] + turn.messages
+        return turn.token, turn.messages
+
+    def claim(self, session_id: str, token: CancelToken) -> bool:
+        """
+        Claim the turn's messages before committing its answer
+
+        Returns:
+            False if a newer turn took them over (the turn must not commit)
+        """
+        with self._lock:
+            if token.reason == "superseded":
+                return False
+            turn = self._turns.get(session_id)
+            if turn is not None and turn.token is token:
+                turn.claimed = True
+            return True
+
+    def end(self, session_id: str, token: CancelToken):
+        """Unregister a finished turn (no-op if a newer turn already replaced it)"""
+        with self._lock:
+            turn = self._turns.get(session_id)
+            if turn is not None and turn.token is token:
+                del self._turns[session_id]
+
+    def cancel(self, session_id: str, reason: str) -> bool:
+        """Cancel the session's in-flight turn, if any"""
+        with self._lock:
+            turn = self._turns.get(session_id)
+        return turn.token.cancel(reason) if turn is not None else False
+
+    def __len__(self):
+        with self._lock:
+            return len(self._turns)
+
+
+_in_flight_turns: Optional[InFlightTurns] = None
+
+
+def get_in_flight_turns() -> InFlightTurns:
+    """Get the process-wide registry of in-flight turns"""
+    global _in_flight_turns
+    if _in_flight_turns is None:
+        _in_flight_turns = InFlightTurns()
+    return _in_flight_turns
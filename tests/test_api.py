@@ -0,0 +1,227 @@
+"""
+API Tests
+The therapy system is built off the event loop (503 until ready), /health
+probes Ollama without blocking it and follows the session store, /health/ready
+waits for the models to be loaded, and a newer message for a session pre-empts
+the turn still running for it and answers its message too
+"""
+
+import asyncio
+import threading
+import time
+import sys
+import os
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pytest
+from fastapi import HTTPException
+
+from src.api import main
+from src.core.session_state_manager import TRTSessionState
+from src.utils.turn_context import TurnCancelled
+
+
+class FakeTherapySystem:
+    def warm_up(self):
+        return True
+
+
+def test_therapy_system_builds_in_the_background(monkeypatch):
+    building = threading.Event()
+    release = threading.Event()
+
+    def build():
+        building.set()
+        assert release.wait(5)
+        main._global_therapy_system = FakeTherapySystem()
+        return main._global_therapy_system
+
+    monkeypatch.setattr(main, "_build_therapy_system", build)
+    monkeypatch.setattr(main, "_global_therapy_system", None)
+    monkeypatch.setitem(main.warmup_state, "status", "failed")
+
+    # Not built yet: the request is refused at once while a rebuild starts
+    with pytest.raises(HTTPException) as refused:
+        main.get_therapy_system()
+    assert refused.value.status_code == 503
+    assert building.wait(5)
+    with pytest.raises(HTTPException):
+        main.get_therapy_system()
+
+    release.set()
+    main._warmup_task.join(5)
+    assert main.warmup_state["status"] == "ready"
+    assert isinstance(main.get_therapy_system(), FakeTherapySystem)
+
+
+def test_health_probes_ollama_off_the_event_loop(monkeypatch):
+    class Pool:
+        urls = ["http://ollama-1", "http://ollama-2", "http://ollama-3"]
+
+        def get_status(self):
+            return {"state": "closed"}
+
+    class System:
+        llm_client = type("Client", (), {"pool": Pool()})()
+
+    def slow_probe(url):
+        time.sleep(0.3)
+        return url == "http://ollama-2"
+
+    monkeypatch.setattr(main, "_global_therapy_system", System())
+    monkeypatch.setattr(main, "probe_ollama", slow_probe)
+
+    async def scenario():
+        ticks = 0
+
+        async def ticker():
+            nonlocal ticks
+            while True:
+                await asyncio.sleep(0.02)
+                ticks += 1
+
+        ticking = asyncio.ensure_future(ticker())
+        start = time.monotonic()
+        health = await main.health_check()
+        elapsed = time.monotonic() - start
+        ticking.cancel()
+        return health, elapsed, ticks
+
+    health, elapsed, ticks = asyncio.run(scenario())
+    assert health.services["ollama"] == "connected"
+    # The three probes ran side by side, and the loop kept serving meanwhile
+    assert elapsed < 0.6 and ticks >= 5
+
+
+def test_health_follows_the_local_session_store(monkeypatch):
+    class Pool:
+        urls = ["http://ollama-1"]
+
+        def get_status(self):
+            return {"state": "closed"}
+
+    class System:
+        llm_client = type("Client", (), {"pool": Pool()})()
+
+    store_status = {"status": "healthy"}
+    monkeypatch.setattr(main, "_global_therapy_system", System())
+    monkeypatch.setattr(main, "probe_ollama", lambda url: True)
+    monkeypatch.setattr(main.os.path, "exists", lambda path: True)
+    store_health = main.session_store.health_check
+    monkeypatch.setattr(main.session_store, "health_check", lambda: dict(store_health(), **store_status))
+
+    # Without Redis configured, a working local store is healthy...
+    health = asyncio.run(main.health_check())
+    assert health.status == "healthy" and health.services["redis"] == "not_configured"
+
+    # ...and the store's own verdict is what counts
+    store_status["status"] = "degraded"
+    assert asyncio.run(main.health_check()).status == "degraded"
+    store_status["status"] = "unhealthy"
+    assert asyncio.run(main.health_check()).status == "unhealthy"
+
+
+def test_ready_probe_needs_the_models_loaded(monkeypatch):
+    class Residency:
+        loaded = False
+
+        def models_ready(self):
+            return self.loaded
+
+    residency = Residency()
+    monkeypatch.setattr(main, "_global_therapy_system", type("System", (), {"residency_manager": residency})())
+    monkeypatch.setitem(main.warmup_state, "status", "ready")
+
+    # Built, but the preload failed (or Ollama dropped the model): not ready
+    response = asyncio.run(main.readiness_check())
+    assert response.status_code == 503
+    assert b'"degraded"' in response.body and b'"model_loaded":false' in response.body
+
+    residency.loaded = True
+    assert asyncio.run(main.readiness_check()).status_code == 200
+
+
+class BlockingTherapySystem:
+    """Turn "slow" runs until its turn is cancelled; any other input answers at once"""
+
+    def __init__(self):
+        self.started = threading.Event()
+
+    def create_session(self, session_id):
+        return TRTSessionState(session_id)
+
+    def process_client_input(self, text, session_state, deadline, cancel_token, messages):
+        if text == "slow":
+            self.started.set()
+            while True:
+                cancel_token.raise_if_cancelled()
+                time.sleep(0.01)
+        return {
+            "therapist_response": f"answer to {text}",
+            "preprocessing": {
+                "original_input": text, "cleaned_input": text, "corrected_input": text,
+                "emotional_state": {}, "input_category": "statement", "spelling_corrections": [],
+                "self_harm_detected": {}, "thinking_mode_detected": {}, "past_tense_detected": {},
+                "i_dont_know_detected": {}
+            },
+            "navigation": {"navigation_decision": "body_enquiry"},
+            "session_state": {"current_substate": session_state.current_substate, "body_question_count": 0,
+                              "stage_1_completion": session_state.stage_1_completion}
+        }
+
+
+def test_newer_message_supersedes_the_turn_holding_the_lock():
+    therapy_system = BlockingTherapySystem()
+
+    async def turn(text):
+        return await main.execute_session_turn(therapy_system, "supersede-1", [text], [None], None, {})
+
+    async def scenario():
+        older = asyncio.ensure_future(turn("slow"))
+        while not therapy_system.started.is_set():
+            await asyncio.sleep(0.01)
+        # The older turn holds the session lock; the newer one cancels it instead of queueing behind it
+        newer = await asyncio.wait_for(turn("fast"), 5)
+        with pytest.raises(TurnCancelled) as cancelled:
+            await older
+        return newer, cancelled.value
+
+    newer, cancelled = asyncio.run(scenario())
+    assert newer.therapist_response == "answer to slow\nfast"
+    assert cancelled.reason == "superseded"
+    assert main.cancelled_turn_error(cancelled).status_code == 409
+    assert len(main.get_in_flight_turns()) == 0
+
+
+def test_superseded_message_is_answered_by_the_newer_turn(monkeypatch):
+    therapy_system = BlockingTherapySystem()
+    committed = []
+    commit = main.session_store.commit_async
+
+    async def recording_commit(record, exchange=None, fencing_token=None):
+        committed.append(exchange or {})
+        return await commit(record, exchange, fencing_token=fencing_token)
+
+    monkeypatch.setattr(main.session_store, "commit_async", recording_commit)
+    monkeypatch.setattr(main, "history_writer", None)
+
+    async def turn(text):
+        return await main.execute_session_turn(therapy_system, "supersede-2", [text], [None], None, {})
+
+    async def scenario():
+        older = asyncio.ensure_future(turn("slow"))
+        while not therapy_system.started.is_set():
+            await asyncio.sleep(0.01)
+        newer = await asyncio.wait_for(turn("and my chest is tight"), 5)
+        with pytest.raises(TurnCancelled):
+            await older
+        return newer
+
+    newer = asyncio.run(scenario())
+    # Both messages went into the one turn that was stored
+    assert newer.therapist_response == "answer to slow\nand my chest is tight"
+    assert [exchange.get("client_messages") for exchange in committed] == [["slow", "and my chest is tight"]]
+
+
+if __name__ == "__main__":
+    sys.exit(pytest.main([__file__, "-q"]))
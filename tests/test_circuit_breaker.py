@@ -0,0 +1,113 @@
+"""
+Circuit Breaker Tests
+State transitions driven by a fake clock - no Ollama needed
+"""
+
+import sys
+import os
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.utils.circuit_breaker import CircuitBreaker, CLOSED, OPEN, HALF_OPEN
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+def make_breaker(clock, **kwargs):
+    settings = dict(window_size=10, minimum_calls=4, failure_rate_threshold=0.5,
+                    slow_call_seconds=5.0, slow_call_rate_threshold=0.75,
+                    open_seconds=10.0, jitter=0.0, clock=clock)
+    settings.update(kwargs)
+    return CircuitBreaker(name="test", **settings)
+
+
+def test_opens_on_failure_rate_and_rejects():
+    clock = FakeClock()
+    breaker = make_breaker(clock)
+
+    breaker.record_success(0.1)
+    breaker.record_failure()
+    breaker.record_success(0.1)
+    assert breaker.state == CLOSED  # Below minimum_calls
+
+    breaker.record_failure()
+    assert breaker.state == OPEN
+    assert breaker.is_open()
+    assert not breaker.allow_request()
+
+
+def test_opens_on_slow_calls():
+    clock = FakeClock()
+    breaker = make_breaker(clock)
+    for _ in range(4):
+        breaker.record_success(6.0)
+    assert breaker.state == OPEN
+
+
+def test_deadline_cutoffs_count_only_when_slow():
+    clock = FakeClock()
+    breaker = make_breaker(clock)
+    for _ in range(10):
+        breaker.record_deadline(0.2)
+    assert breaker.state == CLOSED and breaker.get_status()["recent_calls"] == 0
+
+    for _ in range(4):
+        breaker.record_deadline(6.0)
+    assert breaker.state == OPEN
+
+
+def test_half_open_probe_closes_on_success():
+    clock = FakeClock()
+    breaker = make_breaker(clock)
+    for _ in range(4):
+        breaker.record_failure()
+
+    clock.now += 10.0
+    assert breaker.allow_request()
+    assert breaker.state == HALF_OPEN
+    assert not breaker.allow_request()  # Only one probe at a time
+
+    breaker.record_success(0.2)
+    assert breaker.state == CLOSED
+    assert breaker.allow_request()
+
+
+def test_failed_probe_reopens_with_backoff():
+    clock = FakeClock()
+    breaker = make_breaker(clock)
+    for _ in range(4):
+        breaker.record_failure()
+
+    clock.now += 10.0
+    assert breaker.allow_request()
+    breaker.record_failure()
+    assert breaker.state == OPEN
+
+    # Second open waits twice as long
+    clock.now += 10.0
+    assert not breaker.allow_request()
+    clock.now += 10.0
+    assert breaker.allow_request()
+
+
+def test_jitter_stays_within_bounds():
+    clock = FakeClock()
+    breaker = make_breaker(clock, jitter=0.2)
+    for _ in range(4):
+        breaker.record_failure()
+    retry_in = breaker.get_status()["retry_in_seconds"]
+    assert 8.0 <= retry_in <= 12.0
+
+
+if __name__ == "__main__":
+    test_opens_on_failure_rate_and_rejects()
+    test_opens_on_slow_calls()
+    test_half_open_probe_closes_on_success()
+    test_failed_probe_reopens_with_backoff()
+    test_jitter_stays_within_bounds()
+    print("✅ All circuit breaker tests passed")
@@ -0,0 +1,114 @@
+"""
+History Codec Tests
+Compact exchange encoding, dictionary compression and reading older JSON entries
+"""
+
+import sys
+import os
+import json
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pytest
+
+from src.core.session_state_manager import TRTSessionState
+from src.utils.history_codec import (
+    encode_exchange, decode_exchange, train_dictionary, dictionary_from_bytes, HistoryCodecError, FLAG_ZSTD,
+    FLAG_DICTIONARY
+)
+
+
+def api_exchange(turn):
+    return {
+        "client_input": f"it's a tightness in my chest ({turn})",
+        "therapist_response": "Where do you feel that in your body?",
+        "navigation_decision": "body_awareness_inquiry",
+        "current_substate": "1.2_problem_and_body",
+        "client_messages": ["it's a tightness", "in my chest"],
+        "timestamp": f"2026-10-18T09:{turn % 60:02d}:07.{turn:06d}"
+    }
+
+
+def navigation_exchange(turn):
+    return {
+        "turn": turn,
+        "timestamp": "2026-10-18T09:00:00",
+        "client_input": "I want to feel calmer at work",
+        "therapist_response": "What do you want our work together to achieve?",
+        "substate": "1.1_goal_and_vision",
+        "navigation_output": {
+            "current_stage": "stage_1_safety_building",
+            "navigation_decision": "clarify_goal",
+            "situation_type": "a situation the tables don't know",
+            "completion_status": dict(TRTSessionState("codec").stage_1_completion),
+            "advancement_blocked_by": ["goal_not_stated"],
+            "llm_confidence": 0.82,
+            "rule_override": True
+        }
+    }
+
+
+def test_exchanges_round_trip_smaller_than_json():
+    for exchange in (api_exchange(3), navigation_exchange(4)):
+        for compress in (False, True):
+            entry = encode_exchange(exchange, compress=compress)
+            assert decode_exchange(entry) == exchange
+        assert len(encode_exchange(exchange, compress=False)) < len(json.dumps(exchange)) / 2
+
+
+def test_values_codes_could_be_confused_with_are_kept_as_is():
+    odd = [
+        {"current_substate": 3, "timestamp": 1760000000},                 # Ints where codes go
+        {"timestamp": "2026-10-18T09:00:00+02:00", "substate": None},    # Not a naive ISO time
+        {1: "int key", "turn": {"nested": {"rag_query": "dr_q_ready"}}},  # Non-string key
+        {"timestamp": "yesterday", "navigation_decision": "an unknown decision"},
+    ]
+    for exchange in odd:
+        assert decode_exchange(encode_exchange(exchange)) == exchange
+
+
+def test_entries_written_before_the_codec_are_read_as_json():
+    exchange = api_exchange(1)
+    assert decode_exchange(json.dumps(exchange)) == exchange
+    assert decode_exchange(json.dumps(exchange).encode()) == exchange
+
+
+def test_dictionary_compression():
+    pytest.importorskip("zstandard")
+    dictionary = dictionary_from_bytes(train_dictionary(
+        [api_exchange(turn) for turn in range(200)] + [navigation_exchange(turn) for turn in range(200)], 4096))
+
+    exchange = api_exchange(7)
+    entry = encode_exchange(exchange, dictionary=dictionary)
+    assert entry[3] == FLAG_ZSTD | FLAG_DICTIONARY
+    assert len(entry) < len(encode_exchange(exchange, compress=True, dictionary=None))
+    assert decode_exchange(entry, dictionary=dictionary) == exchange
+
+    # Without the dictionary it was written with, the entry can't be read
+    with pytest.raises(HistoryCodecError):
+        decode_exchange(entry)
+
+
+def test_redis_history_reads_old_and_new_entries(monkeypatch):
+    fakeredis = pytest.importorskip("fakeredis")
+    pytest.importorskip("lupa")
+    from src.utils import redis_session_manager
+    from src.utils.redis_keys import session_key
+    server = fakeredis.FakeServer()
+    monkeypatch.setattr(redis_session_manager.redis, "from_url",
+                        lambda url, **kwargs: fakeredis.FakeRedis(server=server, **kwargs))
+    manager = redis_session_manager.RedisSessionManager()
+
+    manager.redis.lpush(session_key("hist-1", "history"), json.dumps({"client_input": "from before"}))
+    manager.create_session("hist-1", TRTSessionState("hist-1"))
+    assert manager.commit_turn("hist-1", TRTSessionState("hist-1"), exchange=api_exchange(2))
+    assert manager.add_conversation_exchange("hist-1", navigation_exchange(3))
+    manager.redis.xadd(session_key("hist-1", "stream"), {"entry": b"TH\x01\x03not zstd"})
+
+    history = manager.get_conversation_history("hist-1")
+    assert [entry.get("turn") for entry in history] == [3, None, None]
+    assert history[1]["navigation_decision"] == "body_awareness_inquiry"
+    assert history[2] == {"client_input": "from before"}
+
+
+if __name__ == "__main__":
+    sys.exit(pytest.main([__file__, "-q"]))
@@ -0,0 +1,94 @@
+"""
+History Stream and Feed Tests
+Per-session history streams (capped, range reads by time and turn) and the
+bucketed feed read through consumer groups (fakeredis)
+"""
+
+import sys
+import os
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pytest
+
+from src.core.session_state_manager import TRTSessionState
+from src.utils.history_feed import HistoryFeed
+from src.utils.redis_keys import session_key
+
+
+@pytest.fixture
+def manager(monkeypatch):
+    fakeredis = pytest.importorskip("fakeredis")
+    pytest.importorskip("lupa")
+    from src.utils import redis_session_manager
+    server = fakeredis.FakeServer()
+    monkeypatch.setattr(redis_session_manager.redis, "from_url",
+                        lambda url, **kwargs: fakeredis.FakeRedis(server=server, **kwargs))
+    return redis_session_manager.RedisSessionManager(cluster=False)
+
+
+def record_turns(manager, session_id, turns):
+    state = TRTSessionState(session_id)
+    manager.create_session(session_id, state)
+    for turn in turns:
+        assert manager.commit_turn(session_id, state, exchange={"turn": turn, "client_input": f"turn {turn}"})
+
+
+def test_history_stream_is_capped_and_read_by_range(manager):
+    manager.history_limit = 5
+    record_turns(manager, "stream-1", range(1, 9))
+
+    assert manager.redis.xlen(session_key("stream-1", "stream")) == 5
+    assert [e["turn"] for e in manager.get_conversation_history("stream-1", limit=3)] == [8, 7, 6]
+
+    by_turn = manager.get_history_range("stream-1", first_turn=5, last_turn=7)
+    assert [exchange["turn"] for _, exchange in by_turn] == [5, 6, 7]
+    assert [exchange["turn"] for _, exchange in manager.get_history_range("stream-1", count=2)] == [4, 5]
+
+    # Time bounds follow the stream IDs (milliseconds since the epoch)
+    entry_id = by_turn[1][0]
+    moment = int(entry_id.split("-")[0]) / 1000
+    since = manager.get_history_range("stream-1", since=moment)
+    before = manager.get_history_range("stream-1", before=moment)
+    assert len(since) + len(before) == 5
+    assert entry_id in [found_id for found_id, _ in since]
+    assert all(int(found_id.split("-")[0]) < int(entry_id.split("-")[0]) for found_id, _ in before)
+
+    assert manager.delete_session("stream-1")
+    assert not manager.redis.exists(session_key("stream-1", "stream"))
+
+
+def test_feed_delivers_every_exchange_to_a_consumer_group(manager):
+    record_turns(manager, "feed-a", (1, 2))
+    manager.cluster = True  # fakeredis is a single node; the split commit feeds from the index script
+    record_turns(manager, "feed-b", (1,))
+    manager.add_conversation_exchange("feed-a", {"turn": 3})
+
+    feed = HistoryFeed(manager.redis_binary, "analytics", "worker-1", manager.index_shards)
+    assert feed.ensure_group() == manager.index_shards
+    assert feed.ensure_group() == 0
+
+    entries = feed.read()
+    assert sorted((entry.session_id, entry.exchange["turn"]) for entry in entries) == [
+        ("feed-a", 1), ("feed-a", 2), ("feed-a", 3), ("feed-b", 1)]
+    assert feed.read() == []
+    assert feed.pending() == 4
+
+    # worker-1 died before acking: another consumer takes its entries over
+    other = HistoryFeed(manager.redis_binary, "analytics", "worker-2", manager.index_shards)
+    claimed = other.claim_stale(min_idle_ms=0)
+    assert sorted(entry.entry_id for entry in claimed) == sorted(entry.entry_id for entry in entries)
+    assert other.ack(claimed) == 4
+    assert other.pending() == 0
+
+
+def test_feed_can_be_turned_off(manager):
+    manager.feed_maxlen = 0
+    record_turns(manager, "quiet-1", (1,))
+    feed = HistoryFeed(manager.redis_binary, "analytics", "worker-1", manager.index_shards)
+    feed.ensure_group()
+    assert feed.read() == []
+    assert [e["turn"] for e in manager.get_conversation_history("quiet-1")] == [1]
+
+
+if __name__ == "__main__":
+    sys.exit(pytest.main([__file__, "-q"]))
@@ -0,0 +1,125 @@
+"""
+History Writer Tests
+Exchanges are written behind the turn in ordered batches, retried with
+backoff, flushed on shutdown, and land in the Redis streams (fakeredis)
+"""
+
+import asyncio
+import sys
+import os
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pytest
+
+from src.core.session_state_manager import TRTSessionState
+from src.utils.async_redis_session_manager import AsyncRedisSessionManager
+from src.utils.history_writer import HistoryWriter
+from src.utils.redis_keys import feed_key
+from src.utils.session_store import SessionRecord, RedisSessionStore
+
+
+class RecordingStore:
+    """Fake store: records each batch, failing the first `failures` writes"""
+
+    def __init__(self, failures=0):
+        self.failures = failures
+        self.batches = []
+
+    async def add_exchanges_async(self, exchanges):
+        if self.failures:
+            self.failures -= 1
+            raise ConnectionError("Redis unavailable")
+        self.batches.append([(session_id, exchange["turn"]) for session_id, exchange in exchanges])
+        return True
+
+
+def test_exchanges_are_batched_in_order_before_the_callbacks():
+    async def scenario():
+        store = RecordingStore()
+        writer = HistoryWriter(store, interval_ms=20, batch_size=3)
+        released = []
+
+        async def release(session_id, turn):
+            # The batch is stored before any of its callbacks run
+            assert any((session_id, turn) in batch for batch in store.batches)
+            released.append((session_id, turn))
+
+        for turn in range(1, 4):
+            for session_id in ("a", "b"):
+                exchange = {"turn": turn}
+                assert writer.submit(session_id, exchange,
+                                     after_write=lambda s=session_id, t=turn: release(s, t))
+                assert "timestamp" in exchange
+        assert writer.pending() == 6
+        assert await writer.flush(timeout=1)
+        return store, writer, released
+
+    store, writer, released = asyncio.run(scenario())
+    assert store.batches == [[("a", 1), ("b", 1), ("a", 2)], [("b", 2), ("a", 3), ("b", 3)]]
+    assert sorted(released) == sorted(entry for batch in store.batches for entry in batch)
+    assert writer.stats() == {"pending": 0, "written": 6, "dropped": 0}
+
+
+def test_failed_batches_are_retried_then_dropped():
+    async def scenario(failures):
+        store = RecordingStore(failures=failures)
+        writer = HistoryWriter(store, interval_ms=0, max_attempts=3, backoff_seconds=0.01)
+        released = []
+
+        async def release():
+            released.append(1)
+
+        writer.submit("retry-1", {"turn": 1}, after_write=release)
+        await writer.close(timeout=1)
+        return store, writer, released
+
+    store, writer, released = asyncio.run(scenario(failures=2))
+    assert store.batches == [[("retry-1", 1)]] and writer.written == 1 and released == [1]
+
+    # Given up on: dropped, and the lock released all the same
+    store, writer, released = asyncio.run(scenario(failures=3))
+    assert store.batches == [] and writer.dropped == 1 and released == [1]
+
+
+def test_full_queue_refuses_new_exchanges():
+    async def scenario():
+        writer = HistoryWriter(RecordingStore(), interval_ms=1000, max_pending=1)
+        accepted = [writer.submit("full-1", {"turn": turn}) for turn in (1, 2)]
+        await writer.close(timeout=1)
+        return accepted, writer
+
+    accepted, writer = asyncio.run(scenario())
+    assert accepted == [True, False] and writer.written == 1
+
+
+def test_written_behind_history_reaches_the_redis_streams(monkeypatch):
+    fakeredis = pytest.importorskip("fakeredis")
+    pytest.importorskip("lupa")
+    from src.utils import redis_session_manager
+    server = fakeredis.FakeServer()
+    monkeypatch.setattr(redis_session_manager.redis, "from_url",
+                        lambda url, **kwargs: fakeredis.FakeRedis(server=server, **kwargs))
+    async_manager = AsyncRedisSessionManager(cluster=False)
+    monkeypatch.setattr(async_manager, "_connect", lambda: fakeredis.FakeAsyncRedis(server=server))
+    store = RedisSessionStore(redis_session_manager.RedisSessionManager(cluster=False), async_manager)
+
+    async def scenario():
+        writer = HistoryWriter(store, interval_ms=10)
+        record = SessionRecord(session_id="behind-1", session_state=TRTSessionState("behind-1"))
+        assert await store.create_async(record)
+        for turn in (1, 2, 3):
+            record.turn_count = turn
+            # The turn's commit carries no exchange; the writer stores it afterwards
+            assert await store.commit_async(record, None)
+            writer.submit("behind-1", {"turn": turn, "client_input": f"turn {turn}"})
+        await writer.close()
+
+    asyncio.run(scenario())
+    history = store.manager.get_conversation_history("behind-1")
+    assert [exchange["turn"] for exchange in history] == [3, 2, 1]
+    bucket = store.manager._bucket("behind-1")
+    assert store.manager.redis.xlen(feed_key(bucket)) == 3
+
+
+if __name__ == "__main__":
+    sys.exit(pytest.main([__file__, "-q"]))
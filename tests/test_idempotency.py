@@ -0,0 +1,147 @@
+"""
+Idempotency Key Tests
+Retried requests wait for or replay the original response instead of
+running the turn again (Redis behaviour via fakeredis with Lua support)
+"""
+
+import sys
+import os
+import asyncio
+import time
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pytest
+
+from src.utils.idempotency import (
+    LocalIdempotencyStore, RedisIdempotencyStore, request_fingerprint,
+    IdempotencyKeyReusedError, IdempotencyInProgressError, _IdempotencyStoreBase
+)
+
+
+def redis_store(**kwargs):
+    fakeredis = pytest.importorskip("fakeredis")
+    pytest.importorskip("lupa")
+    return RedisIdempotencyStore(fakeredis.FakeRedis(decode_responses=True), **kwargs)
+
+
+@pytest.fixture(params=["local", "redis"])
+def make_store(request):
+    def make(**kwargs):
+        if request.param == "redis":
+            return redis_store(**kwargs)
+        return LocalIdempotencyStore(**kwargs)
+    return make
+
+
+class CountingTurn:
+    def __init__(self, duration=0.0, fail=False):
+        self.duration = duration
+        self.fail = fail
+        self.calls = 0
+
+    async def __call__(self):
+        self.calls += 1
+        await asyncio.sleep(self.duration)
+        if self.fail:
+            raise RuntimeError("ollama down")
+        return '{"therapist_response": "Where do you feel it?"}'
+
+
+def test_retry_during_turn_waits_for_original(make_store):
+    store = make_store(pending_seconds=5)
+    turn = CountingTurn(duration=0.3)
+    fingerprint = request_fingerprint("/api/v1/input", "s1", "my chest")
+
+    async def scenario():
+        async def retry():
+            await asyncio.sleep(0.1)
+            return await store.run_once("s1:key-1", fingerprint, turn)
+        return await asyncio.gather(store.run_once("s1:key-1", fingerprint, turn), retry())
+
+    original, duplicate = asyncio.run(scenario())
+    assert turn.calls == 1
+    assert original == (turn_result(), False)
+    assert duplicate == (turn_result(), True)
+
+
+def test_finished_request_is_replayed(make_store):
+    store = make_store()
+    turn = CountingTurn()
+    fingerprint = request_fingerprint("/api/v1/input", "s2", "yeah")
+
+    first = asyncio.run(store.run_once("s2:key-2", fingerprint, turn))
+    again = asyncio.run(store.run_once("s2:key-2", fingerprint, turn))
+    assert turn.calls == 1
+    assert again == (first[0], True)
+
+    with pytest.raises(IdempotencyKeyReusedError):
+        asyncio.run(store.run_once("s2:key-2", request_fingerprint("/api/v1/input", "s2", "no"), turn))
+
+
+def test_failed_request_can_be_retried(make_store):
+    store = make_store()
+    fingerprint = request_fingerprint("/api/v1/input", "s3", "hello")
+
+    with pytest.raises(RuntimeError):
+        asyncio.run(store.run_once("s3:key-3", fingerprint, CountingTurn(fail=True)))
+
+    retry = CountingTurn()
+    assert asyncio.run(store.run_once("s3:key-3", fingerprint, retry)) == (turn_result(), False)
+    assert retry.calls == 1
+
+
+def test_duplicate_gives_up_while_original_runs(make_store):
+    store = make_store(pending_seconds=5)
+    fingerprint = request_fingerprint("/api/v1/input", "s4", "hi")
+
+    async def scenario():
+        original = asyncio.create_task(store.run_once("s4:key-4", fingerprint, CountingTurn(duration=1.0)))
+        await asyncio.sleep(0.05)
+        try:
+            with pytest.raises(IdempotencyInProgressError):
+                await store.run_once("s4:key-4", fingerprint, CountingTurn(), wait_seconds=0.2)
+        finally:
+            original.cancel()
+
+    asyncio.run(scenario())
+
+
+def test_claim_of_dead_worker_is_taken_over(make_store):
+    store = make_store(pending_seconds=0.2)
+    fingerprint = request_fingerprint("/api/v1/input", "s5", "hi")
+    assert store.claim("s5:key-5", fingerprint, "crashed-worker") is None
+
+    retry = CountingTurn()
+    assert asyncio.run(store.run_once("s5:key-5", fingerprint, retry)) == (turn_result(), False)
+    assert retry.calls == 1
+
+
+def test_expired_claim_does_not_overwrite_the_new_owner(make_store):
+    store = make_store(pending_seconds=0.2)
+    fingerprint = request_fingerprint("/api/v1/input", "s6", "hi")
+    assert store.claim("s6:key-6", fingerprint, "slow-worker") is None
+    time.sleep(0.3)
+    assert store.claim("s6:key-6", fingerprint, "retry-worker") is None
+
+    # The slow original finishes late: the retry's claim stands
+    assert not store.complete("s6:key-6", fingerprint, "slow-worker", "late")
+    assert store.claim("s6:key-6", fingerprint, "third").owner == "retry-worker"
+    assert store.complete("s6:key-6", fingerprint, "retry-worker", turn_result())
+    assert store.claim("s6:key-6", fingerprint, "third").response == turn_result()
+
+
+def test_incomplete_store_fails_when_created():
+    class ClaimOnly(_IdempotencyStoreBase):
+        def claim(self, key, fingerprint, owner):
+            return None
+
+    with pytest.raises(TypeError):
+        ClaimOnly()
+
+
+def turn_result():
+    return '{"therapist_response": "Where do you feel it?"}'
+
+
+if __name__ == "__main__":
+    sys.exit(pytest.main([__file__, "-q"]))
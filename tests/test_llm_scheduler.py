@@ -0,0 +1,117 @@
+"""
+LLM Scheduler Tests
+Concurrency cap, priority ordering, per-session fairness and queue timeouts
+"""
+
+import sys
+import os
+import threading
+import time
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pytest
+
+from src.utils.llm_scheduler import LLMScheduler, RequestPriority, SchedulerTimeout
+
+
+def wait_for_queue(scheduler, count, timeout=2.0):
+    """Wait until `count` requests are queued"""
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if sum(scheduler.get_status()["queued"].values()) >= count:
+            return
+        time.sleep(0.005)
+    raise AssertionError(f"queue never reached {count}")
+
+
+def run_queued(scheduler, requests):
+    """
+    Hold the only slot, queue `requests` (priority, session_id, label) one by one,
+    then release and return the order in which they were served
+    """
+    served = []
+    served_lock = threading.Lock()
+
+    def worker(priority, session_id, label):
+        with scheduler.slot(priority, session_id):
+            with served_lock:
+                served.append(label)
+
+    scheduler.acquire(RequestPriority.BACKGROUND, "holder")
+    threads = []
+    for index, (priority, session_id, label) in enumerate(requests, 1):
+        thread = threading.Thread(target=worker, args=(priority, session_id, label))
+        thread.start()
+        threads.append(thread)
+        wait_for_queue(scheduler, index)
+
+    scheduler.release()
+    for thread in threads:
+        thread.join(timeout=2)
+    return served
+
+
+def test_concurrency_cap_is_respected():
+    scheduler = LLMScheduler(max_concurrency=2, queue_timeout_seconds=5)
+    peak = {"active": 0, "max": 0}
+    lock = threading.Lock()
+
+    def worker():
+        with scheduler.slot(RequestPriority.DIALOGUE, "s"):
+            with lock:
+                peak["active"] += 1
+                peak["max"] = max(peak["max"], peak["active"])
+            time.sleep(0.02)
+            with lock:
+                peak["active"] -= 1
+
+    threads = [threading.Thread(target=worker) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert peak["max"] == 2
+    assert scheduler.get_status()["active"] == 0
+
+
+def test_higher_priority_is_served_first():
+    scheduler = LLMScheduler(max_concurrency=1, queue_timeout_seconds=5)
+    served = run_queued(scheduler, [
+        (RequestPriority.BACKGROUND, "a", "background"),
+        (RequestPriority.NAVIGATION, "b", "navigation"),
+        (RequestPriority.DIALOGUE, "c", "dialogue"),
+        (RequestPriority.CRISIS, "d", "crisis"),
+    ])
+    assert served == ["crisis", "dialogue", "navigation", "background"]
+
+
+def test_sessions_are_served_round_robin_within_a_priority():
+    scheduler = LLMScheduler(max_concurrency=1, queue_timeout_seconds=5)
+    served = run_queued(scheduler, [
+        (RequestPriority.NAVIGATION, "chatty", "chatty-1"),
+        (RequestPriority.NAVIGATION, "chatty", "chatty-2"),
+        (RequestPriority.NAVIGATION, "chatty", "chatty-3"),
+        (RequestPriority.NAVIGATION, "quiet", "quiet-1"),
+    ])
+    assert served == ["chatty-1", "quiet-1", "chatty-2", "chatty-3"]
+
+
+def test_queue_timeout_raises_and_cleans_up():
+    scheduler = LLMScheduler(max_concurrency=1, queue_timeout_seconds=5)
+    scheduler.acquire(RequestPriority.DIALOGUE, "holder")
+
+    with pytest.raises(SchedulerTimeout):
+        scheduler.acquire(RequestPriority.NAVIGATION, "waiter", timeout=0.05)
+
+    assert scheduler.get_status()["queued"]["navigation"] == 0
+    scheduler.release()
+    assert scheduler.get_status()["active"] == 0
+
+
+if __name__ == "__main__":
+    test_concurrency_cap_is_respected()
+    test_higher_priority_is_served_first()
+    test_sessions_are_served_round_robin_within_a_priority()
+    test_queue_timeout_raises_and_cleans_up()
+    print("✅ All LLM scheduler tests passed")
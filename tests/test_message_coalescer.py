@@ -0,0 +1,112 @@
+"""
+Message Coalescer Tests
+Rapid-fire messages from one session are answered by a single turn
+"""
+
+import sys
+import os
+import asyncio
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.core.session_state_manager import TRTSessionState
+from src.utils.message_coalescer import MessageCoalescer
+from src.utils.turn_context import get_in_flight_turns, TurnCancelled
+
+
+class RecordingTurns:
+    """Fake turn runner: records each run and behaves like a cancellable turn"""
+
+    def __init__(self, session_id, duration=0.0):
+        self.session_id = session_id
+        self.duration = duration
+        self.runs = []
+        self.cancelled_runs = []
+
+    async def __call__(self, messages, waiters):
+        self.runs.append(list(messages))
+        in_flight = get_in_flight_turns()
+        token = in_flight.begin(self.session_id)
+        try:
+            waited = 0.0
+            while waited < self.duration:
+                if token.cancelled:
+                    self.cancelled_runs.append(list(messages))
+                    raise TurnCancelled(token.reason)
+                await asyncio.sleep(0.01)
+                waited += 0.01
+            return f"reply to {' + '.join(messages)}"
+        finally:
+            in_flight.end(self.session_id, token)
+
+
+async def send_later(coalescer, session_id, message, runner, delay):
+    await asyncio.sleep(delay)
+    return await coalescer.submit(session_id, message, runner)
+
+
+def test_messages_within_window_share_one_turn():
+    async def scenario():
+        coalescer = MessageCoalescer(window_ms=100)
+        runner = RecordingTurns("coalesce-1")
+        return runner, await asyncio.gather(
+            send_later(coalescer, "coalesce-1", "yeah", runner, 0.0),
+            send_later(coalescer, "coalesce-1", "my chest feels tight", runner, 0.03),
+        )
+
+    runner, replies = asyncio.run(scenario())
+    assert runner.runs == [["yeah", "my chest feels tight"]]
+    assert replies == ["reply to yeah + my chest feels tight"] * 2
+
+
+def test_message_during_turn_restarts_it_with_all_messages():
+    async def scenario():
+        coalescer = MessageCoalescer(window_ms=50)
+        runner = RecordingTurns("coalesce-2", duration=0.5)
+        return runner, await asyncio.gather(
+            send_later(coalescer, "coalesce-2", "yeah", runner, 0.0),
+            send_later(coalescer, "coalesce-2", "it's in my chest", runner, 0.15),
+        )
+
+    runner, replies = asyncio.run(scenario())
+    assert runner.cancelled_runs == [["yeah"]]
+    assert runner.runs == [["yeah"], ["yeah", "it's in my chest"]]
+    assert replies == ["reply to yeah + it's in my chest"] * 2
+
+
+def test_sessions_are_not_merged_and_disabled_window_runs_each_message():
+    async def scenario():
+        coalescer = MessageCoalescer(window_ms=50)
+        a = RecordingTurns("coalesce-a")
+        b = RecordingTurns("coalesce-b")
+        await asyncio.gather(
+            coalescer.submit("coalesce-a", "one", a),
+            coalescer.submit("coalesce-b", "two", b),
+        )
+
+        disabled = MessageCoalescer(window_ms=0)
+        c = RecordingTurns("coalesce-c")
+        await asyncio.gather(disabled.submit("coalesce-c", "x", c), disabled.submit("coalesce-c", "y", c))
+        return a, b, c
+
+    a, b, c = asyncio.run(scenario())
+    assert a.runs == [["one"]]
+    assert b.runs == [["two"]]
+    assert sorted(c.runs) == [["x"], ["y"]]
+
+
+def test_merged_messages_are_recorded_in_history():
+    state = TRTSessionState("coalesce-history")
+    state.add_exchange("yeah\nmy chest feels tight", "Where in your chest?", {},
+                       client_messages=["yeah", "my chest feels tight"])
+    state.add_exchange("it's heavy", "Heavy. What else?", {}, client_messages=["it's heavy"])
+
+    assert state.conversation_history[0]["client_messages"] == ["yeah", "my chest feels tight"]
+    assert "client_messages" not in state.conversation_history[1]
+
+
+if __name__ == "__main__":
+    test_messages_within_window_share_one_turn()
+    test_message_during_turn_restarts_it_with_all_messages()
+    test_sessions_are_not_merged_and_disabled_window_runs_each_message()
+    test_merged_messages_are_recorded_in_history()
+    print("✅ All message coalescer tests passed")
@@ -0,0 +1,173 @@
+"""
+Model Residency Manager Tests
+Checks keep_alive selection and the pinger's reload/ping decisions without a live Ollama
+"""
+
+import sys
+import os
+import json
+import re
+from datetime import datetime, time as dtime
+from unittest import mock
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.utils.llm_scheduler import LLMScheduler
+from src.utils.model_residency import BusinessHours, ModelPolicy, ModelResidencyManager
+from src.utils.ollama_client import OllamaClient
+from src.utils.ollama_pool import OllamaEndpointPool
+
+
+class StubOllamaClient:
+    """Records preloads and reports a configurable set of loaded models"""
+
+    def __init__(self, loaded=None):
+        self.loaded = loaded
+        self.preloaded = []
+        self.keep_alive_provider = None
+        self.on_model_used = None
+
+    def preload(self, model, keep_alive=None, timeout=120, queue_timeout=None):
+        self.preloaded.append(model)
+        return True
+
+    def loaded_models(self, timeout=5):
+        return self.loaded
+
+
+def make_manager(client, moment, **policy_kwargs):
+    policies = [
+        ModelPolicy(model="llama3.1", roles=["navigation"], **policy_kwargs),
+        ModelPolicy(model="llama3.1", roles=["dialogue"], **policy_kwargs),
+        ModelPolicy(model="phi3", roles=["emotion"], **policy_kwargs)
+    ]
+    hours = BusinessHours(start=dtime(8, 0), end=dtime(18, 0), days=[0, 1, 2, 3, 4])
+    return ModelResidencyManager(client, policies, business_hours=hours,
+                                 ping_interval_seconds=60, clock=lambda: moment)
+
+
+def test_policies_merge_roles_sharing_a_model():
+    manager = make_manager(StubOllamaClient(), datetime(2025, 10, 14, 10, 0))
+    assert set(manager.policies) == {"llama3.1", "phi3"}
+    assert manager.policies["llama3.1"].roles == ["navigation", "dialogue"]
+
+
+def test_keep_alive_depends_on_business_hours():
+    client = StubOllamaClient()
+    in_hours = make_manager(client, datetime(2025, 10, 14, 10, 0))   # Tuesday morning
+    off_hours = make_manager(client, datetime(2025, 10, 18, 10, 0))  # Saturday
+
+    assert in_hours.keep_alive_for("llama3.1") == -1
+    assert off_hours.keep_alive_for("llama3.1") == "10m"
+    # Client requests pick up the manager's keep_alive
+    assert client.keep_alive_provider("llama3.1") == "10m"
+
+
+def test_check_residency_reloads_evicted_and_pings_idle_models():
+    client = StubOllamaClient(loaded=["llama3.1:latest"])
+    manager = make_manager(client, datetime(2025, 10, 14, 10, 0))
+
+    actions = manager.check_residency()
+
+    assert actions == {"llama3.1": "pinged", "phi3": "reloaded"}
+    assert client.preloaded == ["llama3.1", "phi3"]
+
+
+def test_recently_used_model_is_left_alone():
+    client = StubOllamaClient(loaded=["llama3.1:latest", "phi3:latest"])
+    manager = make_manager(client, datetime(2025, 10, 14, 10, 0))
+    client.on_model_used("llama3.1")
+
+    actions = manager.check_residency()
+
+    assert actions["llama3.1"] == "resident"
+    assert actions["phi3"] == "pinged"
+
+
+def test_no_pings_outside_business_hours():
+    client = StubOllamaClient(loaded=[])
+    manager = make_manager(client, datetime(2025, 10, 14, 23, 0))
+
+    assert set(manager.check_residency().values()) == {"skipped"}
+    assert client.preloaded == []
+
+
+def test_unreachable_ollama_is_reported():
+    client = StubOllamaClient(loaded=None)
+    manager = make_manager(client, datetime(2025, 10, 14, 10, 0))
+    assert set(manager.check_residency().values()) == {"unreachable"}
+
+
+def test_models_ready_follows_what_ollama_reports():
+    client = StubOllamaClient(loaded=["llama3.1:latest"])
+    manager = make_manager(client, datetime(2025, 10, 14, 10, 0))
+    assert not manager.models_ready()  # Nothing preloaded yet
+
+    manager.preload_all()
+    assert manager.models_ready()
+
+    client.loaded = None  # Ollama went away
+    manager.check_residency()
+    assert not manager.models_ready()
+
+    # Off hours only models kept warm count
+    off_hours = make_manager(client, datetime(2025, 10, 18, 10, 0))
+    assert off_hours.models_ready()
+
+
+class RecordedResponse:
+    """Stands in for a streamed (generate) or plain (preload) Ollama response"""
+    status_code = 200
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        return False
+
+    def iter_lines(self):
+        yield json.dumps({"response": "ok", "done": True, "load_duration": 0}).encode()
+
+    def json(self):
+        return {"done": True, "load_duration": 0}
+
+
+def is_valid_keep_alive(value) -> bool:
+    """What Ollama accepts: a number of seconds, or a Go duration with a unit"""
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return True
+    return isinstance(value, str) and re.fullmatch(r"-?(\d+(\.\d+)?(ns|us|µs|ms|s|m|h))+", value) is not None
+
+
+def test_requests_carry_a_keep_alive_ollama_accepts():
+    pool = OllamaEndpointPool(["http://ollama.invalid:11434"])
+    client = OllamaClient(scheduler=LLMScheduler(max_concurrency=1, queue_timeout_seconds=5), pool=pool)
+    manager = ModelResidencyManager.from_config(client, {"navigation": "llama3.1"})
+    payloads = []
+
+    def post(url, json=None, **kwargs):
+        payloads.append(json)
+        return RecordedResponse()
+
+    with mock.patch("src.utils.ollama_client.requests.post", post):
+        for moment in (datetime(2025, 10, 14, 10, 0), datetime(2025, 10, 14, 23, 0)):
+            manager.clock = lambda moment=moment: moment
+            assert client.generate("llama3.1", "hi") == "ok"
+            assert client.preload("llama3.1")
+
+    assert [payload["keep_alive"] for payload in payloads] == [-1, -1, "10m", "10m"]
+    assert all(is_valid_keep_alive(payload["keep_alive"]) for payload in payloads)
+    # A bare number in a string is sent as seconds, not as a unitless duration
+    with mock.patch.dict(os.environ, {"OLLAMA_KEEP_ALIVE": "-1"}):
+        assert OllamaClient(pool=pool).keep_alive_for("other") == -1
+
+
+if __name__ == "__main__":
+    test_policies_merge_roles_sharing_a_model()
+    test_keep_alive_depends_on_business_hours()
+    test_check_residency_reloads_evicted_and_pings_idle_models()
+    test_recently_used_model_is_left_alone()
+    test_no_pings_outside_business_hours()
+    test_unreachable_ollama_is_reported()
+    test_models_ready_follows_what_ollama_reports()
+    test_requests_carry_a_keep_alive_ollama_accepts()
+    print("✅ All model residency tests passed")
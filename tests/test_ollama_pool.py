@@ -0,0 +1,283 @@
+"""
+Ollama Endpoint Pool Tests
+Routing, failover and hedged requests against local stand-in Ollama servers
+with injected latency - no real Ollama needed
+"""
+
+import sys
+import os
+import json
+import socket
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pytest
+import requests
+
+from src.utils.circuit_breaker import CircuitBreaker
+from src.utils.llm_scheduler import LLMScheduler, RequestPriority
+from src.utils.metrics import get_metrics
+from src.utils.ollama_client import OllamaClient
+from src.utils.ollama_pool import OllamaEndpointPool
+from src.utils.turn_context import TurnContext, TurnCancelled, turn_scope
+
+
+class StandInOllama:
+    """Streams `tokens` NDJSON chunks, `token_delay` seconds apart, after `first_token_delay`"""
+
+    def __init__(self, name, tokens=5, first_token_delay=0.0, token_delay=0.0):
+        self.name = name
+        self.tokens = tokens
+        self.first_token_delay = first_token_delay
+        self.token_delay = token_delay
+        self.requests = 0
+        self.completed = 0
+        self.aborted = 0
+        self.lock = threading.Lock()
+
+        backend = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def do_POST(self):
+                body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+                with backend.lock:
+                    backend.requests += 1
+                if not body.get("stream"):
+                    self._send_json({"model": body["model"], "done": True, "load_duration": 0})
+                    return
+
+                time.sleep(backend.first_token_delay)
+                self.send_response(200)
+                self.send_header("Content-Type", "application/x-ndjson")
+                self.end_headers()
+                try:
+                    for index in range(backend.tokens):
+                        chunk = {"response": f"{backend.name}{index} ", "done": False}
+                        self.wfile.write((json.dumps(chunk) + "\n").encode())
+                        self.wfile.flush()
+                        time.sleep(backend.token_delay)
+                    self.wfile.write((json.dumps({"response": "", "done": True, "load_duration": 0}) + "\n").encode())
+                    self.wfile.flush()
+                    with backend.lock:
+                        backend.completed += 1
+                except (BrokenPipeError, ConnectionResetError):
+                    with backend.lock:
+                        backend.aborted += 1
+
+            def _send_json(self, payload):
+                data = json.dumps(payload).encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.server.daemon_threads = True
+        self.url = f"http://127.0.0.1:{self.server.server_address[1]}"
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+def unused_url():
+    """URL of a local port nothing is listening on"""
+    sock = socket.socket()
+    sock.bind(("127.0.0.1", 0))
+    port = sock.getsockname()[1]
+    sock.close()
+    return f"http://127.0.0.1:{port}"
+
+
+def quick_breaker(url):
+    return CircuitBreaker(name=url, window_size=4, minimum_calls=2, open_seconds=60, jitter=0.0)
+
+
+def make_client(urls, affinity=False):
+    pool = OllamaEndpointPool(urls, session_affinity=affinity, breaker_factory=quick_breaker)
+    return OllamaClient(scheduler=LLMScheduler(max_concurrency=4, queue_timeout_seconds=5), pool=pool)
+
+
+@pytest.fixture
+def backends():
+    started = []
+
+    def start(*args, **kwargs):
+        backend = StandInOllama(*args, **kwargs)
+        started.append(backend)
+        return backend
+
+    yield start
+    for backend in started:
+        backend.stop()
+
+
+def test_least_outstanding_endpoint_is_chosen():
+    pool = OllamaEndpointPool(["http://a:1", "http://b:1", "http://c:1"], session_affinity=False)
+    pool.endpoints[0].outstanding = 2
+    pool.endpoints[1].outstanding = 0
+    pool.endpoints[2].outstanding = 1
+    assert pool.choose().url == "http://b:1"
+
+
+def test_session_affinity_is_sticky_until_endpoint_is_busy():
+    pool = OllamaEndpointPool(["http://a:1", "http://b:1", "http://c:1"], affinity_slack=2)
+    preferred = pool.choose("session-42")
+    assert all(pool.choose("session-42") is preferred for _ in range(10))
+
+    preferred.outstanding = 3  # More than `affinity_slack` above the idle endpoints
+    assert pool.choose("session-42") is not preferred
+
+
+def test_open_endpoint_is_skipped():
+    pool = OllamaEndpointPool(["http://a:1", "http://b:1"], session_affinity=False, breaker_factory=quick_breaker)
+    broken = pool.endpoints[0]
+    broken.breaker.record_failure()
+    broken.breaker.record_failure()
+    assert broken.breaker.is_open()
+    assert all(pool.choose() is pool.endpoints[1] for _ in range(10))
+
+    pool.endpoints[1].breaker.record_failure()
+    pool.endpoints[1].breaker.record_failure()
+    assert pool.all_open()
+    assert pool.choose() is None
+
+
+def test_streamed_generation_joins_chunks(backends):
+    backend = backends("a", tokens=3)
+    client = make_client([backend.url])
+    assert client.generate("llama3.1", "hi") == "a0 a1 a2 "
+    assert backend.completed == 1
+
+
+def test_unreachable_endpoint_fails_over(backends):
+    live = backends("live", tokens=2)
+    client = make_client([unused_url(), live.url])
+
+    # Ties are broken at random, so the dead endpoint gets picked (and tripped) along the way
+    for _ in range(20):
+        assert client.generate("llama3.1", "hi") == "live0 live1 "
+
+    assert live.completed == 20
+    assert client.pool.endpoints[0].breaker.is_open()
+
+
+def test_slow_call_is_hedged_and_loser_cancelled(backends):
+    slow = backends("slow", tokens=100, token_delay=0.05)
+    fast = backends("fast", tokens=3)
+    client = make_client([slow.url, fast.url], affinity=True)
+    client.hedge_min_delay = 0.2
+    for _ in range(client.hedge_min_samples):
+        client._record_latency("dialogue", 0.1)
+
+    # A session whose affinity endpoint is the slow backend, so the hedge must win
+    session_id = next(f"s{i}" for i in range(100) if client.pool.choose(f"s{i}").url == slow.url)
+    metrics = get_metrics()
+    wins_before = metrics.get_counter("llm_hedge_wins_total", labels={"type": "dialogue", "winner": "hedge"})
+
+    start = time.time()
+    with turn_scope(TurnContext(session_id=session_id)):
+        text = client.generate("llama3.1", "hi", prompt_type="dialogue", priority=RequestPriority.DIALOGUE)
+    elapsed = time.time() - start
+
+    assert text == "fast0 fast1 fast2 "
+    assert elapsed < 2.0  # The slow backend alone would take ~5s
+    assert metrics.get_counter("llm_hedge_wins_total",
+                               labels={"type": "dialogue", "winner": "hedge"}) == wins_before + 1
+
+    # Closing the losing stream makes the slow backend stop generating
+    deadline = time.time() + 3
+    while slow.aborted == 0 and time.time() < deadline:
+        time.sleep(0.05)
+    assert slow.aborted == 1
+    assert slow.completed == 0
+    assert client.scheduler.active == 0  # The hedge's slot was given back too
+    client.close()
+
+
+def test_hedge_is_skipped_when_no_slot_is_free(backends):
+    slow = backends("slow", tokens=4, token_delay=0.1)
+    fast = backends("fast", tokens=1)
+    client = make_client([slow.url, fast.url], affinity=True)
+    client.scheduler = LLMScheduler(max_concurrency=1, queue_timeout_seconds=5)
+    client.hedge_min_delay = 0.05
+    for _ in range(client.hedge_min_samples):
+        client._record_latency("dialogue", 0.01)
+
+    session_id = next(f"s{i}" for i in range(100) if client.pool.choose(f"s{i}").url == slow.url)
+    metrics = get_metrics()
+    skipped_before = metrics.get_counter("llm_hedges_skipped_total",
+                                         labels={"type": "dialogue", "reason": "no_slot"})
+    with turn_scope(TurnContext(session_id=session_id)):
+        text = client.generate("llama3.1", "hi", prompt_type="dialogue", priority=RequestPriority.DIALOGUE)
+
+    # The only slot is the primary's, so the cap holds and the slow answer is used
+    assert text.startswith("slow0")
+    assert fast.requests == 0
+    assert metrics.get_counter("llm_hedges_skipped_total",
+                               labels={"type": "dialogue", "reason": "no_slot"}) == skipped_before + 1
+    client.close()
+
+
+def test_background_calls_are_not_hedged(backends):
+    slow = backends("slow", tokens=4, token_delay=0.1)
+    fast = backends("fast", tokens=1)
+    client = make_client([slow.url, fast.url], affinity=True)
+    client.hedge_min_delay = 0.05
+    for _ in range(client.hedge_min_samples):
+        client._record_latency("navigation", 0.01)
+
+    session_id = next(f"s{i}" for i in range(100) if client.pool.choose(f"s{i}").url == slow.url)
+    with turn_scope(TurnContext(session_id=session_id)):
+        text = client.generate("llama3.1", "hi", prompt_type="navigation", priority=RequestPriority.NAVIGATION)
+
+    assert text.startswith("slow0")
+    assert fast.requests == 0
+
+
+
+def test_cancelled_turn_closes_the_stream(backends):
+    slow = backends("slow", tokens=100, token_delay=0.05)
+    client = make_client([slow.url])
+    turn = TurnContext(session_id="s")
+    threading.Timer(0.3, turn.cancel_token.cancel, args=("client_disconnected",)).start()
+
+    start = time.time()
+    with turn_scope(turn):
+        with pytest.raises(TurnCancelled):
+            client.generate("llama3.1", "hi", prompt_type="dialogue", priority=RequestPriority.DIALOGUE)
+    assert time.time() - start < 1.5
+    assert turn.degraded_stages == []  # Cancelled, not degraded
+
+    deadline = time.time() + 3
+    while slow.aborted == 0 and time.time() < deadline:
+        time.sleep(0.05)
+    assert slow.aborted == 1
+    assert client.pool.endpoints[0].breaker.get_status()["recent_calls"] == 0
+
+
+def test_short_budget_turns_leave_the_breaker_closed(backends):
+    # Both ways a budget runs out: between tokens, and waiting for the first one
+    slow = backends("slow", tokens=100, token_delay=0.05)
+    silent = backends("silent", tokens=1, first_token_delay=2.0)
+    for backend in (slow, silent):
+        client = make_client([backend.url])
+        for _ in range(3):
+            with turn_scope(TurnContext(session_id="s", deadline=time.monotonic() + 0.7)):
+                with pytest.raises(requests.Timeout):
+                    client.generate("llama3.1", "hi", prompt_type="dialogue", priority=RequestPriority.DIALOGUE)
+
+        # The endpoint is healthy; the turns just had too little time
+        breaker = client.pool.endpoints[0].breaker
+        assert not breaker.is_open() and breaker.get_status()["recent_calls"] == 0
+
+
+if __name__ == "__main__":
+    sys.exit(pytest.main([__file__, "-q"]))
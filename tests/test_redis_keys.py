@@ -0,0 +1,92 @@
+"""
+Redis Key Layout Tests
+Hash-tagged session keys, bucketed indexes, the cluster-mode commit path and
+the migration from the old layout (fakeredis)
+"""
+
+import sys
+import os
+import time
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pytest
+
+from src.core.session_state_manager import TRTSessionState
+from src.utils.redis_keys import (
+    session_keys, index_bucket, activity_key, substate_key, all_buckets, legacy_session_key,
+    LEGACY_ACTIVE_SESSIONS_KEY, LEGACY_SUBSTATE_PREFIX
+)
+
+
+@pytest.fixture
+def connect(monkeypatch):
+    fakeredis = pytest.importorskip("fakeredis")
+    pytest.importorskip("lupa")
+    from src.utils import redis_session_manager
+    server = fakeredis.FakeServer()
+    monkeypatch.setattr(redis_session_manager.redis, "from_url",
+                        lambda url, **kwargs: fakeredis.FakeRedis(server=server, **kwargs))
+    return redis_session_manager.RedisSessionManager
+
+
+def test_session_keys_share_a_slot_and_indexes_are_bucketed():
+    from redis.crc import key_slot
+    slots = {key_slot(key.encode()) for key in session_keys("3f2a-session")}
+    assert len(slots) == 1
+
+    buckets = {index_bucket(f"session-{index}", 16) for index in range(200)}
+    assert buckets == set(all_buckets(16))
+    assert index_bucket("3f2a-session", 16) == index_bucket("3f2a-session", 16)
+    assert key_slot(activity_key("07").encode()) == key_slot(substate_key("07", "1.1_goal_and_vision").encode())
+
+
+def test_cluster_mode_indexes_the_session_in_a_second_step(connect):
+    manager = connect(cluster=False)
+    manager.cluster = True  # fakeredis is a single node; exercise the split commit against it
+    state = TRTSessionState("split-1")
+    assert manager.create_session("split-1", state, {"status": "active"})
+
+    bucket = manager._bucket("split-1")
+    assert manager.redis.zscore(activity_key(bucket), "split-1") is not None
+    assert manager.redis.zscore(substate_key(bucket, state.current_substate), "split-1") is not None
+
+    state.current_substate = "1.2_problem_and_body"
+    assert manager.commit_turn("split-1", state, exchange={"client_input": "tight chest"})
+    assert manager.list_active_sessions() == ["split-1"]
+    assert [entry["session_id"] for entry in manager.page_sessions(substate="1.2_problem_and_body")[0]] == ["split-1"]
+    assert manager.page_sessions(substate="1.1_goal_and_vision")[2] == 0
+
+
+def test_migration_moves_sessions_and_rebuilds_the_indexes(connect):
+    sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "scripts"))
+    from migrate_redis_keys import batches, legacy_session_ids, move_sessions, rebuild_indexes
+
+    manager = connect()
+    client = manager.redis_binary
+    # Two sessions as the old layout stored them
+    for session_id, last_active in (("old-a", time.time() - 60), ("old-b", time.time() - 30)):
+        client.hset(legacy_session_key(session_id, "state"), mapping={
+            "session_id": session_id, "current_substate": "1.1_goal_and_vision",
+            "last_interaction": "2026-10-18T09:00:00"})
+        client.expire(legacy_session_key(session_id, "state"), 3600)
+        client.rpush(legacy_session_key(session_id, "history"), '{"client_input": "hello"}')
+        client.zadd(LEGACY_ACTIVE_SESSIONS_KEY, {session_id: last_active})
+        client.zadd(f"{LEGACY_SUBSTATE_PREFIX}1.1_goal_and_vision", {session_id: last_active})
+    manager.create_session("new-c", TRTSessionState("new-c"))
+
+    assert sorted(legacy_session_ids(client)) == ["old-a", "old-b"]
+    for session_ids in batches(legacy_session_ids(client), 1):
+        assert move_sessions(client, session_ids) == 2
+    result = rebuild_indexes(client, manager.index_shards)
+
+    assert result["sessions"] == 3
+    assert list(legacy_session_ids(client)) == []
+    assert not client.exists(LEGACY_ACTIVE_SESSIONS_KEY, f"{LEGACY_SUBSTATE_PREFIX}1.1_goal_and_vision")
+    assert 0 < client.ttl(session_keys("old-a")[0]) <= 3600
+    assert manager.get_conversation_history("old-a") == [{"client_input": "hello"}]
+    assert manager.list_active_sessions() == ["new-c", "old-b", "old-a"]
+    assert manager.page_sessions(substate="1.1_goal_and_vision")[2] == 3
+
+
+if __name__ == "__main__":
+    sys.exit(pytest.main([__file__, "-q"]))
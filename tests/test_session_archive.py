@@ -0,0 +1,128 @@
+"""
+Session Archive Tests
+Append-only segments and index, archiving idle / completed sessions out of
+Redis (fakeredis) and rehydrating them on the next load
+"""
+
+import asyncio
+import sys
+import os
+import time
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pytest
+
+from src.core.session_state_manager import TRTSessionState
+from src.utils.async_redis_session_manager import AsyncRedisSessionManager
+from src.utils.redis_keys import session_key, activity_key
+from src.utils.session_archive import SessionArchive, ArchivedSession, SessionArchiveError
+from src.utils.session_store import SessionRecord, RedisSessionStore
+from src.utils.session_sweeper import SessionSweeper
+
+
+@pytest.fixture
+def store(monkeypatch, tmp_path):
+    fakeredis = pytest.importorskip("fakeredis")
+    pytest.importorskip("lupa")
+    from src.utils import redis_session_manager
+    server = fakeredis.FakeServer()
+    monkeypatch.setattr(redis_session_manager.redis, "from_url",
+                        lambda url, **kwargs: fakeredis.FakeRedis(server=server, **kwargs))
+    async_manager = AsyncRedisSessionManager()
+    monkeypatch.setattr(async_manager, "_connect", lambda: fakeredis.FakeAsyncRedis(server=server))
+    return RedisSessionStore(redis_session_manager.RedisSessionManager(), async_manager,
+                             archive=SessionArchive(str(tmp_path / "archive")))
+
+
+def archived(session_id, archived_at=None, history=(b"h1", b"h2")):
+    return ArchivedSession(session_id, f"record of {session_id}".encode(), list(history),
+                           archived_at or time.time())
+
+
+def test_archive_segments_index_and_compaction(tmp_path):
+    archive = SessionArchive(str(tmp_path), segment_bytes=1, retention_seconds=86400)
+    archive.put_many([archived("a"), archived("b/../c")])
+    archive.put(archived("a", history=[b"newer"]))       # Supersedes the first copy, in a new segment
+    archive.put(archived("old", archived_at=time.time() - 2 * 86400))
+
+    # Another process sharing the directory sees the same sessions
+    reader = SessionArchive(str(tmp_path))
+    assert reader.get("a").history == [b"newer"]
+    assert reader.get("b/../c").record == b"record of b/../c"
+    assert reader.get("missing") is None
+    assert reader.stats()["sessions"] == 3 and reader.stats()["segments"] == 3
+
+    assert archive.remove("b/../c") and not archive.remove("b/../c")
+    assert not reader.contains("b/../c")
+
+    result = archive.compact()
+    assert result == {"expired": 1, "segments_dropped": 1, "bytes_reclaimed": result["bytes_reclaimed"]}
+    assert reader.get("a").history == [b"newer"] and reader.get("old") is None
+    assert reader.stats() == archive.stats() and archive.stats()["segments"] == 2
+
+    # A damaged entry is reported, not returned
+    segment = sorted(name for name in os.listdir(tmp_path) if name.startswith("segment-"))[0]
+    with open(tmp_path / segment, "r+b") as f:
+        f.seek(12)
+        f.write(b"\xff\xff")
+    with pytest.raises(SessionArchiveError):
+        reader.get("a")
+
+
+def test_idle_and_completed_sessions_are_archived_and_rehydrated(store):
+    now = time.time()
+    for session_id, status in (("idle-1", "active"), ("done-1", "completed"), ("recent-1", "active")):
+        record = SessionRecord(session_id=session_id, session_state=TRTSessionState(session_id),
+                               client_id="client-7", status=status)
+        assert store.create(record)
+        record.session_state.current_substate = "1.2_problem_and_body"
+        record.turn_count = 2
+        assert store.commit(record, {"turn": 2, "client_input": f"{session_id} says hi"})
+    store.manager.redis.hset(session_key("idle-1", "state"), "active_at", now - 7200)
+    store.manager.redis.hset(session_key("done-1", "state"), "active_at", now - 600)
+    store.manager.redis.hset(session_key("recent-1", "state"), "active_at", now - 600)
+    for session_id, active_at in (("idle-1", now - 7200), ("done-1", now - 600), ("recent-1", now - 600)):
+        store.manager.redis.zadd(activity_key(store.manager._bucket(session_id)), {session_id: active_at})
+
+    result = store.archive_inactive_sessions(now - 3600, now - 300)
+    assert result["sessions"] == 2 and result["bytes"] > 0
+    assert not store.manager.session_exists("idle-1") and not store.manager.session_exists("done-1")
+    assert store.manager.session_exists("recent-1")
+    assert store.manager.list_active_sessions() == ["recent-1"]
+    assert store.exists("idle-1") and store.health_check()["archive"]["sessions"] == 2
+
+    # The next load brings the session back, state and history intact
+    loaded = store.load("idle-1")
+    assert loaded.client_id == "client-7" and loaded.turn_count == 2
+    assert loaded.session_state.current_substate == "1.2_problem_and_body"
+    assert store.manager.session_exists("idle-1") and not store.archive.contains("idle-1")
+    assert [e["client_input"] for e in store.manager.get_conversation_history("idle-1")] == ["idle-1 says hi"]
+    assert "idle-1" in store.manager.list_active_sessions()
+
+    loaded = asyncio.run(store.load_async("done-1"))
+    assert loaded.status == "completed" and store.manager.session_exists("done-1")
+
+
+def test_sessions_in_use_are_not_archived(store):
+    for session_id in ("locked-1", "deleted-1"):
+        store.create(SessionRecord(session_id=session_id, session_state=TRTSessionState(session_id)))
+    store.manager.redis.set(session_key("locked-1", "lock"), "turn-owner")
+
+    assert store.archive_inactive_sessions(time.time() + 60)["sessions"] == 1
+    assert store.manager.session_exists("locked-1") and not store.archive.contains("locked-1")
+
+    # Deleting an archived session removes it for good
+    assert store.delete("deleted-1")
+    assert store.load("deleted-1") is None and not store.exists("deleted-1")
+
+
+def test_sweeper_archives_before_sweeping(store):
+    store.create(SessionRecord(session_id="swept-1", session_state=TRTSessionState("swept-1")))
+    sweeper = SessionSweeper(store.manager, interval_seconds=60, archive_store=store, archive_idle_seconds=-60)
+    result = sweeper.sweep_once()
+    assert result["archived"] == 1 and result["sessions"] == 0
+    assert store.archive.contains("swept-1")
+
+
+if __name__ == "__main__":
+    sys.exit(pytest.main([__file__, "-q"]))
@@ -0,0 +1,104 @@
+"""
+Session Codec Tests
+Round trips of randomly generated session states, compression and schema evolution
+"""
+
+import sys
+import os
+import random
+from datetime import datetime
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pytest
+
+from src.core.session_state_manager import TRTSessionState
+from src.utils import session_codec
+from src.utils.session_codec import encode_state, decode_state, SessionCodecError, FLAG_ZSTD
+
+SUBSTATES = ["1.1_goal_and_vision", "1.2_problem_and_body", "2.1_seek", "3.1_assess_readiness"]
+
+
+def random_value(rng, depth=0):
+    kinds = ["str", "int", "float", "bool", "none"] + (["list", "dict"] if depth < 3 else [])
+    kind = rng.choice(kinds)
+    if kind == "str":
+        return "".join(rng.choice("abc xyz?é🙂") for _ in range(rng.randint(0, 20)))
+    if kind == "int":
+        return rng.randint(-2 ** 40, 2 ** 40)
+    if kind == "float":
+        return rng.uniform(-1e6, 1e6)
+    if kind == "bool":
+        return rng.random() < 0.5
+    if kind == "none":
+        return None
+    if kind == "list":
+        return [random_value(rng, depth + 1) for _ in range(rng.randint(0, 4))]
+    return {f"k{i}": random_value(rng, depth + 1) for i in range(rng.randint(0, 4))}
+
+
+def random_state(rng):
+    """A session state that went through a random number of turns, plus random extra attributes"""
+    state = TRTSessionState(f"codec-{rng.randint(0, 10 ** 6)}")
+    state.current_substate = rng.choice(SUBSTATES)
+    for turn in range(rng.randint(0, 30)):
+        state.add_exchange(f"client says {random_value(rng)}",
+                           rng.choice(["What else?", "Where do you feel it?", "How do you know?", "Okay."]),
+                           {"navigation_decision": rng.choice(["body", "goal"]), "extra": random_value(rng)})
+    for name in rng.sample(sorted(state.stage_1_completion), 3):
+        state.stage_1_completion[name] = random_value(rng)
+    state.alpha_started = rng.random() < 0.5
+    state.psycho_education_timestamp = rng.randint(0, 30)  # Set by psycho_education, not __init__
+    state.created_at = datetime(2025, 1, 1, 12, rng.randint(0, 59))
+    return state
+
+
+def test_random_states_round_trip():
+    rng = random.Random(2025)
+    for _ in range(200):
+        state = random_state(rng)
+        for compress in (False, True):
+            assert vars(decode_state(encode_state(state, compress=compress))) == vars(state)
+
+
+def test_large_states_are_compressed(monkeypatch):
+    monkeypatch.setenv("TRT_STATE_COMPRESSION_MIN_BYTES", "2048")
+    small = TRTSessionState("codec-small")
+    large = random_state(random.Random(7))
+    for turn in range(20):
+        large.add_exchange("my chest feels tight " * 5, "Where do you feel it?", {"navigation_decision": "body"})
+
+    assert not encode_state(small)[3] & FLAG_ZSTD
+    blob = encode_state(large)
+    assert blob[3] & FLAG_ZSTD
+    assert len(blob) < len(encode_state(large, compress=False)) / 2
+
+
+def test_older_schema_is_migrated_and_new_fields_get_defaults(monkeypatch):
+    old = TRTSessionState("codec-old")
+    old.vision_attempts = 2
+    del old.session_conclusion_given  # A field that didn't exist when the blob was written
+    blob = encode_state(old)
+
+    # Pretend the schema has moved on: v2 renamed vision_attempts
+    def rename_vision_attempts(fields):
+        fields["vision_offer_count"] = fields.pop("vision_attempts")
+        return fields
+
+    monkeypatch.setattr(session_codec, "SCHEMA_VERSION", 2)
+    monkeypatch.setitem(session_codec._MIGRATIONS, 1, rename_vision_attempts)
+
+    loaded = decode_state(blob)
+    assert loaded.vision_offer_count == 2
+    assert loaded.session_conclusion_given is False
+
+
+def test_unreadable_blobs_are_rejected():
+    blob = encode_state(TRTSessionState("codec-new"))
+    with pytest.raises(SessionCodecError):
+        decode_state(b'{"session_id": "json"}')
+    with pytest.raises(SessionCodecError):
+        decode_state(blob[:2] + bytes([session_codec.FORMAT_VERSION + 1]) + blob[3:])
+
+
+if __name__ == "__main__":
+    sys.exit(pytest.main([__file__, "-q"]))
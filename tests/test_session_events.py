@@ -0,0 +1,158 @@
+"""
+Session State Event Tests
+Turn changes diff into small typed events that replay onto a snapshot; the
+Redis manager logs them per write, snapshots every few writes, and loads
+snapshot plus tail (fakeredis)
+"""
+
+import sys
+import os
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pytest
+
+from src.core.session_state_manager import TRTSessionState
+from src.utils.redis_keys import session_key
+from src.utils.session_codec import encode_state
+from src.utils.session_events import (
+    SET, SET_KEY, APPEND, ADD, RESET, SessionEventError, StateEvent, encode_events, decode_events,
+    diff_fields, apply_events, replay, reset_event, track, state_changes
+)
+
+
+def redis_manager(monkeypatch, snapshot_every):
+    fakeredis = pytest.importorskip("fakeredis")
+    pytest.importorskip("lupa")
+    from src.utils import redis_session_manager
+    server = fakeredis.FakeServer()
+    monkeypatch.setattr(redis_session_manager.redis, "from_url",
+                        lambda url, **kwargs: fakeredis.FakeRedis(server=server, **kwargs))
+    monkeypatch.setenv("TRT_STATE_SNAPSHOT_EVERY", str(snapshot_every))
+    return redis_session_manager.RedisSessionManager(cluster=False)
+
+
+def play_turn(session_state, turn):
+    session_state.current_substate = "1.2_problem_and_body"
+    session_state.stage_1_completion["goal_stated"] = True
+    session_state.stage_1_completion["goal_content"] = f"feel calm ({turn})"
+    session_state.add_exchange(f"client {turn}", f"therapist {turn}", {"navigation_decision": "body_enquiry"})
+    session_state.questions_asked_set.add(f"question {turn}")
+
+
+def test_changes_diff_into_small_events_that_replay():
+    session_state = TRTSessionState("events-1")
+    snapshot = encode_state(session_state)
+    track(session_state, snapshot, [], 1)
+    assert state_changes(session_state) == []
+
+    play_turn(session_state, 1)
+    events = state_changes(session_state)
+    kinds = {(event.kind, event.field) for event in events}
+    assert (SET, "current_substate") in kinds
+    assert (SET_KEY, "stage_1_completion") in kinds
+    assert (APPEND, "conversation_history") in kinds
+    assert (ADD, "questions_asked_set") in kinds
+    assert not any(event.kind == RESET for event in events)
+
+    # Smaller than the state, and replays onto the snapshot to the same state
+    batch = encode_events(events)
+    assert len(batch) < len(encode_state(session_state))
+    assert encode_state(replay(snapshot, [batch])) == encode_state(session_state)
+
+    # A reset rebuilds the state from nothing
+    rebuilt = TRTSessionState("other")
+    apply_events(rebuilt, decode_events(encode_events([reset_event(session_state)])))
+    assert encode_state(rebuilt) == encode_state(session_state)
+
+    assert diff_fields({"a": [1]}, {"a": [2]}) == [StateEvent(SET, "a", [2])]
+    with pytest.raises(SessionEventError):
+        decode_events(b"not msgpack")
+
+
+def test_redis_writes_log_events_and_snapshot_every_few(monkeypatch):
+    manager = redis_manager(monkeypatch, snapshot_every=3)
+    session_state = TRTSessionState("events-redis")
+    assert manager.create_session("events-redis", session_state)
+
+    for turn in range(1, 6):
+        session_state = manager.load_session_state("events-redis")["session_state"]
+        play_turn(session_state, turn)
+        assert manager.commit_turn("events-redis", session_state, exchange={"turn": turn}, fencing_token=turn)
+
+        pending = manager.redis.hget(session_key("events-redis", "state"), "pending_events")
+        # Every third write after a snapshot is one; the others only log their events
+        assert int(pending) == turn % 3
+
+    # Loaded from the snapshot plus the events since: the same as the live state
+    loaded = manager.load_session_state("events-redis")
+    assert loaded["version"] == 6
+    assert encode_state(loaded["session_state"]) == encode_state(session_state)
+    assert manager.load_turn("events-redis")[0]["version"] == 6
+
+    # The full log (reset at creation, then one batch per write) replays to it too
+    log = manager.get_state_events("events-redis")
+    assert [version for _, version, _ in log] == [1, 2, 3, 4, 5, 6]
+    assert log[0][2][0].kind == RESET
+    replayed = TRTSessionState("events-redis")
+    for _, _, events in log:
+        apply_events(replayed, events)
+    assert encode_state(replayed) == encode_state(session_state)
+
+
+def test_event_log_is_capped_but_keeps_the_snapshot(monkeypatch):
+    monkeypatch.setenv("TRT_STATE_EVENTS_MAXLEN", "2")
+    manager = redis_manager(monkeypatch, snapshot_every=3)
+    assert manager.events_maxlen == 4  # Never below a snapshot plus the events since
+    session_state = TRTSessionState("events-capped")
+    manager.create_session("events-capped", session_state)
+
+    for turn in range(1, 200):
+        session_state = manager.load_session_state("events-capped")["session_state"]
+        play_turn(session_state, turn)
+        assert manager.commit_turn("events-capped", session_state)
+    # Approximate trimming keeps at least the cap, and stays bounded
+    assert 4 <= manager.redis.xlen(session_key("events-capped", "events")) < 199
+
+    # The reset is gone; the snapshot and the events after it still load and replay
+    loaded = manager.load_session_state("events-capped")["session_state"]
+    assert encode_state(loaded) == encode_state(session_state)
+    snapshot_event, replayed = manager.get_state_snapshot("events-capped")
+    log = manager.get_state_events("events-capped")
+    entry_ids = [entry_id for entry_id, _, _ in log]
+    assert log[0][2][0].kind != RESET and snapshot_event in entry_ids
+    for _, _, events in log[entry_ids.index(snapshot_event) + 1:]:
+        apply_events(replayed, events)
+    assert encode_state(replayed) == encode_state(session_state)
+
+
+def test_concurrent_writer_falls_back_to_a_snapshot(monkeypatch):
+    manager = redis_manager(monkeypatch, snapshot_every=10)
+    manager.create_session("events-race", TRTSessionState("events-race"))
+    first = manager.load_session_state("events-race")["session_state"]
+    second = manager.load_session_state("events-race")["session_state"]
+
+    play_turn(first, 1)
+    assert manager.commit_turn("events-race", first) == 2
+    # Its events were computed against version 1: written whole instead
+    second.vision_attempts = 4
+    assert manager.commit_turn("events-race", second) == 3
+    assert manager.get_state_events("events-race")[-1][2][0].kind == RESET
+
+    loaded = manager.load_session_state("events-race")["session_state"]
+    assert encode_state(loaded) == encode_state(second)
+
+
+def test_snapshot_every_zero_writes_the_whole_state(monkeypatch):
+    manager = redis_manager(monkeypatch, snapshot_every=0)
+    session_state = TRTSessionState("events-off")
+    manager.create_session("events-off", session_state)
+    play_turn(session_state, 1)
+    assert manager.commit_turn("events-off", session_state)
+
+    assert not manager.redis.exists(session_key("events-off", "events"))
+    loaded = manager.load_session_state("events-off")["session_state"]
+    assert encode_state(loaded) == encode_state(session_state)
+
+
+if __name__ == "__main__":
+    sys.exit(pytest.main([__file__, "-q"]))
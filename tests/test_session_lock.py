@@ -0,0 +1,189 @@
+"""
+Session Lock Tests
+Per-session turn serialization, fencing tokens and stale-write rejection
+(Redis behaviour via fakeredis with Lua support)
+"""
+
+import asyncio
+import sys
+import os
+import threading
+import time
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pytest
+
+from src.core.session_state_manager import TRTSessionState
+from src.utils.session_lock import LocalSessionLock, RedisSessionLock, SessionBusyError, _SessionLockBase
+
+fakeredis = pytest.importorskip("fakeredis")
+pytest.importorskip("lupa")
+
+
+def make_redis():
+    return fakeredis.FakeRedis(decode_responses=True)
+
+
+def test_redis_lock_is_exclusive_and_tokens_increase():
+    client = make_redis()
+    worker_a = RedisSessionLock(client, lease_seconds=5, policy="reject")
+    worker_b = RedisSessionLock(client, lease_seconds=5, policy="reject")
+
+    lease = worker_a.acquire("lock-1")
+    with pytest.raises(SessionBusyError):
+        worker_b.acquire("lock-1")
+    assert worker_b.acquire("lock-other").fencing_token == 1  # Other sessions aren't blocked
+
+    assert worker_a.release(lease)
+    second = worker_b.acquire("lock-1")
+    assert second.fencing_token > lease.fencing_token
+
+
+def test_release_by_stale_owner_does_not_drop_newer_lease():
+    client = make_redis()
+    lock = RedisSessionLock(client, lease_seconds=0.1, policy="reject")
+
+    stale = lock.acquire("lock-2")
+    time.sleep(0.2)  # Lease expires mid-turn
+    fresh = lock.acquire("lock-2")
+
+    assert not lock.release(stale)
+    assert client.get(RedisSessionLock.lock_key("lock-2")) == fresh.owner
+    assert lock.release(fresh)
+
+
+def test_queue_policy_waits_for_running_turn():
+    lock = RedisSessionLock(make_redis(), lease_seconds=5, wait_seconds=2, policy="queue")
+    first = lock.acquire("lock-3")
+    threading.Timer(0.2, lock.release, args=(first,)).start()
+
+    start = time.time()
+    second = lock.acquire("lock-3")
+    assert 0.15 < time.time() - start < 1.5
+    assert second.fencing_token == first.fencing_token + 1
+
+    with pytest.raises(SessionBusyError):
+        lock.acquire("lock-3", wait_seconds=0.1)
+
+
+def test_local_lock_serializes_turns():
+    lock = LocalSessionLock(lease_seconds=5, wait_seconds=5, policy="queue")
+    active = []
+    overlaps = []
+
+    def turn():
+        with lock.hold("lock-4"):
+            active.append(1)
+            if len(active) > 1:
+                overlaps.append(1)
+            time.sleep(0.02)
+            active.pop()
+
+    threads = [threading.Thread(target=turn) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert overlaps == []
+
+    with pytest.raises(ValueError):
+        LocalSessionLock(policy="sometimes")
+
+
+def test_stale_fenced_save_is_refused(monkeypatch):
+    from src.utils import redis_session_manager
+    server = fakeredis.FakeServer()
+    monkeypatch.setattr(redis_session_manager.redis, "from_url",
+                        lambda url, **kwargs: fakeredis.FakeRedis(server=server, **kwargs))
+    manager = redis_session_manager.RedisSessionManager()
+
+    newer = TRTSessionState("lock-5")
+    newer.body_questions_asked = 3
+    assert manager.save_session_state("lock-5", newer, fencing_token=7)
+
+    older = TRTSessionState("lock-5")
+    older.body_questions_asked = 1
+    assert not manager.save_session_state("lock-5", older, fencing_token=6)
+    assert manager.load_session_state("lock-5")["body_questions_asked"] == 3
+
+
+def test_async_waiters_queue_on_the_event_loop():
+    server = fakeredis.FakeServer()
+    lock = RedisSessionLock(fakeredis.FakeRedis(server=server), lease_seconds=5, wait_seconds=10, policy="queue",
+                            async_redis=lambda: fakeredis.FakeAsyncRedis(server=server))
+
+    async def turn():
+        lease = await lock.acquire_async("lock-6")
+        await asyncio.sleep(0.01)
+        await lock.release_async(lease)
+        return lease.fencing_token
+
+    async def scenario():
+        first = await lock.acquire_async("lock-6")
+        # Many turns queued behind a busy session hold no worker threads
+        threads = threading.active_count()
+        waiters = [asyncio.ensure_future(turn()) for _ in range(20)]
+        await asyncio.sleep(0.1)
+        assert threading.active_count() <= threads and not any(waiter.done() for waiter in waiters)
+
+        await lock.release_async(first)
+        return first, sorted(await asyncio.gather(*waiters))
+
+    first, tokens = asyncio.run(scenario())
+    assert tokens == list(range(first.fencing_token + 1, first.fencing_token + 21))
+
+
+def test_running_turn_renews_its_lease():
+    server = fakeredis.FakeServer()
+    redis_lock = RedisSessionLock(fakeredis.FakeRedis(server=server), lease_seconds=0.3, policy="reject",
+                                  async_redis=lambda: fakeredis.FakeAsyncRedis(server=server))
+    local_lock = LocalSessionLock(lease_seconds=0.3, policy="reject")
+
+    for lock in (redis_lock, local_lock):
+        async def long_turn():
+            lease = await lock.acquire_async("lock-8")
+            heartbeat = asyncio.create_task(lock.keep_alive(lease))
+            # Three leases long: another worker still can't take the session
+            await asyncio.sleep(0.9)
+            with pytest.raises(SessionBusyError):
+                await lock.acquire_async("lock-8")
+            heartbeat.cancel()
+            return await lock.release_async(lease)
+
+        assert asyncio.run(long_turn())
+
+    # A lease that already expired is not revived
+    stale = [lock.acquire("lock-9") for lock in (redis_lock, local_lock)]
+    time.sleep(0.35)
+    assert not redis_lock.extend(stale[0]) and not local_lock.extend(stale[1])
+
+
+def test_incomplete_lock_backend_fails_when_created():
+    class HalfLock(_SessionLockBase):
+        def _try_acquire(self, session_id):
+            return None
+
+    with pytest.raises(TypeError):
+        HalfLock(policy="reject")
+
+
+def test_fence_expires_after_the_session_and_goes_with_it(monkeypatch):
+    from src.utils import redis_session_manager
+    server = fakeredis.FakeServer()
+    monkeypatch.setattr(redis_session_manager.redis, "from_url",
+                        lambda url, **kwargs: fakeredis.FakeRedis(server=server, **kwargs))
+    manager = redis_session_manager.RedisSessionManager()
+    lock = RedisSessionLock(manager.redis, lease_seconds=60, policy="reject")
+
+    lease = lock.acquire("lock-7")
+    assert manager.save_session_state("lock-7", TRTSessionState("lock-7"), fencing_token=lease.fencing_token)
+    lock.release(lease)
+    fence_ttl = manager.redis.ttl(RedisSessionLock.fence_key("lock-7"))
+    assert manager.session_ttl <= fence_ttl <= manager.session_ttl + 60
+
+    assert manager.delete_session("lock-7")
+    assert not manager.redis.exists(RedisSessionLock.fence_key("lock-7"))
+
+
+if __name__ == "__main__":
+    sys.exit(pytest.main([__file__, "-q"]))
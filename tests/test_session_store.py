@@ -0,0 +1,430 @@
+"""
+Session Store Tests
+The same contract for the in-memory, on-disk, SQLite and Redis (fakeredis) backends
+"""
+
+import asyncio
+import sqlite3
+import sys
+import os
+import time
+from datetime import datetime
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pytest
+
+from src.core.session_state_manager import TRTSessionState
+from src.utils.async_redis_session_manager import AsyncRedisSessionManager
+from src.utils.session_cache import SessionCache
+from src.utils.session_codec import encode_state
+from src.utils.redis_keys import session_key, activity_key
+from src.utils.session_store import (
+    InvalidCursorError, SessionRecord, SessionStore, InMemorySessionStore, FileSessionStore, RedisSessionStore,
+    create_session_store
+)
+from src.utils.sqlite_session_store import SqliteSessionStore
+
+
+def redis_store(monkeypatch, server=None):
+    fakeredis = pytest.importorskip("fakeredis")
+    pytest.importorskip("lupa")
+    from src.utils import redis_session_manager
+    server = server or fakeredis.FakeServer()
+    monkeypatch.setattr(redis_session_manager.redis, "from_url",
+                        lambda url, **kwargs: fakeredis.FakeRedis(server=server, **kwargs))
+    async_manager = AsyncRedisSessionManager()
+    monkeypatch.setattr(async_manager, "_connect", lambda: fakeredis.FakeAsyncRedis(server=server))
+    return RedisSessionStore(redis_session_manager.RedisSessionManager(), async_manager)
+
+
+@pytest.fixture(params=["memory", "disk", "sqlite", "redis"])
+def store(request, tmp_path, monkeypatch):
+    if request.param == "memory":
+        return InMemorySessionStore()
+    if request.param == "disk":
+        return FileSessionStore(str(tmp_path))
+    if request.param == "sqlite":
+        store = SqliteSessionStore(str(tmp_path / "sessions.db"))
+        request.addfinalizer(store.close)
+        return store
+    return redis_store(monkeypatch)
+
+
+def new_record(session_id, **kwargs):
+    return SessionRecord(session_id=session_id, session_state=TRTSessionState(session_id), **kwargs)
+
+
+def test_create_is_exclusive(store):
+    assert store.create(new_record("store-1", client_id="client-9", metadata={"platform": "ios"}))
+    assert not store.create(new_record("store-1"))
+
+    loaded = store.load("store-1")
+    assert loaded.client_id == "client-9"
+    assert loaded.metadata == {"platform": "ios"}
+    assert loaded.turn_count == 0 and loaded.status == "active"
+    assert store.exists("store-1")
+    assert store.load("store-missing") is None
+
+
+def test_turn_updates_are_visible_to_the_next_load(store):
+    record = new_record("store-2")
+    store.create(record)
+
+    record.session_state.current_substate = "1.2_problem_and_body"
+    record.session_state.body_questions_asked = 2
+    record.session_state.stage_1_completion["goal_stated"] = True
+    record.session_state.questions_asked_set = {"where do you feel it?"}
+    record.session_state.body_enquiry_cycles = 1
+    record.session_state.add_exchange("my chest", "Where do you feel it?", {"navigation_decision": "body"})
+    record.turn_count = 3
+    record.status = "completed"
+    assert store.save(record, fencing_token=1)
+
+    loaded = store.load("store-2")
+    assert loaded.session_state.current_substate == "1.2_problem_and_body"
+    assert loaded.session_state.body_questions_asked == 2
+    assert loaded.session_state.stage_1_completion["goal_stated"] is True
+    assert loaded.turn_count == 3
+    assert loaded.status == "completed"
+    # Fields beyond the summary survive too, so every worker resumes the same session
+    assert vars(loaded.session_state) == vars(record.session_state)
+
+
+def test_list_and_delete(store):
+    for index in range(3):
+        store.create(new_record(f"store-list-{index}"))
+
+    listed = {entry["session_id"] for entry in store.list_sessions()}
+    assert {"store-list-0", "store-list-1", "store-list-2"} <= listed
+    assert store.count() == 3
+
+    assert store.delete("store-list-1")
+    assert not store.delete("store-list-1")
+    assert store.load("store-list-1") is None
+    assert store.count() == 2
+
+
+def page_ids(store, **filters):
+    """Walk every page (2 per page), checking each page's total"""
+    ids, totals, cursor = [], set(), None
+    while True:
+        page = store.list_page(limit=2, cursor=cursor, **filters)
+        ids += [entry["session_id"] for entry in page.sessions]
+        totals.add(page.total)
+        if page.next_cursor is None:
+            assert totals == {len(ids)}
+            return ids
+        cursor = page.next_cursor
+
+
+def test_paged_listing_with_filters(store):
+    for index in range(5):
+        record = new_record(f"page-{index}")
+        store.create(record)
+        time.sleep(0.002)
+        if index == 2:
+            midpoint = datetime.now()
+            time.sleep(0.002)
+        record.session_state.current_substate = "1.2_problem_and_body" if index % 2 else "1.1_goal_and_vision"
+        record.last_interaction = datetime.now()
+        assert store.commit(record)
+
+    assert page_ids(store) == ["page-4", "page-3", "page-2", "page-1", "page-0"]
+    assert page_ids(store, substate="1.2_problem_and_body") == ["page-3", "page-1"]
+    assert page_ids(store, substate="1.1_goal_and_vision") == ["page-4", "page-2", "page-0"]
+    assert page_ids(store, active_since=midpoint) == ["page-4", "page-3", "page-2"]
+    assert page_ids(store, active_before=midpoint) == ["page-1", "page-0"]
+    assert page_ids(store, substate="1.1_goal_and_vision", active_before=midpoint) == ["page-0"]
+
+    assert store.delete("page-3")
+    assert page_ids(store, substate="1.2_problem_and_body") == ["page-1"]
+    with pytest.raises(InvalidCursorError):
+        store.list_page(cursor="not-a-cursor")
+
+
+def test_async_api_matches_sync(store):
+    async def turn():
+        record = new_record("store-async", client_id="client-a")
+        assert await store.create_async(record)
+        assert not await store.create_async(new_record("store-async"))
+
+        loaded = await store.load_async("store-async")
+        loaded.session_state.current_substate = "1.2_problem_and_body"
+        loaded.turn_count = 1
+        exchange = {"client_input": "my chest", "therapist_response": "Where?"}
+        assert await store.commit_async(loaded, exchange, fencing_token=1)
+
+        listed = await store.list_sessions_async()
+        assert [entry["session_id"] for entry in listed] == ["store-async"]
+        health = await store.health_check_async()
+        assert health["backend"] == store.backend
+        if store.backend != "redis":  # fakeredis has no INFO
+            assert health["status"] == "healthy"
+        return listed[0]
+
+    summary = asyncio.run(turn())
+    assert summary["turn_count"] == 1 and summary["client_id"] == "client-a"
+
+    # Sync readers (scripts, other workers) see what the async path wrote
+    assert store.load("store-async").session_state.current_substate == "1.2_problem_and_body"
+    assert asyncio.run(store.delete_async("store-async"))
+    assert not asyncio.run(store.delete_async("store-async"))
+    assert store.load("store-async") is None
+
+
+def test_async_redis_pool_settings(monkeypatch):
+    monkeypatch.setenv("REDIS_MAX_CONNECTIONS", "8")
+    monkeypatch.setenv("REDIS_SOCKET_TIMEOUT_SECONDS", "0.5")
+    manager = AsyncRedisSessionManager("redis://localhost:6379")
+
+    async def pools():
+        first, again = manager.redis, manager.redis
+        assert first is again
+        pool = first.connection_pool
+        assert pool.max_connections == 8
+        assert pool.connection_kwargs["socket_timeout"] == 0.5
+        assert pool.connection_kwargs["health_check_interval"] == 30
+        await manager.close()
+        return first
+
+    # asyncio connections can't cross event loops: each loop gets its own pool
+    assert asyncio.run(pools()) is not asyncio.run(pools())
+
+
+def test_disk_store_keeps_full_state_and_refuses_stale_writes(tmp_path):
+    store = FileSessionStore(str(tmp_path))
+    record = new_record("../escape")
+    record.session_state.questions_asked_set = {"what else?"}
+    record.session_state.alpha_started = True
+    store.create(record)
+    assert os.listdir(str(tmp_path)) == ["..%2Fescape.session"]
+
+    assert store.save(record, fencing_token=5)
+    assert not store.save(record, fencing_token=4)
+
+    # A second process (or a restart) sees the same session
+    loaded = FileSessionStore(str(tmp_path)).load("../escape")
+    assert loaded.session_state.questions_asked_set == {"what else?"}
+    assert loaded.session_state.alpha_started is True
+
+
+def test_redis_turn_is_one_round_trip_each_way(monkeypatch):
+    import redis
+    store = redis_store(monkeypatch)
+    record = new_record("store-rtt")
+    store.create(record)
+    store.commit(store.load("store-rtt"), {"client_input": "warm-up"}, fencing_token=1)  # Scripts cached
+    store.cache.clear()
+    store.load("store-rtt")
+
+    round_trips = []
+    execute_command = redis.client.Redis.execute_command
+    pipeline_execute = redis.client.Pipeline.execute
+    monkeypatch.setattr(redis.client.Redis, "execute_command",
+                        lambda self, *args, **kwargs: round_trips.append(args[0]) or execute_command(self, *args, **kwargs))
+    monkeypatch.setattr(redis.client.Pipeline, "execute",
+                        lambda self, *args, **kwargs: round_trips.append("PIPELINE") or pipeline_execute(self, *args, **kwargs))
+
+    store.cache.clear()  # Cold load: a worker that hasn't seen this session yet
+    loaded = store.load("store-rtt")
+    assert round_trips == ["EVALSHA"]
+
+    loaded.turn_count += 1
+    assert store.commit(loaded, {"client_input": "my chest", "therapist_response": "Where?"}, fencing_token=2)
+    assert round_trips == ["EVALSHA", "EVALSHA"]
+
+    # Warm load on the same worker: version check only, no state fetch or decode
+    assert store.load("store-rtt") is loaded
+    assert round_trips == ["EVALSHA", "EVALSHA", "HGET"]
+
+    # Everything the commit wrote is there
+    store.cache.clear()
+    assert store.load("store-rtt").turn_count == 1
+    history = store.manager.get_conversation_history("store-rtt")
+    assert [entry["client_input"] for entry in history] == ["my chest", "warm-up"]
+    assert store.manager.redis.ttl(session_key("store-rtt", "stream")) > 0
+    assert store.manager.redis.zscore(activity_key(store.manager._bucket("store-rtt")), "store-rtt") is not None
+
+
+def test_redis_listing_pages_through_equal_activity_times(monkeypatch):
+    store = redis_store(monkeypatch)
+    for index in range(5):
+        store.create(new_record(f"tie-{index}"))
+    # Spread over several index buckets, merged in ID order
+    for index in range(5):
+        store.manager.redis.zadd(activity_key(store.manager._bucket(f"tie-{index}")), {f"tie-{index}": 1000.0})
+    assert len({store.manager._bucket(f"tie-{index}") for index in range(5)}) > 1
+
+    assert page_ids(store) == ["tie-4", "tie-3", "tie-2", "tie-1", "tie-0"]
+    page = asyncio.run(store.list_page_async(limit=3))
+    assert [entry["session_id"] for entry in page.sessions] == ["tie-4", "tie-3", "tie-2"]
+    assert page.sessions[0]["storage"] == "redis" and page.total == 5
+
+    # Indexed sessions whose keys have expired are skipped (still counted until swept from the index)
+    store.manager.redis.delete(session_key("tie-4", "state"))
+    assert [entry["session_id"] for entry in store.list_page(limit=10).sessions][0] == "tie-3"
+
+
+def test_cache_detects_writes_from_other_workers(monkeypatch):
+    import fakeredis
+    server = fakeredis.FakeServer()
+    worker_a, worker_b = redis_store(monkeypatch, server), redis_store(monkeypatch, server)
+    worker_a.create(new_record("store-l1"))
+
+    on_a = worker_a.load("store-l1")
+    assert worker_a.load("store-l1") is on_a
+
+    # A turn served by the other worker bumps the version
+    on_b = worker_b.load("store-l1")
+    on_b.turn_count = 1
+    assert worker_b.commit(on_b)
+    assert worker_a.load("store-l1").turn_count == 1
+
+    # A turn that failed half-way must not leave its changes cached
+    reloaded = worker_a.load("store-l1")
+    reloaded.turn_count = 99
+    worker_a.invalidate("store-l1")
+    assert worker_a.load("store-l1").turn_count == 1
+
+    # Deleted elsewhere: the cached copy isn't served
+    assert worker_b.delete("store-l1")
+    assert worker_a.load("store-l1") is None
+
+
+def test_cache_is_bounded_and_expires():
+    cache = SessionCache(max_entries=2, ttl_seconds=60)
+    for index in range(3):
+        cache.put(f"s{index}", object(), version=1)
+    assert cache.peek("s0") is None and cache.peek("s2") is not None
+    assert cache.stats()["entries"] == 2
+
+    cache.put("s3", object(), version=0)  # Unversioned (legacy) sessions aren't cached
+    assert cache.peek("s3") is None
+
+    expired = SessionCache(max_entries=2, ttl_seconds=0)
+    expired.put("s0", object(), version=1)
+    assert expired.peek("s0") is None
+    assert SessionCache(max_entries=0).peek("s0") is None
+
+
+def test_memory_store_evicts_least_recently_used():
+    store = InMemorySessionStore(max_sessions=2, max_bytes=0)
+    for index in range(3):
+        store.create(new_record(f"lru-{index}"))
+        if index == 1:
+            store.load("lru-0")  # lru-1 is now the least recently used
+    assert store.load("lru-1") is None and store.load("lru-0") is not None
+    assert store.count() == 2 and store.stats()["evicted"] == 1
+
+    # By size: the records' estimated heap use, here a few KB each - well above their compressed blobs
+    sized = InMemorySessionStore(max_sessions=0, max_bytes=1)
+    sized.create(new_record("big-0"))
+    big = new_record("big-1")
+    sized.create(big)
+    assert sized.load("big-0") is None and sized.load("big-1") is not None
+    assert sized.stats()["bytes"] == sized.health_check()["memory"]["bytes"]
+    assert sized.stats()["bytes"] > 2 * len(encode_state(big.session_state, compress=False))
+
+
+def test_memory_store_spills_to_sqlite_and_loads_back(tmp_path):
+    store = InMemorySessionStore(max_sessions=2, max_bytes=0, spill_path=str(tmp_path / "spill.db"))
+    for index in range(4):
+        record = new_record(f"spill-{index}", client_id=f"client-{index}",
+                            last_interaction=datetime.fromtimestamp(1000 + index))
+        record.session_state.current_substate = "1.2_problem_and_body" if index % 2 else "1.1_goal_and_vision"
+        store.create(record)
+    assert store.stats()["sessions"] == 2 and store.stats()["spilled_sessions"] == 2
+    assert store.exists("spill-0") and not store.create(new_record("spill-0"))
+
+    # Listings merge memory and spill, cursor included
+    assert page_ids(store) == ["spill-3", "spill-2", "spill-1", "spill-0"]
+    page = store.list_page(limit=10, substate="1.2_problem_and_body")
+    assert [entry["session_id"] for entry in page.sessions] == ["spill-3", "spill-1"] and page.total == 2
+
+    # A spilled session comes back on load (evicting the least recently used one)
+    loaded = asyncio.run(store.load_async("spill-0"))
+    assert loaded.client_id == "client-0" and loaded.session_state.current_substate == "1.1_goal_and_vision"
+    assert store.stats()["spilled_sessions"] == 2 and store.count() == 4
+
+    # A turn that ran while its session was evicted keeps its (newer) state
+    running = store.load("spill-3")
+    store.load("spill-1")
+    store.load("spill-2")
+    running.turn_count = 5
+    assert store.save(running)
+    assert store.load("spill-3").turn_count == 5 and store.count() == 4
+
+    assert store.delete("spill-1") and store.delete("spill-0") and not store.delete("spill-0")
+    assert store.count() == 2
+
+
+def test_sqlite_store_writes_behind_in_batches(tmp_path):
+    path = str(tmp_path / "sessions.db")
+    store = SqliteSessionStore(path, flush_interval=60, batch_size=10000)
+    record = new_record("writer-1", client_id="client-1")
+    assert store.create(record) and not store.create(new_record("writer-1"))
+    for turn in range(1, 4):
+        record.turn_count = turn
+        assert store.commit(record, {"turn": turn, "client_input": f"turn {turn}"}, fencing_token=turn)
+    assert not store.save(record, fencing_token=2)
+
+    # Nothing is on disk yet, but this process reads its own writes
+    reader = SqliteSessionStore(path)
+    assert reader.load("writer-1") is None
+    assert store.load("writer-1").turn_count == 3 and store.stats()["pending_writes"] == 4
+    assert [e["client_input"] for e in store.get_conversation_history("writer-1", limit=2)] == ["turn 3", "turn 2"]
+
+    # The three turns go out in one transaction
+    assert store.flush(timeout=5) and store.batches == 1 and store.stats()["pending_writes"] == 0
+    assert reader.load("writer-1").turn_count == 3
+    assert [e["client_input"] for e in reader.get_conversation_history("writer-1")] == ["turn 3", "turn 2", "turn 1"]
+
+    # Deleting drops queued history with the session; close() writes what's left
+    store.add_exchange("writer-1", {"turn": 4})
+    assert store.delete("writer-1") and store.get_conversation_history("writer-1") == []
+    store.create(new_record("writer-2"))
+    store.close()
+    assert reader.load("writer-1") is None and reader.get_conversation_history("writer-1") == []
+    assert reader.count() == 1 and reader.load("writer-2") is not None
+    reader.close()
+
+
+def test_sqlite_store_failing_writes_do_not_block_readers(tmp_path, monkeypatch):
+    store = SqliteSessionStore(str(tmp_path / "sessions.db"), flush_interval=0, flush_timeout=0.5)
+    assert store.create(new_record("failing-0")) and store.flush(timeout=5)
+
+    def disk_full(rows, history):
+        raise sqlite3.OperationalError("database or disk is full")
+
+    monkeypatch.setattr(store, "_write_batch", disk_full)
+    store.create(new_record("failing-1"))
+    assert not store.flush(timeout=0.3) and store.failing
+
+    # Listings answer from the file, health says why, and the overlay still serves the session
+    start = time.monotonic()
+    assert store.count() == 1 and [s["session_id"] for s in store.list_page().sessions] == ["failing-0"]
+    health = store.health_check()
+    assert health["status"] == "degraded" and "disk is full" in health["sqlite"]["last_error"]
+    assert store.load("failing-1") is not None
+    store.close(timeout=0.5)
+    assert time.monotonic() - start < 3 and not store._writer.is_alive()
+
+
+def test_incomplete_store_fails_when_created():
+    class LoadOnly(SessionStore):
+        def load(self, session_id):
+            return None
+
+    with pytest.raises(TypeError):
+        LoadOnly()
+
+
+def test_unreachable_redis_falls_back_to_memory(monkeypatch):
+    monkeypatch.setenv("REDIS_URL", "redis://127.0.0.1:1")
+    assert create_session_store("redis").backend == "memory"
+    with pytest.raises(ValueError):
+        create_session_store("postgres")
+
+
+if __name__ == "__main__":
+    sys.exit(pytest.main([__file__, "-q"]))
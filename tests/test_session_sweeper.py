@@ -0,0 +1,136 @@
+"""
+Session Sweeper Tests
+Batched removal of inactive sessions and leader election (fakeredis)
+"""
+
+import sys
+import os
+import time
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pytest
+
+from src.core.session_state_manager import TRTSessionState
+from src.utils.session_sweeper import SessionSweeper, LEADER_KEY
+from src.utils.redis_keys import session_key, activity_key, substate_key
+
+
+@pytest.fixture
+def connect(monkeypatch):
+    fakeredis = pytest.importorskip("fakeredis")
+    pytest.importorskip("lupa")
+    from src.utils import redis_session_manager
+    server = fakeredis.FakeServer()
+    monkeypatch.setattr(redis_session_manager.redis, "from_url",
+                        lambda url, **kwargs: fakeredis.FakeRedis(server=server, **kwargs))
+    return redis_session_manager.RedisSessionManager
+
+
+def index_entry(manager, session_id, last_active, substate):
+    bucket = manager._bucket(session_id)
+    manager.redis.zadd(activity_key(bucket), {session_id: last_active})
+    manager.redis.zadd(substate_key(bucket, substate), {session_id: last_active})
+
+
+def add_session(manager, session_id, last_active, substate="1.1_goal_and_vision"):
+    state = TRTSessionState(session_id)
+    state.current_substate = substate
+    manager.create_session(session_id, state, {"status": "active"})
+    manager.redis.hset(session_key(session_id, "state"), "active_at", last_active)
+    index_entry(manager, session_id, last_active, substate)
+
+
+def members(manager, substate=None):
+    return sorted(member for key in manager._listing_keys(substate) for member in manager.redis.zrange(key, 0, -1))
+
+
+def test_sweep_removes_inactive_sessions_in_batches(connect, monkeypatch):
+    monkeypatch.setenv("TRT_ACTIVITY_INDEX_SHARDS", "1")  # One bucket, so batch counts are predictable
+    manager = connect()
+    old = time.time() - 2 * 86400
+    for index in range(7):
+        add_session(manager, f"old-{index}", old + index)
+    add_session(manager, "live", time.time())
+    # State already expired: only the index entries are left
+    index_entry(manager, "expired", old, "1.2_problem_and_body")
+
+    sweeper = SessionSweeper(manager, interval_seconds=60, idle_seconds=86400, batch_size=3)
+    result = sweeper.sweep_once()
+
+    assert result["sessions"] == 8 and result["batches"] == 3
+    assert members(manager) == ["live"]
+    assert members(manager, "1.2_problem_and_body") == []
+    assert members(manager, "1.1_goal_and_vision") == ["live"]
+    assert not manager.redis.exists(session_key("old-0", "state"), session_key("old-0", "meta"))
+    assert manager.session_exists("live")
+    assert sweeper.get_status()["last_sweep"]["sessions"] == 8
+
+
+def test_sweep_covers_every_index_bucket(connect):
+    manager = connect()
+    old = time.time() - 2 * 86400
+    for index in range(20):
+        add_session(manager, f"old-{index}", old)
+    assert len({manager._bucket(f"old-{index}") for index in range(20)}) > 1
+
+    assert manager.sweep_inactive_sessions(time.time() - 86400)["sessions"] == 20
+    assert manager.get_session_count() == 0
+
+
+def test_sessions_touched_after_the_batch_was_read_are_kept(connect):
+    manager = connect()
+    add_session(manager, "resumed", time.time() - 7200)
+    # Indexed as inactive, but a turn has written the state since (its index
+    # update, a separate step in cluster mode, hasn't landed yet)
+    manager.redis.hset(session_key("resumed", "state"), "active_at", time.time())
+    assert manager.sweep_inactive_sessions(time.time() - 3600)["sessions"] == 0
+    assert manager.session_exists("resumed")
+
+
+def test_kept_sessions_moving_out_of_range_do_not_shift_the_next_batch(connect, monkeypatch):
+    monkeypatch.setenv("TRT_ACTIVITY_INDEX_SHARDS", "1")
+    manager = connect()
+    old = time.time() - 2 * 86400
+    for index, session_id in enumerate(["kept-a", "kept-b", "idle-c", "idle-d", "idle-e"]):
+        add_session(manager, session_id, old + index)
+    for session_id in ("kept-a", "kept-b"):
+        manager.redis.hset(session_key(session_id, "state"), "active_at", time.time())
+
+    idle_sessions = manager.idle_sessions
+    pages = []
+
+    def paged(bucket, cutoff, after=None, num=500):
+        if pages:
+            # The turns that touched the first batch re-index it meanwhile (out of the range)
+            for session_id in ("kept-a", "kept-b"):
+                index_entry(manager, session_id, time.time(), "1.1_goal_and_vision")
+        pages.append(idle_sessions(bucket, cutoff, after, num))
+        return pages[-1]
+
+    monkeypatch.setattr(manager, "idle_sessions", paged)
+    assert manager.sweep_inactive_sessions(time.time() - 86400, batch_size=2)["sessions"] == 3
+    assert members(manager) == ["kept-a", "kept-b"]
+
+
+def test_only_the_leader_sweeps(connect):
+    first, second = SessionSweeper(connect(), interval_seconds=60), SessionSweeper(connect(), interval_seconds=60)
+    assert first.sweep_once() is not None
+    assert second.sweep_once() is None
+    assert first.sweep_once() is not None  # Renews its lease
+
+    # A leader shutting down hands over straight away
+    first.stop()
+    assert second.manager.redis.get(LEADER_KEY) is None
+    assert second.sweep_once() is not None
+
+
+def test_cleanup_inactive_sessions_uses_the_batched_sweep(connect):
+    manager = connect()
+    add_session(manager, "stale", time.time() - 7200)
+    add_session(manager, "fresh", time.time())
+    assert manager.cleanup_inactive_sessions(hours=1) == 1
+    assert manager.list_active_sessions() == ["fresh"]
+
+
+if __name__ == "__main__":
+    sys.exit(pytest.main([__file__, "-q"]))
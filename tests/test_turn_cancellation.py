@@ -0,0 +1,90 @@
+"""
+Turn Cancellation Tests
+In-flight turn registry and cancellation while queued for an LLM slot
+"""
+
+import sys
+import os
+import threading
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pytest
+
+from src.utils.llm_scheduler import LLMScheduler, RequestPriority
+from src.utils.metrics import get_metrics
+from src.utils.turn_context import CancelToken, InFlightTurns, TurnCancelled
+
+
+def test_newer_turn_supersedes_the_one_in_flight():
+    turns = InFlightTurns(supersede=True)
+    first = turns.begin("session-1")
+    other = turns.begin("session-2")
+    second = turns.begin("session-1")
+
+    assert first.cancelled and first.reason == "superseded"
+    assert not second.cancelled
+    assert not other.cancelled
+
+    # The superseded turn finishing late must not unregister its replacement
+    turns.end("session-1", first)
+    assert turns.cancel("session-1", "client_disconnected")
+    assert second.reason == "client_disconnected"
+
+
+def test_newer_turn_takes_over_the_superseded_messages():
+    turns = InFlightTurns(supersede=True)
+    first, _ = turns.takeover("session-1", ["yeah"])
+    second, messages = turns.takeover("session-1", ["my chest feels tight"])
+    assert first.cancelled and messages == ["yeah", "my chest feels tight"]
+    assert not turns.claim("session-1", first) and turns.claim("session-1", second)
+
+    # Claimed (committing): a newer message no longer takes it over, and a retry isn't carried twice
+    third, messages = turns.takeover("session-1", ["still tight"])
+    assert not second.cancelled and messages == ["still tight"]
+    _, messages = turns.takeover("session-1", ["still tight"])
+    assert third.cancelled and messages == ["still tight"]
+
+
+def test_supersede_can_be_disabled():
+    turns = InFlightTurns(supersede=False)
+    first = turns.begin("session-1")
+    turns.begin("session-1")
+    assert not first.cancelled
+
+
+def test_first_cancel_reason_wins_and_is_counted():
+    metrics = get_metrics()
+    before = metrics.get_counter("turn_cancellations_total", labels={"reason": "client_disconnected"})
+
+    token = CancelToken()
+    assert token.cancel("client_disconnected")
+    assert not token.cancel("superseded")
+    assert token.reason == "client_disconnected"
+    with pytest.raises(TurnCancelled):
+        token.raise_if_cancelled()
+
+    assert metrics.get_counter("turn_cancellations_total",
+                               labels={"reason": "client_disconnected"}) == before + 1
+
+
+def test_cancelled_turn_leaves_the_scheduler_queue():
+    scheduler = LLMScheduler(max_concurrency=1, queue_timeout_seconds=5)
+    scheduler.acquire(RequestPriority.DIALOGUE, "holder")
+
+    token = CancelToken()
+    threading.Timer(0.05, token.cancel, args=("superseded",)).start()
+    with pytest.raises(TurnCancelled):
+        scheduler.acquire(RequestPriority.DIALOGUE, "waiter", cancel_token=token)
+
+    assert scheduler.get_status()["queued"]["dialogue"] == 0
+    scheduler.release()
+    assert scheduler.get_status()["active"] == 0
+
+
+if __name__ == "__main__":
+    test_newer_turn_supersedes_the_one_in_flight()
+    test_newer_turn_takes_over_the_superseded_messages()
+    test_supersede_can_be_disabled()
+    test_first_cancel_reason_wins_and_is_counted()
+    test_cancelled_turn_leaves_the_scheduler_queue()
+    print("✅ All turn cancellation tests passed")